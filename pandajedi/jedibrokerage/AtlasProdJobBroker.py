@@ -82,12 +82,16 @@ class AtlasProdJobBroker(JobBrokerBase):
         if self.max_prio_for_bootstrap is None:
             self.max_prio_for_bootstrap = 150
 
-        # load the SW availability map
+        # the SW availability map which is loaded once per task
+        self.sw_map = {}
+
+    # load the SW availability map, which returns None if failed not to be reused for the subsequent input chunks
+    def load_sw_map(self):
         try:
-            self.sw_map = taskBufferIF.load_sw_map()
+            return self.taskBufferIF.load_sw_map()
         except BaseException:
             logger.error("Failed to load the SW tags map!!!")
-            self.sw_map = {}
+            return None
 
     def convertMBpsToWeight(self, mbps):
         """
@@ -130,6 +134,12 @@ class AtlasProdJobBroker(JobBrokerBase):
         retFatal = self.SC_FATAL, inputChunk
         retTmpError = self.SC_FAILED, inputChunk
 
+        # task-independent data are loaded once and reused for the subsequent input chunks of the task,
+        # while job statistics are loaded for each input chunk since they change as jobs are generated
+        self.sw_map = self.get_task_common_or_load("sw_map", self.load_sw_map)
+        if self.sw_map is None:
+            self.sw_map = {}
+
         # new maxwdir
         newMaxwdir = {}
 
@@ -399,7 +409,7 @@ class AtlasProdJobBroker(JobBrokerBase):
         #################################################
         # get the nucleus and the network map
         nucleus = taskSpec.nucleus
-        storageMapping = self.taskBufferIF.getPandaSiteToOutputStorageSiteMapping()
+        storageMapping = self.get_task_common_or_load("storageMapping", self.taskBufferIF.getPandaSiteToOutputStorageSiteMapping)
 
         if nucleus:
             # get connectivity stats to the nucleus
@@ -410,7 +420,10 @@ class AtlasProdJobBroker(JobBrokerBase):
                 transferred_tag = f"{PRD_ACTIVITY}{TRANSFERRED_6H}"
                 queued_tag = f"{PRD_ACTIVITY}{QUEUED}"
 
-            networkMap = self.taskBufferIF.getNetworkMetrics(nucleus, [AGIS_CLOSENESS, transferred_tag, queued_tag, FTS_1H, FTS_1D, FTS_1W])
+            networkMap = self.get_task_common_or_load(
+                f"networkMap_{nucleus}_{transferred_tag}",
+                lambda: self.taskBufferIF.getNetworkMetrics(nucleus, [AGIS_CLOSENESS, transferred_tag, queued_tag, FTS_1H, FTS_1D, FTS_1W]),
+            )
 
         #####################################################
         # filtering out blacklisted or links with long queues
@@ -526,7 +539,7 @@ class AtlasProdJobBroker(JobBrokerBase):
         ):
             # get inactive sites
             inactiveTimeLimit = 2
-            inactiveSites = self.taskBufferIF.getInactiveSites_JEDI("production", inactiveTimeLimit)
+            inactiveSites = self.get_task_common_or_load("inactiveSites", lambda: self.taskBufferIF.getInactiveSites_JEDI("production", inactiveTimeLimit))
             newScanSiteList = []
             oldScanSiteList = copy.copy(scanSiteList)
             newSkippedTmp = dict()
@@ -626,7 +639,7 @@ class AtlasProdJobBroker(JobBrokerBase):
             max_diskio_per_core_default = 10**10
 
         # get the current disk IO usage per site
-        diskio_percore_usage = self.taskBufferIF.getAvgDiskIO_JEDI()
+        diskio_percore_usage = self.get_task_common_or_load("diskio_percore_usage", self.taskBufferIF.getAvgDiskIO_JEDI)
         unified_site_list = self.get_unified_sites(scanSiteList)
         newScanSiteList = []
         oldScanSiteList = copy.copy(scanSiteList)
@@ -1376,7 +1389,7 @@ class AtlasProdJobBroker(JobBrokerBase):
         # selection for nPilot
         nPilotMap = {}
         if not sitePreAssigned and not siteListPreAssigned:
-            nWNmap = self.taskBufferIF.getCurrentSiteData()
+            nWNmap = self.get_task_common_or_load("nWNmap", self.taskBufferIF.getCurrentSiteData)
             newScanSiteList = []
             oldScanSiteList = copy.copy(scanSiteList)
             newSkippedTmp = dict()
@@ -1607,8 +1620,8 @@ class AtlasProdJobBroker(JobBrokerBase):
             tmpLog.error("failed to get job statistics with priority")
             taskSpec.setErrDiag(tmpLog.uploadLog(taskSpec.jediTaskID))
             return retTmpError
-        workerStat = self.taskBufferIF.ups_load_worker_stats()
-        upsQueues = set(self.taskBufferIF.ups_get_queues())
+        workerStat = self.get_task_common_or_load("workerStat", self.taskBufferIF.ups_load_worker_stats)
+        upsQueues = self.get_task_common_or_load("upsQueues", lambda: set(self.taskBufferIF.ups_get_queues()))
         tmpLog.info(f"calculate weight and check cap for {len(scanSiteList)} candidates")
         cutoffName = f"NQUEUELIMITSITE_{taskSpec.gshare}"
         cutOffValue = self.taskBufferIF.getConfigValue(COMPONENT, cutoffName, APP, VO)
@@ -16,6 +16,7 @@ class JobBrokerBase(object):
         self.refresh()
         self.task_common = None
         self.summaryList = None
+        self.droppedSites = None
 
     # set task common dictionary
     def set_task_common_dict(self, task_common):
@@ -30,6 +31,20 @@ class JobBrokerBase(object):
     def set_task_common(self, attr_name, attr_value):
         self.task_common[attr_name] = attr_value
 
+    # get task common attribute, or load it to be reused for the subsequent input chunks of the task
+    def get_task_common_or_load(self, attr_name, load_func):
+        """
+        :param attr_name: attribute name
+        :param load_func: function to load the attribute, which returns None if failed
+        :return: attribute value
+        """
+        attr_value = self.get_task_common(attr_name)
+        if attr_value is None:
+            attr_value = load_func()
+            if attr_value is not None and self.task_common is not None:
+                self.set_task_common(attr_name, attr_value)
+        return attr_value
+
     def refresh(self):
         self.siteMapper = self.taskBufferIF.get_site_mapper()
 
@@ -99,6 +114,7 @@ class JobBrokerBase(object):
         if comment:
             self.summaryList.append(comment)
         self.summaryList.append(f"the number of initial candidates: {len(initial_list)}")
+        self.droppedSites = {}
 
     # dump summary
     def dump_summary(self, tmp_log, final_candidates=None):
@@ -110,6 +126,12 @@ class JobBrokerBase(object):
         if not final_candidates:
             final_candidates = []
         tmp_log.info(f"the number of final candidates: {len(final_candidates)}")
+        # sites dropped by each criterion
+        for message, site_list in self.get_dropped_sites_per_criterion().items():
+            tmp_str = ",".join(sorted(site_list)[:10])
+            if len(site_list) > 10:
+                tmp_str += f",... ({len(site_list) - 10} more)"
+            tmp_log.info(f"dropped by {message} : {tmp_str}")
         tmp_log.info("")
 
     # make summary
@@ -117,6 +139,23 @@ class JobBrokerBase(object):
         if old_list and len(old_list) != len(new_list):
             red = int(math.ceil(((len(old_list) - len(new_list)) * 100) / len(old_list)))
             self.summaryList.append(f"{len(old_list):>5} -> {len(new_list):>3} candidates, {red:>3}% cut : {message}")
+            # record the criterion which dropped each site
+            if self.droppedSites is not None:
+                for tmpSiteName in set(old_list).difference(new_list):
+                    self.droppedSites.setdefault(tmpSiteName, message)
+
+    # get the criterion which dropped each site
+    def get_dropped_sites(self):
+        if not self.droppedSites:
+            return {}
+        return dict(self.droppedSites)
+
+    # get sites dropped by each criterion
+    def get_dropped_sites_per_criterion(self):
+        ret_map = {}
+        for tmpSiteName, message in self.get_dropped_sites().items():
+            ret_map.setdefault(message, []).append(tmpSiteName)
+        return ret_map
 
 
 Interaction.installSC(JobBrokerBase)
@@ -1,10 +1,17 @@
 import datetime
+import hashlib
+import io
+import itertools
 import multiprocessing
 import multiprocessing.reduction
 import os
+import pickle
 import signal
+import struct
 import sys
+import threading
 import time
+from collections import OrderedDict
 
 from pandacommon.pandautils.PandaUtils import naive_utcnow
 
@@ -75,6 +82,35 @@ def dumpStdOut(sender, message):
     print(f"{str(timeNow)} {sender}: INFO    {message}")
 
 
+# header of message with the number of out-of-band buffers
+_messageHeader = struct.Struct("!I")
+
+# counter for request IDs
+_requestIdCounter = itertools.count()
+
+
+# send an object with pickle protocol 5 where large buffers are sent out-of-band without copying
+def sendMessage(connection, obj):
+    buffers = []
+    stream = io.BytesIO()
+    stream.write(_messageHeader.pack(0))
+    multiprocessing.reduction.ForkingPickler(stream, 5, True, buffers.append).dump(obj)
+    data = stream.getbuffer()
+    _messageHeader.pack_into(data, 0, len(buffers))
+    connection.send_bytes(data)
+    del data
+    for buffer in buffers:
+        connection.send_bytes(buffer.raw())
+
+
+# receive an object sent by sendMessage
+def recvMessage(connection):
+    data = connection.recv_bytes()
+    (nBuffers,) = _messageHeader.unpack_from(data)
+    buffers = [connection.recv_bytes() for _ in range(nBuffers)]
+    return pickle.loads(memoryview(data)[_messageHeader.size :], buffers=buffers)
+
+
 # object class for command
 class CommandObject(object):
     # constructor
@@ -91,6 +127,7 @@ class ReturnObject(object):
         self.statusCode = None
         self.errorValue = None
         self.returnValue = None
+        self.cacheStats = None
 
 
 # process class
@@ -101,6 +138,7 @@ class ProcessClass(object):
         self.nused = 0
         self.usedMemory = 0
         self.nMemLookup = 20
+        self.cacheStats = None
         # reduce connection to make it picklable
         self.reduced_pipe = reduce_connection(connection)
 
@@ -154,11 +192,40 @@ class MethodClass(object):
     # method emulation
     def __call__(self, *args, **kwargs):
         commandObj = CommandObject(self.methodName, args, kwargs)
+        return self.voIF.executeCommands([commandObj])[0]
+
+
+# interface class to send command
+class CommandSendInterface(object):
+    # constructor
+    def __init__(self, vo, maxChild, moduleName, className):
+        self.vo = vo
+        self.maxChild = maxChild
+        self.connectionQueue = multiprocessing.Queue(maxChild)
+        self.moduleName = moduleName
+        self.className = className
+
+    # execute commands in a child process
+    def executeCommands(self, commandList, returnExceptions=False):
+        """
+        Send commands to a child process in one message and receive return values identified by request IDs.
+        Commands failed with temporary errors are retried
+
+        :param commandList: list of CommandObject
+        :param returnExceptions: True to return exceptions in the list instead of raising the first one
+        :return: list of return values
+        """
+        # return objects or exceptions for commands
+        results = [None] * len(commandList)
+        pending = list(range(len(commandList)))
         nTry = 3
         for iTry in range(nTry):
             # exceptions
             retException = None
             strException = None
+            # map of request ID to command index
+            requestMap = {next(_requestIdCounter): idx for idx in pending}
+            responseMap = {}
             try:
                 stepIdx = 0
                 # get child process
@@ -166,43 +233,43 @@ class MethodClass(object):
                 # get pipe
                 stepIdx = 1
                 pipe = child_process.connection()
-                # get ack
+                # send commands
                 stepIdx = 2
-                timeoutPeriodACK = 30
-                if not pipe.poll(timeoutPeriodACK):
-                    raise JEDITimeoutError(f"did not get ACK for {timeoutPeriodACK}sec")
-                ack = pipe.recv()
-                # send command
-                stepIdx = 3
-                pipe.send(commandObj)
-                # wait response
-                stepIdx = 4
-                timeoutPeriod = 600
-                timeNow = naive_utcnow()
-                if not pipe.poll(timeoutPeriod):
-                    raise JEDITimeoutError(f"did not get response for {timeoutPeriod}sec")
-                regTime = naive_utcnow() - timeNow
-                if regTime > datetime.timedelta(seconds=60):
-                    dumpStdOut(
-                        self.className,
-                        f"methodName={self.methodName} took {regTime.seconds}.{int(regTime.microseconds / 1000):03d} sec in pid={child_process.pid}",
-                    )
-                # get response
-                stepIdx = 5
-                ret = pipe.recv()
-                # set exception type based on error
-                stepIdx = 6
-                if ret.statusCode == SC_FAILED:
-                    retException = JEDITemporaryError
-                elif ret.statusCode == SC_FATAL:
-                    retException = JEDIFatalError
+                sendMessage(pipe, [(requestID, commandList[idx]) for requestID, idx in requestMap.items()])
+                while len(responseMap) < len(requestMap):
+                    # wait response
+                    stepIdx = 3
+                    timeoutPeriod = 600
+                    timeNow = naive_utcnow()
+                    if not pipe.poll(timeoutPeriod):
+                        raise JEDITimeoutError(f"did not get response for {timeoutPeriod}sec")
+                    # get response
+                    stepIdx = 4
+                    requestID, ret = recvMessage(pipe)
+                    # ignore stale responses
+                    if requestID not in requestMap:
+                        continue
+                    responseMap[requestID] = ret
+                    if ret.cacheStats is not None:
+                        child_process.cacheStats = ret.cacheStats
+                    regTime = naive_utcnow() - timeNow
+                    if regTime > datetime.timedelta(seconds=60):
+                        dumpStdOut(
+                            self.className,
+                            f"methodName={commandList[requestMap[requestID]].methodName} took {regTime.seconds}.{int(regTime.microseconds / 1000):03d} sec "
+                            f"in pid={child_process.pid}",
+                        )
             except Exception:
                 errtype, errvalue = sys.exc_info()[:2]
                 retException = errtype
-                argStr = f"args={str(args)} kargs={str(kwargs)}"
-                strException = f"VO={self.vo} type={errtype.__name__} stepIdx={stepIdx} : {self.className}.{self.methodName} {errvalue} {argStr[:200]}"
+                commandObj = commandList[pending[0]]
+                argStr = f"args={str(commandObj.argList)} kargs={str(commandObj.argMap)}"
+                strException = (
+                    f"VO={self.vo} type={errtype.__name__} stepIdx={stepIdx} : {self.className}.{commandObj.methodName} "
+                    f"nCommands={len(requestMap)} {errvalue} {argStr[:200]}"
+                )
             # increment nused
-            child_process.nused += 1
+            child_process.nused += len(requestMap)
             # memory check
             largeMemory = False
             memUsed = child_process.getMemUsage()
@@ -210,13 +277,13 @@ class MethodClass(object):
                 memStr = f"pid={child_process.pid} memory={memUsed}MB"
                 if memUsed > 1.5 * 1024:
                     largeMemory = True
-                    memStr += " exceeds memory limit"
+                    memStr += f" exceeds memory limit with result cache {child_process.cacheStats}"
                     dumpStdOut(self.className, memStr)
             # kill old or problematic process
-            if child_process.nused > 1000 or retException not in [None, JEDITemporaryError, JEDIFatalError] or largeMemory:
+            if child_process.nused > 1000 or retException is not None or largeMemory:
                 dumpStdOut(
                     self.className,
-                    f"methodName={self.methodName} ret={retException} nused={child_process.nused} {strException} in pid={child_process.pid}",
+                    f"methodName={commandList[pending[0]].methodName} ret={retException} nused={child_process.nused} {strException} in pid={child_process.pid}",
                 )
                 # close connection
                 try:
@@ -235,37 +302,51 @@ class MethodClass(object):
                     if "No child processes" not in str(errvalue):
                         dumpStdOut(self.className, f"failed to terminate {child_process.pid} with {errtype}:{errvalue}")
                 # make new child process
-                self.voIF.launchChild()
+                self.launchChild()
             else:
                 # reduce process object to avoid deadlock due to rebuilding of connection
                 child_process.reduceConnection(pipe)
                 self.connectionQueue.put(child_process)
+            # collect results. commands without response or with temporary errors are retried
+            pending = []
+            for requestID, idx in requestMap.items():
+                ret = responseMap.get(requestID)
+                if ret is None:
+                    results[idx] = retException(strException)
+                    pending.append(idx)
+                elif ret.statusCode == SC_SUCCEEDED:
+                    results[idx] = ret
+                elif ret.statusCode == SC_FATAL:
+                    results[idx] = JEDIFatalError(f"VO={self.vo} {ret.errorValue}")
+                else:
+                    results[idx] = JEDITemporaryError(f"VO={self.vo} {ret.errorValue}")
+                    pending.append(idx)
             # success, fatal error, or maximally attempted
-            if retException in [None, JEDIFatalError] or (iTry + 1 == nTry):
+            if not pending or (iTry + 1 == nTry):
                 break
             # sleep
             time.sleep(1)
-        # raise exception
-        if retException is not None:
-            if strException is None:
-                strException = f"VO={self.vo} {ret.errorValue}"
-            raise retException(strException)
         # return
-        if ret.statusCode == SC_SUCCEEDED:
-            return ret.returnValue
-        else:
-            raise retException(f"VO={self.vo} {ret.errorValue}")
+        retList = []
+        for ret in results:
+            if isinstance(ret, ReturnObject):
+                retList.append(ret.returnValue)
+            elif returnExceptions:
+                retList.append(ret)
+            else:
+                raise ret
+        return retList
 
+    # execute a list of method calls with one message
+    def batchCall(self, calls, returnExceptions=False):
+        """
+        Execute a list of method calls in a child process with one message
 
-# interface class to send command
-class CommandSendInterface(object):
-    # constructor
-    def __init__(self, vo, maxChild, moduleName, className):
-        self.vo = vo
-        self.maxChild = maxChild
-        self.connectionQueue = multiprocessing.Queue(maxChild)
-        self.moduleName = moduleName
-        self.className = className
+        :param calls: list of tuples of method name, args, and kwargs
+        :param returnExceptions: True to return exceptions in the list instead of raising the first one
+        :return: list of return values
+        """
+        return self.executeCommands([CommandObject(methodName, args, kwargs) for methodName, args, kwargs in calls], returnExceptions)
 
     # factory method
     def __getattr__(self, attrName):
@@ -313,99 +394,217 @@ class CommandSendInterface(object):
             self.launchChild()
 
 
+# make a hashable structure of an argument for cache keys
+def freezeArgument(arg):
+    if arg is None or isinstance(arg, (str, bytes, int, float, bool, datetime.datetime, datetime.date, datetime.timedelta)):
+        return arg
+    if isinstance(arg, (list, tuple)):
+        return (type(arg).__name__,) + tuple(freezeArgument(item) for item in arg)
+    if isinstance(arg, dict):
+        return ("dict",) + tuple(sorted(((str(key), freezeArgument(val)) for key, val in arg.items()), key=lambda item: item[0]))
+    if isinstance(arg, (set, frozenset)):
+        return ("set",) + tuple(sorted((freezeArgument(item) for item in arg), key=repr))
+    # other objects are represented by their string as before
+    return (type(arg).__name__, str(arg))
+
+
+# cache of results in child processes
+class ResultCache(object):
+    """
+    LRU cache of method results bounded by the number of entries and the total size of pickled results.
+    Entries expire after the time range given when they are stored, and concurrent calls with the same key
+    wait for the first one to compute the result
+    """
+
+    # constructor
+    def __init__(self, maxEntries=1000, maxBytes=256 * 1024 * 1024, purgeInterval=60):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.purgeInterval = purgeInterval
+        self.lock = threading.Lock()
+        # key: (stored time, time range, size, value)
+        self.entries = OrderedDict()
+        self.nBytes = 0
+        self.lastPurge = time.monotonic()
+        # keys being computed
+        self.inFlight = {}
+        self.stats = {"hits": 0, "misses": 0, "waits": 0, "evictions": 0, "expirations": 0, "uncached": 0}
+
+    # remove an entry
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.nBytes -= entry[2]
+
+    # remove expired entries
+    def _purgeExpired(self, timeNow):
+        if timeNow - self.lastPurge < self.purgeInterval:
+            return
+        self.lastPurge = timeNow
+        for key, (storedTime, timeRange, nBytes, value) in list(self.entries.items()):
+            if timeNow - storedTime > timeRange:
+                self._remove(key)
+                self.stats["expirations"] += 1
+
+    # store a result
+    def _store(self, key, timeRange, value):
+        try:
+            nBytes = len(pickle.dumps(value, protocol=5))
+        except Exception:
+            nBytes = None
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if nBytes is None or nBytes > self.maxBytes:
+                self.stats["uncached"] += 1
+                return
+            self.entries[key] = (time.monotonic(), timeRange, nBytes, value)
+            self.nBytes += nBytes
+            # evict least recently used entries
+            while len(self.entries) > self.maxEntries or self.nBytes > self.maxBytes:
+                self._remove(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+
+    # get a cached result or compute it
+    def getOrCompute(self, key, timeRange, func, isCacheable):
+        """
+        Get a result from the cache if it was stored within timeRange, otherwise compute and store it
+
+        :param key: cache key
+        :param timeRange: time range in seconds
+        :param func: function to compute the result
+        :param isCacheable: function to check if the result can be cached
+        :return: result
+        """
+        while True:
+            with self.lock:
+                timeNow = time.monotonic()
+                self._purgeExpired(timeNow)
+                entry = self.entries.get(key)
+                if entry is not None and timeNow - entry[0] < timeRange:
+                    self.entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[3]
+                event = self.inFlight.get(key)
+                if event is None:
+                    # compute in this thread
+                    event = threading.Event()
+                    self.inFlight[key] = event
+                    self.stats["misses"] += 1
+                    break
+                self.stats["waits"] += 1
+            # wait for the other thread and check the cache again
+            event.wait()
+        try:
+            value = func()
+            if isCacheable(value):
+                self._store(key, timeRange, value)
+            return value
+        finally:
+            with self.lock:
+                del self.inFlight[key]
+            event.set()
+
+    # get statistics
+    def getStats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+            stats["bytes"] = self.nBytes
+        return stats
+
+
 # interface class to receive command
 class CommandReceiveInterface(object):
     # constructor
-    def __init__(self, con):
+    def __init__(self, con, cacheMaxEntries=1000, cacheMaxBytes=256 * 1024 * 1024):
         self.con = con
-        self.cacheMap = {}
+        self.resultCache = ResultCache(cacheMaxEntries, cacheMaxBytes)
 
     # make key for cache
     def makeKey(self, className, methodName, argList, argMap):
         try:
-            tmpKey = f"{className}:{methodName}:"
-            for argItem in argList:
-                tmpKey += f"{str(argItem)}:"
-            for argKey, argVal in argMap.items():
-                tmpKey += f"{argKey}={str(argVal)}:"
-            tmpKey = tmpKey[:-1]
-            return tmpKey
+            tmpKey = (className, methodName, freezeArgument(argList), freezeArgument(argMap))
+            return hashlib.sha256(pickle.dumps(tmpKey, protocol=5)).digest()
         except Exception:
             return None
 
+    # check if a result is successful to be cached
+    def isSucceeded(self, tmpRet):
+        if isinstance(tmpRet, StatusCode):
+            return tmpRet == self.SC_SUCCEEDED
+        if isinstance(tmpRet, (tuple, list)) and len(tmpRet) > 0 and isinstance(tmpRet[0], StatusCode):
+            return tmpRet[0] == self.SC_SUCCEEDED
+        return True
+
     # main loop
     def start(self):
         # sync
         self.con.send("ready")
         # main loop
         while True:
-            # send ACK
-            self.con.send("ack")
-            # get command
-            commandObj = self.con.recv()
-            # make return
-            retObj = ReturnObject()
-            # get class name
-            className = self.__class__.__name__
-            # check method name
-            if not hasattr(self, commandObj.methodName):
-                # method not found
-                retObj.statusCode = self.SC_FATAL
-                retObj.errorValue = f"type=AttributeError : {className} instance has no attribute {commandObj.methodName}"
-            else:
-                try:
+            # get commands with request IDs
+            requests = recvMessage(self.con)
+            for requestID, commandObj in requests:
+                retObj = self.executeCommand(commandObj)
+                # return
+                sendMessage(self.con, (requestID, retObj))
+
+    # execute a command
+    def executeCommand(self, commandObj):
+        # make return
+        retObj = ReturnObject()
+        # get class name
+        className = self.__class__.__name__
+        # check method name
+        if not hasattr(self, commandObj.methodName):
+            # method not found
+            retObj.statusCode = self.SC_FATAL
+            retObj.errorValue = f"type=AttributeError : {className} instance has no attribute {commandObj.methodName}"
+        else:
+            try:
+                # get function
+                functionObj = getattr(self, commandObj.methodName)
+                # make key for cache
+                tmpCacheKey = None
+                if "useResultCache" in commandObj.argMap:
+                    # get time range and delete from args map
+                    timeRange = commandObj.argMap.pop("useResultCache")
+                    tmpCacheKey = self.makeKey(className, commandObj.methodName, commandObj.argList, commandObj.argMap)
+                # exec
+                if tmpCacheKey is not None:
                     # use cache
-                    useCache = False
-                    doExec = True
-                    if "useResultCache" in commandObj.argMap:
-                        # get time range
-                        timeRange = commandObj.argMap["useResultCache"]
-                        # delete from args map
-                        del commandObj.argMap["useResultCache"]
-                        # make key for cache
-                        tmpCacheKey = self.makeKey(className, commandObj.methodName, commandObj.argList, commandObj.argMap)
-                        if tmpCacheKey is not None:
-                            useCache = True
-                            # cache is fresh
-                            if tmpCacheKey in self.cacheMap and self.cacheMap[tmpCacheKey]["utime"] + datetime.timedelta(seconds=timeRange) > naive_utcnow():
-                                tmpRet = self.cacheMap[tmpCacheKey]["value"]
-                                doExec = False
-                    # exec
-                    if doExec:
-                        # get function
-                        functionObj = getattr(self, commandObj.methodName)
-                        # exec
-                        tmpRet = functionObj(*commandObj.argList, **commandObj.argMap)
-                    if isinstance(tmpRet, StatusCode):
-                        # only status code was returned
-                        retObj.statusCode = tmpRet
-                    elif (isinstance(tmpRet, tuple) or isinstance(tmpRet, list)) and len(tmpRet) > 0 and isinstance(tmpRet[0], StatusCode):
-                        retObj.statusCode = tmpRet[0]
-                        # status code + return values
-                        if len(tmpRet) > 1:
-                            if retObj.statusCode == self.SC_SUCCEEDED:
-                                if len(tmpRet) == 2:
-                                    retObj.returnValue = tmpRet[1]
-                                else:
-                                    retObj.returnValue = tmpRet[1:]
+                    tmpRet = self.resultCache.getOrCompute(
+                        tmpCacheKey, timeRange, lambda: functionObj(*commandObj.argList, **commandObj.argMap), self.isSucceeded
+                    )
+                    retObj.cacheStats = self.resultCache.getStats()
+                else:
+                    tmpRet = functionObj(*commandObj.argList, **commandObj.argMap)
+                if isinstance(tmpRet, StatusCode):
+                    # only status code was returned
+                    retObj.statusCode = tmpRet
+                elif (isinstance(tmpRet, tuple) or isinstance(tmpRet, list)) and len(tmpRet) > 0 and isinstance(tmpRet[0], StatusCode):
+                    retObj.statusCode = tmpRet[0]
+                    # status code + return values
+                    if len(tmpRet) > 1:
+                        if retObj.statusCode == self.SC_SUCCEEDED:
+                            if len(tmpRet) == 2:
+                                retObj.returnValue = tmpRet[1]
                             else:
-                                if len(tmpRet) == 2:
-                                    retObj.errorValue = tmpRet[1]
-                                else:
-                                    retObj.errorValue = tmpRet[1:]
-                    else:
-                        retObj.statusCode = self.SC_SUCCEEDED
-                        retObj.returnValue = tmpRet
-                except Exception:
-                    errtype, errvalue = sys.exc_info()[:2]
-                    # failed
-                    retObj.statusCode = self.SC_FATAL
-                    retObj.errorValue = f"type={errtype.__name__} : {className}.{commandObj.methodName} : {errvalue}"
-                # cache
-                if useCache and doExec and retObj.statusCode == self.SC_SUCCEEDED:
-                    self.cacheMap[tmpCacheKey] = {"utime": naive_utcnow(), "value": tmpRet}
-            # return
-            self.con.send(retObj)
+                                retObj.returnValue = tmpRet[1:]
+                        else:
+                            if len(tmpRet) == 2:
+                                retObj.errorValue = tmpRet[1]
+                            else:
+                                retObj.errorValue = tmpRet[1:]
+                else:
+                    retObj.statusCode = self.SC_SUCCEEDED
+                    retObj.returnValue = tmpRet
+            except Exception:
+                errtype, errvalue = sys.exc_info()[:2]
+                # failed
+                retObj.statusCode = self.SC_FATAL
+                retObj.errorValue = f"type={errtype.__name__} : {className}.{commandObj.methodName} : {errvalue}"
+        return retObj
 
 
 # install SCs
@@ -284,6 +284,11 @@ class JediTaskBuffer(TaskBuffer.TaskBuffer, CommandReceiveInterface):
         with self.proxyPool.get() as proxy:
             return proxy.getJobStatisticsByResourceType(workqueue)
 
+    # get snapshot of job statistics for all workqueues and global shares
+    def get_job_statistics_snapshot(self, vo):
+        with self.proxyPool.get() as proxy:
+            return proxy.get_job_statistics_snapshot(vo)
+
     # get job statistics by site and resource type
     def getJobStatisticsByResourceTypeSite(self, workqueue):
         with self.proxyPool.get() as proxy:
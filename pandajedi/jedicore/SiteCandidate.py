@@ -33,19 +33,19 @@ class SiteCandidate(object):
 
     # add local disk files
     def add_local_disk_files(self, files):
-        self.localDiskFiles = self.localDiskFiles.union([f.fileID for f in files])
+        self.localDiskFiles.update(f.fileID for f in files)
 
     # add local tape files
     def add_local_tape_files(self, files):
-        self.localTapeFiles = self.localTapeFiles.union([f.fileID for f in files])
+        self.localTapeFiles.update(f.fileID for f in files)
 
     # add cache files
     def add_cache_files(self, files):
-        self.cacheFiles = self.cacheFiles.union([f.fileID for f in files])
+        self.cacheFiles.update(f.fileID for f in files)
 
     # add remote files
     def add_remote_files(self, files):
-        self.remoteFiles = self.remoteFiles.union([f.fileID for f in files])
+        self.remoteFiles.update(f.fileID for f in files)
 
     # get locality of a file
     def getFileLocality(self, fileSpec):
@@ -36,6 +36,8 @@ from pandajedi.jedicore.MsgWrapper import MsgWrapper
 from pandaserver.dataservice import DataServiceUtils, ddm
 
 from .DDMClientBase import DDMClientBase
+from .DDMMetadataCache import cached_ddm_call, invalidating_ddm_call, make_cache
+from .FileAvailabilityIndex import FileAvailabilityIndex
 
 logger = PandaLogger().getLogger(__name__.split(".")[-1])
 
@@ -58,6 +60,8 @@ class AtlasDDMClient(DDMClientBase):
         self.timeIntervalEP = datetime.timedelta(seconds=60 * 10)
         # pid
         self.pid = os.getpid()
+        # cache of metadata shared by processes
+        self.metadata_cache = make_cache()
 
     # get files in dataset
     def getFilesInDataset(self, datasetName, getNumEvents=False, skipDuplicate=True, ignoreUnknown=False, longFormat=False, lfn_only=False):
@@ -144,6 +148,7 @@ class AtlasDDMClient(DDMClientBase):
         return errCode, f"{methodName} : {errMsg}"
 
     # list dataset replicas
+    @cached_ddm_call("datasetName")
     def listDatasetReplicas(self, datasetName, use_vp=False, detailed=False, skip_incomplete_element=False, use_deep=False, element_list=None):
         methodName = "listDatasetReplicas"
         methodName += f" pid={self.pid}"
@@ -351,17 +356,16 @@ class AtlasDDMClient(DDMClientBase):
 
             # collect GUIDs and LFNs
             file_map = {}  # GUID to LFN
-            lfn_filespec_map = {}  # LFN to file spec
             scope_map = {}  # LFN to scope list
             for tmp_file in dataset_spec.Files:
                 file_map[tmp_file.GUID] = tmp_file.lfn
-                lfn_filespec_map.setdefault(tmp_file.lfn, [])
-                lfn_filespec_map[tmp_file.lfn].append(tmp_file)
                 scope_map[tmp_file.lfn] = tmp_file.scope
 
             complete_replica_map = {}
             endpoint_storagetype_map = {}
             rse_list = []
+            # storage types of endpoints
+            storage_type_cache = {}
 
             # figure out complete replicas and storage types
             for site_name, endpoint_list in site_endpoint_map.items():
@@ -373,11 +377,13 @@ class AtlasDDMClient(DDMClientBase):
                 # loop over all endpoints
                 for endpoint in endpoint_list:
                     # storage type
-                    tmp_status, is_tape = self.getSiteProperty(endpoint, "is_tape")
-                    if is_tape:
-                        storage_type = "localtape"
-                    else:
-                        storage_type = "localdisk"
+                    if endpoint not in storage_type_cache:
+                        tmp_status, is_tape = self.getSiteProperty(endpoint, "is_tape")
+                        if is_tape:
+                            storage_type_cache[endpoint] = "localtape"
+                        else:
+                            storage_type_cache[endpoint] = "localdisk"
+                    storage_type = storage_type_cache[endpoint]
 
                     if (
                         self.SiteHasCompleteReplica(dataset_replica_map, endpoint, total_files_in_dataset)
@@ -404,7 +410,7 @@ class AtlasDDMClient(DDMClientBase):
             # get the file locations from Rucio
             if len(rse_list) > 0:
                 tmp_log.debug(f"lookup file replicas in Rucio for RSEs: {rse_list}")
-                tmp_status, rucio_lfn_to_rse_map = self.jedi_list_replicas(file_map, rse_list, scopes=scope_map)
+                tmp_status, rucio_lfn_to_rse_map = self.jedi_list_replicas(file_map, rse_list, scopes=scope_map, dataset_name=dataset_spec.datasetName)
                 tmp_log.debug(f"lookup file replicas return status: {str(tmp_status)}")
                 if tmp_status != self.SC_SUCCEEDED:
                     raise RuntimeError(rucio_lfn_to_rse_map)
@@ -432,9 +438,13 @@ class AtlasDDMClient(DDMClientBase):
                         if tmp_file.lfn in files_in_container and files_in_container[tmp_file.lfn] in detailed_comp_replica_map:
                             rucio_lfn_to_rse_map[tmp_file.lfn] = detailed_comp_replica_map[files_in_container[tmp_file.lfn]]
 
-            # initialize the return map and add complete/cached replicas
+            # index file replicas
+            availability_index = FileAvailabilityIndex(dataset_spec.Files)
+            if rucio_lfn_to_rse_map:
+                availability_index.add_replicas(rucio_lfn_to_rse_map, endpoint_storagetype_map)
+
+            # make the return map with complete/cached replicas and available files
             return_map = {}
-            checked_dst = set()
             for site_name, tmp_endpoints in site_endpoint_map.items():
                 return_map.setdefault(site_name, {"localdisk": [], "localtape": [], "cache": [], "remote": []})
                 tmp_site_spec = site_mapper.getSite(site_name)
@@ -445,26 +455,19 @@ class AtlasDDMClient(DDMClientBase):
                     return_map[site_name]["cache"] += dataset_spec.Files
 
                 # complete replicas
+                complete_storage_types = set()
                 if not check_LFC:
                     for tmp_endpoint in tmp_endpoints:
                         if tmp_endpoint in complete_replica_map:
                             storage_type = complete_replica_map[tmp_endpoint]
                             return_map[site_name][storage_type] += dataset_spec.Files
-                            checked_dst.add(site_name)
-
-            # loop over all available LFNs
-            available_lfns = sorted(rucio_lfn_to_rse_map.keys())
-            for tmp_lfn in available_lfns:
-                tmp_filespec_list = lfn_filespec_map[tmp_lfn]
-                tmp_filespec = lfn_filespec_map[tmp_lfn][0]
-                for site in site_endpoint_map:
-                    for endpoint in site_endpoint_map[site]:
-                        if endpoint in rucio_lfn_to_rse_map[tmp_lfn] and endpoint in endpoint_storagetype_map:
-                            storage_type = endpoint_storagetype_map[endpoint]
-                            if tmp_filespec not in return_map[site][storage_type]:
-                                return_map[site][storage_type] += tmp_filespec_list
-                            checked_dst.add(site)
-                            break
+                            complete_storage_types.add(storage_type)
+
+                # available files which are not in complete replicas
+                if rucio_lfn_to_rse_map:
+                    for storage_type, file_mask in availability_index.resolve_site(tmp_endpoints, endpoint_storagetype_map).items():
+                        if storage_type not in complete_storage_types:
+                            return_map[site_name][storage_type] += availability_index.get_files(file_mask)
 
             # aggregate all types of storage types into the 'all' key
             for site, storage_type_files in return_map.items():
@@ -495,7 +498,8 @@ class AtlasDDMClient(DDMClientBase):
             tmp_log.error(error_message)
             return self.SC_FAILED, f"{self.__class__.__name__}.{method_name} {error_message}"
 
-    def jedi_list_replicas(self, files, storages, scopes={}):
+    @cached_ddm_call("dataset_name")
+    def jedi_list_replicas(self, files, storages, scopes={}, dataset_name=None):
         try:
             method_name = "jedi_list_replicas"
             method_name += f" pid={self.pid}"
@@ -558,6 +562,7 @@ class AtlasDDMClient(DDMClientBase):
         return self.SC_SUCCEEDED, lfn_to_rses_map
 
     # get dataset metadata
+    @cached_ddm_call("datasetName")
     def getDatasetMetaData(self, datasetName, ignore_missing=False):
         # make logger
         methodName = "getDatasetMetaData"
@@ -644,6 +649,7 @@ class AtlasDDMClient(DDMClientBase):
             return errCode, f"{methodName} : {errMsg}"
 
     # register new dataset/container
+    @invalidating_ddm_call("datasetName")
     def registerNewDataset(self, datasetName, backEnd="rucio", location=None, lifetime=None, metaData=None, resurrect=False):
         methodName = "registerNewDataset"
         methodName += f" pid={self.pid}"
@@ -706,6 +712,7 @@ class AtlasDDMClient(DDMClientBase):
         return retList
 
     # list datasets in container
+    @cached_ddm_call("containerName")
     def listDatasetsInContainer(self, containerName):
         methodName = "listDatasetsInContainer"
         methodName += f" pid={self.pid}"
@@ -783,6 +790,7 @@ class AtlasDDMClient(DDMClientBase):
             return errCode, f"{methodName} : {errMsg}"
 
     # add dataset to container
+    @invalidating_ddm_call("containerName")
     def addDatasetsToContainer(self, containerName, datasetNames, backEnd="rucio"):
         methodName = "addDatasetsToContainer"
         methodName += f" pid={self.pid}"
@@ -909,6 +917,7 @@ class AtlasDDMClient(DDMClientBase):
         return self.SC_SUCCEEDED, latestDBR
 
     # freeze dataset
+    @invalidating_ddm_call("datasetName")
     def freezeDataset(self, datasetName, ignoreUnknown=False):
         methodName = "freezeDataset"
         methodName += f" pid={self.pid}"
@@ -963,6 +972,7 @@ class AtlasDDMClient(DDMClientBase):
             return self.SC_FAILED, err_msg
 
     # set dataset metadata
+    @invalidating_ddm_call("datasetName")
     def setDatasetMetadata(self, datasetName, metadataName, metadaValue):
         methodName = "setDatasetMetadata"
         methodName += f" pid={self.pid}"
@@ -987,6 +997,7 @@ class AtlasDDMClient(DDMClientBase):
         return self.SC_SUCCEEDED, True
 
     # register location
+    @invalidating_ddm_call("datasetName")
     def registerDatasetLocation(
         self, datasetName, location, lifetime=None, owner=None, backEnd="rucio", activity=None, grouping=None, weight=None, copies=1, ignore_availability=True
     ):
@@ -1045,6 +1056,7 @@ class AtlasDDMClient(DDMClientBase):
         return self.SC_SUCCEEDED, True
 
     # delete dataset
+    @invalidating_ddm_call("datasetName")
     def deleteDataset(self, datasetName, emptyOnly, ignoreUnknown=False):
         methodName = "deleteDataset"
         methodName += f" pid={self.pid}"
@@ -1191,6 +1203,7 @@ class AtlasDDMClient(DDMClientBase):
         return retMap
 
     # delete files from dataset
+    @invalidating_ddm_call("datasetName")
     def deleteFilesFromDataset(self, datasetName, filesToDelete):
         methodName = "deleteFilesFromDataset"
         methodName += f" pid={self.pid}"
@@ -1236,7 +1249,14 @@ class AtlasDDMClient(DDMClientBase):
         scope, name = self.extract_scope(raw_name)
         return f"{scope}:{name}"
 
+    # get statistics of the metadata cache
+    def get_metadata_cache_stats(self):
+        if self.metadata_cache is None:
+            return self.SC_SUCCEEDED, None
+        return self.SC_SUCCEEDED, self.metadata_cache.get_stats()
+
     # open dataset
+    @invalidating_ddm_call("datasetName")
     def openDataset(self, datasetName):
         methodName = "openDataset"
         methodName += f" pid={self.pid}"
@@ -0,0 +1,297 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from pandacommon.pandalogger.PandaLogger import PandaLogger
+
+from pandajedi.jediconfig import jedi_config
+from pandajedi.jedicore.Interaction import StatusCode, freezeArgument
+from pandajedi.jedicore.MsgWrapper import MsgWrapper
+
+logger = PandaLogger().getLogger(__name__.split(".")[-1])
+
+# default time-to-live in seconds per call type
+DEFAULT_TTLS = {
+    "getDatasetMetaData": 60,
+    "listDatasetReplicas": 300,
+    "listDatasetsInContainer": 300,
+    "jedi_list_replicas": 300,
+}
+
+
+# cache of DDM metadata shared by processes through a SQLite database on the local disk
+class DDMMetadataCache(object):
+    """
+    Results of DDM lookups are stored with the DID they are about, so that they can be shared by all DDM client processes
+    and invalidated when JEDI changes the DID. Entries expire after the time-to-live of the call type, and results
+    showing that the DID doesn't exist are cached with the negative time-to-live. Least recently used entries are evicted
+    when the number of entries or the total size exceeds the limit, and concurrent calls with the same key in a process
+    wait for the first one to get the result
+    """
+
+    # constructor
+    def __init__(self, path, ttl_map=None, negative_ttl=60, max_entries=10000, max_bytes=512 * 1024 * 1024, purge_interval=60):
+        self.path = path
+        self.ttl_map = dict(DEFAULT_TTLS)
+        if ttl_map:
+            self.ttl_map.update(ttl_map)
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.purge_interval = purge_interval
+        self.last_purge = time.monotonic()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # keys being looked up
+        self.in_flight = {}
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "waits": 0, "errors": 0, "evictions": 0, "invalidations": 0}
+
+    # get the connection of the thread
+    def get_connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ddm_cache (cache_key TEXT PRIMARY KEY, did TEXT, call_type TEXT, "
+                "expire_time REAL, access_time REAL, n_bytes INTEGER, value BLOB)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ddm_cache_did_idx ON ddm_cache (did)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ddm_cache_access_idx ON ddm_cache (access_time)")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    # make a key
+    def make_key(self, call_type, arguments):
+        return hashlib.sha256(pickle.dumps((call_type, freezeArgument(arguments)), protocol=5)).hexdigest()
+
+    # check if a result shows that the DID doesn't exist
+    def is_negative(self, result):
+        if not isinstance(result, (tuple, list)) or len(result) < 2 or not isinstance(result[0], StatusCode):
+            return False
+        if result[0] == StatusCode(0):
+            return isinstance(result[1], dict) and result[1].get("state") == "missing"
+        return "DataIdentifierNotFound" in str(result[1])
+
+    # check if a result can be cached
+    def is_cacheable(self, result):
+        if isinstance(result, (tuple, list)) and len(result) > 0 and isinstance(result[0], StatusCode):
+            return result[0] == StatusCode(0) or self.is_negative(result)
+        return False
+
+    # read an entry
+    def read(self, key):
+        time_now = time.time()
+        conn = self.get_connection()
+        row = conn.execute("SELECT value FROM ddm_cache WHERE cache_key=? AND expire_time>?", (key, time_now)).fetchone()
+        if row is None:
+            return False, None
+        conn.execute("UPDATE ddm_cache SET access_time=? WHERE cache_key=?", (time_now, key))
+        return True, pickle.loads(row[0])
+
+    # write an entry
+    def write(self, key, did, call_type, result):
+        value = pickle.dumps(result, protocol=5)
+        if len(value) > self.max_bytes:
+            return
+        if self.is_negative(result):
+            ttl = self.negative_ttl
+        else:
+            ttl = self.ttl_map.get(call_type, 0)
+        time_now = time.time()
+        self.get_connection().execute(
+            "INSERT OR REPLACE INTO ddm_cache (cache_key,did,call_type,expire_time,access_time,n_bytes,value) VALUES (?,?,?,?,?,?,?)",
+            (key, did, call_type, time_now + ttl, time_now, len(value), value),
+        )
+
+    # get a cached result or get it from DDM
+    def get_or_compute(self, call_type, did, arguments, func):
+        """
+        :param call_type: call type
+        :param did: DID the result is about, which is used for invalidation
+        :param arguments: dictionary of arguments to make the key
+        :param func: function to get the result from DDM
+        :return: result
+        """
+        if self.ttl_map.get(call_type, 0) <= 0:
+            return func()
+        try:
+            key = self.make_key(call_type, arguments)
+        except Exception:
+            return func()
+        while True:
+            try:
+                found, result = self.read(key)
+            except Exception as e:
+                with self.lock:
+                    self.stats["errors"] += 1
+                logger.error(f"failed to read {call_type} for {did} with {str(e)}")
+                return func()
+            with self.lock:
+                if found:
+                    if self.is_negative(result):
+                        self.stats["negative_hits"] += 1
+                    else:
+                        self.stats["hits"] += 1
+                    return result
+                event = self.in_flight.get(key)
+                if event is None:
+                    # get the result in this thread
+                    event = threading.Event()
+                    self.in_flight[key] = event
+                    self.stats["misses"] += 1
+                    break
+                self.stats["waits"] += 1
+            # wait for the other thread and check the cache again
+            event.wait()
+        try:
+            result = func()
+            if self.is_cacheable(result):
+                try:
+                    self.write(key, did, call_type, result)
+                    self.purge()
+                except Exception as e:
+                    with self.lock:
+                        self.stats["errors"] += 1
+                    logger.error(f"failed to write {call_type} for {did} with {str(e)}")
+            return result
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            event.set()
+
+    # invalidate entries of DIDs
+    def invalidate(self, dids):
+        """
+        :param dids: list of DIDs
+        """
+        try:
+            conn = self.get_connection()
+            n_deleted = 0
+            for did in dids:
+                n_deleted += conn.execute("DELETE FROM ddm_cache WHERE did=?", (did,)).rowcount
+            with self.lock:
+                self.stats["invalidations"] += n_deleted
+        except Exception as e:
+            logger.error(f"failed to invalidate {dids} with {str(e)}")
+
+    # remove expired entries and evict least recently used entries
+    def purge(self):
+        with self.lock:
+            time_now = time.monotonic()
+            if time_now - self.last_purge < self.purge_interval:
+                return
+            self.last_purge = time_now
+        tmp_log = MsgWrapper(logger, f"purge pid={os.getpid()}")
+        conn = self.get_connection()
+        conn.execute("DELETE FROM ddm_cache WHERE expire_time<?", (time.time(),))
+        n_entries, n_bytes = conn.execute("SELECT COUNT(*),COALESCE(SUM(n_bytes),0) FROM ddm_cache").fetchone()
+        n_evicted = 0
+        if n_entries > self.max_entries or n_bytes > self.max_bytes:
+            keys = []
+            for key, tmp_bytes in conn.execute("SELECT cache_key,n_bytes FROM ddm_cache ORDER BY access_time"):
+                if n_entries <= self.max_entries and n_bytes <= self.max_bytes:
+                    break
+                keys.append(key)
+                n_entries -= 1
+                n_bytes -= tmp_bytes
+            for key in keys:
+                n_evicted += conn.execute("DELETE FROM ddm_cache WHERE cache_key=?", (key,)).rowcount
+        with self.lock:
+            self.stats["evictions"] += n_evicted
+        stats = self.get_stats()
+        tmp_log.debug(f"entries={n_entries} bytes={n_bytes} " + " ".join(f"{k}={v}" for k, v in stats.items()))
+
+    # get statistics of the process
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        n_lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["negative_hits"]) / n_lookups, 3) if n_lookups else 0.0
+        return stats
+
+
+# make the cache with the configuration
+def make_cache():
+    """
+    :return: DDMMetadataCache, or None if the cache is disabled
+    """
+    path = getattr(jedi_config.ddm, "metadata_cache_path", None)
+    if not path:
+        return None
+    ttl_map = {}
+    for item in getattr(jedi_config.ddm, "metadata_cache_ttls", "").split(","):
+        item = item.strip()
+        if item:
+            call_type, ttl = item.split(":")
+            ttl_map[call_type.strip()] = int(ttl)
+    return DDMMetadataCache(
+        path,
+        ttl_map=ttl_map,
+        negative_ttl=int(getattr(jedi_config.ddm, "metadata_cache_negative_ttl", 60)),
+        max_entries=int(getattr(jedi_config.ddm, "metadata_cache_max_entries", 10000)),
+        max_bytes=int(getattr(jedi_config.ddm, "metadata_cache_max_mb", 512)) * 1024 * 1024,
+    )
+
+
+# decorator to cache results of DDM lookups in the metadata cache of the client
+def cached_ddm_call(did_arg):
+    """
+    :param did_arg: name of the argument giving the DID the result is about
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            cache = getattr(self, "metadata_cache", None)
+            if cache is None:
+                return func(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            del arguments["self"]
+            did = arguments.get(did_arg)
+            if did is not None:
+                # the same key with and without scope
+                raw_name = did
+                did = self.get_did_str(raw_name)
+                arguments[did_arg] = did + "/" if raw_name.endswith("/") else did
+            return cache.get_or_compute(func.__name__, did, arguments, lambda: func(self, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+# decorator to invalidate cached results of a DID which is changed by the method of the client
+def invalidating_ddm_call(did_arg):
+    """
+    :param did_arg: name of the argument giving the DID to be changed
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                cache = getattr(self, "metadata_cache", None)
+                if cache is not None:
+                    did = signature.bind(self, *args, **kwargs).arguments.get(did_arg)
+                    if did is not None:
+                        cache.invalidate([self.get_did_str(did)])
+
+        return wrapper
+
+    return decorator
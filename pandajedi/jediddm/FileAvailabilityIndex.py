@@ -0,0 +1,94 @@
+import numpy as np
+
+
+# columnar index of file replicas to resolve file availability at sites
+class FileAvailabilityIndex(object):
+    """
+    File specs are indexed by LFN in the sorted order, and replicas at each RSE are held as a boolean array over the index,
+    so that files available at a site are resolved with array operations over RSEs rather than with loops over files
+    """
+
+    # constructor
+    def __init__(self, files):
+        """
+        :param files: list of file specs. Multiple file specs can have the same LFN
+        """
+        lfn_filespec_map = {}
+        for tmp_file in files:
+            lfn_filespec_map.setdefault(tmp_file.lfn, []).append(tmp_file)
+        self.lfns = sorted(lfn_filespec_map)
+        self.filespec_lists = [lfn_filespec_map[lfn] for lfn in self.lfns]
+        self.lfn_index = {lfn: i for i, lfn in enumerate(self.lfns)}
+        self.rse_masks = {}
+
+    # number of LFNs
+    def __len__(self):
+        return len(self.lfns)
+
+    # add replicas
+    def add_replicas(self, lfn_to_rses_map, rses=None):
+        """
+        :param lfn_to_rses_map: map of LFN to a collection of RSEs where the file is available
+        :param rses: RSEs to be indexed. None to index all RSEs
+        """
+        index_map = {}
+        if rses is not None:
+            for rse in rses:
+                index_map.setdefault(rse, [])
+        for lfn, tmp_rses in lfn_to_rses_map.items():
+            idx = self.lfn_index.get(lfn)
+            if idx is None:
+                continue
+            for rse in tmp_rses:
+                idx_list = index_map.get(rse)
+                if idx_list is None:
+                    if rses is not None:
+                        continue
+                    idx_list = index_map[rse] = []
+                idx_list.append(idx)
+        for rse, idx_list in index_map.items():
+            mask = self.rse_masks.get(rse)
+            if mask is None:
+                mask = self.rse_masks[rse] = np.zeros(len(self.lfns), dtype=bool)
+            mask[np.array(idx_list, dtype=np.int64)] = True
+
+    # get the mask of files available at an RSE
+    def get_rse_mask(self, rse):
+        mask = self.rse_masks.get(rse)
+        if mask is None:
+            return np.zeros(len(self.lfns), dtype=bool)
+        return mask
+
+    # resolve storage types of files available at a site
+    def resolve_site(self, endpoints, endpoint_storage_type_map):
+        """
+        :param endpoints: endpoints of the site in the order of preference
+        :param endpoint_storage_type_map: map of endpoint to storage type. Endpoints not in the map are ignored
+        :return: map of storage type to the mask of files. Each file is given the storage type of the first endpoint where the file is available
+        """
+        ret_map = {}
+        remaining = np.ones(len(self.lfns), dtype=bool)
+        for endpoint in endpoints:
+            if endpoint not in endpoint_storage_type_map or endpoint not in self.rse_masks:
+                continue
+            hit = self.rse_masks[endpoint] & remaining
+            if not hit.any():
+                continue
+            storage_type = endpoint_storage_type_map[endpoint]
+            if storage_type in ret_map:
+                ret_map[storage_type] |= hit
+            else:
+                ret_map[storage_type] = hit
+            remaining &= ~hit
+        return ret_map
+
+    # get file specs in a mask
+    def get_files(self, mask):
+        """
+        :param mask: mask of files
+        :return: list of file specs in the LFN order
+        """
+        ret_list = []
+        for idx in np.flatnonzero(mask):
+            ret_list += self.filespec_lists[idx]
+        return ret_list
@@ -6,6 +6,7 @@ import random
 import re
 import socket
 import sys
+import threading
 import time
 import traceback
 from urllib.parse import unquote
@@ -23,6 +24,7 @@ from pandajedi.jedicore.ThreadUtils import (
     WorkerThread,
 )
 from pandajedi.jedirefine import RefinerUtils
+from pandajedi.jedithrottle.JobStatsSnapshot import JobStatsSnapshot
 from pandaserver.dataservice import DataServiceUtils
 from pandaserver.dataservice.DataServiceUtils import select_scope
 from pandaserver.srvcore import CoreUtils
@@ -52,6 +54,56 @@ TIME_PROFILE_ON = 1
 TIME_PROFILE_DEEP = 2
 
 
+# combination of VO, prodSourceLabel, cloud, workqueue, and resource type processed in a cycle
+class JobGenCombination:
+    # constructor
+    def __init__(self, pid, vo, prodSourceLabel, cloudName, workQueue, resource_type, cycleStartTime, timeBudget):
+        self.vo = vo
+        self.prodSourceLabel = prodSourceLabel
+        self.cloudName = cloudName
+        self.workQueue = workQueue
+        self.resource_type = resource_type
+        self.active = True
+        self.cycleStartTime = cycleStartTime
+        self.timeBudget = timeBudget
+        self.startTime = None
+        self.endTime = None
+        self.status = None
+        workqueue_name_nice = "_".join(workQueue.queue_name.split(" "))
+        self.cycleStr = "pid={0} vo={1} cloud={2} queue={3} ( id={4} ) label={5} resource_type={6}".format(
+            pid, vo, cloudName, workqueue_name_nice, workQueue.queue_id, prodSourceLabel, resource_type.resource_name
+        )
+
+    # key to sort combinations. active ones first, then by queue order and share
+    def getSortKey(self):
+        queue_order = self.workQueue.queue_order if self.workQueue.queue_order is not None else sys.maxsize
+        queue_share = self.workQueue.queue_share if self.workQueue.queue_share is not None else 0
+        return not self.active, queue_order, -queue_share
+
+    # start processing
+    def start(self):
+        self.startTime = time.monotonic()
+
+    # finish processing
+    def finish(self, status):
+        self.endTime = time.monotonic()
+        self.status = status
+
+    # get remaining time in the time budget
+    def getRemainingTime(self):
+        return self.timeBudget - (time.monotonic() - self.startTime)
+
+    # get latency from the beginning of the cycle
+    def getLatency(self):
+        return self.endTime - self.cycleStartTime
+
+    # dump latency
+    def dumpLatency(self):
+        return "wait={0:.1f} exec={1:.1f} cycle_latency={2:.1f} sec".format(
+            self.startTime - self.cycleStartTime, self.endTime - self.startTime, self.endTime - self.cycleStartTime
+        )
+
+
 # worker class to generate jobs
 class JobGenerator(JediKnight):
     # constructor
@@ -79,10 +131,21 @@ class JobGenerator(JediKnight):
         except AttributeError:
             inactive_poll_probability = 0.25
 
+        # snapshot of job statistics shared by throttlers. It is reloaded every cycle unless the refresh interval is specified
+        jobStatsRefreshInterval = getattr(jedi_config.jobgen, "jobStatsRefreshInterval", None)
+        jobStatsSnapshot = JobStatsSnapshot(self.taskBufferIF, jobStatsRefreshInterval)
+
+        # number of workers to process combinations of cloud, workqueue, and resource type concurrently
+        nCombinationWorkers = getattr(jedi_config.jobgen, "nCombinationWorkers", 1)
+        # time budget in seconds for each combination
+        combinationTimeBudget = getattr(jedi_config.jobgen, "combinationTimeBudget", 60 * 10)
+
         # go into main loop
         while True:
             startTime = naive_utcnow()
+            cycleStartTime = time.monotonic()
             tmpLog = MsgWrapper(logger)
+            combinationList = []
             try:
                 tmpLog.debug("start")
                 # get SiteMapper
@@ -96,15 +159,13 @@ class JobGenerator(JediKnight):
                 if not resource_types:
                     raise RuntimeError("failed to get resource types")
                 tmpLog.debug("got resource types")
-                # get Throttle
-                throttle = JobThrottler(self.vos, self.prodSourceLabels)
-                throttle.initializeMods(self.taskBufferIF)
-                tmpLog.debug("got Throttle")
+                if jobStatsRefreshInterval is None:
+                    jobStatsSnapshot.invalidate()
                 # get TaskSetupper
                 taskSetupper = TaskSetupper(self.vos, self.prodSourceLabels)
                 taskSetupper.initializeMods(self.taskBufferIF, self.ddmIF)
-                # loop over all vos
-                tmpLog.debug("go into loop")
+                # make the list of combinations
+                tmpLog.debug("make combinations")
                 for vo in self.vos:
                     # get the active gshare rtypes combinations in order to reduce polling frequency on unused combinations
                     active_gshare_rtypes = self.taskBufferIF.get_active_gshare_rtypes(vo)
@@ -123,217 +184,40 @@ class JobGenerator(JediKnight):
                             tmpLog.debug(f"{len(workQueueList)} workqueues for vo:{vo} label:{prodSourceLabel}")
                             for workQueue in workQueueList:
                                 for resource_type in resource_types:
-                                    workqueue_name_nice = "_".join(workQueue.queue_name.split(" "))
-                                    cycleStr = "pid={0} vo={1} cloud={2} queue={3} ( id={4} ) label={5} resource_type={6}".format(
-                                        self.pid, vo, cloudName, workqueue_name_nice, workQueue.queue_id, prodSourceLabel, resource_type.resource_name
+                                    combination = JobGenCombination(
+                                        self.pid, vo, prodSourceLabel, cloudName, workQueue, resource_type, cycleStartTime, combinationTimeBudget
                                     )
-                                    tmpLog_inner = MsgWrapper(logger, cycleStr)
-
                                     # reduce the polling frequency on unused combinations
-                                    active = (
+                                    combination.active = (
                                         workQueue.queue_name in active_gshare_rtypes
                                         and resource_type.resource_name in active_gshare_rtypes[workQueue.queue_name]
                                     )
-                                    if active_gshare_rtypes and not active:
+                                    if active_gshare_rtypes and not combination.active:
                                         if random.uniform(0, 1) > inactive_poll_probability:
-                                            tmpLog_inner.debug(f"skipping {cycleStr} due to inactivity")
-                                            continue
-
-                                    tmpLog_inner.debug(f"start {cycleStr}")
-                                    # check if to lock
-                                    lockFlag = self.toLockProcess(vo, prodSourceLabel, workQueue.queue_name, cloudName)
-                                    flagLocked = False
-                                    if lockFlag:
-                                        tmpLog_inner.debug("check if to lock")
-                                        # lock
-                                        flagLocked = self.taskBufferIF.lockProcess_JEDI(
-                                            vo=vo,
-                                            prodSourceLabel=prodSourceLabel,
-                                            cloud=cloudName,
-                                            workqueue_id=workQueue.queue_id,
-                                            resource_name=resource_type.resource_name,
-                                            component=None,
-                                            pid=self.pid,
-                                        )
-                                        if not flagLocked:
-                                            tmpLog_inner.debug("skip since locked by another process")
-                                            continue
-
-                                    # throttle
-                                    tmpLog_inner.debug(f"check throttle with {throttle.getClassName(vo, prodSourceLabel)}")
-                                    try:
-                                        tmpSt, thrFlag = throttle.toBeThrottled(vo, prodSourceLabel, cloudName, workQueue, resource_type.resource_name)
-                                    except Exception:
-                                        errtype, errvalue = sys.exc_info()[:2]
-                                        tmpLog_inner.error(f"throttler failed with {errtype} {errvalue}")
-                                        tmpLog_inner.error(f"throttler failed with traceback {traceback.format_exc()}")
-                                        raise RuntimeError("crashed when checking throttle")
-                                    if tmpSt != self.SC_SUCCEEDED:
-                                        raise RuntimeError("failed to check throttle")
-                                    mergeUnThrottled = None
-                                    if thrFlag is True:
-                                        if flagLocked:
-                                            tmpLog_inner.debug("throttled")
-                                            self.taskBufferIF.unlockProcess_JEDI(
-                                                vo=vo,
-                                                prodSourceLabel=prodSourceLabel,
-                                                cloud=cloudName,
-                                                workqueue_id=workQueue.queue_id,
-                                                resource_name=resource_type.resource_name,
-                                                component=None,
-                                                pid=self.pid,
-                                            )
+                                            MsgWrapper(logger, combination.cycleStr).debug(f"skipping {combination.cycleStr} due to inactivity")
                                             continue
-                                    elif thrFlag is False:
-                                        pass
-                                    else:
-                                        # leveled flag
-                                        mergeUnThrottled = not throttle.mergeThrottled(vo, workQueue.queue_type, thrFlag)
-                                        if not mergeUnThrottled:
-                                            tmpLog_inner.debug("throttled including merge")
-                                            if flagLocked:
-                                                self.taskBufferIF.unlockProcess_JEDI(
-                                                    vo=vo,
-                                                    prodSourceLabel=prodSourceLabel,
-                                                    cloud=cloudName,
-                                                    workqueue_id=workQueue.queue_id,
-                                                    resource_name=resource_type.resource_name,
-                                                    component=None,
-                                                    pid=self.pid,
-                                                )
-                                                continue
-                                        else:
-                                            tmpLog_inner.debug("only merge is unthrottled")
-
-                                    tmpLog_inner.debug(f"minPriority={throttle.minPriority} maxNumJobs={throttle.maxNumJobs}")
-                                    # get typical number of files
-                                    typicalNumFilesMap = self.taskBufferIF.getTypicalNumInput_JEDI(vo, prodSourceLabel, workQueue, useResultCache=600)
-                                    if typicalNumFilesMap is None:
-                                        raise RuntimeError("failed to get typical number of files")
-                                    # get params
-                                    tmpParamsToGetTasks = self.getParamsToGetTasks(vo, prodSourceLabel, workQueue.queue_name, cloudName)
-                                    nTasksToGetTasks = tmpParamsToGetTasks["nTasks"]
-                                    nFilesToGetTasks = tmpParamsToGetTasks["nFiles"]
-                                    tmpLog_inner.debug(f"nTasks={nTasksToGetTasks} nFiles={nFilesToGetTasks} to get tasks")
-                                    # get number of tasks to generate new jumbo jobs
-                                    numTasksWithRunningJumbo = self.taskBufferIF.getNumTasksWithRunningJumbo_JEDI(vo, prodSourceLabel, cloudName, workQueue)
-                                    if not self.withThrottle:
-                                        numTasksWithRunningJumbo = 0
-                                    maxNumTasksWithRunningJumbo = 50
-                                    if numTasksWithRunningJumbo < maxNumTasksWithRunningJumbo:
-                                        numNewTaskWithJumbo = maxNumTasksWithRunningJumbo - numTasksWithRunningJumbo
-                                        if numNewTaskWithJumbo < 0:
-                                            numNewTaskWithJumbo = 0
-                                    else:
-                                        numNewTaskWithJumbo = 0
-                                    # release lock when lack of jobs
-                                    lackOfJobs = False
-                                    if thrFlag is False and flagLocked and throttle.lackOfJobs:
-                                        tmpLog_inner.debug(f"unlock {cycleStr} for multiple processes to quickly fill the queue until nQueueLimit is reached")
-                                        self.taskBufferIF.unlockProcess_JEDI(
-                                            vo=vo,
-                                            prodSourceLabel=prodSourceLabel,
-                                            cloud=cloudName,
-                                            workqueue_id=workQueue.queue_id,
-                                            resource_name=resource_type.resource_name,
-                                            component=None,
-                                            pid=self.pid,
-                                        )
-                                        lackOfJobs = True
-                                    # get the list of input
-                                    tmpList = self.taskBufferIF.getTasksToBeProcessed_JEDI(
-                                        self.pid,
-                                        vo,
-                                        workQueue,
-                                        prodSourceLabel,
-                                        cloudName,
-                                        nTasks=nTasksToGetTasks,
-                                        nFiles=nFilesToGetTasks,
-                                        minPriority=throttle.minPriority,
-                                        maxNumJobs=throttle.maxNumJobs,
-                                        typicalNumFilesMap=typicalNumFilesMap,
-                                        mergeUnThrottled=mergeUnThrottled,
-                                        numNewTaskWithJumbo=numNewTaskWithJumbo,
-                                        resource_name=resource_type.resource_name,
-                                    )
-                                    if tmpList is None:
-                                        # failed
-                                        tmpLog_inner.error("failed to get the list of input chunks to generate jobs")
-                                    else:
-                                        tmpLog_inner.debug(f"got {len(tmpList)} input tasks")
-                                        if len(tmpList) != 0:
-                                            # put to a locked list
-                                            inputList = ListWithLock(tmpList)
-                                            # make thread pool
-                                            threadPool = ThreadPool()
-                                            # make lock if necessary
-                                            if lockFlag:
-                                                liveCounter = MapWithLock()
-                                            else:
-                                                liveCounter = None
-                                            # make list for brokerage lock
-                                            brokerageLockIDs = ListWithLock([])
-                                            # make workers
-                                            nWorker = jedi_config.jobgen.nWorkers
-                                            for iWorker in range(nWorker):
-                                                thr = JobGeneratorThread(
-                                                    inputList,
-                                                    threadPool,
-                                                    self.taskBufferIF,
-                                                    self.ddmIF,
-                                                    siteMapper,
-                                                    self.execJobs,
-                                                    taskSetupper,
-                                                    self.pid,
-                                                    workQueue,
-                                                    resource_type.resource_name,
-                                                    cloudName,
-                                                    liveCounter,
-                                                    brokerageLockIDs,
-                                                    lackOfJobs,
-                                                    resource_types,
-                                                )
-                                                globalThreadPool.add(thr)
-                                                thr.start()
-                                            # join
-                                            tmpLog_inner.debug("try to join")
-                                            threadPool.join(60 * 10)
-                                            # unlock locks made by brokerage
-                                            for brokeragelockID in brokerageLockIDs:
-                                                self.taskBufferIF.unlockProcessWithPID_JEDI(
-                                                    vo, prodSourceLabel, workQueue.queue_name, resource_type.resource_name, brokeragelockID, True
-                                                )
-                                            tmpLog_inner.debug(f"dump one-time pool : {threadPool.dump()} remTasks={inputList.dump()}")
-                                    # unlock
-                                    self.taskBufferIF.unlockProcess_JEDI(
-                                        vo=vo,
-                                        prodSourceLabel=prodSourceLabel,
-                                        cloud=cloudName,
-                                        workqueue_id=workQueue.queue_id,
-                                        resource_name=resource_type.resource_name,
-                                        component=None,
-                                        pid=self.pid,
-                                    )
+                                    combinationList.append(combination)
+                # process combinations in order of priority and share
+                combinationList.sort(key=lambda x: x.getSortKey())
+                tmpLog.debug(f"go into loop with {len(combinationList)} combinations and {nCombinationWorkers} workers")
+                self.runCombinations(combinationList, nCombinationWorkers, jobStatsSnapshot, siteMapper, taskSetupper, resource_types, globalThreadPool)
+                # dump latency of combinations to see which queues starve
+                doneList = [combination for combination in combinationList if combination.endTime is not None]
+                if doneList:
+                    latencyList = [combination.getLatency() for combination in doneList]
+                    tmpLog.info(
+                        f"processed {len(doneList)} combinations in cycle_latency avg={sum(latencyList) / len(latencyList):.1f} max={max(latencyList):.1f} sec"
+                    )
+                    doneList.sort(key=lambda x: x.getLatency(), reverse=True)
+                    for combination in doneList[:10]:
+                        tmpLog.info(f"slowest {combination.cycleStr} status={combination.status} {combination.dumpLatency()}")
             except Exception:
                 errtype, errvalue = sys.exc_info()[:2]
                 tmpLog.error(f"failed in {self.__class__.__name__}.start() with {errtype.__name__}:{errvalue} {traceback.format_exc()}")
             # unlock just in case
-            try:
-                for vo in self.vos:
-                    for prodSourceLabel in self.prodSourceLabels:
-                        for cloudName in self.cloudList:
-                            for workQueue in workQueueList:
-                                self.taskBufferIF.unlockProcess_JEDI(
-                                    vo=vo,
-                                    prodSourceLabel=prodSourceLabel,
-                                    cloud=cloudName,
-                                    workqueue_id=workQueue.queue_id,
-                                    resource_name=resource_type.resource_name,
-                                    component=None,
-                                    pid=self.pid,
-                                )
-            except Exception:
-                pass
+            for combination in combinationList:
+                if combination.startTime is not None and combination.endTime is None:
+                    self.unlockCombination(combination)
             try:
                 # clean up global thread pool
                 globalThreadPool.clean()
@@ -367,15 +251,275 @@ class JobGenerator(JediKnight):
             # randomize cycle
             self.randomSleep(max_val=loopCycle)
 
+    # process a combination of VO, prodSourceLabel, cloud, workqueue, and resource type
+    def processCombination(self, combination, throttle, tmpLog_inner, siteMapper, taskSetupper, resource_types, globalThreadPool):
+        vo = combination.vo
+        prodSourceLabel = combination.prodSourceLabel
+        cloudName = combination.cloudName
+        workQueue = combination.workQueue
+        resource_type = combination.resource_type
+        cycleStr = combination.cycleStr
+        tmpLog_inner.debug(f"start {cycleStr}")
+        # check if to lock
+        lockFlag = self.toLockProcess(vo, prodSourceLabel, workQueue.queue_name, cloudName)
+        flagLocked = False
+        if lockFlag:
+            tmpLog_inner.debug("check if to lock")
+            # lock
+            flagLocked = self.taskBufferIF.lockProcess_JEDI(
+                vo=vo,
+                prodSourceLabel=prodSourceLabel,
+                cloud=cloudName,
+                workqueue_id=workQueue.queue_id,
+                resource_name=resource_type.resource_name,
+                component=None,
+                pid=self.pid,
+            )
+            if not flagLocked:
+                tmpLog_inner.debug("skip since locked by another process")
+                return "locked"
+
+        # throttle
+        tmpLog_inner.debug(f"check throttle with {throttle.getClassName(vo, prodSourceLabel)}")
+        try:
+            tmpSt, thrFlag = throttle.toBeThrottled(vo, prodSourceLabel, cloudName, workQueue, resource_type.resource_name)
+        except Exception:
+            errtype, errvalue = sys.exc_info()[:2]
+            tmpLog_inner.error(f"throttler failed with {errtype} {errvalue}")
+            tmpLog_inner.error(f"throttler failed with traceback {traceback.format_exc()}")
+            raise RuntimeError("crashed when checking throttle")
+        if tmpSt != self.SC_SUCCEEDED:
+            raise RuntimeError("failed to check throttle")
+        mergeUnThrottled = None
+        if thrFlag is True:
+            if flagLocked:
+                tmpLog_inner.debug("throttled")
+                self.taskBufferIF.unlockProcess_JEDI(
+                    vo=vo,
+                    prodSourceLabel=prodSourceLabel,
+                    cloud=cloudName,
+                    workqueue_id=workQueue.queue_id,
+                    resource_name=resource_type.resource_name,
+                    component=None,
+                    pid=self.pid,
+                )
+                return "throttled"
+        elif thrFlag is False:
+            pass
+        else:
+            # leveled flag
+            mergeUnThrottled = not throttle.mergeThrottled(vo, workQueue.queue_type, thrFlag)
+            if not mergeUnThrottled:
+                tmpLog_inner.debug("throttled including merge")
+                if flagLocked:
+                    self.taskBufferIF.unlockProcess_JEDI(
+                        vo=vo,
+                        prodSourceLabel=prodSourceLabel,
+                        cloud=cloudName,
+                        workqueue_id=workQueue.queue_id,
+                        resource_name=resource_type.resource_name,
+                        component=None,
+                        pid=self.pid,
+                    )
+                    return "throttled"
+            else:
+                tmpLog_inner.debug("only merge is unthrottled")
+
+        tmpLog_inner.debug(f"minPriority={throttle.minPriority} maxNumJobs={throttle.maxNumJobs}")
+        # get typical number of files
+        typicalNumFilesMap = self.taskBufferIF.getTypicalNumInput_JEDI(vo, prodSourceLabel, workQueue, useResultCache=600)
+        if typicalNumFilesMap is None:
+            raise RuntimeError("failed to get typical number of files")
+        # get params
+        tmpParamsToGetTasks = self.getParamsToGetTasks(vo, prodSourceLabel, workQueue.queue_name, cloudName)
+        nTasksToGetTasks = tmpParamsToGetTasks["nTasks"]
+        nFilesToGetTasks = tmpParamsToGetTasks["nFiles"]
+        tmpLog_inner.debug(f"nTasks={nTasksToGetTasks} nFiles={nFilesToGetTasks} to get tasks")
+        # get number of tasks to generate new jumbo jobs
+        numTasksWithRunningJumbo = self.taskBufferIF.getNumTasksWithRunningJumbo_JEDI(vo, prodSourceLabel, cloudName, workQueue)
+        if not self.withThrottle:
+            numTasksWithRunningJumbo = 0
+        maxNumTasksWithRunningJumbo = 50
+        if numTasksWithRunningJumbo < maxNumTasksWithRunningJumbo:
+            numNewTaskWithJumbo = maxNumTasksWithRunningJumbo - numTasksWithRunningJumbo
+            if numNewTaskWithJumbo < 0:
+                numNewTaskWithJumbo = 0
+        else:
+            numNewTaskWithJumbo = 0
+        # release lock when lack of jobs
+        lackOfJobs = False
+        if thrFlag is False and flagLocked and throttle.lackOfJobs:
+            tmpLog_inner.debug(f"unlock {cycleStr} for multiple processes to quickly fill the queue until nQueueLimit is reached")
+            self.taskBufferIF.unlockProcess_JEDI(
+                vo=vo,
+                prodSourceLabel=prodSourceLabel,
+                cloud=cloudName,
+                workqueue_id=workQueue.queue_id,
+                resource_name=resource_type.resource_name,
+                component=None,
+                pid=self.pid,
+            )
+            lackOfJobs = True
+        # check the time budget
+        if combination.getRemainingTime() <= 0:
+            tmpLog_inner.warning(f"skip getting tasks since the time budget of {combination.timeBudget} sec was used up")
+            self.taskBufferIF.unlockProcess_JEDI(
+                vo=vo,
+                prodSourceLabel=prodSourceLabel,
+                cloud=cloudName,
+                workqueue_id=workQueue.queue_id,
+                resource_name=resource_type.resource_name,
+                component=None,
+                pid=self.pid,
+            )
+            return "over_budget"
+        # get the list of input
+        tmpList = self.taskBufferIF.getTasksToBeProcessed_JEDI(
+            self.pid,
+            vo,
+            workQueue,
+            prodSourceLabel,
+            cloudName,
+            nTasks=nTasksToGetTasks,
+            nFiles=nFilesToGetTasks,
+            minPriority=throttle.minPriority,
+            maxNumJobs=throttle.maxNumJobs,
+            typicalNumFilesMap=typicalNumFilesMap,
+            mergeUnThrottled=mergeUnThrottled,
+            numNewTaskWithJumbo=numNewTaskWithJumbo,
+            resource_name=resource_type.resource_name,
+        )
+        retStatus = "done"
+        if tmpList is None:
+            # failed
+            tmpLog_inner.error("failed to get the list of input chunks to generate jobs")
+            retStatus = "failed"
+        else:
+            tmpLog_inner.debug(f"got {len(tmpList)} input tasks")
+            if len(tmpList) != 0:
+                # put to a locked list
+                inputList = ListWithLock(tmpList)
+                # make thread pool
+                threadPool = ThreadPool()
+                # make lock if necessary
+                if lockFlag:
+                    liveCounter = MapWithLock()
+                else:
+                    liveCounter = None
+                # make list for brokerage lock
+                brokerageLockIDs = ListWithLock([])
+                # make workers
+                nWorker = jedi_config.jobgen.nWorkers
+                for iWorker in range(nWorker):
+                    thr = JobGeneratorThread(
+                        inputList,
+                        threadPool,
+                        self.taskBufferIF,
+                        self.ddmIF,
+                        siteMapper,
+                        self.execJobs,
+                        taskSetupper,
+                        self.pid,
+                        workQueue,
+                        resource_type.resource_name,
+                        cloudName,
+                        liveCounter,
+                        brokerageLockIDs,
+                        lackOfJobs,
+                        resource_types,
+                    )
+                    globalThreadPool.add(thr)
+                    thr.start()
+                # join
+                tmpLog_inner.debug("try to join")
+                threadPool.join(max(combination.getRemainingTime(), 1))
+                # unlock locks made by brokerage
+                for brokeragelockID in brokerageLockIDs:
+                    self.taskBufferIF.unlockProcessWithPID_JEDI(vo, prodSourceLabel, workQueue.queue_name, resource_type.resource_name, brokeragelockID, True)
+                tmpLog_inner.debug(f"dump one-time pool : {threadPool.dump()} remTasks={inputList.dump()}")
+                if combination.getRemainingTime() <= 0:
+                    retStatus = "over_budget"
+        # unlock
+        self.taskBufferIF.unlockProcess_JEDI(
+            vo=vo,
+            prodSourceLabel=prodSourceLabel,
+            cloud=cloudName,
+            workqueue_id=workQueue.queue_id,
+            resource_name=resource_type.resource_name,
+            component=None,
+            pid=self.pid,
+        )
+        return retStatus
+
+    # process combinations concurrently with a bounded number of workers
+    def runCombinations(self, combinationList, nCombinationWorkers, jobStatsSnapshot, siteMapper, taskSetupper, resource_types, globalThreadPool):
+        combinationQueue = ListWithLock(combinationList)
+
+        def runWorker():
+            # each worker has own throttler since throttlers keep results of the last check
+            throttle = JobThrottler(self.vos, self.prodSourceLabels)
+            throttle.initializeMods(self.taskBufferIF)
+            throttle.setJobStatsSnapshot(jobStatsSnapshot)
+            while True:
+                tmpList = combinationQueue.get(1)
+                if not tmpList:
+                    return
+                combination = tmpList[0]
+                combination.start()
+                tmpLog_inner = MsgWrapper(logger, combination.cycleStr)
+                try:
+                    retStatus = self.processCombination(combination, throttle, tmpLog_inner, siteMapper, taskSetupper, resource_types, globalThreadPool)
+                except Exception:
+                    errtype, errvalue = sys.exc_info()[:2]
+                    tmpLog_inner.error(f"failed with {errtype.__name__}:{errvalue} {traceback.format_exc()}")
+                    retStatus = "failed"
+                    self.unlockCombination(combination)
+                combination.finish(retStatus)
+                tmpLog_inner.debug(f"end status={retStatus} {combination.dumpLatency()}")
+
+        def runWorkerInThread():
+            try:
+                runWorker()
+            except Exception:
+                errtype, errvalue = sys.exc_info()[:2]
+                logger.error(f"combination worker failed with {errtype.__name__}:{errvalue} {traceback.format_exc()}")
+
+        if nCombinationWorkers <= 1:
+            runWorker()
+            return
+        workerList = []
+        for iWorker in range(min(nCombinationWorkers, len(combinationList))):
+            thr = threading.Thread(target=runWorkerInThread)
+            thr.start()
+            workerList.append(thr)
+        for thr in workerList:
+            thr.join()
+
+    # unlock a combination
+    def unlockCombination(self, combination):
+        try:
+            self.taskBufferIF.unlockProcess_JEDI(
+                vo=combination.vo,
+                prodSourceLabel=combination.prodSourceLabel,
+                cloud=combination.cloudName,
+                workqueue_id=combination.workQueue.queue_id,
+                resource_name=combination.resource_type.resource_name,
+                component=None,
+                pid=self.pid,
+            )
+        except Exception:
+            pass
+
     # get parameters to get tasks
     def getParamsToGetTasks(self, vo, prodSourceLabel, queueName, cloudName):
         paramsList = ["nFiles", "nTasks"]
         # get group specified params
         if self.paramsToGetTasks is None:
-            self.paramsToGetTasks = {}
+            # build the map locally and publish it once complete since this is called from concurrent threads
+            paramsToGetTasks = {}
             # loop over all params
             for paramName in paramsList:
-                self.paramsToGetTasks[paramName] = {}
+                paramsToGetTasks[paramName] = {}
                 configParamName = paramName + "PerGroup"
                 # check if param is defined in config
                 if hasattr(jedi_config.jobgen, configParamName):
@@ -388,24 +532,25 @@ class JobGenerator(JediKnight):
                             for tmpVO in tmpVOs.split("|"):
                                 if tmpVO == "":
                                     tmpVO = "any"
-                                self.paramsToGetTasks[paramName][tmpVO] = {}
+                                paramsToGetTasks[paramName][tmpVO] = {}
                                 # loop over all labels
                                 for tmpProdSourceLabel in tmpProdSourceLabels.split("|"):
                                     if tmpProdSourceLabel == "":
                                         tmpProdSourceLabel = "any"
-                                    self.paramsToGetTasks[paramName][tmpVO][tmpProdSourceLabel] = {}
+                                    paramsToGetTasks[paramName][tmpVO][tmpProdSourceLabel] = {}
                                     # loop over all queues
                                     for tmpQueueName in tmpQueueNames.split("|"):
                                         if tmpQueueName == "":
                                             tmpQueueName = "any"
-                                        self.paramsToGetTasks[paramName][tmpVO][tmpProdSourceLabel][tmpQueueName] = {}
+                                        paramsToGetTasks[paramName][tmpVO][tmpProdSourceLabel][tmpQueueName] = {}
                                         for tmpCloudName in tmpCloudNames.split("|"):
                                             if tmpCloudName == "":
                                                 tmpCloudName = "any"
                                             # add
-                                            self.paramsToGetTasks[paramName][tmpVO][tmpProdSourceLabel][tmpQueueName][tmpCloudName] = int(nXYZ)
+                                            paramsToGetTasks[paramName][tmpVO][tmpProdSourceLabel][tmpQueueName][tmpCloudName] = int(nXYZ)
                         except Exception:
                             pass
+            self.paramsToGetTasks = paramsToGetTasks
         # make return
         retMap = {}
         for paramName in paramsList:
@@ -22,6 +22,14 @@ class JobThrottler(FactoryBase):
         self.lackOfJobs = impl.underNqLimit
         return retVal
 
+    # set snapshot of job statistics to all implementations
+    def setJobStatsSnapshot(self, jobStatsSnapshot):
+        for voImplMap in self.implMap.values():
+            for srcImplMap in voImplMap.values():
+                for impl in srcImplMap.values():
+                    if hasattr(impl, "setJobStatsSnapshot"):
+                        impl.setJobStatsSnapshot(jobStatsSnapshot)
+
     # check throttle level
     def mergeThrottled(self, vo, sourceLabel, thrLevel):
         impl = self.getImpl(vo, sourceLabel)
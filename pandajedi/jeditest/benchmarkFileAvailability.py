@@ -0,0 +1,73 @@
+"""
+Benchmark of resolving files available at sites over a synthetic replica map, with the per-LFN loop and FileAvailabilityIndex.
+Each file has replicas at a random subset of RSEs, and each site has a few RSEs some of which are tape.
+
+Usage: python benchmarkFileAvailability.py [nFiles] [nSites] [nRSEsPerSite] [replicaFraction]
+"""
+
+import random
+import sys
+import time
+
+from pandajedi.jediddm.FileAvailabilityIndex import FileAvailabilityIndex
+
+
+# dummy file spec
+class DummyFileSpec(object):
+    def __init__(self, file_id, lfn):
+        self.fileID = file_id
+        self.lfn = lfn
+
+
+# resolve available files with the loop over LFNs
+def resolve_with_loop(files, site_endpoint_map, endpoint_storage_type_map, lfn_to_rses_map):
+    lfn_filespec_map = {}
+    for tmp_file in files:
+        lfn_filespec_map.setdefault(tmp_file.lfn, []).append(tmp_file)
+    return_map = {site: {"localdisk": [], "localtape": []} for site in site_endpoint_map}
+    for tmp_lfn in sorted(lfn_to_rses_map):
+        tmp_filespec_list = lfn_filespec_map[tmp_lfn]
+        tmp_filespec = tmp_filespec_list[0]
+        for site, endpoints in site_endpoint_map.items():
+            for endpoint in endpoints:
+                if endpoint in lfn_to_rses_map[tmp_lfn] and endpoint in endpoint_storage_type_map:
+                    storage_type = endpoint_storage_type_map[endpoint]
+                    if tmp_filespec not in return_map[site][storage_type]:
+                        return_map[site][storage_type] += tmp_filespec_list
+                    break
+    return return_map
+
+
+# resolve available files with the index
+def resolve_with_index(files, site_endpoint_map, endpoint_storage_type_map, lfn_to_rses_map):
+    availability_index = FileAvailabilityIndex(files)
+    availability_index.add_replicas(lfn_to_rses_map, endpoint_storage_type_map)
+    return_map = {site: {"localdisk": [], "localtape": []} for site in site_endpoint_map}
+    for site, endpoints in site_endpoint_map.items():
+        for storage_type, file_mask in availability_index.resolve_site(endpoints, endpoint_storage_type_map).items():
+            return_map[site][storage_type] += availability_index.get_files(file_mask)
+    return return_map
+
+
+if __name__ == "__main__":
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_sites = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    n_rses_per_site = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    replica_fraction = float(sys.argv[4]) if len(sys.argv) > 4 else 0.1
+
+    random.seed(0)
+    files = [DummyFileSpec(i, f"EVNT.{i:08d}.pool.root.1") for i in range(n_files)]
+    site_endpoint_map = {f"SITE_{i}": [f"SITE_{i}_RSE_{j}" for j in range(n_rses_per_site)] for i in range(n_sites)}
+    all_rses = [rse for endpoints in site_endpoint_map.values() for rse in endpoints]
+    endpoint_storage_type_map = {rse: "localtape" if random.random() < 0.2 else "localdisk" for rse in all_rses}
+    lfn_to_rses_map = {}
+    for tmp_file in files:
+        lfn_to_rses_map[tmp_file.lfn] = {rse: [] for rse in all_rses if random.random() < replica_fraction}
+
+    results = {}
+    for label, func in [("loop", resolve_with_loop), ("index", resolve_with_index)]:
+        t_start = time.perf_counter()
+        results[label] = func(files, site_endpoint_map, endpoint_storage_type_map, lfn_to_rses_map)
+        elapsed = time.perf_counter() - t_start
+        print(f"{label:6s} : nFiles={n_files} nSites={n_sites} nRSEs={len(all_rses)} {elapsed:.3f} sec")
+    print(f"identical results : {results['loop'] == results['index']}")
@@ -0,0 +1,52 @@
+"""
+Benchmark of calls per second through Interaction for small and large payloads, with single calls and batchCall.
+
+Usage: python benchmarkInteraction.py [nCalls] [largePayloadMB] [batchSize]
+"""
+
+import sys
+import time
+
+from pandajedi.jedicore.Interaction import CommandReceiveInterface, CommandSendInterface
+
+
+# dummy receiver which echoes payloads
+class EchoReceiver(CommandReceiveInterface):
+    def __init__(self, con):
+        CommandReceiveInterface.__init__(self, con)
+
+    def echo(self, payload):
+        return self.SC_SUCCEEDED, payload
+
+    def make_payload(self, size):
+        return self.SC_SUCCEEDED, bytearray(size)
+
+
+# measure calls per second
+def measure(label, func, n_calls):
+    t_start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - t_start
+    print(f"{label:24s} : {n_calls / elapsed:10.1f} calls/sec")
+
+
+if __name__ == "__main__":
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    large_size = int(float(sys.argv[2]) * 1024 * 1024) if len(sys.argv) > 2 else 8 * 1024 * 1024
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    n_large = max(1, n_calls // 100)
+
+    # the child is forked, so the receiver class is taken from this module
+    interface = CommandSendInterface("any", 1, "__main__", "EchoReceiver")
+    interface.initialize()
+
+    small_payload = {"jediTaskID": 123, "status": "running", "attrs": list(range(10))}
+    measure("small single", lambda: [interface.echo(small_payload) for _ in range(n_calls)], n_calls)
+    measure(
+        f"small batch of {batch_size}",
+        lambda: [interface.batchCall([("echo", (small_payload,), {})] * batch_size) for _ in range(n_calls // batch_size)],
+        n_calls // batch_size * batch_size,
+    )
+    measure(f"large {large_size // 1024 // 1024}MB result", lambda: [interface.make_payload(large_size) for _ in range(n_large)], n_large)
+    large_payload = bytearray(large_size)
+    measure(f"large {large_size // 1024 // 1024}MB echo", lambda: [interface.echo(large_payload) for _ in range(n_large)], n_large)
@@ -0,0 +1,156 @@
+"""
+Replayable benchmark of AtlasProdJobBroker.doBrokerage.
+The capture mode runs the brokerage for input chunks of a task like brokerTest.py, and records the inputs and the results
+of all calls to the task buffer and DDM interfaces in a file. The replay mode runs the brokerage with the recorded results
+without the database or DDM, with and without reusing task-independent data between input chunks, and reports the time
+and the number of interface calls per input chunk together with the sites dropped by each criterion.
+
+Usage: python benchmarkProdJobBroker.py capture <jediTaskID> <captureFile> [datasetID]
+       python benchmarkProdJobBroker.py replay <captureFile> [nIterations]
+"""
+
+import collections
+import copy
+import pickle
+import sys
+import time
+
+from pandacommon.pandalogger.PandaLogger import PandaLogger
+
+from pandajedi.jedibrokerage.AtlasProdJobBroker import AtlasProdJobBroker
+from pandajedi.jedicore.Interaction import freezeArgument
+from pandajedi.jedicore.MsgWrapper import MsgWrapper
+
+logger = PandaLogger().getLogger("benchmarkProdJobBroker")
+
+
+# make a key of a call
+def make_call_key(method_name, args, kwargs):
+    return method_name, freezeArgument(args), freezeArgument(kwargs)
+
+
+# interface to record results of calls
+class RecordingInterface(object):
+    def __init__(self, target, records):
+        self.target = target
+        self.records = records
+
+    def __getattr__(self, method_name):
+        target_method = getattr(self.target, method_name)
+        if not callable(target_method):
+            return target_method
+
+        def record(*args, **kwargs):
+            ret = target_method(*args, **kwargs)
+            self.records[make_call_key(method_name, args, kwargs)] = pickle.dumps(ret)
+            return ret
+
+        return record
+
+
+# interface to replay recorded results
+class ReplayInterface(object):
+    def __init__(self, records):
+        self.records = records
+        self.n_calls = collections.Counter()
+
+    def __getattr__(self, method_name):
+        def replay(*args, **kwargs):
+            self.n_calls[method_name] += 1
+            ret = self.records.get(make_call_key(method_name, args, kwargs))
+            if ret is None:
+                return None
+            return pickle.loads(ret)
+
+        return replay
+
+
+# capture inputs and results of calls
+def capture(jedi_task_id, capture_file, dataset_ids):
+    from pandajedi.jedicore.JediTaskBufferInterface import JediTaskBufferInterface
+    from pandajedi.jedicore.ThreadUtils import ThreadPool
+    from pandajedi.jediddm.DDMInterface import DDMInterface
+    from pandajedi.jediorder.JobGenerator import JobGeneratorThread
+
+    tbIF = JediTaskBufferInterface()
+    tbIF.setupInterface()
+    ddmIF = DDMInterface()
+    ddmIF.setupInterface()
+    s, taskSpec = tbIF.getTaskWithID_JEDI(jedi_task_id)
+    workQueue = tbIF.getWorkQueueMap().getQueueWithID(taskSpec.workQueue_ID, taskSpec.gshare)
+    tmpListList = tbIF.getTasksToBeProcessed_JEDI(
+        None,
+        taskSpec.vo,
+        workQueue,
+        taskSpec.prodSourceLabel,
+        taskSpec.cloud,
+        nFiles=10,
+        simTasks=[jedi_task_id],
+        fullSimulation=True,
+        typicalNumFilesMap={},
+        simDatasets=dataset_ids,
+    )
+    tb_records = {}
+    ddm_records = {}
+    tb_recorder = RecordingInterface(tbIF, tb_records)
+    ddm_recorder = RecordingInterface(ddmIF.getInterface(taskSpec.vo), ddm_records)
+    gen = JobGeneratorThread(None, ThreadPool(), tbIF, ddmIF, tbIF.get_site_mapper(), False, None, None, None, "dummy", None, None)
+    chunks = []
+    for dummyID, tmpList in tmpListList:
+        task_common = {}
+        for taskSpec, cloudName, inputChunk in tmpList:
+            taskParamMap = None
+            if taskSpec.useLimitedSites():
+                tmpStat, taskParamMap = gen.readTaskParams(taskSpec, taskParamMap, MsgWrapper(logger))
+            # inputs are recorded before the brokerage changes them
+            chunks.append(pickle.dumps((taskSpec, cloudName, inputChunk, taskParamMap)))
+            jobBroker = AtlasProdJobBroker(ddm_recorder, tb_recorder)
+            jobBroker.setTestMode()
+            jobBroker.set_task_common_dict(task_common)
+            tmpStat, inputChunk = jobBroker.doBrokerage(taskSpec, cloudName, inputChunk, taskParamMap)
+            print(f"captured jediTaskID={taskSpec.jediTaskID} datasetID={inputChunk.masterIndexName} status={tmpStat}")
+    with open(capture_file, "wb") as f:
+        pickle.dump({"chunks": chunks, "tb_records": tb_records, "ddm_records": ddm_records}, f)
+    print(f"captured {len(chunks)} input chunks with {len(tb_records)} task buffer calls and {len(ddm_records)} DDM calls to {capture_file}")
+
+
+# replay the brokerage
+def replay(capture_file, n_iterations):
+    with open(capture_file, "rb") as f:
+        captured = pickle.load(f)
+    for reuse_task_common in [False, True]:
+        label = "reuse" if reuse_task_common else "no reuse"
+        elapsed_list = []
+        n_calls = collections.Counter()
+        dropped_map = {}
+        for i_iteration in range(n_iterations):
+            task_common = {} if reuse_task_common else None
+            for pickled_chunk in captured["chunks"]:
+                taskSpec, cloudName, inputChunk, taskParamMap = pickle.loads(pickled_chunk)
+                tb_replayer = ReplayInterface(captured["tb_records"])
+                ddm_replayer = ReplayInterface(captured["ddm_records"])
+                t_start = time.perf_counter()
+                jobBroker = AtlasProdJobBroker(ddm_replayer, tb_replayer)
+                jobBroker.setTestMode()
+                jobBroker.set_task_common_dict(task_common)
+                jobBroker.doBrokerage(taskSpec, cloudName, inputChunk, copy.copy(taskParamMap), glLog=MsgWrapper(logger))
+                elapsed_list.append(time.perf_counter() - t_start)
+                n_calls.update(tb_replayer.n_calls)
+                n_calls.update(ddm_replayer.n_calls)
+                dropped_map = jobBroker.get_dropped_sites_per_criterion()
+        n_chunks = max(len(elapsed_list), 1)
+        elapsed_list.sort()
+        print(
+            f"{label:8s} : chunks={len(captured['chunks'])} iterations={n_iterations} "
+            f"median={elapsed_list[len(elapsed_list) // 2] * 1000:.1f}ms max={elapsed_list[-1] * 1000:.1f}ms "
+            f"calls/chunk={sum(n_calls.values()) / n_chunks:.1f}"
+        )
+    for message, site_list in dropped_map.items():
+        print(f"  dropped by {message} : {len(site_list)} sites")
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == "capture":
+        capture(int(sys.argv[2]), sys.argv[3], [int(sys.argv[4])] if len(sys.argv) > 4 else None)
+    else:
+        replay(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 10)
@@ -0,0 +1,108 @@
+"""
+Micro-benchmark of the split rule getters of JediTaskSpec, which are called for each job in a generation cycle by
+JobSplitter and JobGenerator. The getters with the parsed split rule are compared with the getters searching the raw
+split rule string with regular expressions for each call, and results of both are checked to be identical.
+
+Usage: python benchmarkSplitRule.py [nJobs] [splitRule]
+"""
+
+import re
+import sys
+import time
+
+from pandaserver.taskbuffer.JediTaskSpec import JediTaskSpec
+
+# getters called for each job in a generation cycle
+getters = [
+    "getNumFilesPerJob",
+    "getMaxNumFilesPerJob",
+    "getMaxSizePerJob",
+    "getNumEventsPerJob",
+    "get_max_events_per_job",
+    "getMaxWalltime",
+    "getNumSitesPerJob",
+    "getNumEventServiceConsumer",
+    "getNumJumboJobs",
+    "useGroupWithBoundaryID",
+    "dynamicNumEvents",
+    "useJobCloning",
+    "useRandomSeed",
+    "getRndmSeedOffset",
+    "getFirstEventOffset",
+    "usePrePro",
+    "useLocalIO",
+    "useLoadXML",
+    "useFileAsSourceLFN",
+    "instantiateTmpl",
+    "mergeOutput",
+    "is_fine_grained_process",
+    "on_site_merging",
+    "inFilePosEvtNum",
+    "getAltStageOut",
+    "getMaxAttemptEsJob",
+    "toRegisterDatasets",
+    "is_hpo_workflow",
+    "getDdmBackEnd",
+]
+
+
+# task spec with the getters searching the raw split rule string for each call
+class RegexJediTaskSpec(JediTaskSpec):
+    def check_split_rule(self, key):
+        if self.splitRule is not None:
+            if re.search(self.splitRuleToken[key] + r"=(\d+)", self.splitRule):
+                return True
+        return False
+
+    def get_split_rule_int(self, key, default=None):
+        if self.splitRule is not None:
+            tmpMatch = re.search(self.splitRuleToken[key] + r"=(\d+)", self.splitRule)
+            if tmpMatch is not None:
+                return int(tmpMatch.group(1))
+        return default
+
+    def get_split_rule_digits(self, key, default=None):
+        if self.splitRule is not None:
+            tmpMatch = re.search(self.splitRuleToken[key] + r"=(\d+)", self.splitRule)
+            if tmpMatch is not None:
+                return tmpMatch.group(1)
+        return default
+
+    def getDdmBackEnd(self):
+        if self.splitRule is not None:
+            tmpMatch = re.search(self.splitRuleToken["ddmBackEnd"] + "=([^,$]+)", self.splitRule)
+            if tmpMatch is not None:
+                return tmpMatch.group(1)
+        return None
+
+
+# make a task spec
+def make_task_spec(cls, split_rule):
+    task_spec = cls()
+    task_spec.splitRule = split_rule
+    task_spec.eventService = 0
+    task_spec.useJumbo = None
+    return task_spec
+
+
+# call the getters for each job
+def run_cycle(task_spec, n_jobs):
+    results = []
+    for _ in range(n_jobs):
+        results.append([getattr(task_spec, getter)() for getter in getters])
+    return results
+
+
+if __name__ == "__main__":
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    split_rule = sys.argv[2] if len(sys.argv) > 2 else "NF=5,NG=10,MF=200,RS=1,FT=1,MW=24,DE=rucio,US=1,CC=8,NP=1,TW=-1,UE=1,LS=1,IP=1,UT=1"
+
+    results = {}
+    for label, cls in [("regex", RegexJediTaskSpec), ("parsed", JediTaskSpec)]:
+        task_spec = make_task_spec(cls, split_rule)
+        t_start = time.perf_counter()
+        results[label] = run_cycle(task_spec, n_jobs)
+        elapsed = time.perf_counter() - t_start
+        n_calls = n_jobs * len(getters)
+        print(f"{label:6s} : nJobs={n_jobs} nCalls={n_calls} {elapsed:.3f} sec {elapsed / n_calls * 1e9:.0f} ns/call")
+    print(f"identical results : {results['regex'] == results['parsed']}")
@@ -0,0 +1,107 @@
+"""
+Check the DDM metadata cache of AtlasDDMClient with a local stand-in for the Rucio client, which counts calls to Rucio.
+Lookups are repeated in multiple threads to see hits and request coalescing, and freezing a dataset invalidates its entries.
+
+Usage: python ddmMetadataCacheTest.py [cachePath]
+"""
+
+import collections
+import os
+import sys
+import tempfile
+import threading
+
+from rucio.common.exception import DataIdentifierNotFound
+
+from pandajedi.jediconfig import jedi_config
+from pandajedi.jediddm import AtlasDDMClient as AtlasDDMClientModule
+
+
+# local stand-in for the Rucio client
+class LocalRucioClient(object):
+    account = "jedi"
+    n_calls = collections.Counter()
+    lock = threading.Lock()
+    # DIDs
+    dids = {
+        ("mc23", "mc23.123.EVNT.e1_tid01"): {"did_type": "DATASET", "is_open": False, "length": 3},
+        ("mc23", "mc23.123.EVNT.e1_tid02"): {"did_type": "DATASET", "is_open": True, "length": 2},
+        ("mc23", "mc23.123.EVNT.e1"): {"did_type": "CONTAINER", "is_open": True, "length": None},
+    }
+    # contents of containers
+    contents = {("mc23", "mc23.123.EVNT.e1"): [("mc23", "mc23.123.EVNT.e1_tid01"), ("mc23", "mc23.123.EVNT.e1_tid02")]}
+    # dataset replicas
+    dataset_replicas = {
+        ("mc23", "mc23.123.EVNT.e1_tid01"): [("CERN-PROD_DATADISK", 3, 3)],
+        ("mc23", "mc23.123.EVNT.e1_tid02"): [("CERN-PROD_DATADISK", 2, 1), ("BNL-OSG2_DATADISK", 2, 2)],
+    }
+
+    def count(self, method_name):
+        with self.lock:
+            self.n_calls[method_name] += 1
+
+    def get_metadata(self, scope, name):
+        self.count("get_metadata")
+        if (scope, name) not in self.dids:
+            raise DataIdentifierNotFound(f"{scope}:{name}")
+        return dict(self.dids[(scope, name)], scope=scope, name=name)
+
+    def set_status(self, scope, name, open):
+        self.count("set_status")
+        self.dids[(scope, name)]["is_open"] = open
+
+    def list_content(self, scope, name):
+        self.count("list_content")
+        return [{"scope": s, "name": n, "type": self.dids[(s, n)]["did_type"]} for s, n in self.contents.get((scope, name), [])]
+
+    def list_dataset_replicas(self, scope, name, deep=False):
+        self.count("list_dataset_replicas")
+        return [
+            {"rse": rse, "length": length, "available_length": available, "bytes": length, "available_bytes": available}
+            for rse, length, available in self.dataset_replicas.get((scope, name), [])
+        ]
+
+    def list_dataset_replicas_vp(self, scope, name):
+        self.count("list_dataset_replicas_vp")
+        return []
+
+
+# run lookups in threads
+def run_in_threads(func, n_threads=8):
+    threads = [threading.Thread(target=func) for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    cache_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.mkdtemp(), "ddm_metadata_cache.db")
+    jedi_config.ddm.metadata_cache_path = cache_path
+    AtlasDDMClientModule.RucioClient = LocalRucioClient
+    ddm_client = AtlasDDMClientModule.AtlasDDMClient(None)
+
+    # metadata
+    run_in_threads(lambda: ddm_client.getDatasetMetaData("mc23:mc23.123.EVNT.e1_tid02"))
+    print(f"getDatasetMetaData x8 : get_metadata calls={LocalRucioClient.n_calls['get_metadata']}")
+    assert LocalRucioClient.n_calls["get_metadata"] == 1
+
+    # negative caching
+    for _ in range(3):
+        tmp_status, tmp_out = ddm_client.getDatasetMetaData("mc23:mc23.123.EVNT.missing")
+    print(f"getDatasetMetaData for missing x3 : status={tmp_status} get_metadata calls={LocalRucioClient.n_calls['get_metadata']}")
+    assert LocalRucioClient.n_calls["get_metadata"] == 2
+
+    # container replicas, which look up contents and metadata of constituents through the cache
+    run_in_threads(lambda: ddm_client.listDatasetReplicas("mc23:mc23.123.EVNT.e1/"))
+    tmp_status, tmp_out = ddm_client.listDatasetReplicas("mc23.123.EVNT.e1/")
+    print(f"listDatasetReplicas x9 : {tmp_out} calls={dict(LocalRucioClient.n_calls)}")
+    assert LocalRucioClient.n_calls["list_content"] == 1
+
+    # invalidation when the dataset is frozen
+    ddm_client.freezeDataset("mc23:mc23.123.EVNT.e1_tid02")
+    tmp_status, tmp_out = ddm_client.getDatasetMetaData("mc23:mc23.123.EVNT.e1_tid02")
+    print(f"getDatasetMetaData after freezeDataset : state={tmp_out['state']}")
+    assert tmp_out["state"] == "closed"
+
+    print(f"stats : {ddm_client.get_metadata_cache_stats()[1]}")
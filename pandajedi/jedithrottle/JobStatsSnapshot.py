@@ -0,0 +1,148 @@
+import threading
+import time
+
+
+# snapshot of job statistics shared by job throttlers
+class JobStatsSnapshot(object):
+    """
+    Job statistics of all workqueues and global shares loaded with a single grouped query per VO.
+    The statistics are indexed by (queue, resource type, status) in memory and the MCORE/SCORE and global share
+    roll-ups are computed once per queue and resource type, so that throttlers don't query the database
+    for every combination of cloud, workqueue, and resource type in a cycle.
+    The snapshot is reloaded after invalidate() is called, or when it gets older than refreshInterval if specified.
+    It can be shared by throttlers in multiple threads
+    """
+
+    # constructor
+    def __init__(self, taskBufferIF, refreshInterval=None):
+        self.taskBufferIF = taskBufferIF
+        self.refreshInterval = refreshInterval
+        self.voDataMap = {}
+        self.lock = threading.RLock()
+
+    # invalidate the snapshot to reload it for the next cycle
+    def invalidate(self):
+        with self.lock:
+            self.voDataMap = {}
+
+    # get the key of a work queue
+    def getQueueKey(self, workQueue):
+        if workQueue.is_global_share:
+            return "gs", workQueue.queue_name
+        return "wq", workQueue.queue_id
+
+    # load statistics of a VO
+    def load(self, vo):
+        tmpStat, tmpMap = self.taskBufferIF.get_job_statistics_snapshot(vo)
+        if not tmpStat:
+            raise RuntimeError("failed to get job statistics")
+        resourceQueueIDs = set(tmpMap["resource_queue_ids"])
+        # number of jobs per queue, status, and resource type
+        countMap = {}
+        # number of starting jobs per queue, resource type, and site
+        startingMap = {}
+        for gshare, workqueueID, jobStatus, resourceType, computingSite, nJobs in tmpMap["stats"]:
+            queueKeys = [("wq", workqueueID)]
+            if workqueueID not in resourceQueueIDs:
+                queueKeys.append(("gs", gshare))
+            for queueKey in queueKeys:
+                statusMap = countMap.setdefault(queueKey, {}).setdefault(jobStatus, {})
+                statusMap.setdefault(resourceType, 0)
+                statusMap[resourceType] += nJobs
+                if jobStatus == "starting":
+                    siteKey = (queueKey, resourceType, computingSite)
+                    startingMap.setdefault(siteKey, 0)
+                    startingMap[siteKey] += nJobs
+        self.voDataMap[vo] = {
+            "loadTime": time.monotonic(),
+            "countMap": countMap,
+            "startingMap": startingMap,
+            "standby": tmpMap["standby"],
+            "standbyMap": {},
+            "rollupMap": {},
+        }
+
+    # get statistics of a VO
+    def getVoData(self, vo):
+        with self.lock:
+            voData = self.voDataMap.get(vo)
+            if voData is None or (self.refreshInterval is not None and time.monotonic() - voData["loadTime"] > self.refreshInterval):
+                self.load(vo)
+                voData = self.voDataMap[vo]
+            return voData
+
+    # get the number of standby jobs which is used as the number of running jobs
+    def getNumMapForStandbyJobs(self, workQueue):
+        voData = self.getVoData(workQueue.VO)
+        queueKey = self.getQueueKey(workQueue)
+        if queueKey in voData["standbyMap"]:
+            return voData["standbyMap"][queueKey]
+        retMapStatic = dict()
+        retMapDynamic = dict()
+        for siteid, wq_tag, resource_type, num in voData["standby"]:
+            if workQueue.is_global_share:
+                if workQueue.queue_name != wq_tag:
+                    continue
+            else:
+                if str(workQueue.queue_id) != wq_tag:
+                    continue
+            if num == 0:
+                retMap = retMapDynamic
+                # dynamic : use # of starting jobs as # of standby jobs
+                num = voData["startingMap"].get((queueKey, resource_type, siteid), 0)
+            else:
+                retMap = retMapStatic
+            if resource_type not in retMap:
+                retMap[resource_type] = 0
+            if num:
+                retMap[resource_type] += num
+        voData["standbyMap"][queueKey] = (retMapStatic, retMapDynamic)
+        return retMapStatic, retMapDynamic
+
+    # get job statistics broken down by status and resource type
+    def getJobStatisticsByResourceType(self, workQueue):
+        voData = self.getVoData(workQueue.VO)
+        return voData["countMap"].get(self.getQueueKey(workQueue), {})
+
+    # get the number of jobs in each status at resource type, MCORE/SCORE, and global share levels
+    def getRollup(self, workQueue, resource_name):
+        """
+        :param workQueue: work_queue object
+        :param resource_name: resource name, e.g. SCORE, MCORE, SCORE_HIMEM, MCORE_HIMEM
+        :return: dictionary of status: (nJobs_rt, nJobs_ms, nJobs_gs). Standby jobs are included in running,
+                 and starting jobs to be subtracted for the dynamic number of standby jobs are given as dummy
+        """
+        voData = self.getVoData(workQueue.VO)
+        rollupKey = (self.getQueueKey(workQueue), resource_name)
+        if rollupKey in voData["rollupMap"]:
+            return voData["rollupMap"][rollupKey]
+        # SCORE vs MCORE
+        if resource_name.startswith("MCORE"):
+            ms = "MCORE"
+        else:
+            ms = "SCORE"
+        wq_stats = dict(self.getJobStatisticsByResourceType(workQueue))
+        standby_num_static, standby_num_static_dynamic = self.getNumMapForStandbyJobs(workQueue)
+        # add running if the original stat doesn't have running and standby jobs are required
+        if "running" not in wq_stats and (len(standby_num_static) > 0 or len(standby_num_static_dynamic) > 0):
+            wq_stats["running"] = {}
+        # add dummy to subtract # of starting for dynamic number of standby jobs
+        if len(standby_num_static_dynamic) > 0:
+            wq_stats["dummy"] = standby_num_static_dynamic
+        rollup = {}
+        for status in wq_stats:
+            nJobs_rt, nJobs_ms, nJobs_gs = 0, 0, 0
+            stats_list = list(wq_stats[status].items())
+            # take into account the number of standby jobs
+            if status == "running":
+                stats_list += list(standby_num_static.items())
+                stats_list += list(standby_num_static_dynamic.items())
+            for resource_type, count in stats_list:
+                if resource_type == resource_name:
+                    nJobs_rt = count
+                if resource_type.startswith(ms):
+                    nJobs_ms += count
+                nJobs_gs += count
+            rollup[status] = (nJobs_rt, nJobs_ms, nJobs_gs)
+        voData["rollupMap"][rollupKey] = rollup
+        return rollup
@@ -1,6 +1,8 @@
 from pandajedi.jedicore import Interaction
 from pandajedi.jedicore.MsgWrapper import MsgWrapper
 
+from .JobStatsSnapshot import JobStatsSnapshot
+
 # throttle level
 THR_LEVEL5 = 5
 
@@ -28,6 +30,8 @@ class JobThrottlerBase(object):
         self.retThrottled = self.SC_SUCCEEDED, True
         self.retUnThrottled = self.SC_SUCCEEDED, False
         self.retMergeUnThr = self.SC_SUCCEEDED, THR_LEVEL5
+        # snapshot of job statistics
+        self.jobStatsSnapshot = None
         # limit
         self.refresh()
         self.msgType = "jobthrottler"
@@ -41,6 +45,10 @@ class JobThrottlerBase(object):
         self.underNqLimit = False
         self.siteMapper = self.taskBufferIF.get_site_mapper()
 
+    # set snapshot of job statistics shared in a cycle
+    def setJobStatsSnapshot(self, jobStatsSnapshot):
+        self.jobStatsSnapshot = jobStatsSnapshot
+
     # set maximum number of jobs to be submitted
     def setMaxNumJobs(self, maxNumJobs):
         self.maxNumJobs = maxNumJobs
@@ -114,27 +122,12 @@ class JobThrottlerBase(object):
         :param resource_name: resource name, e.g. SCORE, MCORE, SCORE_HIMEM, MCORE_HIMEM
         :return: resource_level, nRunning, nRunning_level, nNotRun, nNotRun_level, nDefine, nDefine_level, nWaiting, nWaiting_level
         """
-        # SCORE vs MCORE
-        if resource_name.startswith("MCORE"):
-            ms = "MCORE"
-        else:
-            ms = "SCORE"
-
-        # get job statistics
-        status, wq_stats = self.taskBufferIF.getJobStatisticsByResourceType(work_queue)
-        if not status:
-            raise RuntimeError("failed to get job statistics")
-
-        # get the number of standby jobs which is used as the number of running jobs
-        standby_num_static, standby_num_static_dynamic = self.taskBufferIF.getNumMapForStandbyJobs_JEDI(work_queue)
-
-        # add running if the original stat doesn't have running and standby jobs are required
-        if "running" not in wq_stats and (len(standby_num_static) > 0 or len(standby_num_static_dynamic) > 0):
-            wq_stats["running"] = {}
-
-        # add dummy to subtract # of starting for dynamic number of standby jobs
-        if len(standby_num_static_dynamic) > 0:
-            wq_stats["dummy"] = standby_num_static_dynamic
+        # get the number of jobs in each status from the snapshot
+        jobStatsSnapshot = self.jobStatsSnapshot
+        if jobStatsSnapshot is None:
+            # snapshot loaded once for this call when the snapshot is not shared
+            jobStatsSnapshot = JobStatsSnapshot(self.taskBufferIF)
+        rollup = jobStatsSnapshot.getRollup(work_queue, resource_name)
 
         # Count number of jobs in each status
         # We want to generate one value for the total, one value for the relevant MCORE/SCORE level
@@ -144,20 +137,7 @@ class JobThrottlerBase(object):
         nDefine_rt, nDefine_ms, nDefine_gs = 0, 0, 0
         nWaiting_rt, nWaiting_gs = 0, 0
 
-        for status in wq_stats:
-            nJobs_rt, nJobs_ms, nJobs_gs = 0, 0, 0
-            stats_list = list(wq_stats[status].items())
-            # take into account the number of standby jobs
-            if status == "running":
-                stats_list += list(standby_num_static.items())
-                stats_list += list(standby_num_static_dynamic.items())
-            for resource_type, count in stats_list:
-                if resource_type == resource_name:
-                    nJobs_rt = count
-                if resource_type.startswith(ms):
-                    nJobs_ms += count
-                nJobs_gs += count
-
+        for status, (nJobs_rt, nJobs_ms, nJobs_gs) in rollup.items():
             if status == "running":
                 nRunning_rt = nJobs_rt
                 nRunning_ms = nJobs_ms
@@ -2,7 +2,6 @@ import ast
 import inspect
 import re
 import sys
-import threading
 import time
 import typing
 from functools import wraps
@@ -14,7 +13,7 @@ from pandacommon.pandalogger.LogWrapper import LogWrapper
 import pandaserver.jobdispatcher.Protocol as Protocol
 from pandaserver.config import panda_config
 from pandaserver.dataservice.ddm import rucioAPI
-from pandaserver.srvcore import CoreUtils
+from pandaserver.srvcore import CoreUtils, timed_executor
 
 TIME_OUT = "TimeOut"
 
@@ -319,17 +318,17 @@ def request_validation(logger, secure=True, production=False, request_method=Non
 
 # a wrapper to install timeout into a method
 class TimedMethod:
-    def __init__(self, method, timeout):
+    def __init__(self, method, timeout, read_only=False):
         self.method = method
         self.timeout = timeout
+        # the deadline applies only while waiting for a worker unless the method is read-only
+        self.read_only = read_only
         self.result = TIME_OUT
 
     # method emulation
     def __call__(self, *var, **kwargs):
         self.result = self.method(*var, **kwargs)
 
-    # run
+    # run in the shared executor until the deadline
     def run(self, *var, **kwargs):
-        thr = threading.Thread(target=self, args=var, kwargs=kwargs)
-        thr.start()
-        thr.join()
+        self.result = timed_executor.get_executor().call(self.method, self.timeout, TIME_OUT, var, kwargs, read_only=self.read_only)
@@ -40,7 +40,9 @@ def init_task_buffer(task_buffer: TaskBuffer) -> None:
 
         # This variable depends on having an initialized task buffer
         global global_dispatch_parameter_cache
-        global_dispatch_parameter_cache = CoreUtils.CachedObject("dispatcher_params", 60 * 10, _get_dispatch_parameters, _logger)
+        global_dispatch_parameter_cache = CoreUtils.CachedObject(
+            "dispatcher_params", 60 * 10, _get_dispatch_parameters, _logger, stale_while_revalidate=True, jitter=0.1, max_staleness=60 * 30
+        )
 
         global global_token_cache_config
         global_token_cache_config = _read_token_cache_configuration()
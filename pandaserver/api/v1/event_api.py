@@ -1,3 +1,5 @@
+from typing import List
+
 from pandacommon.pandalogger.LogWrapper import LogWrapper
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 
@@ -54,7 +56,7 @@ def get_available_event_range_count(req: PandaRequest, job_id: int, jobset_id: i
 
     tmp_logger.debug("Start")
 
-    timed_method = TimedMethod(global_task_buffer.checkEventsAvailability, timeout)
+    timed_method = TimedMethod(global_task_buffer.checkEventsAvailability, timeout, read_only=True)
     timed_method.run(job_id, jobset_id, task_id)
 
     # Case of time out
@@ -168,6 +170,66 @@ def acquire_event_ranges(
     return generate_response(True, data=event_ranges)
 
 
+@request_validation(_logger, secure=True, production=True, request_method="POST")
+def acquire_event_ranges_bulk(
+    req: PandaRequest,
+    jobs: List,
+    timeout: int = 60,
+    scattered: bool = False,
+    segment_id: int = None,
+) -> dict:
+    """
+    Acquire event ranges in bulk
+
+    Acquires lists of event ranges for multiple PanDA jobs for execution. Event ranges are claimed for all jobs in a jobset in a single transaction. Requires a secure connection and production role.
+
+    API details:
+        HTTP Method: POST
+        Path: /v1/event/acquire_event_ranges_bulk
+
+    Args:
+        req(PandaRequest): Internally generated request object containing the environment.
+        jobs(list): list of dictionaries `{"job_id": <PanDA job ID>, "jobset_id": <jobset ID>, "n_ranges": <number of event ranges>}`. `n_ranges` defaults to 10.
+        timeout(int, optional): The timeout value. Defaults to 60.
+        scattered(bool, optional): Whether the event ranges are scattered. Defaults to None.
+        segment_id(int, optional): The segment ID. Defaults to None.
+
+    Returns:
+        dict: The system response `{"success": success, "message": message, "data": data}`.
+              When successful, the data field contains a dictionary `{<job_id>: [<event range>, ...], ...}`. The list is null for jobs of which event ranges failed to be acquired.
+              When unsuccessful, the message field contains the error message.
+    """
+
+    tmp_logger = LogWrapper(_logger, f"acquire_event_ranges_bulk < n_jobs={len(jobs)} segment_id={segment_id} >")
+    tmp_logger.debug("Start")
+
+    try:
+        job_list = [(job["job_id"], job["jobset_id"], job.get("n_ranges", 10)) for job in jobs]
+    except Exception as e:
+        tmp_logger.error(f"Invalid jobs: {str(e)}")
+        return generate_response(False, f"invalid jobs: {str(e)}")
+
+    accept_json = True  # Dummy variable required in the timed method
+
+    timed_method = TimedMethod(global_task_buffer.get_event_ranges_bulk, timeout)
+    timed_method.run(job_list, accept_json, scattered, segment_id)
+
+    # Case of time out
+    if timed_method.result == Protocol.TimeOutToken:
+        tmp_logger.error("Timed out")
+        return generate_response(False, TIME_OUT)
+
+    # Case of failure
+    if timed_method.result is None:
+        tmp_logger.debug(MESSAGE_DATABASE)
+        return generate_response(False, MESSAGE_DATABASE)
+
+    event_ranges = timed_method.result
+
+    tmp_logger.debug(f"Done: {sum(len(ranges) for ranges in event_ranges.values() if ranges)} event ranges")
+    return generate_response(True, data=event_ranges)
+
+
 @request_validation(_logger, secure=True, production=True, request_method="POST")
 def update_single_event_range(
     req: PandaRequest,
@@ -16,6 +16,7 @@ from pandaserver.api.v1.common import (
     has_production_role,
     request_validation,
 )
+from pandaserver.brokerage import site_mapper_snapshot
 from pandaserver.brokerage.SiteMapper import SiteMapper
 from pandaserver.config import panda_config
 from pandaserver.dataservice.adder_gen import AdderGen
@@ -43,10 +44,15 @@ def init_task_buffer(task_buffer: TaskBuffer) -> None:
     global_task_buffer = task_buffer
 
     global global_site_mapper_cache
-    global_site_mapper_cache = CoreUtils.CachedObject("site_mapper", 60 * 10, _get_site_mapper, _logger)
+    global_site_mapper_cache = CoreUtils.CachedObject(
+        "site_mapper", 60 * 10, _get_site_mapper, _logger, stale_while_revalidate=True, jitter=0.1, max_staleness=60 * 30
+    )
 
 
 def _get_site_mapper():
+    # use the snapshot shared by processes
+    if panda_config.site_mapper_snapshot:
+        return True, site_mapper_snapshot.get_site_mapper(global_task_buffer, panda_config.site_mapper_snapshot, 60 * 10)
     return True, SiteMapper(global_task_buffer)
 
 
@@ -225,11 +231,13 @@ def acquire_jobs(
 
     # add each job to the list
     response_list = []
+    # site-level values are resolved once for all jobs
+    site_context = Protocol.SiteContext(global_site_mapper_cache, jobs)
     for tmp_job in jobs:
         try:
             # The response is nothing but a dictionary with the job information
             response = Protocol.Response(Protocol.SC_Success)
-            response.appendJob(tmp_job, global_site_mapper_cache)
+            response.appendJob(tmp_job, siteContext=site_context)
         except Exception as e:
             tmp_msg = f"failed to get jobs with {str(e)}"
             tmp_logger.error(f"{tmp_msg}\n{traceback.format_exc()}")
@@ -257,7 +265,8 @@ def acquire_jobs(
     if n_jobs is not None:
         try:
             response = Protocol.Response(Protocol.SC_Success)
-            response.appendNode("jobs", response_list)
+            # jobs are serialized one by one while being sent
+            response.appendNode("jobs", CoreUtils.StreamedList(response_list))
         except Exception as e:
             tmp_msg = f"Failed to make response with {str(e)}"
             tmp_logger.error(f"{tmp_msg}\n{traceback.format_exc()}")
@@ -298,7 +307,7 @@ def get_job_status(req: PandaRequest, job_ids: List[int], timeout: int = 60) ->
     tmp_logger.debug("Start")
 
     # peek jobs
-    timed_method = TimedMethod(global_task_buffer.peekJobs, timeout)
+    timed_method = TimedMethod(global_task_buffer.peekJobs, timeout, read_only=True)
     timed_method.run(job_ids, fromDefined=False, fromActive=True, fromArchived=True, forAnal=False, use_json=False)
 
     # make response
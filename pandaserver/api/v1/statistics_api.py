@@ -4,6 +4,7 @@ from pandacommon.pandalogger.LogWrapper import LogWrapper
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 
 from pandaserver.api.v1.common import generate_response, request_validation
+from pandaserver.srvcore import statistics_snapshot
 from pandaserver.srvcore.panda_request import PandaRequest
 from pandaserver.taskbuffer.TaskBuffer import TaskBuffer
 
@@ -22,6 +23,25 @@ def init_task_buffer(task_buffer: TaskBuffer) -> None:
     global_task_buffer = task_buffer
 
 
+def _get_statistics(req: PandaRequest, view_name: str, method, *args) -> tuple[Any, bool]:
+    """
+    Get statistics from the snapshot with ETag and stale-age headers, or from the database when the view is unavailable in the snapshot.
+
+    Args:
+        req(PandaRequest): internally generated request object
+        view_name(str): name of the view in the snapshot. None to query the database
+        method: task buffer method to query the database
+        *args: arguments of the method
+
+    Returns:
+        tuple: statistics and whether the client has the same statistics
+    """
+    view = statistics_snapshot.get_view(view_name) if view_name else None
+    if view is None:
+        return method(*args), False
+    return view.data, view.set_response_headers(req)
+
+
 @request_validation(_logger, secure=False, request_method="GET")
 def job_stats_by_cloud(req: PandaRequest, type: str = "production") -> Dict[str, Any]:
     """
@@ -48,7 +68,10 @@ def job_stats_by_cloud(req: PandaRequest, type: str = "production") -> Dict[str,
         tmp_logger.error("Invalid type parameter")
         return generate_response(False, 'Parameter "type" needs to be either "production" or "analysis" ', {})
 
-    data = global_task_buffer.getJobStatisticsForExtIF(type)
+    data, not_modified = _get_statistics(req, f"job_stats_by_cloud.{type}", global_task_buffer.getJobStatisticsForExtIF, type)
+    if not_modified:
+        tmp_logger.debug("Done. Not modified")
+        return generate_response(True)
     success = data != {}
     message = "" if success else "Database failure getting the job statistics"
     tmp_logger.debug(f"Done. {message}")
@@ -77,7 +100,10 @@ def production_job_stats_by_cloud_and_processing_type(req: PandaRequest) -> Dict
     tmp_logger = LogWrapper(_logger, "production_job_stats_by_cloud_and_processing_type")
 
     tmp_logger.debug("Start")
-    data = global_task_buffer.getJobStatisticsForBamboo()
+    data, not_modified = _get_statistics(req, "job_stats_by_cloud_and_processing_type", global_task_buffer.getJobStatisticsForBamboo)
+    if not_modified:
+        tmp_logger.debug("Done. Not modified")
+        return generate_response(True)
     success = data != {}
     message = "" if success else "Database failure getting the job statistics"
     tmp_logger.debug(f"Done. {message}")
@@ -105,7 +131,10 @@ def active_job_stats_by_site(req: PandaRequest) -> Dict[str, Any]:
     tmp_logger = LogWrapper(_logger, "active_job_stats_by_site")
 
     tmp_logger.debug("Start")
-    data = global_task_buffer.getJobStatistics()
+    data, not_modified = _get_statistics(req, "job_stats_by_site", global_task_buffer.getJobStatistics)
+    if not_modified:
+        tmp_logger.debug("Done. Not modified")
+        return generate_response(True)
     success = data != {}
     message = "" if success else "Database failure getting the job statistics"
     tmp_logger.debug(f"Done. {message}")
@@ -138,7 +167,11 @@ def job_stats_by_site_and_resource_type(req: PandaRequest, time_window: int = No
         tmp_logger.error("Invalid time_window parameter")
         return generate_response(False, 'Parameter "time_window" needs to be a positive integer smaller than 10080 min (7 days)', {})
 
-    data = global_task_buffer.getJobStatisticsPerSiteResource(time_window)
+    view_name = "job_stats_by_site_and_resource_type" if time_window is None else None
+    data, not_modified = _get_statistics(req, view_name, global_task_buffer.getJobStatisticsPerSiteResource, time_window)
+    if not_modified:
+        tmp_logger.debug("Done. Not modified")
+        return generate_response(True)
     success = data != {}
     message = "" if success else "Database failure getting the job statistics"
     tmp_logger.debug(f"Done. {message}")
@@ -171,7 +204,11 @@ def job_stats_by_site_share_and_resource_type(req: PandaRequest, time_window: in
         tmp_logger.error("Invalid time_window parameter")
         return generate_response(False, 'Parameter "time_window" needs to be a positive integer smaller than 10080 min (7 days)', {})
 
-    data = global_task_buffer.get_job_statistics_per_site_label_resource(time_window)
+    view_name = "job_stats_by_site_share_and_resource_type" if time_window is None else None
+    data, not_modified = _get_statistics(req, view_name, global_task_buffer.get_job_statistics_per_site_label_resource, time_window)
+    if not_modified:
+        tmp_logger.debug("Done. Not modified")
+        return generate_response(True)
     success = data != {}
     message = "" if success else "Database failure getting the job statistics"
     tmp_logger.debug(f"Done. {message}")
@@ -14,6 +14,7 @@ from pandaserver.api.v1.common import (
     request_validation,
 )
 from pandaserver.config import panda_config
+from pandaserver.srvcore import request_metrics
 from pandaserver.srvcore.CoreUtils import clean_user_id
 from pandaserver.srvcore.panda_request import PandaRequest
 
@@ -184,3 +185,58 @@ def is_alive(req: PandaRequest) -> Dict:
     tmp_logger.debug("Done")
 
     return generate_response(True)
+
+
+@request_validation(_logger, secure=False, request_method="GET")
+def get_metrics(req: PandaRequest) -> str:
+    """
+    Get metrics
+
+    Gets histograms of latency, response size, DB proxy wait time, and DB time per API module and method in the Prometheus text format,
+    together with histograms of DB proxy wait and hold times per caller in the DB proxy pools and counters of hits and refreshes of caches.
+    The histograms are aggregated over all httpd processes when request_metrics_dir is set in the server configuration.
+
+    API details:
+        HTTP Method: GET
+        Path: /v1/system/get_metrics
+
+    Args:
+        req(PandaRequest): internally generated request object containing the env variables
+
+    Returns:
+        str: metrics in the Prometheus text format
+    """
+    return request_metrics.render_prometheus()
+
+
+@request_validation(_logger, secure=True, production=True, request_method="POST")
+def set_profiler(req: PandaRequest, method_name: str, fraction: float, api_module: str = None, duration: int = 3600) -> Dict:
+    """
+    Set profiler
+
+    Enables the sampling profiler for a fraction of requests to a method in all httpd processes without restart.
+    Profiles are dumped to the profiles directory under request_metrics_dir. Requires a secure connection and production role.
+
+    API details:
+        HTTP Method: POST
+        Path: /v1/system/set_profiler
+
+    Args:
+        req(PandaRequest): internally generated request object containing the env variables
+        method_name(str): name of the method to be profiled
+        fraction(float): fraction of requests to be profiled. 0 to disable the profiler
+        api_module(str, optional): API module of the method, e.g. `pilot`, or `panda` for the legacy API. Any module if omitted
+        duration(int, optional): duration in seconds to keep profiling. Defaults to 3600
+
+    Returns:
+        dict: The system response `{"success": success, "message": message, "data": data}`.
+    """
+    tmp_logger = LogWrapper(_logger, f"set_profiler method_name={method_name} fraction={fraction} api_module={api_module} duration={duration}")
+    tmp_logger.debug("Start")
+    try:
+        request_metrics.set_profiler(api_module, method_name, fraction, duration)
+    except Exception as e:
+        tmp_logger.error(f"failed with {str(e)}")
+        return generate_response(False, message=str(e))
+    tmp_logger.debug("Done")
+    return generate_response(True)
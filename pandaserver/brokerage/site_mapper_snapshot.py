@@ -0,0 +1,168 @@
+"""
+Versioned snapshot of SiteMapper shared by processes through a memory-mapped file.
+One process builds SiteMapper from the database and writes the snapshot, while the other processes
+attach to the file and materialize SiteSpec objects lazily when they are accessed.
+
+File layout:
+    preamble: magic, format version, snapshot version, creation time, and header length
+    header: pickled dictionary of clouds, nuclei, satellites, endpoint maps, and offsets of site blobs
+    site blobs: pickled SiteSpec objects
+"""
+
+import fcntl
+import mmap
+import os
+import pickle
+import struct
+import time
+from collections.abc import Mapping
+
+from pandacommon.pandalogger.PandaLogger import PandaLogger
+
+from pandaserver.brokerage.SiteMapper import SiteMapper
+
+_logger = PandaLogger().getLogger("site_mapper_snapshot")
+
+# magic and format version of the snapshot file
+SNAPSHOT_MAGIC = b"PSMS"
+SNAPSHOT_FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<4sIQdQ")
+
+
+def write_snapshot(site_mapper: SiteMapper, path: str) -> int:
+    """
+    Write a snapshot of SiteMapper atomically so that attached processes keep reading the previous file
+
+    Args:
+        site_mapper (SiteMapper): SiteMapper to be serialized
+        path (str): path of the snapshot file
+
+    Returns:
+        int: version of the snapshot
+    """
+    version = time.time_ns()
+    # serialize sites
+    site_offsets = {}
+    site_blobs = []
+    offset = 0
+    for site_name, site_spec in site_mapper.siteSpecList.items():
+        blob = pickle.dumps(site_spec, protocol=pickle.HIGHEST_PROTOCOL)
+        site_offsets[site_name] = (offset, len(blob))
+        site_blobs.append(blob)
+        offset += len(blob)
+    # serialize header
+    header = {
+        "sites": site_offsets,
+        "cloudSpec": site_mapper.cloudSpec,
+        "worldCloudSpec": site_mapper.worldCloudSpec,
+        "nuclei": site_mapper.nuclei,
+        "satellites": site_mapper.satellites,
+        "endpoint_to_sites_map": site_mapper.endpoint_to_sites_map,
+        "endpoint_detailed_status_summary": site_mapper.endpoint_detailed_status_summary,
+    }
+    header_blob = pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+    # write to a temporary file and rename it to replace the old file atomically
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, version, time.time(), len(header_blob)))
+        f.write(header_blob)
+        for blob in site_blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+    return version
+
+
+class LazySiteSpecMap(Mapping):
+    """
+    Read-only mapping of site names to SiteSpec objects which are unpickled from the snapshot on first access
+    """
+
+    def __init__(self, buffer: memoryview, base_offset: int, site_offsets: dict):
+        self._buffer = buffer
+        self._base_offset = base_offset
+        self._site_offsets = site_offsets
+        self._materialized = {}
+
+    def __getitem__(self, site_name):
+        site_spec = self._materialized.get(site_name)
+        if site_spec is None:
+            offset, length = self._site_offsets[site_name]
+            start = self._base_offset + offset
+            site_spec = self._materialized.setdefault(site_name, pickle.loads(self._buffer[start : start + length]))
+        return site_spec
+
+    def __contains__(self, site_name):
+        return site_name in self._site_offsets
+
+    def __iter__(self):
+        return iter(self._site_offsets)
+
+    def __len__(self):
+        return len(self._site_offsets)
+
+    def num_materialized(self) -> int:
+        return len(self._materialized)
+
+
+class SiteMapperSnapshot(SiteMapper):
+    """
+    SiteMapper attached to a snapshot file with the same accessors as SiteMapper
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        magic, format_version, self.version, self.created, header_length = _PREAMBLE.unpack_from(self._buffer, 0)
+        if magic != SNAPSHOT_MAGIC or format_version != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"{path} is not a SiteMapper snapshot of format version {SNAPSHOT_FORMAT_VERSION}")
+        header = pickle.loads(self._buffer[_PREAMBLE.size : _PREAMBLE.size + header_length])
+        self.siteSpecList = LazySiteSpecMap(self._buffer, _PREAMBLE.size + header_length, header["sites"])
+        self.cloudSpec = header["cloudSpec"]
+        self.worldCloudSpec = header["worldCloudSpec"]
+        self.nuclei = header["nuclei"]
+        self.satellites = header["satellites"]
+        self.endpoint_to_sites_map = header["endpoint_to_sites_map"]
+        self.endpoint_detailed_status_summary = header["endpoint_detailed_status_summary"]
+
+
+def get_site_mapper(task_buffer, path: str, max_age: int):
+    """
+    Get SiteMapper from the snapshot file. One of the processes refreshes the snapshot when it is older than max_age
+    while the others keep using the current one
+
+    Args:
+        task_buffer (TaskBuffer): task buffer to build SiteMapper
+        path (str): path of the snapshot file
+        max_age (int): maximum age of the snapshot in seconds
+
+    Returns:
+        SiteMapper: SiteMapperSnapshot attached to the snapshot, or SiteMapper built from the database if the snapshot is unavailable
+    """
+    tmp_log = f"PID={os.getpid()} {path}"
+    try:
+        is_fresh = os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age
+        if not is_fresh:
+            with open(f"{path}.lock", "w") as lock_file:
+                try:
+                    # only one process refreshes the snapshot
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    try:
+                        # check again since another process could have refreshed the snapshot before getting the lock
+                        if not os.path.exists(path) or time.time() - os.path.getmtime(path) >= max_age:
+                            time_start = time.monotonic()
+                            version = write_snapshot(SiteMapper(task_buffer), path)
+                            _logger.debug(f"{tmp_log} wrote version={version} in {time.monotonic() - time_start:.3f} sec")
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+                except BlockingIOError:
+                    # being refreshed by another process
+                    if not os.path.exists(path):
+                        _logger.debug(f"{tmp_log} not yet available")
+                        return SiteMapper(task_buffer)
+        site_mapper = SiteMapperSnapshot(path)
+        _logger.debug(f"{tmp_log} attached version={site_mapper.version} with {len(site_mapper.siteSpecList)} sites")
+        return site_mapper
+    except Exception as e:
+        _logger.error(f"{tmp_log} failed to use snapshot due to {str(e)}")
+        return SiteMapper(task_buffer)
@@ -52,6 +52,11 @@ if "dbport" not in tmpSelf.__dict__:
 if "dbtimeout" not in tmpSelf.__dict__:
     tmpSelf.__dict__["dbtimeout"] = 60
 
+# minimum size of responses to be compressed. Negative to disable compression. Responses are read up to this size before
+# the status is sent, so serialization errors beyond it end up with truncated bodies with 200
+if "gzip_response_threshold" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["gzip_response_threshold"] = 8192
+
 # Directory for certs
 if "certdir" not in tmpSelf.__dict__:
     tmpSelf.__dict__["certdir"] = "/data/atlpan"
@@ -66,6 +71,49 @@ if "endpoint_mapfile" not in tmpSelf.__dict__:
 if "record_sandbox_info" not in tmpSelf.__dict__:
     tmpSelf.__dict__["record_sandbox_info"] = True
 
+# snapshot file of SiteMapper shared by processes
+if "site_mapper_snapshot" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["site_mapper_snapshot"] = None
+
+# directory for request metrics and profiles shared by httpd processes
+if "request_metrics_dir" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["request_metrics_dir"] = None
+
+# number of workers updated in a transaction of updateWorkers
+if "update_workers_batch_size" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["update_workers_batch_size"] = 500
+
+# lifetime in seconds of retrial rules cached in each process
+if "retrial_rules_cache_interval" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["retrial_rules_cache_interval"] = 300
+
+# maximum number of consumer processes and number of job output reports locked in bulk by each consumer in add_main
+if "adder_max_workers" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["adder_max_workers"] = 10
+if "adder_prefetch_size" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["adder_prefetch_size"] = 20
+# DB round trip time in seconds above which add_main halves the number of consumer processes
+if "adder_db_latency_threshold" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["adder_db_latency_threshold"] = 1.0
+
+# number of worker threads and number of jobs peeked and updated in bulk by each worker to fail jobs whose heartbeat timed out
+if "heartbeat_reaper_workers" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["heartbeat_reaper_workers"] = 4
+if "heartbeat_reaper_batch_size" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["heartbeat_reaper_batch_size"] = 100
+
+# number of worker threads shared by timed methods of API calls in each process, and number of calls allowed to wait for them
+if "timed_method_workers" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["timed_method_workers"] = 32
+if "timed_method_max_queue" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["timed_method_max_queue"] = 64
+
+# snapshot file of job statistics shared by processes, and age in seconds after which endpoints query the database
+if "statistics_snapshot" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["statistics_snapshot"] = None
+if "statistics_snapshot_max_age" not in tmpSelf.__dict__:
+    tmpSelf.__dict__["statistics_snapshot_max_age"] = 600
+
 # secrets
 if "pilot_secrets" not in tmpSelf.__dict__:
     tmpSelf.__dict__["pilot_secrets"] = "pilot secrets"
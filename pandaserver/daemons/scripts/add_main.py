@@ -1,7 +1,11 @@
 import datetime
+import json
+import math
 import multiprocessing
+import queue
 import random
 import sys
+import threading
 import time
 import traceback
 
@@ -47,6 +51,15 @@ def main(argv=tuple(), tbuf=None, lock_pool=None, **kwargs):
     # last recovery time
     last_recovery = naive_utcnow() + datetime.timedelta(seconds=random.randint(0, 30))
 
+    # maximum number of consumer processes
+    max_workers = panda_config.adder_max_workers
+
+    # number of reports locked in bulk by each consumer
+    prefetch_size = panda_config.adder_prefetch_size
+
+    # DB round trip time in seconds to reduce consumers
+    db_latency_threshold = panda_config.adder_db_latency_threshold
+
     # instantiate TB
     if tbuf is None:
         from pandaserver.taskbuffer.TaskBuffer import taskBuffer
@@ -66,21 +79,63 @@ def main(argv=tuple(), tbuf=None, lock_pool=None, **kwargs):
 
     # thread for adder
     class AdderThread(GenericThread):
-        def __init__(self, taskBuffer, aSiteMapper, job_output_reports, lock_pool):
+        """
+        Adder consumer which runs in a pipeline. A prefetch thread locks job output reports in bulk, gets their records,
+        and parses their JSON data, while the main thread takes prefetched reports batch by batch, refreshes their locks
+        in bulk, runs AdderGen for them, and deletes processed reports in bulk. File statuses are still updated per job
+        by AdderGen
+        """
+
+        def __init__(self, taskBuffer, aSiteMapper, job_output_reports, lock_pool, n_processed=None):
             GenericThread.__init__(self)
             self.taskBuffer = taskBuffer
             self.aSiteMapper = aSiteMapper
             self.job_output_reports = job_output_reports
             self.lock_pool = lock_pool
+            self.n_processed = n_processed
+
+        # prefetch stage to lock reports in bulk and to parse JSON data
+        def prefetch(self, uniq_pid, report_queue):
+            try:
+                while True:
+                    # get reports to lock
+                    jor_map = {}
+                    for _ in range(prefetch_size):
+                        one_jor = self.job_output_reports.pop()
+                        if not one_jor:
+                            break
+                        panda_id, job_status, attempt_nr, time_stamp = one_jor
+                        jor_map[(panda_id, attempt_nr)] = one_jor
+                    if not jor_map:
+                        break
+                    # lock
+                    locked_list = self.taskBuffer.lock_job_output_reports(list(jor_map), uniq_pid, lock_interval)
+                    if locked_list is None:
+                        tmpLog.error(f"pid={uniq_pid} : failed to lock {len(jor_map)} reports")
+                        continue
+                    tmpLog.debug(f"pid={uniq_pid} : locked {len(locked_list)}/{len(jor_map)} reports")
+                    batch = []
+                    for report_dict in locked_list:
+                        # parse JSON. Parse errors are handled by AdderGen
+                        try:
+                            if isinstance(report_dict["data"], str):
+                                report_dict["parsed_data"] = json.loads(report_dict["data"])
+                        except Exception:
+                            pass
+                        batch.append((jor_map[(report_dict["PandaID"], report_dict["attemptNr"])], report_dict))
+                    if batch:
+                        report_queue.put(batch)
+            except Exception as e:
+                tmpLog.error(f"pid={uniq_pid} : failed to prefetch with {str(e)} {traceback.format_exc()}")
+            finally:
+                report_queue.put(None)
 
         # main loop
         def run(self):
             # initialize
             taskBuffer = self.taskBuffer
-            aSiteMapper = self.aSiteMapper
             # get file list
             timeNow = naive_utcnow()
-            timeInt = naive_utcnow()
             # unique pid
             GenericThread.__init__(self)
             uniq_pid = self.get_pid()
@@ -88,59 +143,79 @@ def main(argv=tuple(), tbuf=None, lock_pool=None, **kwargs):
             tmpLog.debug(f"pid={uniq_pid} : run")
             # stats
             n_processed = 0
+            # start prefetch stage which keeps one batch ahead
+            report_queue = queue.Queue(maxsize=1)
+            prefetcher = threading.Thread(target=self.prefetch, args=(uniq_pid, report_queue), daemon=True)
+            prefetcher.start()
             # loop
             while True:
-                # get report
-                one_jor = self.job_output_reports.pop()
-                if not one_jor:
+                # get a batch of reports
+                batch = report_queue.get()
+                if batch is None:
                     break
-                # lock
-                panda_id, job_status, attempt_nr, time_stamp = one_jor
-                token_str = f"pid={uniq_pid} : job={panda_id}.{attempt_nr}"
-                tmpLog.debug(f"{token_str} to lock timestamp={time_stamp}")
-                got_lock = taskBuffer.lockJobOutputReport(
-                    panda_id=panda_id,
-                    attempt_nr=attempt_nr,
-                    pid=uniq_pid,
-                    time_limit=lock_interval,
+                # refresh locks in bulk since the reports were locked ahead. reports taken over by other processes after expiry are skipped
+                refreshed_list = taskBuffer.lock_job_output_reports(
+                    [(report_dict["PandaID"], report_dict["attemptNr"]) for _, report_dict in batch], uniq_pid, lock_interval, get_data=False
                 )
-                if not got_lock:
-                    tmpLog.debug(f"{token_str} skipped")
+                if refreshed_list is None:
+                    tmpLog.error(f"pid={uniq_pid} : failed to refresh locks of {len(batch)} reports")
                     continue
-                # add
-                try:
-                    modTime = time_stamp
-                    if (timeNow - modTime) > datetime.timedelta(hours=24):
-                        # last add
-                        tmpLog.debug(f"{token_str} last add st={job_status}")
-                        ignoreTmpError = False
-                    else:
-                        # usual add
-                        tmpLog.debug(f"{token_str} add st={job_status}")
-                        ignoreTmpError = True
-                    # get adder
-                    adder_gen = AdderGen(
-                        taskBuffer,
-                        panda_id,
-                        job_status,
-                        attempt_nr,
-                        ignore_tmp_error=ignoreTmpError,
-                        siteMapper=aSiteMapper,
-                        pid=uniq_pid,
-                        prelock_pid=uniq_pid,
-                        lock_offset=lock_interval - retry_interval,
-                        lock_pool=lock_pool,
-                    )
+                locked_set = {(report_dict["PandaID"], report_dict["attemptNr"]) for report_dict in refreshed_list}
+                if len(locked_set) < len(batch):
+                    tmpLog.debug(f"pid={uniq_pid} : skip {len(batch) - len(locked_set)} reports since locks were lost")
+                # reports to be deleted in bulk
+                processed_reports = []
+                for (panda_id, job_status, attempt_nr, time_stamp), report_dict in batch:
+                    if (panda_id, attempt_nr) not in locked_set:
+                        continue
+                    self.add(uniq_pid, timeNow, panda_id, job_status, attempt_nr, time_stamp, report_dict, processed_reports)
                     n_processed += 1
-                    # execute
-                    adder_gen.run()
-                    tmpLog.debug(f"{token_str} done")
-                    del adder_gen
-                except Exception as e:
-                    tmpLog.error(f"pid={uniq_pid} : failed to run with {str(e)} {traceback.format_exc()}")
+                # delete processed reports
+                if processed_reports and not taskBuffer.delete_job_output_reports(processed_reports):
+                    tmpLog.error(f"pid={uniq_pid} : failed to delete {len(processed_reports)} reports")
             # stats
+            if self.n_processed is not None:
+                with self.n_processed.get_lock():
+                    self.n_processed.value += n_processed
             tmpLog.debug(f"pid={uniq_pid} : processed {n_processed}")
 
+        # run AdderGen for a report
+        def add(self, uniq_pid, timeNow, panda_id, job_status, attempt_nr, time_stamp, report_dict, processed_reports):
+            token_str = f"pid={uniq_pid} : job={panda_id}.{attempt_nr}"
+            try:
+                modTime = time_stamp
+                if (timeNow - modTime) > datetime.timedelta(hours=24):
+                    # last add
+                    tmpLog.debug(f"{token_str} last add st={job_status}")
+                    ignoreTmpError = False
+                else:
+                    # usual add
+                    tmpLog.debug(f"{token_str} add st={job_status}")
+                    ignoreTmpError = True
+                # get adder
+                adder_gen = AdderGen(
+                    self.taskBuffer,
+                    panda_id,
+                    job_status,
+                    attempt_nr,
+                    ignore_tmp_error=ignoreTmpError,
+                    siteMapper=self.aSiteMapper,
+                    pid=uniq_pid,
+                    prelock_pid=uniq_pid,
+                    lock_offset=lock_interval - retry_interval,
+                    lock_pool=self.lock_pool,
+                    report_dict=report_dict,
+                    delete_report=False,
+                )
+                # execute
+                adder_gen.run()
+                if adder_gen.report_processed:
+                    processed_reports.append((panda_id, attempt_nr))
+                tmpLog.debug(f"{token_str} done")
+                del adder_gen
+            except Exception as e:
+                tmpLog.error(f"pid={uniq_pid} : failed to run with {str(e)} {traceback.format_exc()}")
+
         # launcher, run with multiprocessing
         def proc_launch(self):
             # run
@@ -171,16 +246,19 @@ def main(argv=tuple(), tbuf=None, lock_pool=None, **kwargs):
     interval = 10
     nLoop = 50
     recover_dataset_update = False
+    nThr = max_workers
     for iLoop in range(nLoop):
         tmpLog.debug(f"start iLoop={iLoop}/{nLoop}")
         start_time = naive_utcnow()
         adderThrList = []
-        nThr = 10
 
         n_jors_per_batch = 200
 
         jor_lists = WeightedLists(multiprocessing.Lock())
 
+        # measure the DB round trip time
+        db_latency = taskBuffer.get_db_round_trip_time()
+
         # get some job output reports
         jor_list_others = taskBuffer.listJobOutputReport(
             only_unlocked=True,
@@ -199,10 +277,20 @@ def main(argv=tuple(), tbuf=None, lock_pool=None, **kwargs):
         )
         jor_lists.add(7, jor_list_user)
 
+        # adapt the number of consumers to the backlog and DB latency
+        n_backlog = len(jor_lists)
+        time_stamps = [jor[3] for jor in (jor_list_others or []) + (jor_list_user or [])]
+        backlog_age = (naive_utcnow() - min(time_stamps)).total_seconds() if time_stamps else 0
+        nThr = min(max_workers, max(1, math.ceil(n_backlog / n_jors_per_batch)))
+        if db_latency is None or db_latency > db_latency_threshold:
+            # fewer consumers not to overload the DB
+            nThr = max(1, nThr // 2)
+        tmpLog.debug(f"got {n_backlog} job reports : backlog_age={backlog_age:.0f} sec db_latency={db_latency} sec n_workers={nThr}")
+
         # adder consumer processes
         _n_thr_with_tbuf = 0
         tbuf_list = []
-        tmpLog.debug(f"got {len(jor_lists)} job reports")
+        n_processed = multiprocessing.Value("i", 0)
         for i in range(nThr):
             if i < _n_thr_with_tbuf:
                 tbuf = TaskBuffer()
@@ -214,9 +302,9 @@ def main(argv=tuple(), tbuf=None, lock_pool=None, **kwargs):
                     useTimeout=True,
                     requester=requester_id,
                 )
-                thr = AdderThread(tbuf, aSiteMapper, jor_lists, lock_pool)
+                thr = AdderThread(tbuf, aSiteMapper, jor_lists, lock_pool, n_processed)
             else:
-                thr = AdderThread(taskBufferIF.getInterface(), aSiteMapper, jor_lists, lock_pool)
+                thr = AdderThread(taskBufferIF.getInterface(), aSiteMapper, jor_lists, lock_pool, n_processed)
             adderThrList.append(thr)
         # start all threads
         for thr in adderThrList:
@@ -230,6 +318,12 @@ def main(argv=tuple(), tbuf=None, lock_pool=None, **kwargs):
             thr.proc_join()
         [tbuf.cleanup(requester=requester_id) for tbuf in tbuf_list]
         end_time = naive_utcnow()
+        # stats
+        duration = (end_time - start_time).total_seconds()
+        tmpLog.debug(
+            f"iLoop={iLoop} processed {n_processed.value} reports in {duration:.1f} sec : "
+            f"throughput={n_processed.value / max(duration, 1e-3):.1f}/sec backlog={n_backlog} backlog_age={backlog_age:.0f} sec"
+        )
         sleep_time = interval - (end_time - start_time).seconds
         if sleep_time > 0 and iLoop + 1 < nLoop:
             sleep_time = random.randint(1, sleep_time)
@@ -16,6 +16,7 @@ from urllib3.exceptions import InsecureRequestWarning
 import pandaserver.userinterface.Client as Client
 from pandaserver.brokerage.SiteMapper import SiteMapper
 from pandaserver.config import panda_config
+from pandaserver.jobdispatcher.HeartbeatReaper import HeartbeatReaper
 from pandaserver.jobdispatcher.Watcher import Watcher
 from pandaserver.taskbuffer import EventServiceUtils
 
@@ -71,7 +72,7 @@ def main(argv=tuple(), tbuf=None, **kwargs):
     taskBuffer.init(
         panda_config.dbhost,
         panda_config.dbpasswd,
-        nDBConnection=1,
+        nDBConnection=max(1, panda_config.heartbeat_reaper_workers),
         useTimeout=True,
         requester=requester_id,
     )
@@ -273,6 +274,9 @@ def main(argv=tuple(), tbuf=None, **kwargs):
 
     _logger.debug("Watcher session")
 
+    # reaper to fail jobs whose heartbeat timed out in bulk
+    heartbeat_reaper = HeartbeatReaper(taskBuffer, panda_config.heartbeat_reaper_workers, panda_config.heartbeat_reaper_batch_size)
+
     # get the list of workflows
     sql = "SELECT /* use_json_type */ DISTINCT scj.data.workflow FROM ATLAS_PANDA.schedconfig_json scj WHERE scj.data.status='online' "
     status, res = taskBuffer.querySQLS(sql, {})
@@ -305,11 +309,7 @@ def main(argv=tuple(), tbuf=None, **kwargs):
         _logger.debug(f"# of Anal Watcher : {res}")
     else:
         _logger.debug(f"# of Anal Watcher : {len(res)}")
-        for (id,) in res:
-            _logger.debug(f"Anal Watcher {id}")
-            thr = Watcher(taskBuffer, id, single=True, sleepTime=60, sitemapper=siteMapper)
-            thr.start()
-            thr.join()
+        heartbeat_reaper.add("Anal Watcher", [id for (id,) in res], 60)
 
     # check heartbeat for analysis jobs in transferring
     timeLimit = naive_utcnow() - datetime.timedelta(hours=workflow_timeout_map["analysis"])
@@ -325,11 +325,7 @@ def main(argv=tuple(), tbuf=None, **kwargs):
         _logger.debug(f"# of Transferring Anal Watcher : {res}")
     else:
         _logger.debug(f"# of Transferring Anal Watcher : {len(res)}")
-        for (id,) in res:
-            _logger.debug(f"Trans Anal Watcher {id}")
-            thr = Watcher(taskBuffer, id, single=True, sleepTime=60, sitemapper=siteMapper)
-            thr.start()
-            thr.join()
+        heartbeat_reaper.add("Trans Anal Watcher", [id for (id,) in res], 60)
 
     # check heartbeat for sent jobs
     timeLimit = naive_utcnow() - datetime.timedelta(minutes=30)
@@ -344,11 +340,7 @@ def main(argv=tuple(), tbuf=None, **kwargs):
         _logger.debug(f"# of Sent Watcher : {res}")
     else:
         _logger.debug(f"# of Sent Watcher : {len(res)}")
-        for (id,) in res:
-            _logger.debug(f"Sent Watcher {id}")
-            thr = Watcher(taskBuffer, id, single=True, sleepTime=30, sitemapper=siteMapper)
-            thr.start()
-            thr.join()
+        heartbeat_reaper.add("Sent Watcher", [id for (id,) in res], 30)
 
     # check heartbeat for 'holding' analysis/ddm jobs
     timeLimit = naive_utcnow() - datetime.timedelta(hours=3)
@@ -377,14 +369,13 @@ def main(argv=tuple(), tbuf=None, **kwargs):
         _logger.debug(f"# of Holding Anal/DDM Watcher : {res}")
     else:
         _logger.debug(f"# of Holding Anal/DDM Watcher : {len(res)} - XMLs : {len(xmlIDs)}")
+        ids = []
         for (id,) in res:
-            _logger.debug(f"Holding Anal/DDM Watcher {id}")
             if int(id) in xmlIDs:
                 _logger.debug(f"   found XML -> skip {id}")
                 continue
-            thr = Watcher(taskBuffer, id, single=True, sleepTime=180, sitemapper=siteMapper)
-            thr.start()
-            thr.join()
+            ids.append(id)
+        heartbeat_reaper.add("Holding Anal/DDM Watcher", ids, 180)
 
     # check heartbeat for high prio production jobs
     timeOutVal = 3
@@ -401,17 +392,7 @@ def main(argv=tuple(), tbuf=None, **kwargs):
         _logger.debug(f"# of High prio Holding Watcher : {res}")
     else:
         _logger.debug(f"# of High prio Holding Watcher : {len(res)}")
-        for (id,) in res:
-            _logger.debug(f"High prio Holding Watcher {id}")
-            thr = Watcher(
-                taskBuffer,
-                id,
-                single=True,
-                sleepTime=60 * timeOutVal,
-                sitemapper=siteMapper,
-            )
-            thr.start()
-            thr.join()
+        heartbeat_reaper.add("High prio Holding Watcher", [id for (id,) in res], 60 * timeOutVal)
 
     # check heartbeat for production jobs
     timeOutVal = taskBuffer.getConfigValue("job_timeout", "TIMEOUT_holding", "pandaserver")
@@ -429,11 +410,7 @@ def main(argv=tuple(), tbuf=None, **kwargs):
         _logger.debug(f"# of Holding Watcher with timeout {timeOutVal}min: {str(res)}")
     else:
         _logger.debug(f"# of Holding Watcher with timeout {timeOutVal}min: {len(res)}")
-        for (id,) in res:
-            _logger.debug(f"Holding Watcher {id}")
-            thr = Watcher(taskBuffer, id, single=True, sleepTime=timeOutVal, sitemapper=siteMapper)
-            thr.start()
-            thr.join()
+        heartbeat_reaper.add("Holding Watcher", [id for (id,) in res], timeOutVal)
 
     # check heartbeat for production jobs
     sql = (
@@ -468,20 +445,16 @@ def main(argv=tuple(), tbuf=None, **kwargs):
             _logger.debug(f"# of General Watcher with workflow={workflow}: {res}")
         else:
             _logger.debug(f"# of General Watcher with workflow={workflow}: {len(res)}")
+            ids = []
             for pandaID, jobStatus, computingSite in res:
                 if computingSite in sitesToSkipTO:
                     _logger.debug(f"skip General Watcher for PandaID={pandaID} at {computingSite} since timeout is disabled for {jobStatus}")
                     continue
-                _logger.debug(f"General Watcher {pandaID}")
-                thr = Watcher(
-                    taskBuffer,
-                    pandaID,
-                    single=True,
-                    sleepTime=60 * timeOutVal,
-                    sitemapper=siteMapper,
-                )
-                thr.start()
-                thr.join()
+                ids.append(pandaID)
+            heartbeat_reaper.add(f"General Watcher with workflow={workflow}", ids, 60 * timeOutVal)
+
+    # fail jobs whose heartbeat timed out
+    heartbeat_reaper.run()
 
     _memoryCheck("reassign")
 
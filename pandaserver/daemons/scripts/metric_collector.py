@@ -2,6 +2,7 @@ import copy
 import datetime
 import functools
 import json
+import math
 import os
 import socket
 import sys
@@ -9,9 +10,10 @@ import traceback
 from zlib import adler32
 
 import numpy as np
+import polars as pl
 from pandacommon.pandalogger import logger_utils
 from pandacommon.pandalogger.PandaLogger import PandaLogger
-from pandacommon.pandautils.PandaUtils import naive_utcnow
+from pandacommon.pandautils.PandaUtils import get_sql_IN_bind_variables, naive_utcnow
 from pandacommon.pandautils.thread_utils import GenericThread
 from scipy import stats
 
@@ -35,6 +37,12 @@ metric_list = [
 # constant maps
 class_value_rank_map = {1: "A_sites", 0: "B_sites", -1: "C_sites"}
 
+# number of PandaIDs in a query to jobs_StatusLog
+STATUS_LOG_CHUNK_SIZE = 1000
+
+# number of rows in a batch to update or insert metrics
+METRICS_BATCH_SIZE = 1000
+
 
 def get_now_time_str():
     """
@@ -51,19 +59,92 @@ def conf_interval_upper(n, mean, stdev, cl=0.95):
     """
     max_value = 999999
     ciu = stats.t.ppf(cl, (n - 1), loc=mean, scale=stdev)
-    ciu = min(ciu, max_value)
+    ciu = np.minimum(ciu, max_value)
     return ciu
 
 
-def weighted_stats(values, weights):
+def get_jobs_wait_time_and_run_age(tbuf, job_site_set, now_time, tmp_log):
+    """
+    Get wait time from activated to running and run age of jobs from jobs_StatusLog, querying PandaIDs in chunks
+    Return lists of sites, wait times, and run ages of jobs in the same order
     """
-    Return sum of weights, weighted mean and standard deviation
+    sql_get_jobs_mtime_status_template = (
+        "SELECT pandaID, "
+        "MIN(CASE WHEN jobStatus='activated' THEN modificationTime END), "
+        "MIN(CASE WHEN jobStatus='running' THEN modificationTime END) "
+        "FROM ATLAS_PANDA.jobs_StatusLog "
+        "WHERE pandaID IN ({panda_id_var_names_str}) "
+        "AND jobStatus IN ('activated','running') "
+        "GROUP BY pandaID "
+    )
+    # get modificationTime when activated and running in chunks of jobs
+    panda_id_list = sorted({pandaID for pandaID, site in job_site_set if site})
+    status_mtime_map = {}
+    for i in range(0, len(panda_id_list), STATUS_LOG_CHUNK_SIZE):
+        panda_id_var_names_str, varMap = get_sql_IN_bind_variables(panda_id_list[i : i + STATUS_LOG_CHUNK_SIZE], prefix=":pandaID_")
+        sql_get_jobs_mtime_status = sql_get_jobs_mtime_status_template.format(panda_id_var_names_str=panda_id_var_names_str)
+        for pandaID, activated_time, running_time in tbuf.querySQL(sql_get_jobs_mtime_status, varMap):
+            status_mtime_map[pandaID] = (activated_time, running_time)
+    tmp_log.debug(f"queried {len(panda_id_list)} jobs in {math.ceil(len(panda_id_list) / STATUS_LOG_CHUNK_SIZE)} chunks")
+    # wait time and run age of jobs
+    site_list = []
+    wait_time_list = []
+    run_age_list = []
+    for pandaID, site in job_site_set:
+        if not site:
+            continue
+        activated_time, running_time = status_mtime_map.get(pandaID, (None, None))
+        if activated_time is None or running_time is None:
+            continue
+        wait_time_sec = (running_time - activated_time).total_seconds()
+        if wait_time_sec < 0:
+            tmp_log.warning(f"job {pandaID} has negative wait time")
+            continue
+        run_age_sec = int((now_time - running_time).total_seconds())
+        if run_age_sec < 0:
+            tmp_log.warning(f"job {pandaID} has negative run age")
+            continue
+        site_list.append(site)
+        wait_time_list.append(wait_time_sec)
+        run_age_list.append(run_age_sec)
+    return site_list, wait_time_list, run_age_list
+
+
+def get_site_wait_time_stats(site_list, wait_time_list, run_age_list):
     """
-    sum_of_weights = np.sum(weights)
-    mean = np.average(values, weights=weights)
-    variance = np.average((values - mean) ** 2, weights=weights)
-    stdev = np.sqrt(variance)
-    return sum_of_weights, mean, stdev
+    Return map of site to statistics of wait time of jobs, where the weight of a job halves every 12 hours of its run age
+    """
+    df = pl.DataFrame(
+        {"site": site_list, "wait_time": wait_time_list, "run_age": run_age_list},
+        schema={"site": pl.Utf8, "wait_time": pl.Float64, "run_age": pl.Float64},
+    )
+    df = df.with_columns(weight=pl.lit(2.0).pow(-pl.col("run_age") / (12 * 60 * 60)))
+    stats_df = df.group_by("site").agg(
+        n=pl.len(),
+        mean=pl.col("wait_time").mean(),
+        stdev=pl.col("wait_time").std(ddof=0),
+        med=pl.col("wait_time").median(),
+        sum_of_weights=pl.col("weight").sum(),
+        w_mean=(pl.col("weight") * pl.col("wait_time")).sum() / pl.col("weight").sum(),
+    )
+    w_stdev_df = (
+        df.join(stats_df.select("site", "w_mean"), on="site")
+        .group_by("site")
+        .agg(w_stdev=((pl.col("weight") * (pl.col("wait_time") - pl.col("w_mean")) ** 2).sum() / pl.col("weight").sum()).sqrt())
+    )
+    stats_df = stats_df.join(w_stdev_df, on="site").sort("site")
+    # upper bounds of confidence intervals for all sites at once
+    cl95upp_array = conf_interval_upper(n=stats_df["n"].to_numpy(), mean=stats_df["mean"].to_numpy(), stdev=stats_df["stdev"].to_numpy(), cl=0.95)
+    w_cl95upp_array = conf_interval_upper(
+        n=stats_df["sum_of_weights"].to_numpy() + 1, mean=stats_df["w_mean"].to_numpy(), stdev=stats_df["w_stdev"].to_numpy(), cl=0.95
+    )
+    ret_map = {}
+    for row, cl95upp, w_cl95upp in zip(stats_df.iter_rows(named=True), cl95upp_array, w_cl95upp_array):
+        site = row.pop("site")
+        row["cl95upp"] = float(cl95upp)
+        row["w_cl95upp"] = float(w_cl95upp)
+        ret_map[site] = row
+    return ret_map
 
 
 # get site slot to-running rate statistics
@@ -172,6 +253,7 @@ class MetricsDB(object):
             """WHERE computingSite=:site AND gshare=:gshare AND metric=:metric """
         )
         sql_insert = """INSERT INTO ATLAS_PANDA.Metrics """ """VALUES ( """ """:site, :gshare, :metric, :patch_value_json, :timestamp """ """) """
+        sql_get_keys = """SELECT computingSite, gshare """ """FROM ATLAS_PANDA.Metrics """ """WHERE metric=:metric """
         # now
         now_time = naive_utcnow()
         # var map template
@@ -237,15 +319,25 @@ class MetricsDB(object):
                     )
                 # append to the list
                 varMap_list.append(varMap)
-        # update
-        n_row = self.tbuf.executemanySQL(sql_update, varMap_list)
-        # try insert if not all rows updated
+        # update in batches
+        n_row = 0
+        for i in range(0, len(varMap_list), METRICS_BATCH_SIZE):
+            tmp_n_row = self.tbuf.executemanySQL(sql_update, varMap_list[i : i + METRICS_BATCH_SIZE], arraySize=METRICS_BATCH_SIZE)
+            if tmp_n_row is None:
+                tmp_log.warning(f"failed to update for metric={metric}")
+                return
+            n_row += tmp_n_row
+        # insert rows not updated
         if n_row < len(varMap_list):
             try:
                 tmp_log.debug(f"only {n_row}/{len(varMap_list)} rows updated for metric={metric} ; trying insert")
-                for varMap in varMap_list:
-                    self.tbuf.querySQLS(sql_insert, varMap)
-                tmp_log.debug(f"inserted for metric={metric}")
+                varMap = {":metric": metric}
+                existing_keys = set(self.tbuf.querySQL(sql_get_keys, varMap))
+                insert_varMap_list = [tmp_varMap for tmp_varMap in varMap_list if (tmp_varMap[":site"], tmp_varMap[":gshare"]) not in existing_keys]
+                for i in range(0, len(insert_varMap_list), METRICS_BATCH_SIZE):
+                    if self.tbuf.executemanySQL(sql_insert, insert_varMap_list[i : i + METRICS_BATCH_SIZE], arraySize=METRICS_BATCH_SIZE) is None:
+                        raise RuntimeError("insert failed")
+                tmp_log.debug(f"inserted {len(insert_varMap_list)} rows for metric={metric}")
             except Exception:
                 tmp_log.warning(f"failed to insert for metric={metric}")
         else:
@@ -332,10 +424,11 @@ class FetchData(object):
             "AND (processingType='pmerge' OR prodUserName='gangarbt') "
             "AND modificationTime>:modificationTime "
         )
-        sql_get_latest_job_mtime_status = (
-            "SELECT jobStatus, MIN(modificationTime) " "FROM ATLAS_PANDA.jobs_StatusLog " "WHERE pandaID=:pandaID " "GROUP BY jobStatus "
+        sql_get_site_workflow_template = (
+            "SELECT /* use_json_type */ scj.panda_queue, scj.data.workflow "
+            "FROM ATLAS_PANDA.schedconfig_json scj "
+            "WHERE scj.panda_queue IN ({site_var_names_str}) "
         )
-        sql_get_site_workflow = "SELECT /* use_json_type */ scj.data.workflow " "FROM ATLAS_PANDA.schedconfig_json scj " "WHERE scj.panda_queue=:computingSite "
         sql_get_long_queuing_job_wait_time_template = (
             "SELECT COUNT(*), AVG(CURRENT_DATE-creationtime) "
             "FROM ATLAS_PANDA.jobsActive4 "
@@ -347,8 +440,6 @@ class FetchData(object):
             "AND (CURRENT_DATE-creationtime)>:w_mean "
         )
         try:
-            # initialize
-            tmp_site_dict = dict()
             # now time
             now_time = naive_utcnow()
             # get user jobs
@@ -362,94 +453,41 @@ class FetchData(object):
             all_jobs_set.update(active4_jobs_list)
             n_tot_jobs = len(all_jobs_set)
             tmp_log.debug(f"got total {n_tot_jobs} jobs")
-            # loop over jobs to get modificationTime when activated and running
-            cc = 0
-            for pandaID, site in all_jobs_set:
-                if not site:
-                    continue
-                varMap = {":pandaID": pandaID}
-                status_mtime_list = self.tbuf.querySQL(sql_get_latest_job_mtime_status, varMap)
-                status_mtime_dict = dict(status_mtime_list)
-                if "activated" not in status_mtime_dict or "running" not in status_mtime_dict:
-                    continue
-                wait_time = status_mtime_dict["running"] - status_mtime_dict["activated"]
-                wait_time_sec = wait_time.total_seconds()
-                if wait_time_sec < 0:
-                    tmp_log.warning(f"job {pandaID} has negative wait time")
-                    continue
-                run_age_sec = int((now_time - status_mtime_dict["running"]).total_seconds())
-                if run_age_sec < 0:
-                    tmp_log.warning(f"job {pandaID} has negative run age")
-                    continue
-                tmp_site_dict.setdefault(site, {"wait_time": [], "run_age": []})
-                tmp_site_dict[site]["wait_time"].append(wait_time_sec)
-                tmp_site_dict[site]["run_age"].append(run_age_sec)
-                # log message
-                if cc > 0 and cc % 5000 == 0:
-                    tmp_log.debug(f"... queried {cc:9d} jobs ...")
-                cc += 1
-            tmp_log.debug(f"queried {cc} jobs")
-            # evaluate stats
-            site_dict = dict()
-            for site, data_dict in tmp_site_dict.items():
-                site_dict.setdefault(site, {})
-                n_jobs = len(data_dict["wait_time"])
-                # init with nan
-                mean = np.nan
-                stdev = np.nan
-                median = np.nan
-                cl95upp = np.nan
-                sum_of_weights = np.nan
-                w_mean = np.nan
-                w_stdev = np.nan
-                w_cl95upp = np.nan
+            # get wait time and run age of jobs
+            site_list, wait_time_list, run_age_list = get_jobs_wait_time_and_run_age(self.tbuf, all_jobs_set, now_time, tmp_log)
+            # evaluate stats of all sites
+            site_dict = get_site_wait_time_stats(site_list, wait_time_list, run_age_list)
+            # workflows of sites
+            site_workflow_map = {}
+            site_name_list = sorted(site_dict)
+            for i in range(0, len(site_name_list), STATUS_LOG_CHUNK_SIZE):
+                site_var_names_str, varMap = get_sql_IN_bind_variables(site_name_list[i : i + STATUS_LOG_CHUNK_SIZE], prefix=":site_")
+                sql_get_site_workflow = sql_get_site_workflow_template.format(site_var_names_str=site_var_names_str)
+                site_workflow_map.update(self.tbuf.querySQL(sql_get_site_workflow, varMap))
+            for site, stats_dict in site_dict.items():
+                w_mean = stats_dict["w_mean"]
                 long_q_n = np.nan
                 long_q_mean = np.nan
-                # fill the stats values
-                if n_jobs > 0:
-                    wait_time_array = np.array(data_dict["wait_time"])
-                    run_age_array = np.array(data_dict["run_age"])
-                    # stats
-                    mean = np.mean(wait_time_array)
-                    stdev = np.std(wait_time_array)
-                    median = np.median(wait_time_array)
-                    cl95upp = conf_interval_upper(n=n_jobs, mean=mean, stdev=stdev, cl=0.95)
-                    # weighted by run age (weight halves every 12 hours)
-                    weight_array = np.exp2(-run_age_array / (12 * 60 * 60))
-                    sum_of_weights, w_mean, w_stdev = weighted_stats(wait_time_array, weight_array)
-                    w_cl95upp = conf_interval_upper(n=sum_of_weights + 1, mean=w_mean, stdev=w_stdev, cl=0.95)
-                    # current long queuing jobs
-                    if w_mean:
-                        q_status_list_str = "('activated', 'sent')"
-                        varMap = {
-                            ":computingSite": site,
-                        }
-                        (site_workflow,) = self.tbuf.querySQL(sql_get_site_workflow, varMap)[0]
-                        if site_workflow and site_workflow.startswith("push"):
-                            q_status_list_str = "('activated', 'sent', 'starting')"
-                        varMap = {
-                            ":computingSite": site,
-                            ":w_mean": w_mean / (24 * 60 * 60),
-                        }
-                        sql_get_long_queuing_job_wait_time = sql_get_long_queuing_job_wait_time_template.format(q_status_list_str=q_status_list_str)
-                        (long_q_n, long_q_mean_day) = self.tbuf.querySQL(sql_get_long_queuing_job_wait_time, varMap)[0]
-                        if long_q_mean_day:
-                            long_q_mean = long_q_mean_day * (24 * 60 * 60)
-                        else:
-                            long_q_mean = w_mean
-                            long_q_n = 0
+                # current long queuing jobs
+                if w_mean:
+                    q_status_list_str = "('activated', 'sent')"
+                    site_workflow = site_workflow_map.get(site)
+                    if site_workflow and site_workflow.startswith("push"):
+                        q_status_list_str = "('activated', 'sent', 'starting')"
+                    varMap = {
+                        ":computingSite": site,
+                        ":w_mean": w_mean / (24 * 60 * 60),
+                    }
+                    sql_get_long_queuing_job_wait_time = sql_get_long_queuing_job_wait_time_template.format(q_status_list_str=q_status_list_str)
+                    (long_q_n, long_q_mean_day) = self.tbuf.querySQL(sql_get_long_queuing_job_wait_time, varMap)[0]
+                    if long_q_mean_day:
+                        long_q_mean = long_q_mean_day * (24 * 60 * 60)
+                    else:
+                        long_q_mean = w_mean
+                        long_q_n = 0
                 # update
-                site_dict[site].update(
+                stats_dict.update(
                     {
-                        "n": n_jobs,
-                        "mean": mean,
-                        "stdev": stdev,
-                        "med": median,
-                        "cl95upp": cl95upp,
-                        "sum_of_weights": sum_of_weights,
-                        "w_mean": w_mean,
-                        "w_stdev": w_stdev,
-                        "w_cl95upp": w_cl95upp,
                         "long_q_n": long_q_n,
                         "long_q_mean": long_q_mean,
                     }
@@ -462,12 +500,12 @@ class FetchData(object):
                         "sum_of_weights={sum_of_weights:.3f}, "
                         "w_mean={w_mean:.3f}, w_stdev={w_stdev:.3f}, w_cl95upp={w_cl95upp:.3f}, "
                         "long_q_n={long_q_n}, long_q_mean={long_q_mean:.3f} "
-                    ).format(site=site, **site_dict[site])
+                    ).format(site=site, **stats_dict)
                 )
                 # turn nan into None
-                for key in site_dict[site]:
-                    if np.isnan(site_dict[site][key]):
-                        site_dict[site][key] = None
+                for key in stats_dict:
+                    if np.isnan(stats_dict[key]):
+                        stats_dict[key] = None
             # return
             return site_dict
         except Exception:
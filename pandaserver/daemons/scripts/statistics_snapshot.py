@@ -0,0 +1,51 @@
+import sys
+import time
+import traceback
+
+from pandacommon.pandalogger.PandaLogger import PandaLogger
+from pandacommon.pandautils.thread_utils import GenericThread
+
+from pandaserver.config import panda_config
+from pandaserver.srvcore import statistics_snapshot
+
+# logger
+_logger = PandaLogger().getLogger("statistics_snapshot_daemon")
+
+
+def main(argv=tuple(), tbuf=None, **kwargs):
+    _logger.debug("start")
+    path = panda_config.statistics_snapshot
+    if not path:
+        _logger.debug("skipped since statistics_snapshot is not set")
+        return
+    try:
+        # instantiate TB
+        requester_id = GenericThread().get_full_id(__name__, sys.modules[__name__].__file__)
+        if tbuf is None:
+            from pandaserver.taskbuffer.TaskBuffer import taskBuffer
+
+            taskBuffer.init(
+                panda_config.dbhost,
+                panda_config.dbpasswd,
+                nDBConnection=1,
+                useTimeout=True,
+                requester=requester_id,
+            )
+        else:
+            taskBuffer = tbuf
+        # compute all views and publish them
+        time_start = time.monotonic()
+        views = statistics_snapshot.compute_views(taskBuffer)
+        version = statistics_snapshot.write_snapshot(views, path)
+        _logger.debug(f"wrote version={version} with {len(views)}/{len(statistics_snapshot.VIEWS)} views to {path} in {time.monotonic() - time_start:.3f} sec")
+        # stop taskBuffer if created inside this script
+        if tbuf is None:
+            taskBuffer.cleanup(requester=requester_id)
+    except Exception:
+        _logger.error(f"failed to write snapshot: {traceback.format_exc()}")
+    # done
+    _logger.debug("done")
+
+
+if __name__ == "__main__":
+    main(argv=sys.argv)
@@ -44,12 +44,16 @@ class AdderGen:
         prelock_pid=None,
         lock_offset=10,
         lock_pool=None,
+        report_dict=None,
+        delete_report=True,
     ) -> None:
         """
         Initialize the AdderGen.
 
         :param job: The job object.
         :param params: Additional parameters.
+        :param report_dict: Record of the job output report prefetched by the caller, optionally with the parsed data in "parsed_data".
+        :param delete_report: False if the caller deletes the job output report after the report is processed.
         """
         self.job = None
         self.job_id = job_id
@@ -71,7 +75,10 @@ class AdderGen:
         self.prelock_pid = prelock_pid
         self.data = None
         self.lock_pool = lock_pool
-        self.report_dict = None
+        self.report_dict = report_dict
+        self.parsed_data = None
+        self.delete_report = delete_report
+        self.report_processed = False
         self.adder_plugin = None
         self.add_result = None
         self.adder_plugin_class = None
@@ -101,7 +108,8 @@ class AdderGen:
             self.logger.debug("end: took %s.%03d sec in total" % (duration.seconds, duration.microseconds / 1000))
 
             # remove Catalog
-            if processed:
+            self.report_processed = processed
+            if processed and self.delete_report:
                 self.taskBuffer.deleteJobOutputReport(panda_id=self.job_id, attempt_nr=self.attempt_nr)
 
             del self.data
@@ -168,8 +176,10 @@ class AdderGen:
         """
         Get the job output report.
         """
-        self.report_dict = self.taskBuffer.getJobOutputReport(panda_id=self.job_id, attempt_nr=self.attempt_nr)
+        if self.report_dict is None:
+            self.report_dict = self.taskBuffer.getJobOutputReport(panda_id=self.job_id, attempt_nr=self.attempt_nr)
         self.data = self.report_dict.get("data")
+        self.parsed_data = self.report_dict.get("parsed_data")
 
     def register_event_service_files(self) -> None:
         """
@@ -712,7 +722,10 @@ class AdderGen:
         guid_map = {}
 
         try:
-            json_dict = json.loads(self.data)
+            if self.parsed_data is not None:
+                json_dict = self.parsed_data
+            else:
+                json_dict = json.loads(self.data)
             for lfn in json_dict:
                 file_data = json_dict[lfn]
                 lfn = str(lfn)
@@ -0,0 +1,153 @@
+"""
+fail jobs whose heartbeat timed out in bulk
+
+"""
+
+import collections
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from pandacommon.pandalogger.LogWrapper import LogWrapper
+from pandacommon.pandalogger.PandaLogger import PandaLogger
+from pandacommon.pandautils.PandaUtils import naive_utcnow
+
+from pandaserver.jobdispatcher.Watcher import (
+    is_heartbeat_timed_out,
+    is_watched_status,
+    post_process_timeout,
+    set_timeout_error,
+)
+
+# logger
+_logger = PandaLogger().getLogger("HeartbeatReaper")
+
+
+class HeartbeatReaper(object):
+    """
+    Stale PandaIDs found by the heartbeat queries of Watcher categories are collected first, and then processed in
+    batches by a pool of worker threads. Jobs in a batch are peeked with IN-list queries and classified in memory, and
+    jobs whose heartbeat timed out are failed with one call of updateJobs before the post-processing of each job. A
+    PandaID found in multiple categories is processed only once in the category with the shortest timeout
+    """
+
+    # constructor
+    def __init__(self, task_buffer, n_workers=4, batch_size=100):
+        self.task_buffer = task_buffer
+        self.n_workers = max(1, n_workers)
+        self.batch_size = max(1, batch_size)
+        # list of category, timeout, and the number of PandaIDs found
+        self.categories = []
+        # map of PandaID to the index of the category with the shortest timeout
+        self.category_index_map = {}
+
+    # add stale PandaIDs of a category
+    def add(self, category, panda_ids, sleep_time):
+        """
+        :param category: category name used in logs
+        :param panda_ids: PandaIDs found by the heartbeat query of the category
+        :param sleep_time: timeout in minutes
+        """
+        category_index = len(self.categories)
+        n_found = 0
+        for panda_id in panda_ids:
+            n_found += 1
+            # keep the shortest timeout, or the first category for the same timeout
+            old_index = self.category_index_map.get(panda_id)
+            if old_index is None or sleep_time < self.categories[old_index][1]:
+                self.category_index_map[panda_id] = category_index
+        self.categories.append((category, sleep_time, n_found))
+
+    # process a batch of PandaIDs
+    def process_batch(self, category, panda_ids, sleep_time):
+        """
+        :param category: category name
+        :param panda_ids: PandaIDs in the batch
+        :param sleep_time: timeout in minutes
+        :return: counter of results
+        """
+        stats = collections.Counter()
+        try:
+            jobs = self.task_buffer.peek_jobs_in_bulk(panda_ids, from_defined=False, from_archived=False, from_waiting=False)
+            if jobs is None:
+                raise RuntimeError("failed to peek at jobs")
+            time_now = naive_utcnow()
+            # classify jobs
+            jobs_to_fail = []
+            for job in jobs:
+                if job is None:
+                    stats["not_found"] += 1
+                elif not is_watched_status(job):
+                    stats["wrong_status"] += 1
+                elif not is_heartbeat_timed_out(job, sleep_time, time_now):
+                    stats["alive"] += 1
+                else:
+                    jobs_to_fail.append(job)
+            # set errors
+            jobs_to_update = []
+            dest_db_lists = []
+            for job in jobs_to_fail:
+                tmp_log = LogWrapper(_logger, f"< PandaID={job.PandaID} >")
+                try:
+                    tmp_log.debug(f"{category} {job.jobStatus} lastmod:{str(job.modificationTime)} endtime:{str(job.endTime)}")
+                    dest_db_lists.append(set_timeout_error(self.task_buffer, job, sleep_time))
+                    jobs_to_update.append(job)
+                except Exception as e:
+                    stats["errors"] += 1
+                    tmp_log.error(f"failed to set error with {str(e)} {traceback.format_exc()}")
+            if not jobs_to_update:
+                return stats
+            # update jobs
+            update_results = self.task_buffer.updateJobs(jobs_to_update, False)
+            # post-processing only for jobs successfully updated
+            for job, dest_db_list, ret in zip(jobs_to_update, dest_db_lists, update_results):
+                tmp_log = LogWrapper(_logger, f"< PandaID={job.PandaID} >")
+                if not ret:
+                    stats["update_failed"] += 1
+                    tmp_log.error("failed to update")
+                    continue
+                try:
+                    post_process_timeout(self.task_buffer, job, dest_db_list, tmp_log)
+                    tmp_log.debug("done")
+                except Exception as e:
+                    stats["errors"] += 1
+                    tmp_log.error(f"failed to post-process with {str(e)} {traceback.format_exc()}")
+                stats["failed"] += 1
+        except Exception as e:
+            stats["errors"] += 1
+            _logger.error(f"{category} failed to process {len(panda_ids)} jobs with {str(e)} {traceback.format_exc()}")
+        return stats
+
+    # process all categories
+    def run(self):
+        """
+        :return: map of category to counter of results
+        """
+        ret_map = {}
+        # PandaIDs to process in each category
+        ids_per_category = [[] for _ in self.categories]
+        for panda_id, category_index in self.category_index_map.items():
+            ids_per_category[category_index].append(panda_id)
+        with ThreadPoolExecutor(max_workers=self.n_workers) as thread_pool:
+            for (category, sleep_time, n_found), panda_ids in zip(self.categories, ids_per_category):
+                t_start = time.monotonic()
+                futures = [
+                    thread_pool.submit(self.process_batch, category, panda_ids[i : i + self.batch_size], sleep_time)
+                    for i in range(0, len(panda_ids), self.batch_size)
+                ]
+                stats = collections.Counter()
+                for future in futures:
+                    stats.update(future.result())
+                elapsed = time.monotonic() - t_start
+                stats["found"] = n_found
+                stats["duplicated"] = n_found - len(panda_ids)
+                ret_map[category] = stats
+                rate = len(panda_ids) / elapsed if elapsed > 0 else 0
+                _logger.debug(
+                    f"{category} : found={n_found} duplicated={stats['duplicated']} failed={stats['failed']} alive={stats['alive']} "
+                    f"wrong_status={stats['wrong_status']} not_found={stats['not_found']} update_failed={stats['update_failed']} "
+                    f"errors={stats['errors']} {elapsed:.1f} sec {rate:.1f} jobs/sec"
+                )
+        self.categories = []
+        self.category_index_map = {}
+        return ret_map
@@ -9,7 +9,6 @@ import os
 import re
 import socket
 import sys
-import threading
 import time
 import traceback
 from threading import Lock
@@ -18,12 +17,13 @@ from pandacommon.pandalogger.LogWrapper import LogWrapper
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 from pandacommon.pandautils.PandaUtils import naive_utcnow
 
+from pandaserver.brokerage import site_mapper_snapshot
 from pandaserver.brokerage.SiteMapper import SiteMapper
 from pandaserver.config import panda_config
 from pandaserver.dataservice.adder_gen import AdderGen
 from pandaserver.jobdispatcher import Protocol
 from pandaserver.proxycache import panda_proxy_cache, token_cache
-from pandaserver.srvcore import CoreUtils
+from pandaserver.srvcore import CoreUtils, timed_executor
 
 # logger
 _logger = PandaLogger().getLogger("JobDispatcher")
@@ -32,20 +32,20 @@ _pilotReqLogger = PandaLogger().getLogger("PilotRequests")
 
 # a wrapper to install timeout into a method
 class _TimedMethod:
-    def __init__(self, method, timeout):
+    def __init__(self, method, timeout, read_only=False):
         self.method = method
         self.timeout = timeout
+        # the deadline applies only while waiting for a worker unless the method is read-only
+        self.read_only = read_only
         self.result = Protocol.TimeOutToken
 
     # method emulation
     def __call__(self, *var):
         self.result = self.method(*var)
 
-    # run
+    # run in the shared executor until the deadline
     def run(self, *var):
-        thr = threading.Thread(target=self, args=var)
-        thr.start()
-        thr.join()
+        self.result = timed_executor.get_executor().call(self.method, self.timeout, Protocol.TimeOutToken, var, read_only=self.read_only)
 
 
 # job dispatcher
@@ -84,10 +84,14 @@ class JobDispatcher:
             self.taskBuffer = taskBuffer
         # special dispatcher parameters
         if self.specialDispatchParams is None:
-            self.specialDispatchParams = CoreUtils.CachedObject("dispatcher_params", 60 * 10, self.get_special_dispatch_params, _logger)
+            self.specialDispatchParams = CoreUtils.CachedObject(
+                "dispatcher_params", 60 * 10, self.get_special_dispatch_params, _logger, stale_while_revalidate=True, jitter=0.1, max_staleness=60 * 30
+            )
         # site mapper cache
         if self.siteMapperCache is None:
-            self.siteMapperCache = CoreUtils.CachedObject("site_mapper", 60 * 10, self.getSiteMapper, _logger)
+            self.siteMapperCache = CoreUtils.CachedObject(
+                "site_mapper", 60 * 10, self.getSiteMapper, _logger, stale_while_revalidate=True, jitter=0.1, max_staleness=60 * 30
+            )
         # release
         self.lock.release()
 
@@ -218,11 +222,13 @@ class JobDispatcher:
         if len(jobs) != 0:
             # succeed
             responseList = []
+            # site-level values are resolved once for all jobs
+            siteContext = Protocol.SiteContext(self.siteMapperCache, jobs)
             # append Jobs
             for tmpJob in jobs:
                 try:
                     response = Protocol.Response(Protocol.SC_Success)
-                    response.appendJob(tmpJob, self.siteMapperCache)
+                    response.appendJob(tmpJob, siteContext=siteContext)
                 except Exception as e:
                     tmpMsg = f"failed to get jobs with {str(e)}"
                     tmpLog.error(tmpMsg + "\n" + traceback.format_exc())
@@ -268,12 +274,18 @@ class JobDispatcher:
                     response = Protocol.Response(Protocol.SC_NoJobs)
                 _pilotReqLogger.info(f"method=noJob,site={siteName},node={node},type={prodSourceLabel}")
         # return
-        tmpLog.debug(f"{siteName} {node} ret -> {response.encode(acceptJson)}")
+        if len(jobs) != 0:
+            # job descriptions are streamed to the response body instead of being dumped in the log
+            tmpLog.debug(f"{siteName} {node} ret -> PandaIDs={[tmpJob.PandaID for tmpJob in jobs]}")
+            ret = response.encode(acceptJson, stream=True)
+        else:
+            ret = response.encode(acceptJson)
+            tmpLog.debug(f"{siteName} {node} ret -> {ret}")
 
         t_getJob_end = time.time()
         t_getJob_spent = t_getJob_end - t_getJob_start
         tmpLog.info(f"siteName={siteName} took timing={t_getJob_spent}s in_test={in_test}")
-        return response.encode(acceptJson)
+        return ret
 
     # update job status
     def updateJob(
@@ -368,7 +380,7 @@ class JobDispatcher:
         # convert str to list
         ids = strIDs.split()
         # peek jobs
-        tmpWrapper = _TimedMethod(self.taskBuffer.peekJobs, timeout)
+        tmpWrapper = _TimedMethod(self.taskBuffer.peekJobs, timeout, read_only=True)
         tmpWrapper.run(ids, False, True, True, False)
         # make response
         if tmpWrapper.result == Protocol.TimeOutToken:
@@ -398,7 +410,7 @@ class JobDispatcher:
 
     # check job status
     def checkJobStatus(self, pandaIDs, timeout):
-        tmpWrapper = _TimedMethod(self.taskBuffer.checkJobStatus, timeout)
+        tmpWrapper = _TimedMethod(self.taskBuffer.checkJobStatus, timeout, read_only=True)
         tmpWrapper.run(pandaIDs)
         # make response
         if tmpWrapper.result == Protocol.TimeOutToken:
@@ -445,6 +457,26 @@ class JobDispatcher:
         _logger.debug(f"getEventRanges : {pandaID} ret -> {response.encode(acceptJson)}")
         return response.encode(acceptJson)
 
+    # get lists of event ranges for multiple PandaIDs
+    def getEventRangesBulk(self, jobList, timeout, acceptJson, scattered, segment_id):
+        tmpWrapper = _TimedMethod(self.taskBuffer.get_event_ranges_bulk, timeout)
+        tmpWrapper.run(jobList, acceptJson, scattered, segment_id)
+        # make response
+        if tmpWrapper.result == Protocol.TimeOutToken:
+            # timeout
+            response = Protocol.Response(Protocol.SC_TimeOut)
+        else:
+            if tmpWrapper.result is not None:
+                # succeed
+                response = Protocol.Response(Protocol.SC_Success)
+                # make return
+                response.appendNode("eventRanges", tmpWrapper.result)
+            else:
+                # failed
+                response = Protocol.Response(Protocol.SC_Failed)
+        _logger.debug(f"getEventRangesBulk : {len(jobList)} jobs ret -> {response.encode(acceptJson)}")
+        return response.encode(acceptJson)
+
     # update an event range
     def updateEventRange(
         self,
@@ -492,7 +524,7 @@ class JobDispatcher:
 
     # check event availability
     def checkEventsAvailability(self, pandaID, jobsetID, jediTaskID, timeout):
-        tmpWrapper = _TimedMethod(self.taskBuffer.checkEventsAvailability, timeout)
+        tmpWrapper = _TimedMethod(self.taskBuffer.checkEventsAvailability, timeout, read_only=True)
         tmpWrapper.run(pandaID, jobsetID, jediTaskID)
         # make response
         if tmpWrapper.result == Protocol.TimeOutToken:
@@ -595,6 +627,9 @@ class JobDispatcher:
 
     # get site mapper
     def getSiteMapper(self):
+        # use the snapshot shared by processes
+        if panda_config.site_mapper_snapshot:
+            return True, site_mapper_snapshot.get_site_mapper(self.taskBuffer, panda_config.site_mapper_snapshot, 60 * 10)
         return True, SiteMapper(self.taskBuffer)
 
     def getCommands(self, harvester_id, n_commands, timeout, accept_json):
@@ -641,7 +676,7 @@ class JobDispatcher:
         """
         Get resource types (SCORE, MCORE, SCORE_HIMEM, MCORE_HIMEM) and their definitions
         """
-        tmp_wrapper = _TimedMethod(self.taskBuffer.getResourceTypes, timeout)
+        tmp_wrapper = _TimedMethod(self.taskBuffer.getResourceTypes, timeout, read_only=True)
         tmp_wrapper.run()
 
         # Make response
@@ -1316,6 +1351,59 @@ def getEventRanges(
     )
 
 
+# get lists of event ranges for multiple PandaIDs
+def getEventRangesBulk(
+    req,
+    jobList,
+    timeout=60,
+    scattered=None,
+    segment_id=None,
+):
+    """
+    Check the permissions and retrieve lists of event ranges for multiple PandaIDs.
+    Event ranges are claimed for all jobs in a jobset in a single transaction.
+
+    Args:
+        req: The request object containing the environment variables.
+        jobList (str): A JSON string containing the list of [PandaID, jobsetID, nRanges].
+        timeout (int, optional): The timeout value. Defaults to 60.
+        scattered (str, optional): Whether the event ranges are scattered. Defaults to None.
+        segment_id (int, optional): The segment ID. Defaults to None.
+    Returns:
+        dict: The response from the job dispatcher. Event ranges are given as a dictionary of PandaID and a list of event ranges.
+    """
+    tmp_log = LogWrapper(_logger, f"getEventRangesBulk(segment={segment_id})")
+    tmp_log.debug("start")
+
+    tmp_stat, tmp_out = checkPilotPermission(req)
+    if not tmp_stat:
+        tmp_log.error(f"failed with {tmp_out}")
+        return tmp_out
+
+    try:
+        job_list = json.loads(jobList)
+    except Exception:
+        tmp_log.error(f"failed to decode jobList={jobList}")
+        response = Protocol.Response(Protocol.SC_Failed, "failed to decode jobList")
+        return response.encode(req.acceptJson())
+
+    if scattered == "True":
+        scattered = True
+    else:
+        scattered = False
+
+    if segment_id is not None:
+        segment_id = int(segment_id)
+
+    return jobDispatcher.getEventRangesBulk(
+        job_list,
+        int(timeout),
+        req.acceptJson(),
+        scattered,
+        segment_id,
+    )
+
+
 def updateEventRange(
     req,
     eventRangeID,
@@ -30,6 +30,75 @@ SC_MissKey = 80
 SC_ProxyError = 90
 
 
+# pattern of the prefix for distributed destination tokens
+_dddPattern = re.compile("^ddd:")
+
+
+# join per-file fields with commas in the same way as appending each field after a comma only when the string is not empty
+def joinFields(fields):
+    iStart = 0
+    while iStart < len(fields) and fields[iStart] == "":
+        iStart += 1
+    return ",".join(fields[iStart:])
+
+
+# site-level values shared by jobs in a request
+class SiteContext:
+    """
+    Site-level values resolved once per request and shared by jobs dispatched in the request.
+    The SiteMapper lock is taken only once to resolve nuclei and to get site specs,
+    and DDM endpoints are memoized per site, space token, and mode
+    """
+
+    # constructor
+    def __init__(self, siteMapperCache=None, jobs=None):
+        """
+        :param siteMapperCache: cache of SiteMapper. Site specs are None and nuclei are not resolved if None
+        :param jobs: list of job specs whose destinationSE are resolved
+        """
+        self.siteSpecMap = {}
+        self.ddmEndpointMap = {}
+        if siteMapperCache is None or not jobs:
+            return
+        siteMapper = siteMapperCache.get_object()
+        try:
+            nucleusMap = {}
+            for job in jobs:
+                if job.computingSite not in self.siteSpecMap:
+                    self.siteSpecMap[job.computingSite] = siteMapper.getSite(job.computingSite)
+                # resolve destSE
+                try:
+                    for tmpObj in [job] + job.Files:
+                        if tmpObj.destinationSE not in nucleusMap:
+                            nucleusMap[tmpObj.destinationSE] = siteMapper.resolveNucleus(tmpObj.destinationSE)
+                        tmpObj.destinationSE = nucleusMap[tmpObj.destinationSE]
+                except Exception:
+                    pass
+        finally:
+            siteMapperCache.release_object()
+
+    # get site spec
+    def getSiteSpec(self, siteName):
+        return self.siteSpecMap.get(siteName)
+
+
+# serialize a dictionary to JSON in pieces where list values are split into items
+def iterateJson(data):
+    separator = "{"
+    for key, value in data.items():
+        yield separator + json.dumps(key) + ": "
+        if isinstance(value, list) and value:
+            itemSeparator = "["
+            for item in value:
+                yield itemSeparator + json.dumps(item)
+                itemSeparator = ", "
+            yield "]"
+        else:
+            yield json.dumps(value)
+        separator = ", "
+    yield "}" if data else "{}"
+
+
 # response
 class Response:
     # constructor
@@ -40,9 +109,19 @@ class Response:
             self.data["errorDialog"] = errorDialog
 
     # URL encode
-    def encode(self, acceptJson=False):
+    def encode(self, acceptJson=False, stream=False):
+        """
+        Encode the response
+
+        :param acceptJson: True to encode in JSON, otherwise URL-encoded
+        :param stream: True to give JSON as an iterator of pieces, so that jobs are written to the response body one by one
+                       without making the whole string. Ignored for URL-encoded responses
+        :return: URL-encoded string, or a dictionary of the type and the JSON content
+        """
         if not acceptJson:
             return urlencode(self.data)
+        elif stream:
+            return {"type": "json", "content": iterateJson(self.data)}
         else:
             return {"type": "json", "content": json.dumps(self.data)}
 
@@ -51,7 +130,14 @@ class Response:
         self.data[name] = value
 
     # append job
-    def appendJob(self, job, siteMapperCache=None):
+    def appendJob(self, job, siteMapperCache=None, siteContext=None):
+        """
+        Append a job description
+
+        :param job: job spec
+        :param siteMapperCache: cache of SiteMapper. Ignored when siteContext is given
+        :param siteContext: SiteContext shared by jobs in the request. Created for the job if None
+        """
         # event service merge
         if EventServiceUtils.isEventServiceMerge(job):
             isEventServiceMerge = True
@@ -74,143 +160,112 @@ class Response:
         # cloud
         self.data["cloud"] = job.cloud
         # files
-        strIFiles = ""
-        strOFiles = ""
-        strDispatch = ""
-        strDisToken = ""
-        strDisTokenForOutput = ""
-        strDestination = ""
-        strRealDataset = ""
-        strRealDatasetIn = ""
-        strProdDBlock = ""
-        strDestToken = ""
-        strProdToken = ""
-        strProdTokenForOutput = ""
-        strGUID = ""
-        strFSize = ""
-        strCheckSum = ""
-        strFileDestinationSE = ""
-        strScopeIn = ""
-        strScopeOut = ""
+        if siteContext is None:
+            siteContext = SiteContext(siteMapperCache, [job])
+        siteSpec = siteContext.getSiteSpec(job.computingSite)
+        ddmEndpointMap = siteContext.ddmEndpointMap
+        isJumbo = EventServiceUtils.isJumboJob(job)
+        # per-file fields are collected in lists and joined at the end
+        inFiles = []
+        dispatchDBlocks = []
+        dispatchDBlockTokens = []
+        prodDBlocks = []
+        prodDBlockTokens = []
+        guids = []
+        realDatasetsIn = []
+        fsizes = []
+        checksums = []
+        scopesIn = []
+        ddmEndPointIn = []
+        outFiles = []
+        destinationDBlocks = []
+        realDatasets = []
+        fileDestinationSEs = []
+        scopesOut = []
+        destinationDBlockTokens = []
+        dispatchDBlockTokensForOutput = []
+        prodDBlockTokensForOutput = []
+        ddmEndPointOut = []
         strScopeLog = ""
         logFile = ""
         logGUID = ""
-        ddmEndPointIn = []
-        ddmEndPointOut = []
         noOutput = []
-        siteSpec = None
         inDsLfnMap = {}
         inLFNset = set()
-        if siteMapperCache is not None:
-            siteMapper = siteMapperCache.get_object()
-            siteSpec = siteMapper.getSite(job.computingSite)
-            # resolve destSE
-            try:
-                job.destinationSE = siteMapper.resolveNucleus(job.destinationSE)
-                for tmpFile in job.Files:
-                    tmpFile.destinationSE = siteMapper.resolveNucleus(tmpFile.destinationSE)
-            except Exception:
-                pass
-            siteMapperCache.release_object()
         for file in job.Files:
             if file.type == "input":
-                if EventServiceUtils.isJumboJob(job) and file.lfn in inLFNset:
+                if isJumbo and file.lfn in inLFNset:
                     pass
                 else:
                     inLFNset.add(file.lfn)
-                    if strIFiles != "":
-                        strIFiles += ","
-                    strIFiles += file.lfn
-                    if strDispatch != "":
-                        strDispatch += ","
-                    strDispatch += file.dispatchDBlock
-                    if strDisToken != "":
-                        strDisToken += ","
-                    strDisToken += file.dispatchDBlockToken
-                    strProdDBlock += f"{file.prodDBlock},"
+                    inFiles.append(file.lfn)
+                    dispatchDBlocks.append(file.dispatchDBlock)
+                    dispatchDBlockTokens.append(file.dispatchDBlockToken)
+                    prodDBlocks.append(str(file.prodDBlock))
                     if not isEventServiceMerge:
-                        strProdToken += f"{file.prodDBlockToken},"
+                        prodDBlockTokens.append(str(file.prodDBlockToken))
                     else:
-                        strProdToken += f"{job.metadata[1][file.lfn]},"
-                    if strGUID != "":
-                        strGUID += ","
-                    strGUID += file.GUID
-                    strRealDatasetIn += f"{file.dataset},"
-                    strFSize += f"{file.fsize},"
+                        prodDBlockTokens.append(str(job.metadata[1][file.lfn]))
+                    guids.append(file.GUID)
+                    realDatasetsIn.append(str(file.dataset))
+                    fsizes.append(str(file.fsize))
                     if file.checksum not in ["", "NULL", None]:
-                        strCheckSum += f"{file.checksum},"
+                        checksums.append(str(file.checksum))
                     else:
-                        strCheckSum += f"{file.md5sum},"
-                    strScopeIn += f"{file.scope},"
-                    ddmEndPointIn.append(
-                        self.getDdmEndpoint(
-                            siteSpec,
-                            file.dispatchDBlockToken,
-                            "input",
-                            job.prodSourceLabel,
-                            job.job_label,
-                        )
-                    )
+                        checksums.append(str(file.md5sum))
+                    scopesIn.append(str(file.scope))
+                    endpointKey = (job.computingSite, file.dispatchDBlockToken, "input", job.prodSourceLabel, job.job_label)
+                    if endpointKey not in ddmEndpointMap:
+                        ddmEndpointMap[endpointKey] = self.getDdmEndpoint(siteSpec, *endpointKey[1:])
+                    ddmEndPointIn.append(ddmEndpointMap[endpointKey])
                     if file.dataset not in inDsLfnMap:
                         inDsLfnMap[file.dataset] = []
                     inDsLfnMap[file.dataset].append(file.lfn)
             if file.type == "output" or file.type == "log":
-                if strOFiles != "":
-                    strOFiles += ","
-                strOFiles += file.lfn
-                if strDestination != "":
-                    strDestination += ","
-                strDestination += file.destinationDBlock
-                if strRealDataset != "":
-                    strRealDataset += ","
-                strRealDataset += file.dataset
-                strFileDestinationSE += f"{file.destinationSE},"
+                outFiles.append(file.lfn)
+                destinationDBlocks.append(file.destinationDBlock)
+                realDatasets.append(file.dataset)
+                fileDestinationSEs.append(str(file.destinationSE))
                 if file.type == "log":
                     logFile = file.lfn
                     logGUID = file.GUID
                     strScopeLog = file.scope
                 else:
-                    strScopeOut += f"{file.scope},"
-                if strDestToken != "":
-                    strDestToken += ","
-                strDestToken += re.sub("^ddd:", "dst:", file.destinationDBlockToken.split(",")[0])
-                strDisTokenForOutput += f"{file.dispatchDBlockToken},"
-                strProdTokenForOutput += f"{file.prodDBlockToken},"
-                ddmEndPointOut.append(
-                    self.getDdmEndpoint(
-                        siteSpec,
-                        file.destinationDBlockToken.split(",")[0],
-                        "output",
-                        job.prodSourceLabel,
-                        job.job_label,
-                    )
-                )
+                    scopesOut.append(str(file.scope))
+                destinationToken = file.destinationDBlockToken.split(",")[0]
+                destinationDBlockTokens.append(_dddPattern.sub("dst:", destinationToken))
+                dispatchDBlockTokensForOutput.append(str(file.dispatchDBlockToken))
+                prodDBlockTokensForOutput.append(str(file.prodDBlockToken))
+                endpointKey = (job.computingSite, destinationToken, "output", job.prodSourceLabel, job.job_label)
+                if endpointKey not in ddmEndpointMap:
+                    ddmEndpointMap[endpointKey] = self.getDdmEndpoint(siteSpec, *endpointKey[1:])
+                ddmEndPointOut.append(ddmEndpointMap[endpointKey])
                 if file.isAllowedNoOutput():
                     noOutput.append(file.lfn)
         # inFiles
-        self.data["inFiles"] = strIFiles
+        self.data["inFiles"] = joinFields(inFiles)
         # dispatch DBlock
-        self.data["dispatchDblock"] = strDispatch
+        self.data["dispatchDblock"] = joinFields(dispatchDBlocks)
         # dispatch DBlock space token
-        self.data["dispatchDBlockToken"] = strDisToken
+        self.data["dispatchDBlockToken"] = joinFields(dispatchDBlockTokens)
         # dispatch DBlock space token for output
-        self.data["dispatchDBlockTokenForOut"] = strDisTokenForOutput[:-1]
+        self.data["dispatchDBlockTokenForOut"] = ",".join(dispatchDBlockTokensForOutput)
         # outFiles
-        self.data["outFiles"] = strOFiles
+        self.data["outFiles"] = joinFields(outFiles)
         # destination DBlock
-        self.data["destinationDblock"] = strDestination
+        self.data["destinationDblock"] = joinFields(destinationDBlocks)
         # destination DBlock space token
-        self.data["destinationDBlockToken"] = strDestToken
+        self.data["destinationDBlockToken"] = joinFields(destinationDBlockTokens)
         # prod DBlocks
-        self.data["prodDBlocks"] = strProdDBlock[:-1]
+        self.data["prodDBlocks"] = ",".join(prodDBlocks)
         # prod DBlock space token
-        self.data["prodDBlockToken"] = strProdToken[:-1]
+        self.data["prodDBlockToken"] = ",".join(prodDBlockTokens)
         # real output datasets
-        self.data["realDatasets"] = strRealDataset
+        self.data["realDatasets"] = joinFields(realDatasets)
         # real output datasets
-        self.data["realDatasetsIn"] = strRealDatasetIn[:-1]
+        self.data["realDatasetsIn"] = ",".join(realDatasetsIn)
         # file's destinationSE
-        self.data["fileDestinationSE"] = strFileDestinationSE[:-1]
+        self.data["fileDestinationSE"] = ",".join(fileDestinationSEs)
         # log filename
         self.data["logFile"] = logFile
         # log GUID
@@ -224,14 +279,14 @@ class Response:
         # attempt number
         self.data["attemptNr"] = job.attemptNr
         # GUIDs
-        self.data["GUID"] = strGUID
+        self.data["GUID"] = joinFields(guids)
         # checksum
-        self.data["checksum"] = strCheckSum[:-1]
+        self.data["checksum"] = ",".join(checksums)
         # fsize
-        self.data["fsize"] = strFSize[:-1]
+        self.data["fsize"] = ",".join(fsizes)
         # scope
-        self.data["scopeIn"] = strScopeIn[:-1]
-        self.data["scopeOut"] = strScopeOut[:-1]
+        self.data["scopeIn"] = ",".join(scopesIn)
+        self.data["scopeOut"] = ",".join(scopesOut)
         self.data["scopeLog"] = strScopeLog
         # DDM endpoints
         try:
@@ -297,7 +352,7 @@ class Response:
         elif EventServiceUtils.isEventServiceJob(job) or EventServiceUtils.isJumboJob(job):
             self.data["eventService"] = "True"
             # prod DBlock space token for pre-merging output
-            self.data["prodDBlockTokenForOutput"] = strProdTokenForOutput[:-1]
+            self.data["prodDBlockTokenForOutput"] = ",".join(prodDBlockTokensForOutput)
         elif EventServiceUtils.is_fine_grained_job(job):
             self.data["eventService"] = "True"
         # event service merge
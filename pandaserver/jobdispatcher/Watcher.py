@@ -22,6 +22,153 @@ from pandaserver.taskbuffer.SupErrors import SupErrors
 _logger = PandaLogger().getLogger("Watcher")
 
 
+# job statuses to be watched
+watched_statuses = ["running", "sent", "starting", "holding", "stagein", "stageout"]
+
+
+# check if the job is in a status to be watched
+def is_watched_status(job):
+    if job.jobStatus in watched_statuses:
+        return True
+    if job.jobStatus == "transferring" and (job.prodSourceLabel in ["user", "panda"] or job.jobSubStatus not in [None, "NULL", ""]):
+        return True
+    return False
+
+
+# check if the heartbeat of the job timed out
+def is_heartbeat_timed_out(job, sleep_time, time_now=None):
+    if time_now is None:
+        time_now = naive_utcnow()
+    timeLimit = time_now - datetime.timedelta(minutes=sleep_time)
+    return job.modificationTime < timeLimit or (job.endTime != "NULL" and job.endTime < timeLimit)
+
+
+# set the job failed with the error for the timeout
+def set_timeout_error(task_buffer, job, sleep_time):
+    """
+    :param task_buffer: task buffer
+    :param job: job spec whose heartbeat timed out
+    :param sleep_time: timeout in minutes
+    :return: list of destination blocks of output and log files
+    """
+    destDBList = []
+    if job.jobStatus == "sent":
+        # sent job didn't receive reply from pilot within 30 min
+        job.jobDispatcherErrorCode = ErrorCode.EC_SendError
+        job.jobDispatcherErrorDiag = "Sent job didn't receive reply from pilot within 30 min"
+    elif job.exeErrorDiag == "NULL" and job.pilotErrorDiag == "NULL":
+        # lost heartbeat
+        if job.jobDispatcherErrorDiag == "NULL":
+            if job.endTime == "NULL":
+                # normal lost heartbeat
+                job.jobDispatcherErrorCode = ErrorCode.EC_Watcher
+                job.jobDispatcherErrorDiag = f"lost heartbeat : {str(job.modificationTime)}"
+            else:
+                if job.jobStatus == "holding":
+                    job.jobDispatcherErrorCode = ErrorCode.EC_Holding
+                elif job.jobStatus == "transferring":
+                    job.jobDispatcherErrorCode = ErrorCode.EC_Transferring
+                else:
+                    job.jobDispatcherErrorCode = ErrorCode.EC_Timeout
+                job.jobDispatcherErrorDiag = f"timeout in {job.jobStatus} : last heartbeat at {str(job.endTime)}"
+            # get worker
+            workerSpecs = task_buffer.getWorkersForJob(job.PandaID)
+            if len(workerSpecs) > 0:
+                workerSpec = workerSpecs[0]
+                if workerSpec.status in [
+                    "finished",
+                    "failed",
+                    "cancelled",
+                    "missed",
+                ]:
+                    job.supErrorCode = SupErrors.error_codes["WORKER_ALREADY_DONE"]
+                    job.supErrorDiag = f"worker already {workerSpec.status} at {str(workerSpec.endTime)} with {workerSpec.diagMessage}"
+                    job.supErrorDiag = JobSpec.truncateStringAttr("supErrorDiag", job.supErrorDiag)
+    else:
+        # job recovery failed
+        job.jobDispatcherErrorCode = ErrorCode.EC_Recovery
+        job.jobDispatcherErrorDiag = f"job recovery failed for {sleep_time / 60} hours"
+    # set job status
+    job.jobStatus = "failed"
+    # set endTime for lost heartbeat
+    if job.endTime == "NULL":
+        # normal lost heartbeat
+        job.endTime = job.modificationTime
+    # set files status
+    for file in job.Files:
+        if file.type == "output" or file.type == "log":
+            file.status = "failed"
+            if file.destinationDBlock not in destDBList:
+                destDBList.append(file.destinationDBlock)
+    # event service
+    if EventServiceUtils.isEventServiceJob(job) and not EventServiceUtils.isJobCloningJob(job):
+        eventStat = task_buffer.getEventStat(job.jediTaskID, job.PandaID)
+        # set sub status when no sucessful events
+        if EventServiceUtils.ST_finished not in eventStat:
+            job.jobSubStatus = "es_heartbeat"
+    return destDBList
+
+
+# apply retrial rules and close datasets of the job failed due to the timeout
+def post_process_timeout(task_buffer, job, dest_db_list, tmp_logger):
+    """
+    :param task_buffer: task buffer
+    :param job: job spec updated with set_timeout_error
+    :param dest_db_list: list of destination blocks given by set_timeout_error
+    :param tmp_logger: logger
+    """
+    if job.jobStatus != "failed":
+        return
+    source = "jobDispatcherErrorCode"
+    error_code = job.jobDispatcherErrorCode
+    error_diag = job.jobDispatcherErrorDiag
+    errors = [
+        {
+            "source": source,
+            "error_code": error_code,
+            "error_diag": error_diag,
+        }
+    ]
+
+    try:
+        tmp_logger.debug("Watcher will call job_failure_postprocessing")
+        retryModule.job_failure_postprocessing(task_buffer, job.PandaID, errors, job.attemptNr)
+        tmp_logger.debug("job_failure_postprocessing is back")
+    except Exception as e:
+        tmp_logger.debug(f"job_failure_postprocessing excepted and needs to be investigated ({e}): {traceback.format_exc()}")
+
+    # updateJobs was successful and it failed a job with taskBufferErrorCode
+    try:
+        tmp_logger.debug("Watcher.run will peek the job")
+        job_tmp = task_buffer.peekJobs(
+            [job.PandaID],
+            fromDefined=False,
+            fromArchived=True,
+            fromWaiting=False,
+        )[0]
+        if job_tmp.taskBufferErrorCode:
+            source = "taskBufferErrorCode"
+            error_code = job_tmp.taskBufferErrorCode
+            error_diag = job_tmp.taskBufferErrorDiag
+            tmp_logger.debug("Watcher.run 2 will call job_failure_postprocessing")
+            retryModule.job_failure_postprocessing(
+                task_buffer,
+                job_tmp.PandaID,
+                source,
+                error_code,
+                error_diag,
+                job_tmp.attemptNr,
+            )
+            tmp_logger.debug("job_failure_postprocessing 2 is back")
+    except IndexError:
+        pass
+    except Exception as e:
+        tmp_logger.error(f"job_failure_postprocessing 2 excepted and needs to be investigated ({e}): {traceback.format_exc()}")
+
+    cThr = Closer(task_buffer, dest_db_list, job)
+    cThr.run()
+
+
 class Watcher(threading.Thread):
     # constructor
     def __init__(self, taskBuffer, pandaID, single=False, sleepTime=360, sitemapper=None):
@@ -50,130 +197,17 @@ class Watcher(threading.Thread):
                     self.logger.debug("escape : not found")
                     return
                 self.logger.debug(f"in {job.jobStatus}")
-                if job.jobStatus not in [
-                    "running",
-                    "sent",
-                    "starting",
-                    "holding",
-                    "stagein",
-                    "stageout",
-                ]:
-                    if job.jobStatus == "transferring" and (job.prodSourceLabel in ["user", "panda"] or job.jobSubStatus not in [None, "NULL", ""]):
-                        pass
-                    else:
-                        self.logger.debug(f"escape : wrong status {job.jobStatus}")
-                        return
+                if not is_watched_status(job):
+                    self.logger.debug(f"escape : wrong status {job.jobStatus}")
+                    return
                 # time limit
-                timeLimit = naive_utcnow() - datetime.timedelta(minutes=self.sleepTime)
-                if job.modificationTime < timeLimit or (job.endTime != "NULL" and job.endTime < timeLimit):
+                if is_heartbeat_timed_out(job, self.sleepTime):
                     self.logger.debug(f"{job.jobStatus} lastmod:{str(job.modificationTime)} endtime:{str(job.endTime)}")
-                    destDBList = []
-                    if job.jobStatus == "sent":
-                        # sent job didn't receive reply from pilot within 30 min
-                        job.jobDispatcherErrorCode = ErrorCode.EC_SendError
-                        job.jobDispatcherErrorDiag = "Sent job didn't receive reply from pilot within 30 min"
-                    elif job.exeErrorDiag == "NULL" and job.pilotErrorDiag == "NULL":
-                        # lost heartbeat
-                        if job.jobDispatcherErrorDiag == "NULL":
-                            if job.endTime == "NULL":
-                                # normal lost heartbeat
-                                job.jobDispatcherErrorCode = ErrorCode.EC_Watcher
-                                job.jobDispatcherErrorDiag = f"lost heartbeat : {str(job.modificationTime)}"
-                            else:
-                                if job.jobStatus == "holding":
-                                    job.jobDispatcherErrorCode = ErrorCode.EC_Holding
-                                elif job.jobStatus == "transferring":
-                                    job.jobDispatcherErrorCode = ErrorCode.EC_Transferring
-                                else:
-                                    job.jobDispatcherErrorCode = ErrorCode.EC_Timeout
-                                job.jobDispatcherErrorDiag = f"timeout in {job.jobStatus} : last heartbeat at {str(job.endTime)}"
-                            # get worker
-                            workerSpecs = self.taskBuffer.getWorkersForJob(job.PandaID)
-                            if len(workerSpecs) > 0:
-                                workerSpec = workerSpecs[0]
-                                if workerSpec.status in [
-                                    "finished",
-                                    "failed",
-                                    "cancelled",
-                                    "missed",
-                                ]:
-                                    job.supErrorCode = SupErrors.error_codes["WORKER_ALREADY_DONE"]
-                                    job.supErrorDiag = f"worker already {workerSpec.status} at {str(workerSpec.endTime)} with {workerSpec.diagMessage}"
-                                    job.supErrorDiag = JobSpec.truncateStringAttr("supErrorDiag", job.supErrorDiag)
-                    else:
-                        # job recovery failed
-                        job.jobDispatcherErrorCode = ErrorCode.EC_Recovery
-                        job.jobDispatcherErrorDiag = f"job recovery failed for {self.sleepTime / 60} hours"
-                    # set job status
-                    job.jobStatus = "failed"
-                    # set endTime for lost heartbeat
-                    if job.endTime == "NULL":
-                        # normal lost heartbeat
-                        job.endTime = job.modificationTime
-                    # set files status
-                    for file in job.Files:
-                        if file.type == "output" or file.type == "log":
-                            file.status = "failed"
-                            if file.destinationDBlock not in destDBList:
-                                destDBList.append(file.destinationDBlock)
-                    # event service
-                    if EventServiceUtils.isEventServiceJob(job) and not EventServiceUtils.isJobCloningJob(job):
-                        eventStat = self.taskBuffer.getEventStat(job.jediTaskID, job.PandaID)
-                        # set sub status when no sucessful events
-                        if EventServiceUtils.ST_finished not in eventStat:
-                            job.jobSubStatus = "es_heartbeat"
+                    destDBList = set_timeout_error(self.taskBuffer, job, self.sleepTime)
                     # update job
                     self.taskBuffer.updateJobs([job], False)
                     # start closer
-                    if job.jobStatus == "failed":
-                        source = "jobDispatcherErrorCode"
-                        error_code = job.jobDispatcherErrorCode
-                        error_diag = job.jobDispatcherErrorDiag
-                        errors = [
-                            {
-                                "source": source,
-                                "error_code": error_code,
-                                "error_diag": error_diag,
-                            }
-                        ]
-
-                        try:
-                            self.logger.debug("Watcher will call job_failure_postprocessing")
-                            retryModule.job_failure_postprocessing(self.taskBuffer, job.PandaID, errors, job.attemptNr)
-                            self.logger.debug("job_failure_postprocessing is back")
-                        except Exception as e:
-                            self.logger.debug(f"job_failure_postprocessing excepted and needs to be investigated ({e}): {traceback.format_exc()}")
-
-                        # updateJobs was successful and it failed a job with taskBufferErrorCode
-                        try:
-                            self.logger.debug("Watcher.run will peek the job")
-                            job_tmp = self.taskBuffer.peekJobs(
-                                [job.PandaID],
-                                fromDefined=False,
-                                fromArchived=True,
-                                fromWaiting=False,
-                            )[0]
-                            if job_tmp.taskBufferErrorCode:
-                                source = "taskBufferErrorCode"
-                                error_code = job_tmp.taskBufferErrorCode
-                                error_diag = job_tmp.taskBufferErrorDiag
-                                self.logger.debug("Watcher.run 2 will call job_failure_postprocessing")
-                                retryModule.job_failure_postprocessing(
-                                    self.taskBuffer,
-                                    job_tmp.PandaID,
-                                    source,
-                                    error_code,
-                                    error_diag,
-                                    job_tmp.attemptNr,
-                                )
-                                self.logger.debug("job_failure_postprocessing 2 is back")
-                        except IndexError:
-                            pass
-                        except Exception as e:
-                            self.logger.error(f"job_failure_postprocessing 2 excepted and needs to be investigated ({e}): {traceback.format_exc()}")
-
-                        cThr = Closer(self.taskBuffer, destDBList, job)
-                        cThr.run()
+                    post_process_timeout(self.taskBuffer, job, destDBList, self.logger)
                     self.logger.debug("done")
                     return
                 # single action
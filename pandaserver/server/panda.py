@@ -9,12 +9,15 @@ import datetime
 import decimal
 import gzip
 import io
+import itertools
 import json
 import os
 import signal
 import sys
 import tempfile
 import traceback
+import types
+import zlib
 from collections import defaultdict
 from urllib.parse import parse_qsl
 
@@ -52,6 +55,7 @@ from pandaserver.jobdispatcher.JobDispatcher import (
     get_token_key,
     getCommands,
     getEventRanges,
+    getEventRangesBulk,
     getJob,
     getKeyPair,
     getProxy,
@@ -64,11 +68,12 @@ from pandaserver.jobdispatcher.JobDispatcher import (
     updateJobsInBulk,
     updateWorkerPilotStatus,
 )
-from pandaserver.srvcore import CoreUtils
+from pandaserver.srvcore import CoreUtils, request_metrics
 
 # IMPORTANT: Add any new methods here to allow them to be called from the web I/F
 from pandaserver.srvcore.allowed_methods import allowed_methods
 from pandaserver.srvcore.panda_request import PandaRequest
+from pandaserver.srvcore.timed_executor import ServiceOverloaded
 from pandaserver.taskbuffer.Initializer import initializer
 from pandaserver.taskbuffer.TaskBuffer import taskBuffer
 
@@ -394,6 +399,136 @@ def encode_special_cases(obj):
     raise TypeError(f"Type not serializable for {obj} ({type(obj)})")
 
 
+# size of chunks in streamed responses
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+
+# check if the client accepts gzip-encoded responses
+def accepts_gzip(environ):
+    for item in environ.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        fields = [field.strip() for field in item.split(";")]
+        if fields[0].lower() != "gzip":
+            continue
+        for field in fields[1:]:
+            if field.startswith("q="):
+                try:
+                    return float(field[2:]) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+# serialize to JSON in pieces. Containers at the top levels are split so that large responses are not built in a single string,
+# while their items are serialized by the C encoder of json.dumps
+def iterate_json(obj, depth=2):
+    if depth > 0 and isinstance(obj, dict) and obj:
+        separator = "{"
+        for key, value in obj.items():
+            # encode the key in the same way as json.dumps
+            yield separator + json.dumps({key: 0})[1:-4] + ": "
+            yield from iterate_json(value, depth - 1)
+            separator = ", "
+        yield "}"
+    elif isinstance(obj, CoreUtils.StreamedList) and obj:
+        separator = "["
+        for item in obj:
+            yield separator + json.dumps(item, default=encode_special_cases)
+            separator = ", "
+        yield "]"
+    elif depth > 0 and isinstance(obj, (list, tuple)) and obj:
+        separator = "["
+        for item in obj:
+            yield separator
+            yield from iterate_json(item, depth - 1)
+            separator = ", "
+        yield "]"
+    else:
+        yield json.dumps(obj, default=encode_special_cases)
+
+
+# group pieces of strings or bytes into encoded chunks
+def iterate_chunks(pieces):
+    buffer = []
+    buffer_size = 0
+    for piece in pieces:
+        if isinstance(piece, str):
+            piece = piece.encode()
+        buffer.append(piece)
+        buffer_size += len(piece)
+        if buffer_size >= RESPONSE_CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            buffer_size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+# compress chunks with gzip
+def compress_chunks(chunks, stats):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        stats["raw"] += len(chunk)
+        data = compressor.compress(chunk)
+        if data:
+            stats["sent"] += len(data)
+            yield data
+    data = compressor.flush()
+    stats["sent"] += len(data)
+    yield data
+
+
+# stream chunks and log the execution time and the return length at the end
+def stream_chunks(chunks, stats, message, tmp_log, metrics):
+    try:
+        for chunk in chunks:
+            if not stats["compressed"]:
+                stats["raw"] += len(chunk)
+                stats["sent"] += len(chunk)
+            yield chunk
+    except Exception as exc:
+        # the status and headers were already sent, so the client gets a truncated body with 200
+        tmp_log.error(f"streaming failure after the response started, the body is truncated : {str(exc)}\n {traceback.format_exc()}")
+        raise
+    finally:
+        tmp_log.info(f"{message} len={stats['raw']} B sent={stats['sent']} B gzip={stats['compressed']}")
+        metrics.finish(stats["sent"])
+
+
+# make the response body with gzip compression when the client accepts it and the response is large enough
+def make_response_body(chunks, use_gzip):
+    """
+    Read chunks up to the threshold to decide whether the response is compressed. A negative threshold disables
+    compression, and only the first chunk is read. Errors raised while the head is read are reported with 500, while
+    errors raised in the rest of the chunks truncate the body after 200 is sent
+
+    :param chunks: iterator of encoded chunks
+    :param use_gzip: True if the client accepts gzip
+    :return: a tuple of a flag to show if the body is compressed, the body, and statistics of sizes
+    """
+    stats = {"raw": 0, "sent": 0, "compressed": False}
+    threshold = panda_config.gzip_response_threshold
+    chunks = iter(chunks)
+    if threshold < 0:
+        # never compressed
+        head = list(itertools.islice(chunks, 1))
+        return False, itertools.chain(head, chunks), stats
+    head = []
+    head_size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        head_size += len(chunk)
+        if head_size >= threshold:
+            break
+    else:
+        # small response
+        return False, [b"".join(head)], stats
+    if not use_gzip:
+        return False, itertools.chain(head, chunks), stats
+    stats["compressed"] = True
+    return True, compress_chunks(itertools.chain(head, chunks), stats), stats
+
+
 # This is the starting point for all WSGI requests
 def application(environ, start_response):
     # Parse the script name to retrieve method, module and version
@@ -422,6 +557,7 @@ def application(environ, start_response):
 
     start_time = naive_utcnow()
     return_type = None
+    json_result = False
 
     # check method name is allowed, otherwise return 403
     if not validate_method(method_name, api_module, version):
@@ -443,6 +579,9 @@ def application(environ, start_response):
         start_response("500 INTERNAL SERVER ERROR", [("Content-Type", "text/plain")])
         return ["ERROR : {error_message}".encode()]
 
+    # start recording metrics of the request
+    metrics = request_metrics.start_request(api_module, method_name)
+
     try:
         # generate a request object with the environment and the logger
         panda_request = PandaRequest(environ, tmp_log)
@@ -452,7 +591,9 @@ def application(environ, start_response):
         if error_message:
             tmp_log.error(error_message)
             start_response("403 Forbidden", [("Content-Type", "text/plain")])
-            return [f"ERROR : {error_message}".encode()]
+            response = f"ERROR : {error_message}".encode()
+            metrics.finish(len(response))
+            return [response]
 
         # read the body of the request
         body = read_body(environ, cont_length)
@@ -463,9 +604,23 @@ def application(environ, start_response):
         if panda_config.entryVerbose:
             tmp_log.debug(f"with {str(list(params))}")
 
-        # execute the method, passing along the request and the decoded parameters
+        # execute the method, passing along the request and the decoded parameters. A fraction of requests are profiled when enabled
         param_list = [panda_request]
-        exec_result = tmp_method(*param_list, **params)
+        profiler = request_metrics.get_profiler(api_module, method_name)
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # skip profiling since another profiler is active in the process
+                profiler = None
+        if profiler is None:
+            exec_result = tmp_method(*param_list, **params)
+        else:
+            try:
+                exec_result = tmp_method(*param_list, **params)
+            finally:
+                profiler.disable()
+                request_metrics.dump_profile(profiler, api_module, method_name)
 
         # extract return type
         if isinstance(exec_result, dict) and "type" in exec_result and "content" in exec_result:
@@ -479,10 +634,34 @@ def application(environ, start_response):
         # convert the response to JSON or str depending on HTTP_ACCEPT and CONTENT_TYPE
         if new_api:
             if json_app:
-                exec_result = json.dumps(exec_result, default=encode_special_cases)
+                # JSON is serialized in pieces while being sent
+                json_result = True
             elif not isinstance(exec_result, str):
                 exec_result = str(exec_result)
 
+        # encode the response into chunks
+        if json_result:
+            chunks = iterate_chunks(iterate_json(exec_result))
+        elif isinstance(exec_result, types.GeneratorType):
+            # pieces streamed by the method
+            chunks = iterate_chunks(exec_result)
+        else:
+            if isinstance(exec_result, str):
+                encoded_result = exec_result.encode()
+            else:
+                encoded_result = exec_result
+            chunks = (encoded_result[i : i + RESPONSE_CHUNK_SIZE] for i in range(0, len(encoded_result), RESPONSE_CHUNK_SIZE))
+        # read the head of the response to decide compression, which may raise serialization errors
+        is_compressed, response_body, response_stats = make_response_body(chunks, accepts_gzip(environ))
+
+    except ServiceOverloaded as exc:
+        # shed load so that clients retry later
+        tmp_log.warning(f"overloaded : {str(exc)}")
+        start_response("503 Service Unavailable", [("Content-Type", "text/plain"), ("Retry-After", str(exc.retry_after))])
+        response = f"ERROR : {str(exc)}".encode()
+        metrics.finish(len(response))
+        return [response]
+
     except Exception as exc:
         tmp_log.error(f"execution failure : {str(exc)}\n {traceback.format_exc()}")
         if hasattr(panda_config, "dumpBadRequest") and panda_config.dumpBadRequest:
@@ -504,32 +683,48 @@ def application(environ, start_response):
             tmp_log.warning("force restart due")
             os.kill(os.getpid(), signal.SIGINT)
 
-        return [str(exc).encode()]
+        response = str(exc).encode()
+        metrics.finish(len(response))
+        return [response]
 
     if panda_config.entryVerbose:
         tmp_log.debug("done")
 
     # log execution time and return length
     duration = naive_utcnow() - start_time
-    tmp_log.info(
-        f"exec_time={duration.seconds}.{duration.microseconds // 1000:03d} sec, return_type={return_type} real_type={type(exec_result).__name__} len={len(str(exec_result))} B"
-    )
+    log_message = f"exec_time={duration.seconds}.{duration.microseconds // 1000:03d} sec, return_type={return_type} real_type={type(exec_result).__name__}"
 
     # start the response and return result
-    if exec_result == pandaserver.taskbuffer.ErrorCode.EC_NotFound:
+    if not json_result and exec_result == pandaserver.taskbuffer.ErrorCode.EC_NotFound:
+        tmp_log.info(f"{log_message} len={len(str(exec_result))} B")
         start_response("404 Not Found", [("Content-Type", "text/plain")])
+        metrics.finish(len("not found"))
         return ["not found".encode()]
 
-    if exec_result == pandaserver.taskbuffer.ErrorCode.EC_Forbidden:
+    if not json_result and exec_result == pandaserver.taskbuffer.ErrorCode.EC_Forbidden:
+        tmp_log.info(f"{log_message} len={len(str(exec_result))} B")
         start_response("403 Forbidden", [("Content-Type", "text/plain")])
+        metrics.finish(len("forbidden"))
         return ["forbidden".encode()]
 
+    # the client has the same content
+    if panda_request.not_modified:
+        tmp_log.info(f"{log_message} not modified")
+        start_response("304 Not Modified", panda_request.response_headers)
+        metrics.finish(0)
+        return []
+
     if return_type == "json":
-        start_response("200 OK", [("Content-Type", "application/json")])
+        headers = [("Content-Type", "application/json")]
     else:
-        start_response("200 OK", [("Content-Type", "text/plain")])
-
-    if isinstance(exec_result, str):
-        exec_result = exec_result.encode()
-
-    return [exec_result]
+        headers = [("Content-Type", "text/plain")]
+    headers.append(("Vary", "Accept-Encoding"))
+    headers += panda_request.response_headers
+    if is_compressed:
+        headers.append(("Content-Encoding", "gzip"))
+    elif isinstance(response_body, list):
+        # small response is not chunked
+        headers.append(("Content-Length", str(len(response_body[0]))))
+    start_response("200 OK", headers)
+
+    return stream_chunks(response_body, response_stats, log_message, tmp_log, metrics)
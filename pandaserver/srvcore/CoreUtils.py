@@ -3,9 +3,12 @@ import datetime
 import json
 import math
 import os
+import random
 import re
 import subprocess
-from threading import Lock
+import time
+import weakref
+from threading import Event, Lock, Thread
 
 from pandacommon.pandautils.PandaUtils import naive_utcnow
 
@@ -152,47 +155,189 @@ def resolve_bool(param):
     return param
 
 
+# list serialized item by item when a response is streamed
+class StreamedList(list):
+    """
+    List whose items are serialized one by one in streamed JSON responses regardless of the depth in the response,
+    e.g. job descriptions with many files
+    """
+
+
+# caches in the process to expose their statistics
+_caches = weakref.WeakSet()
+
+
+def get_cache_stats():
+    """
+    Get statistics of caches in the process
+
+    :return: list of dictionaries of statistics with the name of each cache
+    """
+    return [cache.get_stats() for cache in list(_caches)]
+
+
 # cached object
 class CachedObject:
+    """
+    Object cached in memory and renewed periodically with update_func.
+    In the stale-while-revalidate mode, readers keep getting the previous object while a single background thread
+    renews it, and they block only when the object is older than max_staleness.
+    """
+
     # constructor
-    def __init__(self, name, time_interval, update_func, log_stream):
+    def __init__(self, name, time_interval, update_func, log_stream, stale_while_revalidate=False, jitter=0.0, max_staleness=None):
+        """
+        :param name: name of the cache
+        :param time_interval: lifetime of the object in seconds
+        :param update_func: function to return (status, new object)
+        :param log_stream: logger
+        :param stale_while_revalidate: True to renew the object in the background while readers get the previous object
+        :param jitter: fraction of time_interval to randomize the lifetime so that processes don't renew the object at the same time
+        :param max_staleness: maximum age of the object in seconds for the stale-while-revalidate mode. None for no limit
+        """
         # name
         self.name = name
         # cached object
         self.cachedObj = None
         # datetime of last updated
         self.lastUpdated = naive_utcnow()
+        # datetime of last successful update
+        self.lastSucceeded = None
         # update frequency
         self.timeInterval = datetime.timedelta(seconds=time_interval)
+        # expiration time
+        self.expiry = self.lastUpdated
         # lock
         self.lock = Lock()
         # function to update object
         self.updateFunc = update_func
         # log
         self.log_stream = log_stream
+        # stale-while-revalidate
+        self.staleWhileRevalidate = stale_while_revalidate
+        self.jitter = jitter
+        if max_staleness is None:
+            self.maxStaleness = None
+        else:
+            self.maxStaleness = datetime.timedelta(seconds=max_staleness)
+        # background refresh
+        self.refreshLock = Lock()
+        self.refreshDone = None
+        # statistics
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "blocking_updates": 0,
+            "refreshes": 0,
+            "refresh_failures": 0,
+            "last_refresh_duration": None,
+            "max_refresh_duration": 0.0,
+            "total_refresh_duration": 0.0,
+        }
+        _caches.add(self)
+
+    # set update time and expiration time
+    def _set_updated(self, current):
+        self.lastUpdated = current
+        self.expiry = current + self.timeInterval * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        # failed renewals don't extend the lifetime beyond max_staleness since the last successful renewal
+        if self.maxStaleness is not None and self.lastSucceeded is not None:
+            self.expiry = min(self.expiry, self.lastSucceeded + self.maxStaleness)
+
+    # run update function
+    def _renew(self):
+        """
+        Run the update function and record the duration
+
+        :return: True and the new object if succeeded, False and None otherwise
+        """
+        self.log_stream.debug(f"PID={os.getpid()} renewing {self.name} cache")
+        time_start = time.monotonic()
+        is_ok, new_obj = False, None
+        try:
+            tmp_stat, tmp_out = self.updateFunc()
+            self.log_stream.debug(f"PID={os.getpid()} got for {self.name} {tmp_stat} {str(tmp_out)}")
+            if tmp_stat:
+                is_ok, new_obj = True, tmp_out
+        except Exception as e:
+            self.log_stream.error(f"PID={os.getpid()} failed to renew {self.name} due to {str(e)}")
+        duration = time.monotonic() - time_start
+        with self.refreshLock:
+            self.stats["refreshes"] += 1
+            if not is_ok:
+                self.stats["refresh_failures"] += 1
+            self.stats["last_refresh_duration"] = duration
+            self.stats["max_refresh_duration"] = max(self.stats["max_refresh_duration"], duration)
+            self.stats["total_refresh_duration"] += duration
+        return is_ok, new_obj
+
+    # renew object in the background
+    def _refresh_in_background(self, done_event):
+        current = naive_utcnow()
+        is_ok, new_obj = self._renew()
+        with self.lock:
+            if is_ok:
+                self.cachedObj = new_obj
+                self.lastSucceeded = current
+            self._set_updated(current)
+        done_event.set()
+
+    # start background refresh unless it is already running
+    def _start_background_refresh(self):
+        with self.refreshLock:
+            if self.refreshDone is None or self.refreshDone.is_set():
+                self.refreshDone = Event()
+                Thread(target=self._refresh_in_background, args=(self.refreshDone,), name=f"{self.name}_refresher", daemon=True).start()
+            return self.refreshDone
 
     # update obj
     def update(self):
-        # lock
-        self.lock.acquire()
         # get current datetime
         current = naive_utcnow()
-        # update if old
-        if self.cachedObj is None or current - self.lastUpdated > self.timeInterval:
-            self.log_stream.debug(f"PID={os.getpid()} renewing {self.name} cache")
-            try:
-                tmp_stat, tmp_out = self.updateFunc()
-                self.log_stream.debug(f"PID={os.getpid()} got for {self.name} {tmp_stat} {str(tmp_out)}")
-                if tmp_stat:
-                    self.cachedObj = tmp_out
-            except Exception as e:
-                self.log_stream.error(f"PID={os.getpid()} failed to renew {self.name} due to {str(e)}")
-            self.lastUpdated = current
-        # release
-        self.lock.release()
+        # stale-while-revalidate once the object is available
+        if self.staleWhileRevalidate and self.cachedObj is not None:
+            if current < self.expiry:
+                self.stats["hits"] += 1
+                return
+            self.stats["stale_hits"] += 1
+            refresh_done = self._start_background_refresh()
+            # wait for the refresh if the object is too old
+            if self.maxStaleness is not None and current - self.lastSucceeded > self.maxStaleness:
+                self.log_stream.debug(f"PID={os.getpid()} waiting for {self.name} cache since it is older than {self.maxStaleness}")
+                refresh_done.wait()
+            return
+        # lock
+        with self.lock:
+            # update if old
+            current = naive_utcnow()
+            if self.cachedObj is None or current > self.expiry:
+                self.stats["blocking_updates"] += 1
+                is_ok, new_obj = self._renew()
+                if is_ok:
+                    self.cachedObj = new_obj
+                    self.lastSucceeded = current
+                self._set_updated(current)
+            else:
+                self.stats["hits"] += 1
         # return
         return
 
+    # get statistics
+    def get_stats(self):
+        """
+        Get statistics of the cache
+
+        :return: dictionary of hit counts, refresh counts and durations in seconds, and age of the object in seconds
+        """
+        with self.refreshLock:
+            stats = copy.copy(self.stats)
+        stats["name"] = self.name
+        if self.lastSucceeded is None:
+            stats["age"] = None
+        else:
+            stats["age"] = (naive_utcnow() - self.lastSucceeded).total_seconds()
+        return stats
+
     # contains
     def __contains__(self, item):
         self.update()
@@ -225,17 +370,69 @@ class CachedObject:
 # dictionary of caches
 class CacheDict:
     """
-    Dictionary of caches with periodic cleanup
+    Dictionary of caches with periodic cleanup.
+    In the stale-while-revalidate mode, an old object is returned while a background thread renews it,
+    unless the object is older than max_staleness.
     """
 
     # constructor
-    def __init__(self, update_interval=10, cleanup_interval=60):
+    def __init__(self, update_interval=10, cleanup_interval=60, stale_while_revalidate=False, jitter=0.0, max_staleness=None, name="cache_dict"):
+        """
+        :param update_interval: lifetime of objects in minutes
+        :param cleanup_interval: interval in minutes to delete unused caches
+        :param stale_while_revalidate: True to renew objects in the background while readers get previous objects
+        :param jitter: fraction of update_interval to randomize the lifetime of objects
+        :param max_staleness: maximum age of objects in minutes for the stale-while-revalidate mode. None for no limit
+        :param name: name of the caches in statistics
+        """
+        self.name = name
         self.idx = 0
         self.lock = Lock()
         self.cache_dict = {}
         self.update_interval = datetime.timedelta(minutes=update_interval)
         self.cleanup_interval = datetime.timedelta(minutes=cleanup_interval)
         self.last_cleanup = naive_utcnow()
+        self.stale_while_revalidate = stale_while_revalidate
+        self.jitter = jitter
+        if max_staleness is None:
+            self.max_staleness = None
+        else:
+            self.max_staleness = datetime.timedelta(minutes=max_staleness)
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0, "total_refresh_duration": 0.0}
+        _caches.add(self)
+
+    def _get_expiry(self, current, last_succeeded):
+        expiry = current + self.update_interval * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        # failed updates don't extend the lifetime beyond max_staleness since the last successful update
+        if self.max_staleness is not None:
+            expiry = min(expiry, last_succeeded + self.max_staleness)
+        return expiry
+
+    def _refresh_in_background(self, obj, tmp_log):
+        """
+        Renew an object in the background
+        :param obj: cache entry
+        :param tmp_log: logger
+        """
+        current = naive_utcnow()
+        time_start = time.monotonic()
+        try:
+            new_obj = obj["update_func"](*obj["update_args"], **obj["update_kwargs"])
+            is_ok = True
+        except Exception as e:
+            tmp_log.error(f"""failed to update cache #{obj["idx"]} due to {str(e)}""")
+            is_ok = False
+        with self.lock:
+            if is_ok:
+                obj["obj"] = new_obj
+                obj["last_succeeded"] = current
+            else:
+                self.stats["refresh_failures"] += 1
+            obj["last_updated"] = current
+            obj["expiry"] = self._get_expiry(current, obj["last_succeeded"])
+            self.stats["refreshes"] += 1
+            self.stats["total_refresh_duration"] += time.monotonic() - time_start
+            obj["refresh_done"].set()
 
     def cleanup(self, tmp_log):
         """
@@ -263,31 +460,63 @@ class CacheDict:
         :return: object or None
         """
         self.cleanup(tmp_log)
+        refresh_done = None
         with self.lock:
             obj = self.cache_dict.get(name)
             current = naive_utcnow()
             if not obj:
                 tmp_log.debug(f"creating new cache #{self.idx}")
+                self.stats["misses"] += 1
                 # create new cache
                 obj = {
                     "obj": update_func(*update_args, **update_kwargs),
                     "last_updated": current,
+                    "last_succeeded": current,
+                    "expiry": self._get_expiry(current, current),
                     "update_func": update_func,
                     "update_args": update_args,
                     "update_kwargs": update_kwargs,
                     "idx": self.idx,
+                    "refresh_done": None,
                 }
                 self.cache_dict[name] = obj
                 self.idx += 1
-            else:
+            elif current > obj["expiry"]:
                 # update if old
-                if current - obj["last_updated"] > self.update_interval:
+                if not self.stale_while_revalidate:
                     tmp_log.debug(f"""updating cache #{obj["idx"]}""")
+                    self.stats["misses"] += 1
                     obj["obj"] = obj["update_func"](*obj["update_args"], **obj["update_kwargs"])
                     obj["last_updated"] = current
+                    obj["last_succeeded"] = current
+                    obj["expiry"] = self._get_expiry(current, current)
                 else:
-                    tmp_log.debug(f"""reusing cache #{obj["idx"]}""")
-            return obj["obj"]
+                    self.stats["stale_hits"] += 1
+                    if obj["refresh_done"] is None or obj["refresh_done"].is_set():
+                        tmp_log.debug(f"""updating cache #{obj["idx"]} in the background""")
+                        obj["refresh_done"] = Event()
+                        Thread(target=self._refresh_in_background, args=(obj, tmp_log), daemon=True).start()
+                    # wait for the refresh if the object is too old
+                    if self.max_staleness is not None and current - obj["last_succeeded"] > self.max_staleness:
+                        refresh_done = obj["refresh_done"]
+            else:
+                tmp_log.debug(f"""reusing cache #{obj["idx"]}""")
+                self.stats["hits"] += 1
+        if refresh_done is not None:
+            tmp_log.debug(f"""waiting for cache #{obj["idx"]} since it is older than {self.max_staleness}""")
+            refresh_done.wait()
+        return obj["obj"]
+
+    def get_stats(self):
+        """
+        Get statistics of the caches
+        :return: dictionary of hit counts, refresh counts, and the total refresh duration in seconds
+        """
+        with self.lock:
+            stats = copy.copy(self.stats)
+            stats["n_caches"] = len(self.cache_dict)
+        stats["name"] = self.name
+        return stats
 
 
 # convert datetime to string
@@ -26,6 +26,7 @@ allowed_methods += [
     "updateJob",
     "getStatus",
     "getEventRanges",
+    "getEventRangesBulk",
     "updateEventRange",
     "getKeyPair",
     "updateEventRanges",
@@ -14,7 +14,7 @@ import traceback
 
 import jwt
 
-cache_dict = CacheDict()
+cache_dict = CacheDict(name="token_decisions")
 
 
 # decode token
@@ -154,6 +154,9 @@ class PandaRequest:
         self.subprocess_env = env
         # header
         self.headers_in = {}
+        # headers and status of the response set by methods
+        self.response_headers = []
+        self.not_modified = False
         # authentication
         self.authenticated = True
         # message
@@ -194,3 +197,11 @@ class PandaRequest:
         except Exception:
             pass
         return False
+
+    # add a header to the response
+    def add_response_header(self, name, value):
+        self.response_headers.append((name, value))
+
+    # respond with 304 Not Modified
+    def set_not_modified(self):
+        self.not_modified = True
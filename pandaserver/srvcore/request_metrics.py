@@ -0,0 +1,434 @@
+"""
+Per-method metrics and sampling profiler for the WSGI entry point.
+
+Each request records its latency, response size, DB proxy wait time, and DB time into histograms per API module and method.
+DB proxy wait time is fed by DBProxyPool and DB time by WrappedCursor, or by ConBridge when database accesses run in child processes.
+Statistics of caches in CoreUtils are collected as well, and other components in the process, such as DB proxy pools,
+register collectors of their own metrics, which are exposed together.
+When request_metrics_dir is set in panda_config, each process dumps its histograms to the directory so that the metrics
+of all httpd processes are aggregated in the Prometheus exposition, and the profiler is controlled through a file in the directory.
+"""
+
+import cProfile
+import glob
+import json
+import os
+import random
+import threading
+import time
+import weakref
+
+from pandacommon.pandalogger.PandaLogger import PandaLogger
+
+from pandaserver.config import panda_config
+from pandaserver.srvcore import CoreUtils
+
+_logger = PandaLogger().getLogger("request_metrics")
+
+# upper bounds of histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# metric names with help and buckets
+METRICS = {
+    "latency": ("panda_request_latency_seconds", "Latency of requests", LATENCY_BUCKETS),
+    "response_size": ("panda_response_size_bytes", "Size of responses sent to clients", SIZE_BUCKETS),
+    "db_wait": ("panda_db_proxy_wait_seconds", "Time to get DB proxies from the pool per request", LATENCY_BUCKETS),
+    "db_time": ("panda_db_time_seconds", "Time spent in database accesses per request", LATENCY_BUCKETS),
+}
+
+# metric names of components with help and types
+COMPONENT_METRICS = {
+    "db_pool_wait": ("panda_db_pool_wait_seconds", "Time to get DB proxies from the pool per caller", "histogram"),
+    "db_pool_hold": ("panda_db_pool_hold_seconds", "Time DB proxies are held per caller", "histogram"),
+    "db_pool_timeouts": ("panda_db_pool_timeouts_total", "Timeouts to get DB proxies from the pool", "counter"),
+    "cache_events": ("panda_cache_events_total", "Hits, stale hits, misses, and refreshes of caches", "counter"),
+    "cache_refresh_time": ("panda_cache_refresh_seconds_total", "Time spent refreshing caches", "counter"),
+}
+
+# interval to dump metrics of the process and to check the profiler control file
+DUMP_INTERVAL = 30
+PROFILER_CHECK_INTERVAL = 10
+
+# metrics files of processes which have not been updated for this period are ignored
+STALE_PERIOD = 24 * 60 * 60
+
+
+class Histogram:
+    """
+    Histogram with cumulative sums for the Prometheus exposition
+    """
+
+    def __init__(self, buckets, counts=None, total=0.0):
+        self.buckets = buckets
+        self.counts = counts if counts is not None else [0] * (len(buckets) + 1)
+        self.sum = total
+
+    def observe(self, value):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+
+
+# histograms per (API module, method)
+_histograms = {}
+_lock = threading.Lock()
+_last_dump = time.monotonic()
+
+# weak references to collectors of component metrics
+_collectors = []
+
+# the request being processed in the thread
+_request_context = threading.local()
+
+# profiler settings
+_profiler_settings = {"checked": 0.0, "mtime": None, "config": None}
+
+
+class RequestMetrics:
+    """
+    Metrics of a request being processed
+    """
+
+    def __init__(self, api_module, method_name):
+        self.api_module = api_module
+        self.method_name = method_name
+        self.start_time = time.monotonic()
+        self.db_wait = 0.0
+        self.db_time = 0.0
+        self.finished = False
+
+    def finish(self, response_size):
+        """
+        Record the metrics of the request
+
+        :param response_size: size of the response in bytes
+        """
+        if self.finished:
+            return
+        self.finished = True
+        latency = time.monotonic() - self.start_time
+        if getattr(_request_context, "current", None) is self:
+            _request_context.current = None
+        values = {"latency": latency, "response_size": response_size, "db_wait": self.db_wait, "db_time": self.db_time}
+        key = (self.api_module, self.method_name)
+        with _lock:
+            histograms = _histograms.get(key)
+            if histograms is None:
+                histograms = {name: Histogram(METRICS[name][2]) for name in METRICS}
+                _histograms[key] = histograms
+            for name, value in values.items():
+                histograms[name].observe(value)
+        _dump_if_needed()
+
+
+def start_request(api_module, method_name):
+    """
+    Start recording metrics of a request in the current thread
+
+    :param api_module: API module
+    :param method_name: method name
+    :return: RequestMetrics
+    """
+    request_metrics = RequestMetrics(api_module, method_name)
+    _request_context.current = request_metrics
+    return request_metrics
+
+
+def get_current_request():
+    """
+    Get the request being processed in the current thread
+
+    :return: RequestMetrics or None
+    """
+    return getattr(_request_context, "current", None)
+
+
+def set_current_request(request_metrics):
+    """
+    Set the request being processed in the current thread, to record metrics of a request processed in another thread
+
+    :param request_metrics: RequestMetrics or None
+    """
+    _request_context.current = request_metrics
+
+
+def add_db_wait(duration):
+    """
+    Add time to get a DB proxy to the request being processed in the current thread
+
+    :param duration: duration in seconds
+    """
+    request_metrics = getattr(_request_context, "current", None)
+    if request_metrics is not None:
+        request_metrics.db_wait += duration
+
+
+def add_db_time(duration):
+    """
+    Add time of a database access to the request being processed in the current thread
+
+    :param duration: duration in seconds
+    """
+    request_metrics = getattr(_request_context, "current", None)
+    if request_metrics is not None:
+        request_metrics.db_time += duration
+
+
+def register_collector(func):
+    """
+    Register a collector of metrics of a component in the process. Only a weak reference is kept so that the component can be deleted
+
+    :param func: bound method to return a list of (key in COMPONENT_METRICS, dictionary of labels, value), where the value is
+                 a Histogram for histograms or a number for counters
+    """
+    with _lock:
+        _collectors.append(weakref.WeakMethod(func))
+
+
+# collect statistics of caches in CoreUtils
+def _collect_cache_metrics():
+    ret = []
+    for stats in CoreUtils.get_cache_stats():
+        for event in ("hits", "stale_hits", "misses", "blocking_updates", "refreshes", "refresh_failures"):
+            if event in stats:
+                ret.append(("cache_events", {"cache": stats["name"], "event": event}, stats[event]))
+        ret.append(("cache_refresh_time", {"cache": stats["name"]}, stats["total_refresh_duration"]))
+    return ret
+
+
+# collect metrics of components in the process
+def _collect_components():
+    with _lock:
+        _collectors[:] = [ref for ref in _collectors if ref() is not None]
+        collectors = [ref() for ref in _collectors]
+    items = []
+    for func in [_collect_cache_metrics] + collectors:
+        if func is None:
+            continue
+        try:
+            for key, labels, value in func():
+                if isinstance(value, Histogram):
+                    items.append({"component": key, "labels": labels, "buckets": list(value.buckets), "counts": value.counts, "sum": value.sum})
+                else:
+                    items.append({"component": key, "labels": labels, "value": value})
+        except Exception as e:
+            _logger.error(f"failed to collect component metrics : {str(e)}")
+    return items
+
+
+# merge metrics of components
+def _merge_components(merged, items):
+    for item in items:
+        key = (item["component"], tuple(sorted(item["labels"].items())))
+        if "counts" in item:
+            histogram = Histogram(tuple(item["buckets"]), list(item["counts"]), item["sum"])
+            if key not in merged:
+                merged[key] = histogram
+            elif merged[key].buckets == histogram.buckets:
+                merged[key].merge(histogram)
+        else:
+            merged[key] = merged.get(key, 0) + item["value"]
+
+
+def _get_metrics_dir():
+    return getattr(panda_config, "request_metrics_dir", None)
+
+
+# dump histograms of the process
+def _dump_if_needed(force=False):
+    global _last_dump
+    metrics_dir = _get_metrics_dir()
+    if not metrics_dir:
+        return
+    time_now = time.monotonic()
+    with _lock:
+        if not force and time_now - _last_dump < DUMP_INTERVAL:
+            return
+        _last_dump = time_now
+        data = [
+            {"api_module": api_module, "method": method_name, "histograms": {name: [h.counts, h.sum] for name, h in histograms.items()}}
+            for (api_module, method_name), histograms in _histograms.items()
+        ]
+    data += _collect_components()
+    try:
+        path = os.path.join(metrics_dir, f"metrics.{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        _logger.error(f"failed to dump metrics : {str(e)}")
+
+
+# check if a process exists
+def _is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists but owned by another user
+        return True
+    return True
+
+
+# collect histograms per method and metrics of components of all processes
+def _collect_histograms():
+    # dump the current process first so that the file is up to date
+    _dump_if_needed(force=True)
+    metrics_dir = _get_metrics_dir()
+    merged_components = {}
+    if not metrics_dir:
+        _merge_components(merged_components, _collect_components())
+        with _lock:
+            merged = {key: {name: Histogram(h.buckets, list(h.counts), h.sum) for name, h in histograms.items()} for key, histograms in _histograms.items()}
+        return merged, merged_components
+    merged = {}
+    for path in glob.glob(os.path.join(metrics_dir, "metrics.*.json")):
+        try:
+            # remove files of processes which no longer exist
+            if not _is_process_alive(int(os.path.basename(path).split(".")[1])):
+                os.remove(path)
+                continue
+            if time.time() - os.path.getmtime(path) > STALE_PERIOD:
+                continue
+            with open(path) as f:
+                data = json.load(f)
+        except Exception:
+            continue
+        _merge_components(merged_components, [item for item in data if "component" in item])
+        for item in data:
+            if "component" in item:
+                continue
+            key = (item["api_module"], item["method"])
+            histograms = merged.setdefault(key, {name: Histogram(METRICS[name][2]) for name in METRICS})
+            for name, (counts, total) in item["histograms"].items():
+                if name in histograms and len(counts) == len(histograms[name].counts):
+                    histograms[name].merge(Histogram(METRICS[name][2], counts, total))
+    return merged, merged_components
+
+
+# render a histogram in the Prometheus text format
+def _render_histogram(lines, metric_name, labels, histogram):
+    cumulative = 0
+    for upper, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{metric_name}_bucket{{{labels},le="{upper}"}} {cumulative}')
+    cumulative += histogram.counts[-1]
+    lines.append(f'{metric_name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+    lines.append(f"{metric_name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{metric_name}_count{{{labels}}} {cumulative}")
+
+
+def render_prometheus():
+    """
+    Render histograms in the Prometheus text format
+
+    :return: string in the Prometheus text format
+    """
+    merged, merged_components = _collect_histograms()
+    lines = []
+    for name, (metric_name, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {metric_name} {help_text}")
+        lines.append(f"# TYPE {metric_name} histogram")
+        for (api_module, method_name), histograms in sorted(merged.items()):
+            _render_histogram(lines, metric_name, f'module="{api_module}",method="{method_name}"', histograms[name])
+    for name, (metric_name, help_text, metric_type) in COMPONENT_METRICS.items():
+        lines.append(f"# HELP {metric_name} {help_text}")
+        lines.append(f"# TYPE {metric_name} {metric_type}")
+        for (key, label_items), value in sorted(merged_components.items()):
+            if key != name:
+                continue
+            labels = ",".join(f'{label}="{label_value}"' for label, label_value in label_items)
+            if isinstance(value, Histogram):
+                _render_histogram(lines, metric_name, labels, value)
+            else:
+                lines.append(f"{metric_name}{{{labels}}} {value}" if labels else f"{metric_name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def set_profiler(api_module, method_name, fraction, duration):
+    """
+    Write the profiler control file which is picked up by all processes
+
+    :param api_module: API module. None for any module
+    :param method_name: method name to be profiled
+    :param fraction: fraction of requests to be profiled. 0 to disable
+    :param duration: duration in seconds to keep profiling
+    :return: path of the control file
+    """
+    metrics_dir = _get_metrics_dir()
+    if not metrics_dir:
+        raise RuntimeError("request_metrics_dir is not set in panda_config")
+    path = os.path.join(metrics_dir, "profiler.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"api_module": api_module, "method": method_name, "fraction": fraction, "expires": time.time() + duration}, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+# read the profiler control file if it was updated
+def _get_profiler_config():
+    metrics_dir = _get_metrics_dir()
+    if not metrics_dir:
+        return None
+    time_now = time.monotonic()
+    if time_now - _profiler_settings["checked"] >= PROFILER_CHECK_INTERVAL:
+        _profiler_settings["checked"] = time_now
+        path = os.path.join(metrics_dir, "profiler.json")
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime != _profiler_settings["mtime"]:
+                with open(path) as f:
+                    _profiler_settings["config"] = json.load(f)
+                _profiler_settings["mtime"] = mtime
+        except FileNotFoundError:
+            _profiler_settings["config"] = None
+            _profiler_settings["mtime"] = None
+        except Exception as e:
+            _logger.error(f"failed to read profiler control file : {str(e)}")
+    return _profiler_settings["config"]
+
+
+def get_profiler(api_module, method_name):
+    """
+    Get a profiler if the request is sampled for profiling
+
+    :param api_module: API module
+    :param method_name: method name
+    :return: cProfile.Profile or None
+    """
+    config = _get_profiler_config()
+    if not config or config.get("method") != method_name or config.get("api_module") not in (None, api_module):
+        return None
+    if time.time() > config.get("expires", 0) or random.random() >= config.get("fraction", 0):
+        return None
+    return cProfile.Profile()
+
+
+def dump_profile(profiler, api_module, method_name):
+    """
+    Dump profiling results to the profiles directory under request_metrics_dir
+
+    :param profiler: cProfile.Profile
+    :param api_module: API module
+    :param method_name: method name
+    """
+    try:
+        profile_dir = os.path.join(_get_metrics_dir(), "profiles")
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{api_module}.{method_name}.{os.getpid()}.{time.time_ns()}.prof")
+        profiler.dump_stats(path)
+        _logger.debug(f"dumped profile to {path}")
+    except Exception as e:
+        _logger.error(f"failed to dump profile : {str(e)}")
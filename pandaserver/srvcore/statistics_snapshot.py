@@ -0,0 +1,253 @@
+"""
+Versioned snapshot of job statistics views shared by httpd processes through a memory-mapped file.
+The statistics_snapshot daemon computes all views on a schedule and writes the snapshot, while the statistics endpoints
+serve the views from the file with ETag and Age headers instead of running aggregate queries for every request.
+Endpoints fall back to the database when the snapshot is disabled, missing, or older than statistics_snapshot_max_age.
+The refresh interval for the max-age of responses is taken from the creation times of the snapshot and the previous one,
+so that it follows the period of the daemon without another setting.
+
+File layout:
+    preamble: magic, format version, snapshot version, creation time, creation time of the previous snapshot, and header length
+    header: pickled dictionary of view names to offsets, lengths, ETags, and computation times of view blobs
+    view blobs: pickled statistics
+"""
+
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+
+from pandacommon.pandalogger.PandaLogger import PandaLogger
+
+from pandaserver.config import panda_config
+
+_logger = PandaLogger().getLogger("statistics_snapshot")
+
+# magic and format version of the snapshot file
+SNAPSHOT_MAGIC = b"PSTS"
+SNAPSHOT_FORMAT_VERSION = 2
+_PREAMBLE = struct.Struct("<4sIQddQ")
+
+# views with the task buffer methods to compute them
+VIEWS = {
+    "job_stats_by_cloud.production": lambda task_buffer: task_buffer.getJobStatisticsForExtIF("production"),
+    "job_stats_by_cloud.analysis": lambda task_buffer: task_buffer.getJobStatisticsForExtIF("analysis"),
+    "job_stats_by_cloud_and_processing_type": lambda task_buffer: task_buffer.getJobStatisticsForBamboo(),
+    "job_stats_by_site": lambda task_buffer: task_buffer.getJobStatistics(),
+    "job_stats_by_site_and_resource_type": lambda task_buffer: task_buffer.getJobStatisticsPerSiteResource(),
+    "job_stats_by_site_share_and_resource_type": lambda task_buffer: task_buffer.get_job_statistics_per_site_label_resource(),
+}
+
+
+def compute_views(task_buffer) -> dict:
+    """
+    Compute all views. Views failed to be computed are omitted so that endpoints query the database
+
+    Args:
+        task_buffer (TaskBuffer): task buffer
+
+    Returns:
+        dict: view names and statistics
+    """
+    views = {}
+    for view_name, method in VIEWS.items():
+        time_start = time.monotonic()
+        try:
+            data = method(task_buffer)
+        except Exception as e:
+            _logger.error(f"failed to compute {view_name} due to {str(e)}")
+            continue
+        if data == {}:
+            _logger.error(f"failed to compute {view_name}")
+            continue
+        views[view_name] = (data, time.time())
+        _logger.debug(f"computed {view_name} in {time.monotonic() - time_start:.3f} sec")
+    return views
+
+
+def _get_previous_creation_time(path: str) -> float:
+    """
+    Get the creation time of the current snapshot file which is replaced
+
+    Args:
+        path (str): path of the snapshot file
+
+    Returns:
+        float: creation time, or 0 if unavailable
+    """
+    try:
+        with open(path, "rb") as f:
+            magic, format_version, _, created = struct.unpack_from("<4sIQd", f.read(_PREAMBLE.size))
+        if magic == SNAPSHOT_MAGIC and format_version == SNAPSHOT_FORMAT_VERSION:
+            return created
+    except Exception:
+        pass
+    return 0.0
+
+
+def write_snapshot(views: dict, path: str) -> int:
+    """
+    Write a snapshot of views atomically so that attached processes keep reading the previous file
+
+    Args:
+        views (dict): view names and tuples of statistics and computation time
+        path (str): path of the snapshot file
+
+    Returns:
+        int: version of the snapshot
+    """
+    version = time.time_ns()
+    previous_created = _get_previous_creation_time(path)
+    view_entries = {}
+    view_blobs = []
+    offset = 0
+    for view_name, (data, computed) in views.items():
+        blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        # ETag depends only on the content so that clients get 304 when statistics are unchanged
+        etag = f'W/"{hashlib.sha1(blob).hexdigest()[:20]}"'
+        view_entries[view_name] = (offset, len(blob), etag, computed)
+        view_blobs.append(blob)
+        offset += len(blob)
+    header_blob = pickle.dumps(view_entries, protocol=pickle.HIGHEST_PROTOCOL)
+    # write to a temporary file and rename it to replace the old file atomically
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, version, time.time(), previous_created, len(header_blob)))
+        f.write(header_blob)
+        for blob in view_blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+    return version
+
+
+class StatisticsView:
+    """
+    Statistics of a view with the ETag, the computation time, and the refresh interval of the snapshot
+    """
+
+    def __init__(self, data, etag: str, computed: float, interval: float | None = None):
+        self.data = data
+        self.etag = etag
+        self.computed = computed
+        self.interval = interval
+
+    def get_age(self) -> int:
+        return max(0, int(time.time() - self.computed))
+
+    def is_not_modified(self, req) -> bool:
+        """
+        Check If-None-Match of the request
+
+        Args:
+            req (PandaRequest): request
+
+        Returns:
+            bool: True if the client has the same view
+        """
+        if_none_match = req.subprocess_env.get("HTTP_IF_NONE_MATCH")
+        if not if_none_match:
+            return False
+        # weak comparison
+        tag = self.etag.removeprefix("W/")
+        for item in if_none_match.split(","):
+            item = item.strip()
+            if item == "*" or item.removeprefix("W/") == tag:
+                return True
+        return False
+
+    def set_response_headers(self, req) -> bool:
+        """
+        Set ETag and stale-age headers of the response, and mark the response as not modified if the client has the same view
+
+        Args:
+            req (PandaRequest): request
+
+        Returns:
+            bool: True if the response is not modified
+        """
+        age = self.get_age()
+        req.add_response_header("ETag", self.etag)
+        req.add_response_header("Age", str(age))
+        # clients revalidate until the refresh interval is known from two snapshots
+        max_age = 0 if self.interval is None else max(0, int(self.interval) - age)
+        req.add_response_header("Cache-Control", f"max-age={max_age}")
+        if self.is_not_modified(req):
+            req.set_not_modified()
+            return True
+        return False
+
+
+class StatisticsSnapshot:
+    """
+    Snapshot attached to the file where views are unpickled on first access
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        magic, format_version = struct.unpack_from("<4sI", self._buffer, 0)
+        if magic != SNAPSHOT_MAGIC or format_version != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"{path} is not a statistics snapshot of format version {SNAPSHOT_FORMAT_VERSION}")
+        _, _, self.version, self.created, previous_created, header_length = _PREAMBLE.unpack_from(self._buffer, 0)
+        # actual interval of the daemon
+        if previous_created > 0 and self.created > previous_created:
+            self.interval = self.created - previous_created
+        else:
+            self.interval = None
+        self._base_offset = _PREAMBLE.size + header_length
+        self._view_entries = pickle.loads(self._buffer[_PREAMBLE.size : self._base_offset])
+        self._materialized = {}
+
+    def get_view(self, view_name: str):
+        view = self._materialized.get(view_name)
+        if view is None:
+            entry = self._view_entries.get(view_name)
+            if entry is None:
+                return None
+            offset, length, etag, computed = entry
+            start = self._base_offset + offset
+            view = self._materialized.setdefault(view_name, StatisticsView(pickle.loads(self._buffer[start : start + length]), etag, computed, self.interval))
+        return view
+
+
+# snapshot attached by the process
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_view(view_name: str):
+    """
+    Get a view from the snapshot. The process attaches to the file again when the daemon replaced it
+
+    Args:
+        view_name (str): view name
+
+    Returns:
+        StatisticsView: view, or None if the snapshot is disabled, unavailable, or stale
+    """
+    global _snapshot
+    path = panda_config.statistics_snapshot
+    if not path:
+        return None
+    try:
+        file_stat = os.stat(path)
+        with _snapshot_lock:
+            snapshot = _snapshot
+            if snapshot is None or (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns) != (file_stat.st_ino, file_stat.st_mtime_ns):
+                snapshot = StatisticsSnapshot(path)
+                _snapshot = snapshot
+                _logger.debug(f"PID={os.getpid()} attached version={snapshot.version}")
+        view = snapshot.get_view(view_name)
+        if view is None or time.time() - view.computed > panda_config.statistics_snapshot_max_age:
+            return None
+        return view
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        _logger.error(f"PID={os.getpid()} failed to get {view_name} from {path} due to {str(e)}")
+        return None
@@ -0,0 +1,213 @@
+"""
+Shared executor for methods called with a timeout in API calls.
+
+Methods run in a bounded pool of worker threads in each process instead of a new thread per call. A call which is still
+waiting for a worker when the deadline passes is cancelled. Since methods changing the state, like getJobs claiming jobs,
+cannot be undone once they started, callers wait for their results after they started. Only read-only methods are left
+to finish in the background with the result discarded when the deadline passes while running. When all workers are busy
+and too many calls are waiting, new calls are rejected with ServiceOverloaded, which the WSGI entry point turns into 503.
+Timing statistics are recorded per method and logged periodically.
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from pandacommon.pandalogger.PandaLogger import PandaLogger
+
+from pandaserver.config import panda_config
+from pandaserver.srvcore import request_metrics
+
+_logger = PandaLogger().getLogger("timed_executor")
+
+# interval to log statistics
+STATS_LOG_INTERVAL = 600
+
+
+class ServiceOverloaded(Exception):
+    """
+    Raised when a call is rejected since too many calls are waiting for workers
+    """
+
+    # seconds for clients to wait before retrying
+    retry_after = 60
+
+
+class MethodStats:
+    """
+    Timing statistics of a method
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.errors = 0
+        self.queue_time = 0.0
+        self.exec_time = 0.0
+        self.max_exec_time = 0.0
+
+    def to_dict(self):
+        n_executed = max(self.calls - self.rejected - self.cancelled, 1)
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "avg_queue_time": round(self.queue_time / n_executed, 3),
+            "avg_exec_time": round(self.exec_time / n_executed, 3),
+            "max_exec_time": round(self.max_exec_time, 3),
+        }
+
+
+class TimedExecutor:
+    """
+    Bounded pool of worker threads with deadlines for calls
+    """
+
+    def __init__(self, n_workers, max_queue):
+        self.n_workers = max(1, n_workers)
+        self.max_queue = max(0, max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=self.n_workers, thread_name_prefix="timed_method")
+        self.lock = threading.Lock()
+        # number of calls submitted and not yet finished
+        self.n_in_flight = 0
+        self.stats = {}
+        self.last_stats_log = time.monotonic()
+
+    def _get_stats(self, method_name):
+        method_stats = self.stats.get(method_name)
+        if method_stats is None:
+            method_stats = MethodStats()
+            self.stats[method_name] = method_stats
+        return method_stats
+
+    def _execute(self, method, method_name, submit_time, current_request, started, args, kwargs):
+        start_time = time.monotonic()
+        started.set()
+        request_metrics.set_current_request(current_request)
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            with self.lock:
+                self._get_stats(method_name).errors += 1
+            _logger.error(f"{method_name} failed with {traceback.format_exc()}")
+            raise
+        finally:
+            request_metrics.set_current_request(None)
+            exec_time = time.monotonic() - start_time
+            with self.lock:
+                method_stats = self._get_stats(method_name)
+                method_stats.queue_time += start_time - submit_time
+                method_stats.exec_time += exec_time
+                method_stats.max_exec_time = max(method_stats.max_exec_time, exec_time)
+
+    def _done(self, future):
+        with self.lock:
+            self.n_in_flight -= 1
+
+    def call(self, method, timeout, default, args=(), kwargs=None, read_only=False):
+        """
+        Call a method in a worker and wait for the result until the deadline. For methods which are not read-only,
+        the deadline applies only while the call waits for a worker, and the result is waited for once the call started
+
+        :param method: method to be called
+        :param timeout: timeout in seconds. None to wait until the method finishes
+        :param default: value returned when the deadline passes or the method fails
+        :param args: positional arguments of the method
+        :param kwargs: keyword arguments of the method
+        :param read_only: True if the method doesn't change the state so that the result can be discarded after the deadline
+        :return: result of the method, or the default value
+        """
+        if kwargs is None:
+            kwargs = {}
+        method_name = getattr(method, "__name__", str(method))
+        submit_time = time.monotonic()
+        with self.lock:
+            method_stats = self._get_stats(method_name)
+            method_stats.calls += 1
+            if self.n_in_flight >= self.n_workers + self.max_queue:
+                method_stats.rejected += 1
+                n_in_flight = self.n_in_flight
+            else:
+                n_in_flight = None
+                self.n_in_flight += 1
+        if n_in_flight is not None:
+            _logger.warning(f"rejected {method_name} since {n_in_flight} calls are in flight with {self.n_workers} workers")
+            raise ServiceOverloaded(f"too many calls in flight for {method_name}")
+        started = threading.Event()
+        try:
+            future = self.executor.submit(self._execute, method, method_name, submit_time, request_metrics.get_current_request(), started, args, kwargs)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        self._log_stats_if_needed()
+        try:
+            if read_only:
+                return future.result(timeout=timeout)
+            if not started.wait(timeout) and future.cancel():
+                with self.lock:
+                    method_stats.timeouts += 1
+                    method_stats.cancelled += 1
+                _logger.warning(f"{method_name} timed out after {timeout} sec before starting")
+                return default
+            # changes by the method cannot be undone once started
+            return future.result()
+        except FutureTimeoutError:
+            cancelled = future.cancel()
+            with self.lock:
+                method_stats.timeouts += 1
+                if cancelled:
+                    method_stats.cancelled += 1
+            _logger.warning(f"{method_name} timed out after {timeout} sec {'before starting' if cancelled else 'while running'}")
+        except CancelledError:
+            pass
+        except Exception:
+            # already logged in the worker
+            pass
+        return default
+
+    def get_stats(self):
+        """
+        Get timing statistics per method
+
+        :return: dictionary of method name and statistics
+        """
+        with self.lock:
+            return {method_name: method_stats.to_dict() for method_name, method_stats in self.stats.items()}
+
+    def _log_stats_if_needed(self):
+        time_now = time.monotonic()
+        with self.lock:
+            if time_now - self.last_stats_log < STATS_LOG_INTERVAL:
+                return
+            self.last_stats_log = time_now
+            n_in_flight = self.n_in_flight
+        for method_name, method_stats in sorted(self.get_stats().items()):
+            _logger.debug(f"PID={os.getpid()} in_flight={n_in_flight} {method_name} " + " ".join(f"{k}={v}" for k, v in method_stats.items()))
+
+
+# executor of the process
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Get the executor of the process, which is made at the first call in each process since worker threads are not inherited by fork
+
+    :return: TimedExecutor
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = TimedExecutor(panda_config.timed_method_workers, panda_config.timed_method_max_queue)
+            _executor_pid = os.getpid()
+        return _executor
@@ -17,6 +17,7 @@ import types
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 
 from pandaserver.config import panda_config
+from pandaserver.srvcore import request_metrics
 from pandaserver.taskbuffer import OraDBProxy as DBProxy
 from pandaserver.taskbuffer.DatasetSpec import DatasetSpec
 from pandaserver.taskbuffer.FileSpec import FileSpec
@@ -448,12 +449,15 @@ class ConBridge(object):
         def __call__(self, *args, **keywords):
             while True:
                 try:
+                    start_time = time.monotonic()
                     # send command name
                     self.parent.bridge_send(self.name)
                     # send variables
                     self.parent.bridge_send((args, keywords))
                     # get response
                     retVal, newArgs, newKeywords = self.parent.bridge_getResponse()
+                    # database accesses run in the child process, so the method call is accounted as DB time
+                    request_metrics.add_db_time(time.monotonic() - start_time)
                     # propagate child's changes in args to master
                     for idxArg, tmpArg in enumerate(args):
                         self.copyChanges(tmpArg, newArgs[idxArg])
@@ -3,81 +3,266 @@ pool for DBProxies
 
 """
 
-try:
-    from Queue import Queue
-except ImportError:
-    from queue import Queue
-
 import os
 import random
+import sys
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from threading import Lock
+from threading import Condition, Lock, Thread
 
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 
 from pandaserver.config import panda_config
+from pandaserver.srvcore import request_metrics
 from pandaserver.taskbuffer import OraDBProxy as DBProxy
 from pandaserver.taskbuffer.ConBridge import ConBridge
 
 # logger
 _logger = PandaLogger().getLogger("DBProxyPool")
 
+# upper bounds of histogram buckets in seconds
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+
+# exception when no proxy is available within the timeout
+class DBProxyPoolTimeout(Exception):
+    pass
+
+
+# get the name of the function which requested a proxy
+def get_caller_name():
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename.endswith(("DBProxyPool.py", "contextlib.py")):
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    return frame.f_code.co_name
+
 
 class DBProxyPool:
+    """
+    Pool of DBProxies which grows on demand between the minimum and maximum number of connections.
+    Idle connections are validated and trimmed by a background thread instead of the request path.
+    Histograms of wait and hold times per caller are exposed through request_metrics.
+    Optional parameters are taken from panda_config:
+        dbpool_max_connections: maximum number of connections. nConnection if not set
+        dbpool_acquire_timeout: timeout in seconds to get a proxy. Wait forever if not set
+        dbpool_validation_interval: interval in seconds to validate idle connections
+        dbpool_idle_timeout: idle time in seconds to close connections above the minimum
+    """
+
     def __init__(self, dbhost, dbpasswd, nConnection, useTimeout=False, dbProxyClass=None):
         # crate lock for callers
         self.lock = Lock()
         self.callers = []
+        # parameters to create proxies
+        self.dbhost = dbhost
+        self.dbpasswd = dbpasswd
+        self.useTimeout = useTimeout
+        self.dbProxyClass = dbProxyClass
+        # pool size and timeouts
+        self.minConnection = nConnection
+        self.maxConnection = max(nConnection, int(getattr(panda_config, "dbpool_max_connections", nConnection)))
+        acquire_timeout = getattr(panda_config, "dbpool_acquire_timeout", None)
+        self.acquireTimeout = float(acquire_timeout) if acquire_timeout else None
+        self.validationInterval = float(getattr(panda_config, "dbpool_validation_interval", 300))
+        self.idleTimeout = float(getattr(panda_config, "dbpool_idle_timeout", 600))
+        # idle proxies with the last used and validated times, and their total number including ones in use
+        self.condition = Condition(self.lock)
+        self.idleProxies = deque()
+        self.nProxies = 0
+        # proxies in use with the caller and the acquired time
+        self.inUse = {}
+        # histograms per caller
+        self.waitHistograms = {}
+        self.holdHistograms = {}
+        self.nTimeouts = 0
         # create Proxies
-        _logger.debug("init")
-        self.proxyList = Queue(nConnection)
+        _logger.debug(f"init min={self.minConnection} max={self.maxConnection}")
         self.connList = []
-        for i in range(nConnection):
-            _logger.debug(f"connect -> {i} ")
-            if dbProxyClass is not None:
-                proxy = dbProxyClass()
-            elif useTimeout and hasattr(panda_config, "usedbtimeout") and panda_config.usedbtimeout is True:
-                """
-                ConBridge allows having database interactions in separate processes and killing them independently when interactions are stalled.
-                This avoids clogged httpd processes due to stalled database accesses.
-                """
-                proxy = ConBridge()
-            else:
-                proxy = DBProxy.DBProxy()
-                self.connList.append(proxy)
-            iTry = 0
-            while True:
-                if proxy.connect(dbhost, dbpasswd, dbtimeout=60):
-                    break
-                iTry += 1
-                _logger.debug(f"failed -> {i} : try {iTry}")
-                time.sleep(random.randint(60, 90))
-            self.proxyList.put(proxy)
-            time.sleep(1)
+        if self._use_con_bridge():
+            # ConBridge forks a child process, so they are created one by one
+            for i in range(nConnection):
+                self._add_idle_proxy(self._create_proxy(i))
+                time.sleep(1)
+        else:
+            with ThreadPoolExecutor(max_workers=min(nConnection, 10) or 1) as executor:
+                for proxy in executor.map(self._create_proxy, range(nConnection)):
+                    self._add_idle_proxy(proxy)
+        # expose histograms
+        request_metrics.register_collector(self.get_metrics)
         # get PID
         self.pid = os.getpid()
+        # start background maintenance
+        Thread(target=self._maintain, name="DBProxyPoolMaintainer", daemon=True).start()
         _logger.debug("ready")
 
-    # return a free proxy. this method blocks until a proxy is available
-    def getProxy(self):
-        # time how long it took to get a proxy
-        start_time = time.time()
+    # check if ConBridge is used
+    def _use_con_bridge(self):
+        return self.dbProxyClass is None and self.useTimeout and hasattr(panda_config, "usedbtimeout") and panda_config.usedbtimeout is True
 
-        # get proxy
-        proxy = self.proxyList.get()
-        # wake up connection
-        proxy.wakeUp()
+    # create a proxy and connect. retry until the deadline in monotonic time if given, otherwise forever
+    def _create_proxy(self, i, deadline=None):
+        _logger.debug(f"connect -> {i} ")
+        if self.dbProxyClass is not None:
+            proxy = self.dbProxyClass()
+        elif self._use_con_bridge():
+            """
+            ConBridge allows having database interactions in separate processes and killing them independently when interactions are stalled.
+            This avoids clogged httpd processes due to stalled database accesses.
+            """
+            proxy = ConBridge()
+        else:
+            proxy = DBProxy.DBProxy()
+            with self.lock:
+                self.connList.append(proxy)
+        iTry = 0
+        while True:
+            if proxy.connect(self.dbhost, self.dbpasswd, dbtimeout=60):
+                break
+            iTry += 1
+            _logger.debug(f"failed -> {i} : try {iTry}")
+            sleep_time = random.randint(60, 90)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._close_proxy(proxy)
+                    raise DBProxyPoolTimeout(f"failed to connect within the timeout after {iTry} tries")
+                sleep_time = min(sleep_time, remaining)
+            time.sleep(sleep_time)
+        return proxy
+
+    # add a new proxy to the pool
+    def _add_idle_proxy(self, proxy):
+        with self.condition:
+            self.nProxies += 1
+            now = time.monotonic()
+            self.idleProxies.append((proxy, now, now))
+            self.condition.notify()
+
+    # discard a proxy in the pool and let a waiting caller create a new one
+    def _discard_proxy(self, proxy):
+        with self.condition:
+            self.nProxies -= 1
+            self.condition.notify()
+        self._close_proxy(proxy)
+
+    # close a proxy
+    def _close_proxy(self, proxy):
+        with self.lock:
+            if proxy in self.connList:
+                self.connList.remove(proxy)
+        try:
+            if isinstance(proxy, ConBridge):
+                proxy.bridge_killChild()
+            else:
+                proxy.cleanup()
+        except Exception as e:
+            _logger.error(f"failed to close proxy : {str(e)}")
 
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-        _logger.debug(f"Getting proxy took: {elapsed_time} seconds")
+    # validate idle proxies and close ones above the minimum
+    def _maintain(self):
+        interval = max(1.0, min(self.validationInterval, self.idleTimeout) / 2)
+        while True:
+            time.sleep(interval)
+            try:
+                to_validate = []
+                to_close = []
+                with self.condition:
+                    now = time.monotonic()
+                    for item in list(self.idleProxies):
+                        proxy, last_used, last_validated = item
+                        if self.nProxies - len(to_close) > self.minConnection and now - last_used > self.idleTimeout:
+                            to_close.append(proxy)
+                        elif now - last_validated > self.validationInterval:
+                            to_validate.append((proxy, last_used))
+                        else:
+                            continue
+                        self.idleProxies.remove(item)
+                    self.nProxies -= len(to_close)
+                for proxy in to_close:
+                    _logger.debug("closing idle proxy")
+                    self._close_proxy(proxy)
+                for proxy, last_used in to_validate:
+                    # wake up connection
+                    try:
+                        proxy.wakeUp()
+                    except Exception as e:
+                        _logger.error(f"discarding idle proxy which failed to wake up : {str(e)}")
+                        self._discard_proxy(proxy)
+                        continue
+                    with self.condition:
+                        # put back to the idle end so that busy proxies are preferred
+                        self.idleProxies.appendleft((proxy, last_used, time.monotonic()))
+                        self.condition.notify()
+            except Exception as e:
+                _logger.error(f"maintenance failed : {str(e)}")
 
+    # return a free proxy. this method blocks until a proxy is available or the timeout is reached
+    def getProxy(self, timeout=None):
+        caller = get_caller_name()
+        if timeout is None:
+            timeout = self.acquireTimeout
+        # time how long it took to get a proxy
+        start_time = time.monotonic()
+        proxy = None
+        to_create = False
+        to_validate = False
+        with self.condition:
+            while True:
+                if self.idleProxies:
+                    # use the most recently used proxy so that others can be trimmed
+                    proxy, last_used, last_validated = self.idleProxies.pop()
+                    # the background thread doesn't exist in forked processes
+                    to_validate = time.monotonic() - max(last_used, last_validated) > self.validationInterval
+                    break
+                if self.nProxies < self.maxConnection:
+                    # grow the pool
+                    self.nProxies += 1
+                    to_create = True
+                    break
+                remaining = None if timeout is None else timeout - (time.monotonic() - start_time)
+                if remaining is not None and remaining <= 0:
+                    self.nTimeouts += 1
+                    raise DBProxyPoolTimeout(f"no DB proxy available for {caller} within {timeout} sec with {self.nProxies} connections in use")
+                self.condition.wait(remaining)
+        deadline = None if timeout is None else start_time + timeout
+        if to_validate:
+            # wake up connection, or replace it if failed
+            try:
+                proxy.wakeUp()
+            except Exception as e:
+                _logger.error(f"replacing proxy which failed to wake up : {str(e)}")
+                self._close_proxy(proxy)
+                to_create = True
+        if to_create:
+            try:
+                proxy = self._create_proxy(self.nProxies, deadline)
+            except Exception:
+                with self.condition:
+                    self.nProxies -= 1
+                    self.condition.notify()
+                raise
+        elapsed_time = time.monotonic() - start_time
+        with self.lock:
+            self.inUse[id(proxy)] = (caller, time.monotonic())
+            self.waitHistograms.setdefault(caller, request_metrics.Histogram(HISTOGRAM_BUCKETS)).observe(elapsed_time)
+        request_metrics.add_db_wait(elapsed_time)
+        _logger.debug(f"Getting proxy took: {elapsed_time} seconds for {caller}")
         return proxy
 
     # put back a proxy
     def putProxy(self, proxy):
-        self.proxyList.put(proxy)
+        with self.condition:
+            in_use = self.inUse.pop(id(proxy), None)
+            if in_use is not None:
+                caller, acquired_time = in_use
+                self.holdHistograms.setdefault(caller, request_metrics.Histogram(HISTOGRAM_BUCKETS)).observe(time.monotonic() - acquired_time)
+            now = time.monotonic()
+            self.idleProxies.append((proxy, now, now))
+            self.condition.notify()
 
     # context manager for getting DBProxy
     @contextmanager
@@ -88,6 +273,20 @@ class DBProxyPool:
         finally:
             self.putProxy(proxy)
 
+    # get metrics for request_metrics
+    def get_metrics(self):
+        """
+        Get histograms of wait and hold times per caller and the number of timeouts
+
+        :return: list of (metric key, labels, value)
+        """
+        with self.lock:
+            ret = [("db_pool_timeouts", {}, self.nTimeouts)]
+            for key, histograms in (("db_pool_wait", self.waitHistograms), ("db_pool_hold", self.holdHistograms)):
+                for caller, histogram in histograms.items():
+                    ret.append((key, {"caller": caller}, request_metrics.Histogram(histogram.buckets, list(histogram.counts), histogram.sum)))
+        return ret
+
     # cleanup
     def cleanup(self):
         _logger.debug("cleanup start")
@@ -5,6 +5,8 @@ file specification
 
 import datetime
 
+from pandaserver.taskbuffer.SpecAttribute import SpecAttribute, install_attributes
+
 reserveChangedState = False
 
 
@@ -34,10 +36,13 @@ class FileSpec(object):
         "fileID",
         "attemptNr",
     )
-    # slots
-    __slots__ = _attributes + (
+    # index of attributes
+    _attributeIndex = {attr: i for i, attr in enumerate(_attributes)}
+    # slots. attribute values are stored in an array with a bitmap of changed attributes
+    __slots__ = (
+        "_values",
+        "_changed",
         "_owner",
-        "_changedAttrs",
         "_oldPandaID",
         "_reserveChangedState",
     )
@@ -49,38 +54,20 @@ class FileSpec(object):
     # constructor
     def __init__(self):
         # install attributes
-        for attr in self._attributes:
-            object.__setattr__(self, attr, None)
+        self._values = ["NULL"] * len(self._attributes)
         # set owner to synchronize PandaID
-        object.__setattr__(self, "_owner", None)
-        # map of changed attributes
-        object.__setattr__(self, "_changedAttrs", {})
+        self._owner = None
+        # bitmap of changed attributes
+        self._changed = 0
         # old PandaID
-        object.__setattr__(self, "_oldPandaID", "NULL")
+        self._oldPandaID = "NULL"
         # reserve changed state at instance level
-        object.__setattr__(self, "_reserveChangedState", False)
-
-    # override __getattribute__ for SQL and PandaID
-    def __getattribute__(self, name):
-        # PandaID
-        if name == "PandaID":
-            if self._owner is None:
-                return "NULL"
-            return self._owner.PandaID
-        # others
-        ret = object.__getattribute__(self, name)
-        if ret is None:
-            return "NULL"
-        return ret
+        self._reserveChangedState = False
 
-    # override __setattr__ to collect the changed attributes
-    def __setattr__(self, name, value):
-        oldVal = getattr(self, name)
-        object.__setattr__(self, name, value)
-        newVal = getattr(self, name)
-        # collect changed attributes
-        if oldVal != newVal:
-            self._changedAttrs[name] = value
+    # map of changed attributes
+    @property
+    def _changedAttrs(self):
+        return {attr: getattr(self, attr) for i, attr in enumerate(self._attributes) if self._changed >> i & 1}
 
     # set owner
     def setOwner(self, owner):
@@ -90,29 +77,32 @@ class FileSpec(object):
     # reset changed attribute list
     def resetChangedList(self):
         self._oldPandaID = self.PandaID
-        object.__setattr__(self, "_changedAttrs", {})
+        self._changed = 0
+
+    # return a list of values with PandaID of the owner
+    def _getValues(self):
+        values = list(self._values)
+        values[self._attributeIndex["PandaID"]] = self.PandaID
+        return values
 
     # return a tuple of values
     def values(self):
-        ret = []
-        for attr in self._attributes:
-            val = getattr(self, attr)
-            ret.append(val)
-        return tuple(ret)
+        return tuple(self._getValues())
 
     # return map of values
     def valuesMap(self, useSeq=False, onlyChanged=False):
         ret = {}
-        for attr in self._attributes:
+        values = self._getValues()
+        for i, attr in enumerate(self._attributes):
             if useSeq and attr in self._seqAttrMap:
                 continue
             if onlyChanged:
                 if attr == "PandaID":
-                    if self.PandaID == self._oldPandaID:
+                    if values[i] == self._oldPandaID:
                         continue
-                elif attr not in self._changedAttrs:
+                elif not self._changed >> i & 1:
                     continue
-            val = getattr(self, attr)
+            val = values[i]
             if val == "NULL":
                 if attr in self._zeroAttrs:
                     val = 0
@@ -123,17 +113,11 @@ class FileSpec(object):
 
     # pack tuple into FileSpec
     def pack(self, values):
-        for i in range(len(self._attributes)):
-            attr = self._attributes[i]
-            val = values[i]
-            object.__setattr__(self, attr, val)
+        self._values = ["NULL" if val is None else val for val in values[: len(self._attributes)]]
 
     # return state values to be pickled
     def __getstate__(self):
-        state = []
-        for attr in self._attributes:
-            val = getattr(self, attr)
-            state.append(val)
+        state = self._getValues()
         if reserveChangedState or self._reserveChangedState:
             state.append(self._changedAttrs)
         # append owner info
@@ -142,22 +126,17 @@ class FileSpec(object):
 
     # restore state from the unpickled state values
     def __setstate__(self, state):
-        pandaID = "NULL"
-        for i in range(len(self._attributes)):
-            if i + 1 < len(state):
-                object.__setattr__(self, self._attributes[i], state[i])
-            else:
-                object.__setattr__(self, self._attributes[i], "NULL")
-            if self._attributes[i] == "PandaID":
-                pandaID = state[i]
-        object.__setattr__(self, "_owner", state[-1])
-        object.__setattr__(self, "_oldPandaID", pandaID)
+        n_state = len(state)
+        self._values = ["NULL" if i + 1 >= n_state or state[i] is None else state[i] for i in range(len(self._attributes))]
+        self._owner = state[-1]
+        self._oldPandaID = state[self._attributeIndex["PandaID"]]
         if not hasattr(self, "_reserveChangedState"):
-            object.__setattr__(self, "_reserveChangedState", False)
+            self._reserveChangedState = False
+        self._changed = 0
         if reserveChangedState or self._reserveChangedState:
-            object.__setattr__(self, "_changedAttrs", state[-2])
-        else:
-            object.__setattr__(self, "_changedAttrs", {})
+            for attr in state[-2]:
+                if attr in self._attributeIndex:
+                    self._changed |= 1 << self._attributeIndex[attr]
 
     # return column names for INSERT
     def columnNames(cls, withMod=False):
@@ -234,8 +213,8 @@ class FileSpec(object):
     # return an expression of bind variables for UPDATE to update only changed attributes
     def bindUpdateChangesExpression(self):
         ret = ""
-        for attr in self._attributes:
-            if attr in self._changedAttrs or (attr == "PandaID" and self.PandaID != self._oldPandaID):
+        for i, attr in enumerate(self._attributes):
+            if self._changed >> i & 1 or (attr == "PandaID" and self.PandaID != self._oldPandaID):
                 ret += f"{attr}=:{attr},"
         ret = ret[:-1]
         ret += " "
@@ -282,9 +261,26 @@ class FileSpec(object):
     # to a dictionary
     def to_dict(self):
         ret = {}
-        for a in self._attributes:
-            v = getattr(self, a)
+        for a, v in zip(self._attributes, self._getValues()):
             if v == "NULL":
                 v = None
             ret[a] = v
         return ret
+
+
+# PandaID of files is synchronized with the owner
+class OwnerPandaIDAttribute(SpecAttribute):
+    __slots__ = ()
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        if obj._owner is None:
+            return "NULL"
+        return obj._owner.PandaID
+
+    def __set__(self, obj, value):
+        obj._values[self.index] = "NULL" if value is None else value
+
+
+install_attributes(FileSpec, special={"PandaID": OwnerPandaIDAttribute})
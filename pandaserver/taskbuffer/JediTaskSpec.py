@@ -1,7 +1,9 @@
 import enum
+import functools
 import json
 import math
 import re
+import types
 
 from pandaserver.taskbuffer import task_split_rules
 
@@ -289,20 +291,27 @@ class JediTaskSpec(object):
         ret += " "
         return ret
 
+    # get parsed split rule
+    def get_split_rule_view(self):
+        return parse_split_rule(self.splitRule)
+
     # check split rule
     def check_split_rule(self, key):
-        if self.splitRule is not None:
-            if re.search(self.splitRuleToken[key] + r"=(\d+)", self.splitRule):
-                return True
-        return False
+        return self.splitRuleToken[key] in parse_split_rule(self.splitRule).digits
+
+    # get integer value of split rule
+    def get_split_rule_int(self, key, default=None):
+        return parse_split_rule(self.splitRule).numbers.get(self.splitRuleToken[key], default)
+
+    # get digits of split rule
+    def get_split_rule_digits(self, key, default=None):
+        return parse_split_rule(self.splitRule).digits.get(self.splitRuleToken[key], default)
 
     # get the max size per job if defined
     def getMaxSizePerJob(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nGBPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                nGBPerJob = int(tmpMatch.group(1)) * 1024 * 1024 * 1024
-                return nGBPerJob
+        nGBPerJob = self.get_split_rule_int("nGBPerJob")
+        if nGBPerJob is not None:
+            return nGBPerJob * 1024 * 1024 * 1024
         return None
 
     # remove nGBPerJob
@@ -311,20 +320,14 @@ class JediTaskSpec(object):
 
     # get the max size per merge job if defined
     def getMaxSizePerMergeJob(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nGBPerMergeJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                nGBPerJob = int(tmpMatch.group(1)) * 1024 * 1024 * 1024
-                return nGBPerJob
+        nGBPerJob = self.get_split_rule_int("nGBPerMergeJob")
+        if nGBPerJob is not None:
+            return nGBPerJob * 1024 * 1024 * 1024
         return None
 
     # get the maxnumber of files per job if defined
     def getMaxNumFilesPerJob(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nMaxFilesPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("nMaxFilesPerJob")
 
     # set MaxNumFilesPerJob
     def setMaxNumFilesPerJob(self, value):
@@ -332,19 +335,11 @@ class JediTaskSpec(object):
 
     # get the maxnumber of files per merge job if defined
     def getMaxNumFilesPerMergeJob(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nMaxFilesPerMergeJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return 50
+        return self.get_split_rule_int("nMaxFilesPerMergeJob", 50)
 
     # get the number of events per merge job if defined
     def getNumEventsPerMergeJob(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nEventsPerMergeJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("nEventsPerMergeJob")
 
     # check if using jumbo
     def usingJumboJobs(self):
@@ -354,43 +349,31 @@ class JediTaskSpec(object):
 
     # get the number of jumbo jobs if defined
     def getNumJumboJobs(self):
-        if self.usingJumboJobs() and self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nJumboJobs"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+        if self.usingJumboJobs():
+            return self.get_split_rule_int("nJumboJobs")
         return None
 
     # get the max number of jumbo jobs per site if defined
     def getMaxJumboPerSite(self):
-        if self.usingJumboJobs() and self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxJumboPerSite"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+        if self.usingJumboJobs():
+            return self.get_split_rule_int("maxJumboPerSite", 1)
         return 1
 
     # get the number of sites per job
     def getNumSitesPerJob(self):
         if not self.useEventService():
             return 1
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nSitesPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return 1
+        return self.get_split_rule_int("nSitesPerJob", 1)
 
     # get the number of files per job if defined
     def getNumFilesPerJob(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nFilesPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                n = int(tmpMatch.group(1))
-                if self.dynamicNumEvents():
-                    inn = self.get_num_events_per_input()
-                    dyn = self.get_min_granularity()
-                    if inn and dyn and inn > dyn:
-                        n *= inn // dyn
-                return n
-        return None
+        n = self.get_split_rule_int("nFilesPerJob")
+        if n is not None and self.dynamicNumEvents():
+            inn = self.get_num_events_per_input()
+            dyn = self.get_min_granularity()
+            if inn and dyn and inn > dyn:
+                n *= inn // dyn
+        return n
 
     # remove nFilesPerJob
     def removeNumFilesPerJob(self):
@@ -398,66 +381,48 @@ class JediTaskSpec(object):
 
     # get the number of files per merge job if defined
     def getNumFilesPerMergeJob(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nFilesPerMergeJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("nFilesPerMergeJob")
 
     # get the number of events per job if defined
     def getNumEventsPerJob(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nEventsPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("nEventsPerJob")
 
     # get offset for random seed
     def getRndmSeedOffset(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["randomSeed"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return 0
+        return self.get_split_rule_int("randomSeed", 0)
 
     # get offset for first event
     def getFirstEventOffset(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["firstEvent"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return 0
+        return self.get_split_rule_int("firstEvent", 0)
 
     # grouping with boundaryID
     def useGroupWithBoundaryID(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["groupBoundaryID"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                gbID = int(tmpMatch.group(1))
-                # 1 : input - can split,    output - free
-                # 2 : input - can split,    output - mapped with provenanceID
-                # 3 : input - cannot split, output - free
-                # 4 : input - cannot split, output - mapped with provenanceID
-                #
-                # * rule for master
-                # 1 : can split. one boundayID per sub chunk
-                # 2 : cannot split. one boundayID per sub chunk
-                # 3 : cannot split. multiple boundayIDs per sub chunk
-                #
-                # * rule for secodary
-                # 1 : must have same boundayID. cannot split
-                #
-                retMap = {}
-                if gbID in [1, 2]:
-                    retMap["inSplit"] = 1
-                else:
-                    retMap["inSplit"] = 2
-                if gbID in [1, 3]:
-                    retMap["outMap"] = False
-                else:
-                    retMap["outMap"] = True
-                retMap["secSplit"] = None
-                return retMap
+        gbID = self.get_split_rule_int("groupBoundaryID")
+        if gbID is not None:
+            # 1 : input - can split,    output - free
+            # 2 : input - can split,    output - mapped with provenanceID
+            # 3 : input - cannot split, output - free
+            # 4 : input - cannot split, output - mapped with provenanceID
+            #
+            # * rule for master
+            # 1 : can split. one boundayID per sub chunk
+            # 2 : cannot split. one boundayID per sub chunk
+            # 3 : cannot split. multiple boundayIDs per sub chunk
+            #
+            # * rule for secodary
+            # 1 : must have same boundayID. cannot split
+            #
+            retMap = {}
+            if gbID in [1, 2]:
+                retMap["inSplit"] = 1
+            else:
+                retMap["inSplit"] = 2
+            if gbID in [1, 3]:
+                retMap["outMap"] = False
+            else:
+                retMap["outMap"] = True
+            retMap["secSplit"] = None
+            return retMap
         return None
 
     # use build
@@ -470,11 +435,7 @@ class JediTaskSpec(object):
 
     # get job cloning type
     def getJobCloningType(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["useJobCloning"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return tmpMatch.group(1)
-        return ""
+        return self.get_split_rule_digits("useJobCloning", "")
 
     # reuse secondary on demand
     def reuseSecOnDemand(self):
@@ -486,11 +447,7 @@ class JediTaskSpec(object):
 
     # check splitRule if not wait for completion of parent
     def noWaitParentSL(cls, splitRule):
-        if splitRule is not None:
-            tmpMatch = re.search(cls.splitRuleToken["noWaitParent"] + "=(\d+)", splitRule)
-            if tmpMatch is not None:
-                return True
-        return False
+        return cls.splitRuleToken["noWaitParent"] in parse_split_rule(splitRule).digits
 
     noWaitParentSL = classmethod(noWaitParentSL)
 
@@ -513,8 +470,7 @@ class JediTaskSpec(object):
             # new
             self.splitRule = self.splitRuleToken["limitedSites"] + "=" + tag
         else:
-            tmpMatch = re.search(self.splitRuleToken["limitedSites"] + "=(\d+)", self.splitRule)
-            if tmpMatch is None:
+            if not self.check_split_rule("limitedSites"):
                 # append
                 self.splitRule += "," + self.splitRuleToken["limitedSites"] + "=" + tag
             else:
@@ -523,10 +479,8 @@ class JediTaskSpec(object):
 
     # use local IO
     def useLocalIO(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["useLocalIO"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and int(tmpMatch.group(1)):
-                return True
+        if self.get_split_rule_int("useLocalIO"):
+            return True
         return False
 
     # use Event Service
@@ -540,21 +494,13 @@ class JediTaskSpec(object):
 
     # get the number of events per worker for Event Service
     def getNumEventsPerWorker(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nEventsPerWorker"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("nEventsPerWorker")
 
     # get the number of event service consumers
     def getNumEventServiceConsumer(self):
         if not self.useEventService():
             return None
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nEsConsumers"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("nEsConsumers")
 
     # disable automatic retry
     def disableAutoRetry(self):
@@ -583,11 +529,7 @@ class JediTaskSpec(object):
 
     # use preprocessing
     def usePrePro(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["usePrePro"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.enum_toPreProcess:
-                return True
-        return False
+        return self.get_split_rule_digits("usePrePro") == self.enum_toPreProcess
 
     # set preprocessed
     def setPreProcessed(self):
@@ -595,8 +537,7 @@ class JediTaskSpec(object):
             # new
             self.splitRule = self.splitRuleToken["usePrePro"] + "=" + self.enum_preProcessed
         else:
-            tmpMatch = re.search(self.splitRuleToken["usePrePro"] + "=(\d+)", self.splitRule)
-            if tmpMatch is None:
+            if not self.check_split_rule("usePrePro"):
                 # append
                 self.splitRule += "," + self.splitRuleToken["usePrePro"] + "=" + self.enum_preProcessed
             else:
@@ -608,11 +549,7 @@ class JediTaskSpec(object):
 
     # check preprocessed
     def checkPreProcessed(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["usePrePro"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.enum_preProcessed:
-                return True
-        return False
+        return self.get_split_rule_digits("usePrePro") == self.enum_preProcessed
 
     # set post preprocess
     def setPostPreProcess(self):
@@ -620,8 +557,7 @@ class JediTaskSpec(object):
             # new
             self.splitRule = self.splitRuleToken["usePrePro"] + "=" + self.enum_postPProcess
         else:
-            tmpMatch = re.search(self.splitRuleToken["usePrePro"] + "=(\d+)", self.splitRule)
-            if tmpMatch is None:
+            if not self.check_split_rule("usePrePro"):
                 # append
                 self.splitRule += "," + self.splitRuleToken["usePrePro"] + "=" + self.enum_postPProcess
             else:
@@ -825,8 +761,7 @@ class JediTaskSpec(object):
             # new
             self.splitRule = self.splitRuleToken[ruleName] + "=" + ruleValue
         else:
-            tmpMatch = re.search(self.splitRuleToken[ruleName] + "=(\d+)", self.splitRule)
-            if tmpMatch is None:
+            if not self.check_split_rule(ruleName):
                 # append
                 self.splitRule += "," + self.splitRuleToken[ruleName] + "=" + ruleValue
             else:
@@ -861,11 +796,7 @@ class JediTaskSpec(object):
     def useScout(self, splitRule=None):
         if splitRule is None:
             splitRule = self.splitRule
-        if splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["useScout"] + "=(\d+)", splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.enum_useScout:
-                return True
-        return False
+        return parse_split_rule(splitRule).digits.get(self.splitRuleToken["useScout"]) == self.enum_useScout
 
     # use exhausted
     def useExhausted(self):
@@ -881,11 +812,7 @@ class JediTaskSpec(object):
 
     # post scout
     def isPostScout(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["useScout"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.enum_postScout:
-                return True
-        return False
+        return self.get_split_rule_digits("useScout") == self.enum_postScout
 
     # wait until input shows up
     def waitInput(self):
@@ -893,10 +820,9 @@ class JediTaskSpec(object):
 
     # input prestaging
     def inputPreStaging(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["inputPreStaging"] + "=" + self.enum_inputPreStaging["use"], self.splitRule)
-            if tmpMatch is not None:
-                return True
+        tmpDigits = self.get_split_rule_digits("inputPreStaging")
+        if tmpDigits is not None and tmpDigits.startswith(self.enum_inputPreStaging["use"]):
+            return True
         return False
 
     # set DDM backend
@@ -905,8 +831,7 @@ class JediTaskSpec(object):
             # new
             self.splitRule = self.splitRuleToken["ddmBackEnd"] + "=" + backEnd
         else:
-            tmpMatch = re.search(self.splitRuleToken["ddmBackEnd"] + "=([^,$]+)", self.splitRule)
-            if tmpMatch is None:
+            if self.getDdmBackEnd() is None:
                 # append
                 self.splitRule += "," + self.splitRuleToken["ddmBackEnd"] + "=" + backEnd
             else:
@@ -915,10 +840,9 @@ class JediTaskSpec(object):
 
     # get DDM backend
     def getDdmBackEnd(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["ddmBackEnd"] + "=([^,$]+)", self.splitRule)
-            if tmpMatch is not None:
-                return tmpMatch.group(1)
+        backEnd = parse_split_rule(self.splitRule).values.get(self.splitRuleToken["ddmBackEnd"])
+        if backEnd:
+            return backEnd
         return None
 
     # get field number to add middle name to LFN
@@ -939,11 +863,7 @@ class JediTaskSpec(object):
 
     # get required success rate for scout jobs
     def getScoutSuccessRate(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["scoutSuccessRate"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("scoutSuccessRate")
 
     # get T1 weight
     def getT1Weight(self):
@@ -975,11 +895,7 @@ class JediTaskSpec(object):
 
     # check if datasets should be registered
     def toRegisterDatasets(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["registerDatasets"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.enum_toRegisterDS:
-                return True
-        return False
+        return self.get_split_rule_digits("registerDatasets") == self.enum_toRegisterDS
 
     # datasets were registered
     def registeredDatasets(self):
@@ -991,18 +907,13 @@ class JediTaskSpec(object):
 
     # get the max number of attempts for ES events
     def getMaxAttemptES(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxAttemptES"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("maxAttemptES")
 
     # get the max number of attempts for ES jobs
     def getMaxAttemptEsJob(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxAttemptEsJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
+        maxAttempt = self.get_split_rule_int("maxAttemptEsJob")
+        if maxAttempt is not None:
+            return maxAttempt
         return self.getMaxAttemptES()
 
     # check attribute length
@@ -1040,18 +951,16 @@ class JediTaskSpec(object):
 
     # get IP connectivity
     def getIpConnectivity(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["ipConnectivity"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return self.enum_ipConnectivity[tmpMatch.group(1)]
+        tmpDigits = self.get_split_rule_digits("ipConnectivity")
+        if tmpDigits is not None:
+            return self.enum_ipConnectivity[tmpDigits]
         return None
 
     # get IP connectivity
     def getIpStack(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["ipStack"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return self.enum_ipStack[tmpMatch.group(1)]
+        tmpDigits = self.get_split_rule_digits("ipStack")
+        if tmpDigits is not None:
+            return self.enum_ipStack[tmpDigits]
         return None
 
     # use HS06 for walltime estimation
@@ -1099,19 +1008,11 @@ class JediTaskSpec(object):
 
     # dynamic number of events
     def dynamicNumEvents(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["dynamicNumEvents"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return True
-        return False
+        return self.check_split_rule("dynamicNumEvents")
 
     # get min granularity for dynamic number of events
     def get_min_granularity(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["dynamicNumEvents"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("dynamicNumEvents")
 
     # set alternative stage-out
     def setAltStageOut(self, value):
@@ -1123,10 +1024,9 @@ class JediTaskSpec(object):
 
     # get alternative stage-out
     def getAltStageOut(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["altStageOut"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return self.enum_altStageOut[tmpMatch.group(1)]
+        tmpDigits = self.get_split_rule_digits("altStageOut")
+        if tmpDigits is not None:
+            return self.enum_altStageOut[tmpDigits]
         return None
 
     # allow WAN for input access
@@ -1143,10 +1043,9 @@ class JediTaskSpec(object):
 
     # check if LAN is used for input access
     def allowInputLAN(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["allowInputLAN"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return self.enum_inputLAN[tmpMatch.group(1)]
+        tmpDigits = self.get_split_rule_digits("allowInputLAN")
+        if tmpDigits is not None:
+            return self.enum_inputLAN[tmpDigits]
         return None
 
     # put log files to OS
@@ -1201,18 +1100,13 @@ class JediTaskSpec(object):
 
     # get num of input chunks to wait
     def nChunksToWait(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nChunksToWait"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("nChunksToWait")
 
     # get max walltime
     def getMaxWalltime(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxWalltime"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1)) * 60 * 60
+        maxWalltime = self.get_split_rule_int("maxWalltime")
+        if maxWalltime is not None:
+            return maxWalltime * 60 * 60
         return None
 
     # set max walltime
@@ -1221,11 +1115,7 @@ class JediTaskSpec(object):
 
     # get target size of the largest output to reset NG
     def getTgtMaxOutputForNG(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["tgtMaxOutputForNG"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("tgtMaxOutputForNG")
 
     # not discard events
     def notDiscardEvents(self):
@@ -1233,11 +1123,7 @@ class JediTaskSpec(object):
 
     # get min CPU efficiency
     def getMinCpuEfficiency(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["minCpuEfficiency"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("minCpuEfficiency")
 
     # decrement attemptNr of events only when failed
     def decAttOnFailedES(self):
@@ -1423,19 +1309,11 @@ class JediTaskSpec(object):
 
     # get max number of jobs
     def get_max_num_jobs(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxNumJobs"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("maxNumJobs")
 
     # get total number of jobs
     def get_total_num_jobs(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["totNumJobs"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("totNumJobs")
 
     # use only tags for fat container
     def use_only_tags_fc(self):
@@ -1454,11 +1332,7 @@ class JediTaskSpec(object):
 
     # check if first contents feed
     def is_first_contents_feed(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["firstContentsFeed"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None and tmpMatch.group(1) == self.FirstContentsFeed.TRUE.value:
-                return True
-        return False
+        return self.get_split_rule_digits("firstContentsFeed") == self.FirstContentsFeed.TRUE.value
 
     # check if work is segmented
     def is_work_segmented(self):
@@ -1486,11 +1360,7 @@ class JediTaskSpec(object):
 
     # get max core count
     def get_max_core_count(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxCoreCount"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("maxCoreCount")
 
     # push status changes
     def push_status_changes(self):
@@ -1526,11 +1396,7 @@ class JediTaskSpec(object):
 
     # get full chain flag
     def get_full_chain(self):
-        if self.splitRule:
-            tmpMatch = re.search(self.splitRuleToken["fullChain"] + r"=(\d+)", self.splitRule)
-            if tmpMatch:
-                return tmpMatch.group(1)
-        return None
+        return self.get_split_rule_digits("fullChain")
 
     # check full chain with mode
     def check_full_chain_with_mode(self, mode):
@@ -1554,22 +1420,11 @@ class JediTaskSpec(object):
 
     # get RAM for retry
     def get_ram_for_retry(self, current_ram):
-        if not self.splitRule:
-            return None
-        tmpMatch = re.search(self.splitRuleToken["retryRamOffset"] + r"=(\d+)", self.splitRule)
-        if not tmpMatch:
+        offset = self.get_split_rule_int("retryRamOffset")
+        if offset is None:
             return None
-        offset = int(tmpMatch.group(1))
-        tmpMatch = re.search(self.splitRuleToken["retryRamStep"] + r"=(\d+)", self.splitRule)
-        if tmpMatch:
-            step = int(tmpMatch.group(1))
-        else:
-            step = 0
-        tmpMatch = re.search(self.splitRuleToken["retryRamMax"] + r"=(\d+)", self.splitRule)
-        if tmpMatch:
-            max_ram = int(tmpMatch.group(1))
-        else:
-            max_ram = None
+        step = self.get_split_rule_int("retryRamStep", 0)
+        max_ram = self.get_split_rule_int("retryRamMax")
         if not current_ram:
             return current_ram
         if current_ram < offset:
@@ -1586,18 +1441,10 @@ class JediTaskSpec(object):
 
     # get number of events per input
     def get_num_events_per_input(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["nEventsPerInput"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("nEventsPerInput")
 
     def get_max_events_per_job(self):
-        if self.splitRule is not None:
-            tmpMatch = re.search(self.splitRuleToken["maxEventsPerJob"] + "=(\d+)", self.splitRule)
-            if tmpMatch is not None:
-                return int(tmpMatch.group(1))
-        return None
+        return self.get_split_rule_int("maxEventsPerJob")
 
     # set order input by
     def set_order_input_by(self, mode):
@@ -1609,11 +1456,8 @@ class JediTaskSpec(object):
 
     # get full chain flag
     def order_input_by(self):
-        if self.splitRule:
-            tmpMatch = re.search(self.splitRuleToken["orderInputBy"] + r"=(\d+)", self.splitRule)
-            if tmpMatch:
-                if tmpMatch.group(1) == self.OrderInputBy.eventsAlignment:
-                    return "eventsAlignment"
+        if self.get_split_rule_digits("orderInputBy") == self.OrderInputBy.eventsAlignment:
+            return "eventsAlignment"
         return None
 
     # check if intermediate task
@@ -1642,12 +1486,61 @@ class JediTaskSpec(object):
 # utils
 
 
+# pattern of numeric values in split rule
+_split_rule_digits_pattern = re.compile(r"\d+")
+
+
+# split rule parsed into values per token
+class SplitRuleView(object):
+    """
+    Immutable view of a split rule string like "NF=10,DE=rucio". values maps each token to the first non-empty raw value
+    of the token, while numbers and digits map the token to the leading decimal number of the first value of the token
+    which starts with a number, as an integer and as a string respectively
+    """
+
+    __slots__ = ("split_rule", "values", "numbers", "digits")
+
+    def __init__(self, split_rule):
+        values = {}
+        numbers = {}
+        digits = {}
+        if split_rule:
+            for item in split_rule.split(","):
+                token, sep, value = item.partition("=")
+                if not sep:
+                    continue
+                if value:
+                    values.setdefault(token, value)
+                if token not in digits:
+                    tmpMatch = _split_rule_digits_pattern.match(value)
+                    if tmpMatch is not None:
+                        digits[token] = tmpMatch.group(0)
+                        numbers[token] = int(digits[token])
+        object.__setattr__(self, "split_rule", split_rule)
+        object.__setattr__(self, "values", types.MappingProxyType(values))
+        object.__setattr__(self, "numbers", types.MappingProxyType(numbers))
+        object.__setattr__(self, "digits", types.MappingProxyType(digits))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SplitRuleView is immutable")
+
+
+# parse split rule. The view is cached per split rule string, so that it is renewed when the split rule changes
+@functools.lru_cache(maxsize=4096)
+def parse_split_rule(split_rule):
+    """
+    :param split_rule: split rule string or None
+    :return: SplitRuleView
+    """
+    return SplitRuleView(split_rule)
+
+
 # check split rule with positive integer
 def check_split_rule_positive_int(key, split_rule):
     if not split_rule:
         return False
-    tmpMatch = re.search(JediTaskSpec.splitRuleToken[key] + r"=(\d+)", split_rule)
-    if not tmpMatch or int(tmpMatch.group(1)) <= 0:
+    value = parse_split_rule(split_rule).numbers.get(JediTaskSpec.splitRuleToken[key])
+    if not value or value <= 0:
         return False
     return True
 
@@ -10,6 +10,7 @@ import re
 from pandacommon.pandautils.PandaUtils import naive_utcnow
 
 from pandaserver.taskbuffer.FileSpec import FileSpec
+from pandaserver.taskbuffer.SpecAttribute import SpecAttribute, install_attributes
 
 reserveChangedState = False
 
@@ -144,8 +145,10 @@ class JobSpec(object):
         "cpu_architecture_level",
         "outputFileType",
     )
-    # slots
-    __slots__ = _attributes + ("Files", "_changedAttrs", "_reserveChangedState")
+    # index of attributes
+    _attributeIndex = {attr: i for i, attr in enumerate(_attributes)}
+    # slots. attribute values are stored in an array with a bitmap of changed attributes
+    __slots__ = ("_values", "_changed", "Files", "_reserveChangedState")
     # attributes which have 0 by default
     _zeroAttrs = (
         "assignedPriority",
@@ -229,37 +232,22 @@ class JobSpec(object):
     # constructor
     def __init__(self):
         # install attributes
-        for attr in self._attributes:
-            object.__setattr__(self, attr, None)
+        self._values = ["NULL"] * len(self._attributes)
         # files list
-        object.__setattr__(self, "Files", [])
-        # map of changed attributes
-        object.__setattr__(self, "_changedAttrs", {})
+        self.Files = []
+        # bitmap of changed attributes
+        self._changed = 0
         # reserve changed state at instance level
-        object.__setattr__(self, "_reserveChangedState", False)
-
-    # override __getattribute__ for SQL
-    def __getattribute__(self, name):
-        ret = object.__getattribute__(self, name)
-        if ret is None:
-            return "NULL"
-        return ret
+        self._reserveChangedState = False
 
-    # override __setattr__ to collecte the changed attributes
-    def __setattr__(self, name, value):
-        oldVal = getattr(self, name)
-        object.__setattr__(self, name, value)
-        newVal = getattr(self, name)
-        if name == "jobStatus":
-            if oldVal != newVal:
-                self.stateChangeTime = naive_utcnow()
-        # collect changed attributes
-        if oldVal != newVal and name not in self._suppAttrs:
-            self._changedAttrs[name] = value
+    # map of changed attributes
+    @property
+    def _changedAttrs(self):
+        return {attr: self._values[i] for i, attr in enumerate(self._attributes) if self._changed >> i & 1}
 
     # reset changed attribute list
     def resetChangedList(self):
-        object.__setattr__(self, "_changedAttrs", {})
+        self._changed = 0
 
     # add File to files list
     def addFile(self, file):
@@ -270,29 +258,22 @@ class JobSpec(object):
 
     # pack tuple into JobSpec
     def pack(self, values):
-        for i in range(len(self._attributes)):
-            attr = self._attributes[i]
-            val = values[i]
-            object.__setattr__(self, attr, val)
+        self._values = ["NULL" if val is None else val for val in values[: len(self._attributes)]]
 
     # return a tuple of values
     def values(self):
-        ret = []
-        for attr in self._attributes:
-            val = getattr(self, attr)
-            ret.append(val)
-        return tuple(ret)
+        return tuple(self._values)
 
     # return map of values
     def valuesMap(self, useSeq=False, onlyChanged=False):
         ret = {}
-        for attr in self._attributes:
+        for i, attr in enumerate(self._attributes):
             if useSeq and attr in self._seqAttrMap:
                 continue
             if onlyChanged:
-                if attr not in self._changedAttrs:
+                if not self._changed >> i & 1:
                     continue
-            val = getattr(self, attr)
+            val = self._values[i]
             if val == "NULL":
                 if attr in self._zeroAttrs:
                     val = 0
@@ -310,10 +291,7 @@ class JobSpec(object):
 
     # return state values to be pickled
     def __getstate__(self):
-        state = []
-        for attr in self._attributes:
-            val = getattr(self, attr)
-            state.append(val)
+        state = list(self._values)
         if reserveChangedState or self._reserveChangedState:
             state.append(self._changedAttrs)
         # append File info
@@ -322,19 +300,17 @@ class JobSpec(object):
 
     # restore state from the unpickled state values
     def __setstate__(self, state):
-        for i in range(len(self._attributes)):
-            # schema evolution is supported only when adding attributes
-            if i + 1 < len(state):
-                object.__setattr__(self, self._attributes[i], state[i])
-            else:
-                object.__setattr__(self, self._attributes[i], "NULL")
-        object.__setattr__(self, "Files", state[-1])
+        # schema evolution is supported only when adding attributes
+        n_state = len(state)
+        self._values = ["NULL" if i + 1 >= n_state or state[i] is None else state[i] for i in range(len(self._attributes))]
+        self.Files = state[-1]
         if not hasattr(self, "_reserveChangedState"):
-            object.__setattr__(self, "_reserveChangedState", False)
+            self._reserveChangedState = False
+        self._changed = 0
         if reserveChangedState or self._reserveChangedState:
-            object.__setattr__(self, "_changedAttrs", state[-2])
-        else:
-            object.__setattr__(self, "_changedAttrs", {})
+            for attr in state[-2]:
+                if attr in self._attributeIndex:
+                    self._changed |= 1 << self._attributeIndex[attr]
 
     # return column names for INSERT or full SELECT
     def columnNames(cls):
@@ -423,8 +399,8 @@ class JobSpec(object):
     # return an expression of bind variables for UPDATE to update only changed attributes
     def bindUpdateChangesExpression(self):
         ret = ""
-        for attr in self._attributes:
-            if attr in self._changedAttrs:
+        for i, attr in enumerate(self._attributes):
+            if self._changed >> i & 1:
                 ret += f"{attr}=:{attr},"
         ret = ret[:-1]
         ret += " "
@@ -912,10 +888,8 @@ class JobSpec(object):
     def load_from_dict(self, job_dict):
         # Extract job attributes (excluding files)
         job_attrs = []
-        for slot in self.__slots__:
-            if slot == "Files":  # skip files here
-                continue
-            job_attrs.append(job_dict.get(slot, None))
+        for attr in self._attributes:
+            job_attrs.append(job_dict.get(attr, None))
 
         # Initialize with empty file list
         self.__setstate__(job_attrs + [[]])
@@ -923,7 +897,7 @@ class JobSpec(object):
         # Add files
         for file_data in job_dict.get("Files", []):
             file_spec = FileSpec()
-            file_spec.__setstate__([file_data.get(s, None) for s in file_spec.__slots__])
+            file_spec.__setstate__([file_data.get(attr, None) for attr in file_spec._attributes] + [None])
             self.addFile(file_spec)
 
     # set input and output file types
@@ -1004,3 +978,17 @@ def get_task_queued_time(special_handling):
     except Exception:
         pass
     return None
+
+
+# jobStatus updates stateChangeTime when it is changed
+class JobStatusAttribute(SpecAttribute):
+    __slots__ = ()
+
+    def __set__(self, obj, value):
+        old_value = obj._values[self.index]
+        SpecAttribute.__set__(self, obj, value)
+        if old_value != obj._values[self.index]:
+            obj.stateChangeTime = naive_utcnow()
+
+
+install_attributes(JobSpec, untracked=JobSpec._suppAttrs, special={"jobStatus": JobStatusAttribute})
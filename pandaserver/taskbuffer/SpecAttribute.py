@@ -0,0 +1,50 @@
+"""
+descriptors for column attributes of array-backed specs
+
+"""
+
+
+class SpecAttribute(object):
+    """
+    Descriptor of a column attribute stored in the value array of a spec.
+    None is stored as "NULL" so that reading an attribute is a plain index lookup,
+    and changes are recorded in the bitmap of changed attributes
+    """
+
+    __slots__ = ("name", "index", "bit", "tracked")
+
+    def __init__(self, name, index, tracked=True):
+        self.name = name
+        self.index = index
+        self.bit = 1 << index
+        self.tracked = tracked
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj._values[self.index]
+
+    def __set__(self, obj, value):
+        if value is None:
+            value = "NULL"
+        values = obj._values
+        old_value = values[self.index]
+        values[self.index] = value
+        # collect changed attributes
+        if self.tracked and old_value != value:
+            obj._changed |= self.bit
+
+
+def install_attributes(cls, untracked=(), special=None):
+    """
+    Install descriptors for the column attributes of a spec class
+
+    :param cls: spec class with _attributes
+    :param untracked: attributes of which changes are not recorded
+    :param special: map of attribute name to descriptor class which overrides SpecAttribute
+    """
+    if special is None:
+        special = {}
+    for index, name in enumerate(cls._attributes):
+        attribute_class = special.get(name, SpecAttribute)
+        setattr(cls, name, attribute_class(name, index, name not in untracked))
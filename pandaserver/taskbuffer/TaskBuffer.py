@@ -988,6 +988,21 @@ class TaskBuffer:
                     retJobs.append(None)
         return retJobs
 
+    # peek at jobs in bulk
+    def peek_jobs_in_bulk(self, panda_ids, from_defined=True, from_active=True, from_archived=True, from_waiting=True, for_anal=False):
+        with self.proxyPool.get() as proxy:
+            ret_map = proxy.peek_jobs_in_bulk(panda_ids, from_defined, from_active, from_archived, from_waiting, for_anal)
+        if ret_map is None:
+            return None
+        # None for jobs not found or invalid IDs as in peekJobs
+        ret_jobs = []
+        for panda_id in panda_ids:
+            try:
+                ret_jobs.append(ret_map.get(int(panda_id)))
+            except Exception:
+                ret_jobs.append(None)
+        return ret_jobs
+
     # get PandaIDs with TaskID
     def getPandaIDsWithTaskID(self, jediTaskID):
         # get DBproxy
@@ -1667,6 +1682,14 @@ class TaskBuffer:
             ret = proxy.getEventRanges(pandaID, jobsetID, jediTaskID, nRanges, acceptJson, scattered, segment_id)
         return ret
 
+    # get lists of event ranges for multiple PandaIDs
+    def get_event_ranges_bulk(self, job_list, accept_json, scattered, segment_id):
+        # get proxy
+        with self.proxyPool.get() as proxy:
+            # exec
+            ret = proxy.get_event_ranges_bulk(job_list, accept_json, scattered, segment_id)
+        return ret
+
     # update an even range
     def updateEventRange(self, eventRangeID, eventStatus, cpuCore, cpuConsumptionTime, objstoreID=None):
         eventDict = {}
@@ -2508,6 +2531,24 @@ class TaskBuffer:
             ret = proxy.unlockJobOutputReport(panda_id, attempt_nr, pid, lock_offset)
         return ret
 
+    # lock job output reports in bulk and get their records
+    def lock_job_output_reports(self, reports, pid, time_limit, get_data=True):
+        with self.proxyPool.get() as proxy:
+            ret = proxy.lock_job_output_reports(reports, pid, time_limit, get_data)
+        return ret
+
+    # delete job output reports in bulk
+    def delete_job_output_reports(self, reports):
+        with self.proxyPool.get() as proxy:
+            ret = proxy.delete_job_output_reports(reports)
+        return ret
+
+    # measure the round trip time to the DB
+    def get_db_round_trip_time(self):
+        with self.proxyPool.get() as proxy:
+            ret = proxy.get_round_trip_time()
+        return ret
+
     # list pandaID and attemptNr of job output report
     def listJobOutputReport(
         self,
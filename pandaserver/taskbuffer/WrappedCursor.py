@@ -5,11 +5,15 @@ WrappedCursor for a generic database connection proxy
 
 import os
 import re
+import time
 import warnings
+from collections import OrderedDict
+from threading import Lock
 
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 
 from pandaserver.config import panda_config
+from pandaserver.srvcore import request_metrics
 
 warnings.filterwarnings("ignore")
 
@@ -28,137 +32,177 @@ def extract_table_names(sql):
     return table_names
 
 
-# convert SQL and parameters in_printf format
-def convert_query_in_printf_format(sql, var_dict_list, sql_conv_map):
-    if sql in sql_conv_map:
-        sql = sql_conv_map[sql]
-    else:
-        old_sql = sql
-        if var_dict_list:
-            var_dict = var_dict_list[0]
-        else:
-            var_dict = {}
-        # %
-        sql = re.sub(r"%", r"%%", sql)
-        # current date except for being used for interval
-        if re.search(r"CURRENT_DATE\s*[\+-]", sql, flags=re.IGNORECASE) is None:
-            sql = re.sub(r"CURRENT_DATE", r"CURRENT_TIMESTAMP", sql, flags=re.IGNORECASE)
-        # sequence
-        sql = re.sub(r"""([^ $,()]+).currval""", r"currval('\1')", sql, flags=re.IGNORECASE)
-        sql = re.sub(r"""([^ $,()]+).nextval""", r"nextval('\1')", sql, flags=re.IGNORECASE)
-        # returning
-        sql = re.sub(r"(RETURNING\s+\S+\s+)INTO\s+\S+", r"\1", sql, flags=re.IGNORECASE)
-        # sub query + rownum
-        sql = re.sub(r"\)\s+WHERE\s+rownum", r") tmp_sub WHERE rownum", sql, flags=re.IGNORECASE)
-        # sub query + GROUP BY
-        if re.search(r"FROM\s+\(\s*SELECT", sql, flags=re.IGNORECASE):
-            sql = re.sub(r"\)\s+GROUP\s+BY", r") tmp_sub GROUP BY", sql, flags=re.IGNORECASE)
-        # rownum
-        sql = re.sub(
-            r"(WHERE|AND)\s+rownum[^\d:]+(\d+|:[^ \)]+)",
-            r" LIMIT \2",
-            sql,
-            flags=re.IGNORECASE,
-        )
-        # NVL
-        sql = re.sub(r"NVL\(", r"COALESCE(", sql, flags=re.IGNORECASE)
-        # random
-        sql = re.sub(r"DBMS_RANDOM.value", r"RANDOM()", sql, flags=re.IGNORECASE)
-        # MINUS
-        sql = re.sub(r" MINUS ", r" EXCEPT ", sql, flags=re.IGNORECASE)
-        # GENERATE_SERIES
-        sql = re.sub(
-            r"\(SELECT\s+level\s+FROM\s+dual\s+CONNECT\s+BY\s+level\s*<=\s*(:[^ \)]+)\)*",
-            r"GENERATE_SERIES(1,\1)",
-            sql,
-            flags=re.IGNORECASE,
-        )
-        # dual
-        sql = re.sub(r"FROM dual", "", sql, flags=re.IGNORECASE)
-        # json
-        if "/* use_json_type */" in sql:
-            # remove \n to make regexp easier
-            sql = re.sub(r"\n", r" ", sql)
-            # collect table names
-            table_names = set(extract_table_names(sql))
-            checked_items = set()
-            # look for a.b(.c)*
-            for item in re.findall(r"(\w+\.\w+\.*\w*)", sql):
-                # skip if already checked
-                if item in checked_items:
-                    continue
-                checked_items.add(item)
-                item_l = item.lower()
-                # ignore tables
-                if item_l in table_names:
-                    continue
-                # ignore float
-                if item.replace(".", "", 1).isdigit():
-                    continue
-                to_skip = False
-                new_pat = None
-                # check if table.column.field
-                for table_name in table_names:
-                    if item_l.startswith(f"{table_name}."):
-                        item_body = re.sub(f"^{table_name}" + r"\.", "", item, flags=re.IGNORECASE)
-                        # no json field
-                        if item_body.count(".") == 0:
-                            to_skip = True
-                            break
-                        # convert . to ->>''
-                        new_body = re.sub(r"\.(?P<pat>\w+)", r"->>'\1'", item_body)
-                        # prepend the table name
-                        new_pat = ".".join(item.split(".")[: -(1 + item_body.count("."))]) + "." + new_body
-                        break
-                # ignore table.column
-                if to_skip:
-                    continue
-                old_pat = item
-                # colum.field
-                if not new_pat:
-                    new_pat = re.sub(r"\.(?P<pat>\w+)", r"->>'\1'", item)
-                # guess type
-                right_vals = re.findall(old_pat + r"\s*[=<>!*]+\s*([\w:\']+)", sql)
-                for right_val in right_vals:
-                    # string
-                    if "'" in right_val:
+# convert SQL in printf format and get the list of bind variable names in the order of placeholders
+def convert_query_in_printf_format(sql, var_dict):
+    # %
+    sql = re.sub(r"%", r"%%", sql)
+    # current date except for being used for interval
+    if re.search(r"CURRENT_DATE\s*[\+-]", sql, flags=re.IGNORECASE) is None:
+        sql = re.sub(r"CURRENT_DATE", r"CURRENT_TIMESTAMP", sql, flags=re.IGNORECASE)
+    # sequence
+    sql = re.sub(r"""([^ $,()]+).currval""", r"currval('\1')", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"""([^ $,()]+).nextval""", r"nextval('\1')", sql, flags=re.IGNORECASE)
+    # returning
+    sql = re.sub(r"(RETURNING\s+\S+\s+)INTO\s+\S+", r"\1", sql, flags=re.IGNORECASE)
+    # sub query + rownum
+    sql = re.sub(r"\)\s+WHERE\s+rownum", r") tmp_sub WHERE rownum", sql, flags=re.IGNORECASE)
+    # sub query + GROUP BY
+    if re.search(r"FROM\s+\(\s*SELECT", sql, flags=re.IGNORECASE):
+        sql = re.sub(r"\)\s+GROUP\s+BY", r") tmp_sub GROUP BY", sql, flags=re.IGNORECASE)
+    # rownum
+    sql = re.sub(
+        r"(WHERE|AND)\s+rownum[^\d:]+(\d+|:[^ \)]+)",
+        r" LIMIT \2",
+        sql,
+        flags=re.IGNORECASE,
+    )
+    # NVL
+    sql = re.sub(r"NVL\(", r"COALESCE(", sql, flags=re.IGNORECASE)
+    # random
+    sql = re.sub(r"DBMS_RANDOM.value", r"RANDOM()", sql, flags=re.IGNORECASE)
+    # MINUS
+    sql = re.sub(r" MINUS ", r" EXCEPT ", sql, flags=re.IGNORECASE)
+    # GENERATE_SERIES
+    sql = re.sub(
+        r"\(SELECT\s+level\s+FROM\s+dual\s+CONNECT\s+BY\s+level\s*<=\s*(:[^ \)]+)\)*",
+        r"GENERATE_SERIES(1,\1)",
+        sql,
+        flags=re.IGNORECASE,
+    )
+    # dual
+    sql = re.sub(r"FROM dual", "", sql, flags=re.IGNORECASE)
+    # json
+    if "/* use_json_type */" in sql:
+        # remove \n to make regexp easier
+        sql = re.sub(r"\n", r" ", sql)
+        # collect table names
+        table_names = set(extract_table_names(sql))
+        checked_items = set()
+        # look for a.b(.c)*
+        for item in re.findall(r"(\w+\.\w+\.*\w*)", sql):
+            # skip if already checked
+            if item in checked_items:
+                continue
+            checked_items.add(item)
+            item_l = item.lower()
+            # ignore tables
+            if item_l in table_names:
+                continue
+            # ignore float
+            if item.replace(".", "", 1).isdigit():
+                continue
+            to_skip = False
+            new_pat = None
+            # check if table.column.field
+            for table_name in table_names:
+                if item_l.startswith(f"{table_name}."):
+                    item_body = re.sub(f"^{table_name}" + r"\.", "", item, flags=re.IGNORECASE)
+                    # no json field
+                    if item_body.count(".") == 0:
+                        to_skip = True
                         break
-                    # integer
-                    if right_val.isdigit():
+                    # convert . to ->>''
+                    new_body = re.sub(r"\.(?P<pat>\w+)", r"->>'\1'", item_body)
+                    # prepend the table name
+                    new_pat = ".".join(item.split(".")[: -(1 + item_body.count("."))]) + "." + new_body
+                    break
+            # ignore table.column
+            if to_skip:
+                continue
+            old_pat = item
+            # colum.field
+            if not new_pat:
+                new_pat = re.sub(r"\.(?P<pat>\w+)", r"->>'\1'", item)
+            # guess type
+            right_vals = re.findall(old_pat + r"\s*[=<>!*]+\s*([\w:\']+)", sql)
+            for right_val in right_vals:
+                # string
+                if "'" in right_val:
+                    break
+                # integer
+                if right_val.isdigit():
+                    new_pat = f"CAST({new_pat} AS integer)"
+                    break
+                # float
+                if right_val.replace(".", "", 1).isdigit():
+                    new_pat = f"CAST({new_pat} AS float)"
+                    break
+                # bind variable
+                if right_val.startswith(":"):
+                    if right_val not in var_dict:
+                        raise KeyError(f"{right_val} is missing to guess data type")
+                    if isinstance(var_dict[right_val], int):
                         new_pat = f"CAST({new_pat} AS integer)"
                         break
-                    # float
-                    if right_val.replace(".", "", 1).isdigit():
+                    if isinstance(var_dict[right_val], float):
                         new_pat = f"CAST({new_pat} AS float)"
                         break
-                    # bind variable
-                    if right_val.startswith(":"):
-                        if right_val not in var_dict:
-                            raise KeyError(f"{right_val} is missing to guess data type")
-                        if isinstance(var_dict[right_val], int):
-                            new_pat = f"CAST({new_pat} AS integer)"
-                            break
-                        if isinstance(var_dict[right_val], float):
-                            new_pat = f"CAST({new_pat} AS float)"
-                            break
-                # replace
-                print(old_pat, new_pat)
-                sql = sql.replace(old_pat, new_pat)
-            # cache
-            sql_conv_map[old_sql] = sql
+            # replace
+            print(old_pat, new_pat)
+            sql = sql.replace(old_pat, new_pat)
     # extract placeholders
-    params_list = []
     items = re.findall(r":[^ $,)\+\-\n]+", sql)
-    for var_dict in var_dict_list:
-        params = []
-        for item in items:
-            if item not in var_dict:
-                raise KeyError(f"{item} is missing in SQL parameters")
-            params.append(var_dict[item])
-        params_list.append(params)
     # using the printf style syntax
     sql = re.sub(":[^ $,)\+\-]+", "%s", sql)
-    return sql, params_list
+    return sql, items
+
+
+# get parameters in the order of placeholders
+def get_params_in_order(bind_names, var_dict):
+    try:
+        return [var_dict[item] for item in bind_names]
+    except KeyError as e:
+        raise KeyError(f"{e.args[0]} is missing in SQL parameters")
+
+
+# cache of translated SQL statements
+class SQLTranslationCache:
+    """
+    Bounded LRU cache of SQL statements translated for the backend.
+    Keys are the raw SQL and the set of bind variable names, and values are the translated SQL and the list of bind variable names
+    in the order of placeholders, so that each execution only needs to reorder values
+    """
+
+    # constructor
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.lock = Lock()
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # get translated SQL
+    def get(self, key):
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.cache.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    # add translated SQL
+    def put(self, key, entry):
+        with self.lock:
+            self.cache[key] = entry
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+
+    # get statistics
+    def get_stats(self):
+        with self.lock:
+            return {"size": len(self.cache), "max_size": self.max_size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+# process-wide cache shared by cursors
+if hasattr(panda_config, "sql_translation_cache_size"):
+    sql_translation_cache = SQLTranslationCache(int(panda_config.sql_translation_cache_size))
+else:
+    sql_translation_cache = SQLTranslationCache(4096)
 
 
 # proxy
@@ -178,8 +222,6 @@ class WrappedCursor(object):
             self.dump = True
         else:
             self.dump = False
-        # SQL conversion map
-        self.sql_conv_map = {}
         # executemany
         if self.backend == "postgres":
             from psycopg2.extras import execute_batch
@@ -236,24 +278,29 @@ class WrappedCursor(object):
             self.execute("SET autocommit=0")
         return hostname
 
+    # execute query on cursor and record the time for request metrics
+    def execute(self, sql, varDict=None, cur=None):
+        start_time = time.monotonic()
+        try:
+            return self._execute(sql, varDict, cur)
+        finally:
+            request_metrics.add_db_time(time.monotonic() - start_time)
+
     # execute query on cursor
-    def execute(self, sql, varDict=None, cur=None):  # , returningInto=None
+    def _execute(self, sql, varDict=None, cur=None):  # , returningInto=None
         if varDict is None:
             varDict = {}
         if cur is None:
             cur = self.cur
         ret = None
-        # schema names
-        sql = self.change_schema(sql)
-        # remove `
-        sql = re.sub("`", "", sql)
+        if self.dump and self.backend == "postgres":
+            _logger.debug(f"OLD: {sql} {str(varDict)}")
+        # schema names, ` removal, and conversion for the backend
+        sql, bind_names = self.translate(sql, varDict, True)
         if self.backend == "oracle":
             ret = cur.execute(sql, varDict)
         elif self.backend == "postgres":
-            if self.dump:
-                _logger.debug(f"OLD: {sql} {str(varDict)}")
-            sql, vars_list = convert_query_in_printf_format(sql, [varDict], self.sql_conv_map)
-            varList = vars_list[0]
+            varList = get_params_in_order(bind_names, varDict)
             if self.dump:
                 _logger.debug(f"NEW: {sql} {str(varList)}")
             ret = cur.execute(sql, varList)
@@ -433,13 +480,24 @@ class WrappedCursor(object):
     def prepare(self, statement):
         self.statement = statement
 
-    # executemany
+    # executemany and record the time for request metrics
     def executemany(self, sql, params):
+        start_time = time.monotonic()
+        try:
+            return self._executemany(sql, params)
+        finally:
+            request_metrics.add_db_time(time.monotonic() - start_time)
+
+    # executemany
+    def _executemany(self, sql, params):
         if sql is None:
             sql = self.statement
-        sql = self.change_schema(sql)
+        if params:
+            sql, bind_names = self.translate(sql, params[0], False)
+        else:
+            sql, bind_names = self.translate(sql, {}, False)
         if self.backend == "postgres":
-            sql, vars_list = convert_query_in_printf_format(sql, params, self.sql_conv_map)
+            vars_list = [get_params_in_order(bind_names, var_dict) for var_dict in params]
             self.alt_executemany(self.cur, sql, vars_list)
         else:
             self.cur.executemany(sql, params)
@@ -463,6 +521,34 @@ class WrappedCursor(object):
     def arraysize(self, val):
         self.cur.arraysize = val
 
+    # translate SQL for the backend
+    def translate(self, sql, var_dict, remove_backquote):
+        """
+        Translate SQL for the backend using the process-wide cache
+
+        :param sql: raw SQL
+        :param var_dict: dictionary of bind variables
+        :param remove_backquote: True to remove backquotes
+        :return: translated SQL and the list of bind variable names in the order of placeholders for postgres, or None for other backends
+        """
+        key = (sql, frozenset(var_dict), remove_backquote)
+        entry = sql_translation_cache.get(key)
+        if entry is None:
+            # schema names
+            new_sql = self.change_schema(sql)
+            # remove `
+            if remove_backquote:
+                new_sql = re.sub("`", "", new_sql)
+            if self.backend == "postgres":
+                new_sql, bind_names = convert_query_in_printf_format(new_sql, var_dict)
+                # check parameters here since later executions with the same key have the same parameters
+                get_params_in_order(bind_names, var_dict)
+            else:
+                bind_names = None
+            entry = (new_sql, bind_names)
+            sql_translation_cache.put(key, entry)
+        return entry
+
     # change schema
     def change_schema(self, sql):
         if panda_config.schemaPANDA != "ATLAS_PANDA":
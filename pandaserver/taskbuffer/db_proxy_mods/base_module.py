@@ -474,6 +474,23 @@ class BaseModule:
                 time.sleep(1)
                 self.connect(reconnect=True)
 
+    # measure the round trip time to the DB
+    def get_round_trip_time(self):
+        """
+        Measure the round trip time to the DB by pinging the connection
+
+        :return: round trip time in seconds, or None if failed
+        """
+        comment = " /* DBProxy.get_round_trip_time */"
+        try:
+            start_time = time.monotonic()
+            self.conn.ping()
+            return time.monotonic() - start_time
+        except Exception:
+            tmp_log = self.create_tagged_logger(comment)
+            self.dump_error_message(tmp_log)
+            return None
+
     # transaction as a context manager
     @contextmanager
     def transaction(self, name: str):
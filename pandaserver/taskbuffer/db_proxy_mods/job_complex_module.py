@@ -29,6 +29,7 @@ from pandaserver.taskbuffer.db_proxy_mods.task_event_module import get_task_even
 from pandaserver.taskbuffer.db_proxy_mods.worker_module import get_worker_module
 from pandaserver.taskbuffer.FileSpec import FileSpec
 from pandaserver.taskbuffer.JobSpec import JobSpec, get_task_queued_time
+from pandaserver.taskbuffer.Utils import create_shards
 
 
 # Module class to define job-related methods that use another module's methods or serve as their dependencies
@@ -2152,6 +2153,440 @@ class JobComplexModule(BaseModule):
 
         return sql_where_clause, get_val_map
 
+    # claim activated jobs in bulk for getJobs
+    def claim_jobs_in_bulk(
+        self,
+        n_jobs,
+        site_name,
+        candidate_sql,
+        candidate_var_map,
+        node,
+        computing_element,
+        scheduler_id,
+        background,
+        prod_source_label,
+        harvester_id,
+        worker_id,
+        time_start,
+        tmp_log,
+    ):
+        """
+        Claim up to n_jobs activated jobs in one transaction instead of locking and updating them one by one.
+        The candidate set is selected once, a batch of rows is locked while skipping rows locked by concurrent
+        getJobs calls, and the batch is flipped to sent with array binds. nSent and the job-worker mapping
+        for Harvester are also handled once per batch.
+
+        :param n_jobs: maximum number of jobs to claim
+        :param site_name: computing site
+        :param candidate_sql: SQL to select candidate PandaIDs, currentPriority and specialHandling ordered by preference
+        :param candidate_var_map: bind variables for candidate_sql
+        :param node: modification host
+        :param computing_element: computing element to be set in the jobs or None
+        :param scheduler_id: scheduler ID to be set in the jobs or None
+        :param background: True if the jobs can run in the background
+        :param prod_source_label: prodSourceLabel in the request
+        :param harvester_id: harvester ID or None
+        :param worker_id: worker ID or None
+        :param time_start: start time of the getJobs call
+        :param tmp_log: logger
+        :return: list of claimed PandaIDs in the candidate order, nSent
+        """
+        comment = " /* DBProxy.claim_jobs_in_bulk */"
+        claimed_panda_ids = []
+        n_sent = 0
+        # start transaction
+        self.conn.begin()
+        # select candidates
+        tmp_log.debug(candidate_sql + comment + str(candidate_var_map))
+        self.cur.arraysize = 100000
+        self.cur.execute(candidate_sql + comment, candidate_var_map)
+        candidate_panda_ids = [tmp_panda_id for tmp_panda_id, _, _ in self.cur.fetchall()]
+        if not candidate_panda_ids:
+            tmp_log.debug("no PandaIDs")
+            if not self._commit():
+                raise RuntimeError("Commit error")
+            return claimed_panda_ids, n_sent
+        # lock candidates while skipping rows already locked by other getJobs calls
+        if self.backend in ["oracle", "postgres"]:
+            lock_option = "FOR UPDATE SKIP LOCKED"
+        else:
+            lock_option = "FOR UPDATE"
+        locked_panda_ids = set()
+        for shard in create_shards(candidate_panda_ids, 500):
+            panda_id_var_names_str, panda_id_var_map = get_sql_IN_bind_variables(shard, prefix=":PandaID")
+            sql_lock = f"SELECT PandaID FROM ATLAS_PANDA.jobsActive4 WHERE PandaID IN ({panda_id_var_names_str}) AND jobStatus=:oldJobStatus {lock_option} "
+            panda_id_var_map[":oldJobStatus"] = "activated"
+            self.cur.execute(sql_lock + comment, panda_id_var_map)
+            for (tmp_panda_id,) in self.cur.fetchall():
+                locked_panda_ids.add(tmp_panda_id)
+        # keep the candidate order and release the rest of locked rows at commit
+        claimed_panda_ids = [tmp_panda_id for tmp_panda_id in candidate_panda_ids if tmp_panda_id in locked_panda_ids][:n_jobs]
+        tmp_log.debug(f"locked {len(locked_panda_ids)} of {len(candidate_panda_ids)} candidates to claim {len(claimed_panda_ids)} jobs")
+        if claimed_panda_ids:
+            # update
+            sql_update = "UPDATE ATLAS_PANDA.jobsActive4 "
+            sql_update += "SET jobStatus=:newJobStatus,modificationTime=CURRENT_DATE,modificationHost=:modificationHost,startTime=CURRENT_DATE"
+            common_var_map = {":newJobStatus": "sent", ":oldJobStatus": "activated", ":modificationHost": node}
+            if computing_element is not None:
+                sql_update += ",computingElement=:computingElement"
+                common_var_map[":computingElement"] = computing_element
+            if scheduler_id is not None:
+                sql_update += ",schedulerID=:schedulerID"
+                common_var_map[":schedulerID"] = scheduler_id
+            if background is not True:
+                sql_update += ",jobExecutionID=0"
+            sql_update += " WHERE PandaID=:PandaID AND jobStatus=:oldJobStatus"
+            var_maps = []
+            for tmp_panda_id in claimed_panda_ids:
+                var_map = copy.copy(common_var_map)
+                var_map[":PandaID"] = tmp_panda_id
+                var_maps.append(var_map)
+            for shard in create_shards(var_maps, 100):
+                self.cur.executemany(sql_update + comment, shard)
+            # get nSent for production jobs
+            if prod_source_label in [None, "managed"]:
+                sql_sent = "SELECT count(*) FROM ATLAS_PANDA.jobsActive4 WHERE jobStatus=:jobStatus "
+                sql_sent += "AND prodSourceLabel IN (:prodSourceLabel1,:prodSourceLabel2) "
+                sql_sent += "AND computingSite=:computingSite "
+                sql_sent += "AND modificationTime>:modificationTime "
+                var_map = {
+                    ":jobStatus": "sent",
+                    ":computingSite": site_name,
+                    ":modificationTime": time_start - datetime.timedelta(seconds=60),
+                    ":prodSourceLabel1": "managed",
+                    ":prodSourceLabel2": "test",
+                }
+                self.cur.execute(sql_sent + comment, var_map)
+                res_sent = self.cur.fetchone()
+                if res_sent is not None:
+                    (n_sent,) = res_sent
+            # insert job and worker mapping
+            if harvester_id is not None and worker_id is not None:
+                # insert worker if missing
+                get_worker_module(self).updateWorkers(
+                    harvester_id,
+                    [
+                        {
+                            "workerID": worker_id,
+                            "nJobs": 1,
+                            "status": "running",
+                            "lastUpdate": naive_utcnow(),
+                        }
+                    ],
+                    useCommit=False,
+                )
+                sql_harvester = "SELECT 1 FROM ATLAS_PANDA.Harvester_Instances WHERE harvester_ID=:harvesterID "
+                self.cur.execute(sql_harvester + comment, {":harvesterID": harvester_id})
+                if self.cur.fetchone() is None:
+                    tmp_log.debug(f"Site {site_name} harvester_id={harvester_id} not found")
+                else:
+                    # get existing mappings
+                    existing_panda_ids = set()
+                    for shard in create_shards(claimed_panda_ids, 500):
+                        panda_id_var_names_str, var_map = get_sql_IN_bind_variables(shard, prefix=":PandaID")
+                        sql_check = "SELECT PandaID FROM ATLAS_PANDA.Harvester_Rel_Jobs_Workers "
+                        sql_check += f"WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID IN ({panda_id_var_names_str}) "
+                        var_map[":harvesterID"] = harvester_id
+                        var_map[":workerID"] = worker_id
+                        self.cur.execute(sql_check + comment, var_map)
+                        for (tmp_panda_id,) in self.cur.fetchall():
+                            existing_panda_ids.add(tmp_panda_id)
+                    # insert or update
+                    sql_insert = "INSERT INTO ATLAS_PANDA.Harvester_Rel_Jobs_Workers (harvesterID,workerID,PandaID,lastUpdate) "
+                    sql_insert += "VALUES (:harvesterID,:workerID,:PandaID,:lastUpdate) "
+                    sql_update_rel = "UPDATE ATLAS_PANDA.Harvester_Rel_Jobs_Workers SET lastUpdate=:lastUpdate "
+                    sql_update_rel += "WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID=:PandaID "
+                    time_now = naive_utcnow()
+                    var_maps_insert = []
+                    var_maps_update = []
+                    for tmp_panda_id in claimed_panda_ids:
+                        var_map = {":harvesterID": harvester_id, ":workerID": worker_id, ":PandaID": tmp_panda_id, ":lastUpdate": time_now}
+                        if tmp_panda_id in existing_panda_ids:
+                            var_maps_update.append(var_map)
+                        else:
+                            var_maps_insert.append(var_map)
+                    for shard in create_shards(var_maps_insert, 100):
+                        self.cur.executemany(sql_insert + comment, shard)
+                    for shard in create_shards(var_maps_update, 100):
+                        self.cur.executemany(sql_update_rel + comment, shard)
+        # commit
+        if not self._commit():
+            raise RuntimeError("Commit error")
+        return claimed_panda_ids, n_sent
+
+    # claim an activated job for getJobs by locking and updating candidates one by one
+    def claim_job(
+        self,
+        siteName,
+        sql_where_clause,
+        sorting_sql,
+        getValMapOrig,
+        maxAttemptIDx,
+        node,
+        computingElement,
+        schedulerID,
+        background,
+        prodSourceLabel,
+        harvester_id,
+        worker_id,
+        timeStart,
+        timeLimit,
+        nSent,
+        tmp_log,
+    ):
+        """
+        Select candidates and claim the first one which can be locked and updated to sent
+
+        :param siteName: computing site
+        :param sql_where_clause: WHERE clause to select candidates
+        :param sorting_sql: SQL for sorting criteria or None
+        :param getValMapOrig: bind variables for the candidate selection
+        :param maxAttemptIDx: maximum number of candidates to try
+        :param node: modification host
+        :param computingElement: computing element to be set in the job or None
+        :param schedulerID: scheduler ID to be set in the job or None
+        :param background: True if the job can run in the background
+        :param prodSourceLabel: prodSourceLabel in the request
+        :param harvester_id: harvester ID or None
+        :param worker_id: worker ID or None
+        :param timeStart: start time of the getJobs call
+        :param timeLimit: time limit of the getJobs call
+        :param nSent: the number of sent jobs so far
+        :param tmp_log: logger
+        :return: PandaID or 0 if no job was claimed, return from update, and the number of sent jobs
+        """
+        comment = " /* DBProxy.getJobs */"
+        getValMap = copy.copy(getValMapOrig)
+        pandaID = 0
+
+        nTry = 1
+        for iTry in range(nTry):
+            # set siteID
+            tmpSiteID = siteName
+            # get file lock
+            tmp_log.debug("lock")
+            if (naive_utcnow() - timeStart) < timeLimit:
+                toGetPandaIDs = True
+                pandaIDs = []
+                specialHandlingMap = {}
+
+                if toGetPandaIDs:
+                    # get PandaIDs
+                    sqlP = "SELECT /*+ INDEX_RS_ASC(tab (PRODSOURCELABEL COMPUTINGSITE JOBSTATUS) ) */ PandaID,currentPriority,specialHandling FROM ATLAS_PANDA.jobsActive4 tab "
+                    sqlP += sql_where_clause
+
+                    if sorting_sql:
+                        sqlP = "SELECT * FROM (" + sqlP
+                        sqlP += sorting_sql
+
+                    tmp_log.debug(sqlP + comment + str(getValMap))
+                    # start transaction
+                    self.conn.begin()
+                    # select
+                    self.cur.arraysize = 100000
+                    self.cur.execute(sqlP + comment, getValMap)
+                    resIDs = self.cur.fetchall()
+                    # commit
+                    if not self._commit():
+                        raise RuntimeError("Commit error")
+
+                    for (
+                        tmpPandaID,
+                        tmpCurrentPriority,
+                        tmpSpecialHandling,
+                    ) in resIDs:
+                        pandaIDs.append(tmpPandaID)
+                        specialHandlingMap[tmpPandaID] = tmpSpecialHandling
+
+                if pandaIDs == []:
+                    tmp_log.debug("no PandaIDs")
+                    retU = 0  # retU: return from update
+                else:
+                    # update
+                    for indexID, tmpPandaID in enumerate(pandaIDs):
+                        # max attempts
+                        if indexID > maxAttemptIDx:
+                            break
+                        # lock first
+                        sqlPL = "SELECT jobStatus FROM ATLAS_PANDA.jobsActive4 " "WHERE PandaID=:PandaID FOR UPDATE NOWAIT "
+                        # update
+                        sqlJ = "UPDATE ATLAS_PANDA.jobsActive4 "
+                        sqlJ += "SET jobStatus=:newJobStatus,modificationTime=CURRENT_DATE,modificationHost=:modificationHost,startTime=CURRENT_DATE"
+                        varMap = {}
+                        varMap[":PandaID"] = tmpPandaID
+                        varMap[":newJobStatus"] = "sent"
+                        varMap[":oldJobStatus"] = "activated"
+                        varMap[":modificationHost"] = node
+                        # set CE
+                        if computingElement is not None:
+                            sqlJ += ",computingElement=:computingElement"
+                            varMap[":computingElement"] = computingElement
+                        # set schedulerID
+                        if schedulerID is not None:
+                            sqlJ += ",schedulerID=:schedulerID"
+                            varMap[":schedulerID"] = schedulerID
+
+                        # background flag
+                        if background is not True:
+                            sqlJ += ",jobExecutionID=0"
+                        sqlJ += " WHERE PandaID=:PandaID AND jobStatus=:oldJobStatus"
+                        # SQL to get nSent
+                        sentLimit = timeStart - datetime.timedelta(seconds=60)
+                        sqlSent = "SELECT count(*) FROM ATLAS_PANDA.jobsActive4 WHERE jobStatus=:jobStatus "
+                        sqlSent += "AND prodSourceLabel IN (:prodSourceLabel1,:prodSourceLabel2) "
+                        sqlSent += "AND computingSite=:computingSite "
+                        sqlSent += "AND modificationTime>:modificationTime "
+                        varMapSent = {}
+                        varMapSent[":jobStatus"] = "sent"
+                        varMapSent[":computingSite"] = tmpSiteID
+                        varMapSent[":modificationTime"] = sentLimit
+                        varMapSent[":prodSourceLabel1"] = "managed"
+                        varMapSent[":prodSourceLabel2"] = "test"
+
+                        # start transaction
+                        self.conn.begin()
+                        # pre-lock
+                        prelocked = False
+                        try:
+                            varMapPL = {":PandaID": tmpPandaID}
+                            tmp_log.debug(sqlPL + comment + str(varMapPL))
+                            self.cur.execute(sqlPL + comment, varMapPL)
+                            prelocked = True
+                        except Exception:
+                            tmp_log.debug("cannot pre-lock")
+                        # update
+                        if prelocked:
+                            tmp_log.debug(sqlJ + comment + str(varMap))
+                            self.cur.execute(sqlJ + comment, varMap)
+                            retU = self.cur.rowcount
+                            tmp_log.debug(f"retU={retU}")
+                        else:
+                            retU = 0
+                        if retU != 0:
+                            # get nSent for production jobs
+                            if prodSourceLabel in [None, "managed"]:
+                                tmp_log.debug(sqlSent + comment + str(varMapSent))
+                                self.cur.execute(sqlSent + comment, varMapSent)
+                                resSent = self.cur.fetchone()
+                                if resSent is not None:
+                                    (nSent,) = resSent
+                            # insert job and worker mapping
+                            if harvester_id is not None and worker_id is not None:
+                                # insert worker if missing
+                                get_worker_module(self).updateWorkers(
+                                    harvester_id,
+                                    [
+                                        {
+                                            "workerID": worker_id,
+                                            "nJobs": 1,
+                                            "status": "running",
+                                            "lastUpdate": naive_utcnow(),
+                                        }
+                                    ],
+                                    useCommit=False,
+                                )
+                                # insert mapping
+                                sqlJWH = "SELECT 1 FROM ATLAS_PANDA.Harvester_Instances WHERE harvester_ID=:harvesterID "
+
+                                sqlJWC = "SELECT PandaID FROM ATLAS_PANDA.Harvester_Rel_Jobs_Workers "
+                                sqlJWC += "WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID=:PandaID "
+
+                                sqlJWI = "INSERT INTO ATLAS_PANDA.Harvester_Rel_Jobs_Workers (harvesterID,workerID,PandaID,lastUpdate) "
+                                sqlJWI += "VALUES (:harvesterID,:workerID,:PandaID,:lastUpdate) "
+
+                                sqlJWU = "UPDATE ATLAS_PANDA.Harvester_Rel_Jobs_Workers SET lastUpdate=:lastUpdate "
+                                sqlJWU += "WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID=:PandaID "
+
+                                varMap = dict()
+                                varMap[":harvesterID"] = harvester_id
+
+                                self.cur.execute(sqlJWH + comment, varMap)
+                                resJWH = self.cur.fetchone()
+                                if resJWH is None:
+                                    tmp_log.debug(f"getJobs : Site {tmpSiteID} harvester_id={harvester_id} not found")
+                                else:
+                                    varMap = dict()
+                                    varMap[":harvesterID"] = harvester_id
+                                    varMap[":workerID"] = worker_id
+                                    varMap[":PandaID"] = tmpPandaID
+                                    self.cur.execute(sqlJWC + comment, varMap)
+                                    resJWC = self.cur.fetchone()
+                                    varMap = dict()
+                                    varMap[":harvesterID"] = harvester_id
+                                    varMap[":workerID"] = worker_id
+                                    varMap[":PandaID"] = tmpPandaID
+                                    varMap[":lastUpdate"] = naive_utcnow()
+                                    if resJWC is None:
+                                        # insert
+                                        self.cur.execute(sqlJWI + comment, varMap)
+                                    else:
+                                        # update
+                                        self.cur.execute(sqlJWU + comment, varMap)
+                        # commit
+                        if not self._commit():
+                            raise RuntimeError("Commit error")
+                        # succeeded
+                        if retU != 0:
+                            pandaID = tmpPandaID
+                            break
+            else:
+                tmp_log.debug("do nothing")
+                retU = 0
+            # release file lock
+            tmp_log.debug("unlock")
+            # succeeded
+            if retU != 0:
+                break
+            if iTry + 1 < nTry:
+                # time.sleep(0.5)
+                pass
+        # failed to UPDATE
+        if retU == 0:
+            # reset pandaID
+            pandaID = 0
+        return pandaID, retU, nSent
+
+    # release jobs claimed in bulk which were not returned to the pilot
+    def release_claimed_jobs(self, panda_ids, node, harvester_id, worker_id, tmp_log):
+        """
+        Reset jobs claimed by claim_jobs_in_bulk back to activated so that they are dispatched again instead of being
+        failed by the Sent Watcher. Jobs already changed by others are left as they are
+
+        :param panda_ids: list of PandaIDs to release
+        :param node: modification host set when the jobs were claimed
+        :param harvester_id: harvester ID or None
+        :param worker_id: worker ID or None
+        :param tmp_log: logger
+        """
+        if not panda_ids:
+            return
+        comment = " /* DBProxy.release_claimed_jobs */"
+        tmp_log.debug(f"releasing {len(panda_ids)} claimed jobs")
+        try:
+            # start transaction
+            self.conn.begin()
+            sql_release = "UPDATE ATLAS_PANDA.jobsActive4 SET jobStatus=:newJobStatus,modificationTime=CURRENT_DATE "
+            sql_release += "WHERE PandaID=:PandaID AND jobStatus=:oldJobStatus AND modificationHost=:modificationHost "
+            var_maps = [{":PandaID": panda_id, ":newJobStatus": "activated", ":oldJobStatus": "sent", ":modificationHost": node} for panda_id in panda_ids]
+            for shard in create_shards(var_maps, 100):
+                self.cur.executemany(sql_release + comment, shard)
+            # delete job and worker mapping
+            if harvester_id is not None and worker_id is not None:
+                sql_delete_rel = "DELETE FROM ATLAS_PANDA.Harvester_Rel_Jobs_Workers "
+                sql_delete_rel += "WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID=:PandaID "
+                var_maps = [{":harvesterID": harvester_id, ":workerID": worker_id, ":PandaID": panda_id} for panda_id in panda_ids]
+                for shard in create_shards(var_maps, 100):
+                    self.cur.executemany(sql_delete_rel + comment, shard)
+            # commit
+            if not self._commit():
+                raise RuntimeError("Commit error")
+            tmp_log.debug(f"released PandaIDs={panda_ids}")
+        except Exception:
+            # roll back
+            self._rollback()
+            tmp_log.error(f"failed to release claimed jobs PandaIDs={panda_ids}")
+            self.dump_error_message(tmp_log)
+
     # get jobs
     def getJobs(
         self,
@@ -2174,12 +2609,16 @@ class JobComplexModule(BaseModule):
         is_gu,
         via_topic,
         remaining_time,
+        bulk_mode=None,
     ):
         """
         1. Construct where clause (sql_where_clause) based on applicable filters for request
         2. Select n jobs with the highest priorities and the lowest pandaids
-        3. Update the jobs to status SENT
+        3. Update the jobs to status SENT, one by one or in bulk
         4. Pack the files and if jobs are AES also the event ranges
+
+        bulk_mode: True to claim all jobs in one lock/update round-trip, False to claim jobs one by one,
+                   or None to follow jobdispatch:BULK_GET_JOBS in the config table
         """
         comment = " /* DBProxy.getJobs */"
         timeStart = naive_utcnow()
@@ -2240,8 +2679,18 @@ class JobComplexModule(BaseModule):
             remaining_time=remaining_time,
         )
 
+        # check if jobs are claimed in bulk
+        if bulk_mode is None:
+            bulk_mode = self.getConfigValue("jobdispatch", "BULK_GET_JOBS") is True
+        use_bulk_claim = bulk_mode and nJobs > 1
+        if use_bulk_claim:
+            tmp_log.debug("bulk claim")
+            maxCandidates = nJobs + maxAttemptIDx
+        else:
+            maxCandidates = maxAttemptIDx
+
         # get the sorting criteria (global shares, age, etc.)
-        sorting_sql, sorting_varmap = get_entity_module(self).getSortingCriteria(siteName, maxAttemptIDx)
+        sorting_sql, sorting_varmap = get_entity_module(self).getSortingCriteria(siteName, maxCandidates)
         if sorting_varmap:  # copy the var map, but not the sql, since it has to be at the very end
             for tmp_key in sorting_varmap:
                 getValMap[tmp_key] = sorting_varmap[tmp_key]
@@ -2249,200 +2698,68 @@ class JobComplexModule(BaseModule):
         retJobs = []
         nSent = 0
         getValMapOrig = copy.copy(getValMap)
+        # jobs claimed in bulk
+        claimedPandaIDs = None
 
         try:
             timeLimit = datetime.timedelta(seconds=timeout - 10)
 
+            # claim jobs in bulk
+            if use_bulk_claim:
+                if (naive_utcnow() - timeStart) < timeLimit:
+                    sqlP = "SELECT /*+ INDEX_RS_ASC(tab (PRODSOURCELABEL COMPUTINGSITE JOBSTATUS) ) */ PandaID,currentPriority,specialHandling FROM ATLAS_PANDA.jobsActive4 tab "
+                    sqlP += sql_where_clause
+                    if sorting_sql:
+                        sqlP = "SELECT * FROM (" + sqlP
+                        sqlP += sorting_sql
+                    claimedPandaIDs, nSent = self.claim_jobs_in_bulk(
+                        nJobs,
+                        siteName,
+                        sqlP,
+                        copy.copy(getValMapOrig),
+                        node,
+                        computingElement,
+                        schedulerID,
+                        background,
+                        prodSourceLabel,
+                        harvester_id,
+                        worker_id,
+                        timeStart,
+                        tmp_log,
+                    )
+                else:
+                    tmp_log.debug("do nothing")
+                    claimedPandaIDs = []
+
             # get nJobs
             for iJob in range(nJobs):
-                getValMap = copy.copy(getValMapOrig)
-                pandaID = 0
-
-                nTry = 1
-                for iTry in range(nTry):
-                    # set siteID
-                    tmpSiteID = siteName
-                    # get file lock
-                    tmp_log.debug("lock")
-                    if (naive_utcnow() - timeStart) < timeLimit:
-                        toGetPandaIDs = True
-                        pandaIDs = []
-                        specialHandlingMap = {}
-
-                        if toGetPandaIDs:
-                            # get PandaIDs
-                            sqlP = "SELECT /*+ INDEX_RS_ASC(tab (PRODSOURCELABEL COMPUTINGSITE JOBSTATUS) ) */ PandaID,currentPriority,specialHandling FROM ATLAS_PANDA.jobsActive4 tab "
-                            sqlP += sql_where_clause
-
-                            if sorting_sql:
-                                sqlP = "SELECT * FROM (" + sqlP
-                                sqlP += sorting_sql
-
-                            tmp_log.debug(sqlP + comment + str(getValMap))
-                            # start transaction
-                            self.conn.begin()
-                            # select
-                            self.cur.arraysize = 100000
-                            self.cur.execute(sqlP + comment, getValMap)
-                            resIDs = self.cur.fetchall()
-                            # commit
-                            if not self._commit():
-                                raise RuntimeError("Commit error")
-
-                            for (
-                                tmpPandaID,
-                                tmpCurrentPriority,
-                                tmpSpecialHandling,
-                            ) in resIDs:
-                                pandaIDs.append(tmpPandaID)
-                                specialHandlingMap[tmpPandaID] = tmpSpecialHandling
-
-                        if pandaIDs == []:
-                            tmp_log.debug("no PandaIDs")
-                            retU = 0  # retU: return from update
-                        else:
-                            # update
-                            for indexID, tmpPandaID in enumerate(pandaIDs):
-                                # max attempts
-                                if indexID > maxAttemptIDx:
-                                    break
-                                # lock first
-                                sqlPL = "SELECT jobStatus FROM ATLAS_PANDA.jobsActive4 " "WHERE PandaID=:PandaID FOR UPDATE NOWAIT "
-                                # update
-                                sqlJ = "UPDATE ATLAS_PANDA.jobsActive4 "
-                                sqlJ += "SET jobStatus=:newJobStatus,modificationTime=CURRENT_DATE,modificationHost=:modificationHost,startTime=CURRENT_DATE"
-                                varMap = {}
-                                varMap[":PandaID"] = tmpPandaID
-                                varMap[":newJobStatus"] = "sent"
-                                varMap[":oldJobStatus"] = "activated"
-                                varMap[":modificationHost"] = node
-                                # set CE
-                                if computingElement is not None:
-                                    sqlJ += ",computingElement=:computingElement"
-                                    varMap[":computingElement"] = computingElement
-                                # set schedulerID
-                                if schedulerID is not None:
-                                    sqlJ += ",schedulerID=:schedulerID"
-                                    varMap[":schedulerID"] = schedulerID
-
-                                # background flag
-                                if background is not True:
-                                    sqlJ += ",jobExecutionID=0"
-                                sqlJ += " WHERE PandaID=:PandaID AND jobStatus=:oldJobStatus"
-                                # SQL to get nSent
-                                sentLimit = timeStart - datetime.timedelta(seconds=60)
-                                sqlSent = "SELECT count(*) FROM ATLAS_PANDA.jobsActive4 WHERE jobStatus=:jobStatus "
-                                sqlSent += "AND prodSourceLabel IN (:prodSourceLabel1,:prodSourceLabel2) "
-                                sqlSent += "AND computingSite=:computingSite "
-                                sqlSent += "AND modificationTime>:modificationTime "
-                                varMapSent = {}
-                                varMapSent[":jobStatus"] = "sent"
-                                varMapSent[":computingSite"] = tmpSiteID
-                                varMapSent[":modificationTime"] = sentLimit
-                                varMapSent[":prodSourceLabel1"] = "managed"
-                                varMapSent[":prodSourceLabel2"] = "test"
-
-                                # start transaction
-                                self.conn.begin()
-                                # pre-lock
-                                prelocked = False
-                                try:
-                                    varMapPL = {":PandaID": tmpPandaID}
-                                    tmp_log.debug(sqlPL + comment + str(varMapPL))
-                                    self.cur.execute(sqlPL + comment, varMapPL)
-                                    prelocked = True
-                                except Exception:
-                                    tmp_log.debug("cannot pre-lock")
-                                # update
-                                if prelocked:
-                                    tmp_log.debug(sqlJ + comment + str(varMap))
-                                    self.cur.execute(sqlJ + comment, varMap)
-                                    retU = self.cur.rowcount
-                                    tmp_log.debug(f"retU={retU}")
-                                else:
-                                    retU = 0
-                                if retU != 0:
-                                    # get nSent for production jobs
-                                    if prodSourceLabel in [None, "managed"]:
-                                        tmp_log.debug(sqlSent + comment + str(varMapSent))
-                                        self.cur.execute(sqlSent + comment, varMapSent)
-                                        resSent = self.cur.fetchone()
-                                        if resSent is not None:
-                                            (nSent,) = resSent
-                                    # insert job and worker mapping
-                                    if harvester_id is not None and worker_id is not None:
-                                        # insert worker if missing
-                                        get_worker_module(self).updateWorkers(
-                                            harvester_id,
-                                            [
-                                                {
-                                                    "workerID": worker_id,
-                                                    "nJobs": 1,
-                                                    "status": "running",
-                                                    "lastUpdate": naive_utcnow(),
-                                                }
-                                            ],
-                                            useCommit=False,
-                                        )
-                                        # insert mapping
-                                        sqlJWH = "SELECT 1 FROM ATLAS_PANDA.Harvester_Instances WHERE harvester_ID=:harvesterID "
-
-                                        sqlJWC = "SELECT PandaID FROM ATLAS_PANDA.Harvester_Rel_Jobs_Workers "
-                                        sqlJWC += "WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID=:PandaID "
-
-                                        sqlJWI = "INSERT INTO ATLAS_PANDA.Harvester_Rel_Jobs_Workers (harvesterID,workerID,PandaID,lastUpdate) "
-                                        sqlJWI += "VALUES (:harvesterID,:workerID,:PandaID,:lastUpdate) "
-
-                                        sqlJWU = "UPDATE ATLAS_PANDA.Harvester_Rel_Jobs_Workers SET lastUpdate=:lastUpdate "
-                                        sqlJWU += "WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID=:PandaID "
-
-                                        varMap = dict()
-                                        varMap[":harvesterID"] = harvester_id
-
-                                        self.cur.execute(sqlJWH + comment, varMap)
-                                        resJWH = self.cur.fetchone()
-                                        if resJWH is None:
-                                            tmp_log.debug(f"getJobs : Site {tmpSiteID} harvester_id={harvester_id} not found")
-                                        else:
-                                            varMap = dict()
-                                            varMap[":harvesterID"] = harvester_id
-                                            varMap[":workerID"] = worker_id
-                                            varMap[":PandaID"] = tmpPandaID
-                                            self.cur.execute(sqlJWC + comment, varMap)
-                                            resJWC = self.cur.fetchone()
-                                            varMap = dict()
-                                            varMap[":harvesterID"] = harvester_id
-                                            varMap[":workerID"] = worker_id
-                                            varMap[":PandaID"] = tmpPandaID
-                                            varMap[":lastUpdate"] = naive_utcnow()
-                                            if resJWC is None:
-                                                # insert
-                                                self.cur.execute(sqlJWI + comment, varMap)
-                                            else:
-                                                # update
-                                                self.cur.execute(sqlJWU + comment, varMap)
-                                # commit
-                                if not self._commit():
-                                    raise RuntimeError("Commit error")
-                                # succeeded
-                                if retU != 0:
-                                    pandaID = tmpPandaID
-                                    break
+                if claimedPandaIDs is not None:
+                    # use a job claimed in bulk
+                    if iJob < len(claimedPandaIDs):
+                        pandaID = claimedPandaIDs[iJob]
+                        retU = 1
                     else:
-                        tmp_log.debug("do nothing")
+                        pandaID = 0
                         retU = 0
-                    # release file lock
-                    tmp_log.debug("unlock")
-                    # succeeded
-                    if retU != 0:
-                        break
-                    if iTry + 1 < nTry:
-                        # time.sleep(0.5)
-                        pass
-                # failed to UPDATE
-                if retU == 0:
-                    # reset pandaID
-                    pandaID = 0
+                else:
+                    pandaID, retU, nSent = self.claim_job(
+                        siteName,
+                        sql_where_clause,
+                        sorting_sql,
+                        getValMapOrig,
+                        maxAttemptIDx,
+                        node,
+                        computingElement,
+                        schedulerID,
+                        background,
+                        prodSourceLabel,
+                        harvester_id,
+                        worker_id,
+                        timeStart,
+                        timeLimit,
+                        nSent,
+                        tmp_log,
+                    )
                 tmp_log.debug(f"retU {retU} : PandaID {pandaID} - {prodSourceLabel}")
                 if pandaID == 0:
                     break
@@ -2766,11 +3083,17 @@ class JobComplexModule(BaseModule):
                     tmp_log.debug("delete job message")
                     mb_proxy_queue = self.get_mb_proxy("panda_pilot_queue")
                     srv_msg_utils.delete_job_message(mb_proxy_queue, job.PandaID)
+            # release jobs claimed in bulk but not returned since the loop ended early
+            if claimedPandaIDs:
+                self.release_claimed_jobs(claimedPandaIDs[len(retJobs) :], node, harvester_id, worker_id, tmp_log)
             return retJobs, nSent
         except Exception as e:
             self.dump_error_message(tmp_log)
             # roll back
             self._rollback()
+            # release all jobs claimed in bulk since none of them are returned
+            if claimedPandaIDs:
+                self.release_claimed_jobs(claimedPandaIDs, node, harvester_id, worker_id, tmp_log)
             return [], 0
 
     # record retry history
@@ -13,6 +13,7 @@ from pandaserver.taskbuffer import EventServiceUtils, JobUtils
 from pandaserver.taskbuffer.db_proxy_mods.base_module import BaseModule
 from pandaserver.taskbuffer.FileSpec import FileSpec
 from pandaserver.taskbuffer.JobSpec import JobSpec
+from pandaserver.taskbuffer.Utils import create_shards
 
 
 # Module class to define miscellaneous job-related methods that are independent of another module's methods
@@ -574,6 +575,98 @@ class JobStandaloneModule(BaseModule):
                 job.jobStatus = "unknown"
                 return job
 
+    # peek at jobs in bulk
+    def peek_jobs_in_bulk(self, panda_ids, from_defined, from_active, from_archived, from_waiting, for_anal=False):
+        """
+        Peek at jobs in bulk with IN-list queries instead of a set of queries per job like peekJob
+
+        :param panda_ids: list of PandaIDs
+        :param from_defined: True to look up jobsDefined4
+        :param from_active: True to look up jobsActive4
+        :param from_archived: True to look up jobsArchived4
+        :param from_waiting: True to look up jobsDefined4 for waiting jobs
+        :param for_anal: True to read metadata of jobs in all tables
+        :return: dictionary of PandaID and JobSpec for jobs found, or None if failed
+        """
+        comment = " /* DBProxy.peek_jobs_in_bulk */"
+        tmp_log = self.create_tagged_logger(comment)
+        tmp_log.debug(f"start for {len(panda_ids)} jobs")
+        try:
+            ret_map = {}
+            # only int
+            ids_to_find = set()
+            for panda_id in panda_ids:
+                try:
+                    ids_to_find.add(int(panda_id))
+                except Exception:
+                    pass
+            tables = []
+            if from_defined or from_waiting:
+                tables.append("ATLAS_PANDA.jobsDefined4")
+            if from_active:
+                tables.append("ATLAS_PANDA.jobsActive4")
+            if from_archived:
+                tables.append("ATLAS_PANDA.jobsArchived4")
+            for table in tables:
+                if not ids_to_find:
+                    break
+                for shard in create_shards(sorted(ids_to_find), 100):
+                    panda_id_var_names_str, var_map = get_sql_IN_bind_variables(shard, prefix=":PandaID")
+                    # start transaction
+                    self.conn.begin()
+                    # jobs
+                    sql_job = f"SELECT {JobSpec.columnNames()} FROM {table} WHERE PandaID IN ({panda_id_var_names_str}) "
+                    self.cur.arraysize = 1000
+                    self.cur.execute(sql_job + comment, var_map)
+                    job_map = {}
+                    for res in self.cur.fetchall():
+                        job = JobSpec()
+                        job.pack(res)
+                        job.jobParameters = None
+                        job.metadata = None
+                        job_map[job.PandaID] = job
+                    if job_map:
+                        panda_id_var_names_str, var_map = get_sql_IN_bind_variables(sorted(job_map), prefix=":PandaID")
+                        # files
+                        sql_file = f"SELECT {FileSpec.columnNames()} FROM ATLAS_PANDA.filesTable4 WHERE PandaID IN ({panda_id_var_names_str}) "
+                        self.cur.arraysize = 10000
+                        self.cur.execute(sql_file + comment, var_map)
+                        for res in self.cur.fetchall():
+                            file_spec = FileSpec()
+                            file_spec.pack(res)
+                            job_map[file_spec.PandaID].addFile(file_spec)
+                        # metadata
+                        if table == "ATLAS_PANDA.jobsArchived4" or for_anal:
+                            sql_meta = f"SELECT PandaID,metaData FROM ATLAS_PANDA.metaTable WHERE PandaID IN ({panda_id_var_names_str}) "
+                            self.cur.execute(sql_meta + comment, var_map)
+                            for panda_id, clob_meta in self.cur.fetchall():
+                                if clob_meta is not None:
+                                    try:
+                                        job_map[panda_id].metadata = clob_meta.read()
+                                    except AttributeError:
+                                        job_map[panda_id].metadata = str(clob_meta)
+                        # job parameters
+                        sql_job_params = f"SELECT PandaID,jobParameters FROM ATLAS_PANDA.jobParamsTable WHERE PandaID IN ({panda_id_var_names_str}) "
+                        self.cur.execute(sql_job_params + comment, var_map)
+                        for panda_id, clob_job_params in self.cur.fetchall():
+                            if clob_job_params is not None:
+                                try:
+                                    job_map[panda_id].jobParameters = clob_job_params.read()
+                                except AttributeError:
+                                    job_map[panda_id].jobParameters = str(clob_job_params)
+                    # commit
+                    if not self._commit():
+                        raise RuntimeError("Commit error")
+                    ret_map.update(job_map)
+                    ids_to_find.difference_update(job_map)
+            tmp_log.debug(f"found {len(ret_map)} jobs")
+            return ret_map
+        except Exception:
+            # roll back
+            self._rollback()
+            self.dump_error_message(tmp_log)
+            return None
+
     # get express jobs
     def getExpressJobs(self, dn):
         comment = " /* DBProxy.getExpressJobs */"
@@ -2448,6 +2541,114 @@ class JobStandaloneModule(BaseModule):
             self.dump_error_message(tmp_log)
             return retVal
 
+    # lock job output reports in bulk and get their records
+    def lock_job_output_reports(self, reports, pid, time_limit, get_data=True):
+        """
+        Lock job output reports in bulk, skipping records locked by other processes, and get the records of locked reports.
+        Reports already locked by the same locker are locked again to refresh the lock
+
+        :param reports: list of (PandaID, attemptNr)
+        :param pid: locker ID
+        :param time_limit: lock older than time_limit minutes is regarded as expired
+        :param get_data: False to skip the data column, e.g. when the lock is refreshed
+        :return: list of dictionaries of locked records, or None if failed
+        """
+        comment = " /* DBProxy.lock_job_output_reports */"
+        tmp_log = self.create_tagged_logger(comment, f"pid={pid}")
+        tmp_log.debug(f"start for {len(reports)} reports")
+        try:
+            ret_list = []
+            reports = sorted(set(reports))
+            if self.backend in ["oracle", "postgres"]:
+                lock_option = "FOR UPDATE SKIP LOCKED"
+            else:
+                lock_option = "FOR UPDATE"
+            # sql to update lock
+            sql_lock = (
+                f"UPDATE {panda_config.schemaPANDA}.Job_Output_Report SET lockedBy=:lockedBy, lockedTime=:lockedTime "
+                "WHERE PandaID=:PandaID AND attemptNr=:attemptNr "
+            )
+            # start transaction
+            self.conn.begin()
+            locked_time = naive_utcnow() - datetime.timedelta(minutes=time_limit)
+            utc_now = naive_utcnow()
+            for shard in create_shards(reports, 100):
+                # only the given attempts are locked, not other attempts of the same jobs
+                var_map = {}
+                conditions = []
+                for idx, (panda_id, attempt_nr) in enumerate(shard):
+                    conditions.append(f"(PandaID=:PandaID{idx} AND attemptNr=:attemptNr{idx})")
+                    var_map[f":PandaID{idx}"] = panda_id
+                    var_map[f":attemptNr{idx}"] = attempt_nr
+                sql_get = (
+                    f"SELECT PandaID,prodSourceLabel,jobStatus,attemptNr,{'data' if get_data else 'NULL'},timeStamp,lockedBy,lockedTime "
+                    f"FROM {panda_config.schemaPANDA}.Job_Output_Report "
+                    f"WHERE ({' OR '.join(conditions)}) "
+                    f"AND (lockedBy IS NULL OR lockedBy=:lockedBy OR lockedTime<:lockedTime) {lock_option} "
+                )
+                var_map[":lockedBy"] = pid
+                var_map[":lockedTime"] = locked_time
+                self.cur.execute(sql_get + comment, var_map)
+                var_maps = []
+                for panda_id, prod_source_label, job_status, attempt_nr, data, time_stamp, locked_by, tmp_locked_time in self.cur.fetchall():
+                    ret_list.append(
+                        {
+                            "PandaID": panda_id,
+                            "prodSourceLabel": prod_source_label,
+                            "jobStatus": job_status,
+                            "attemptNr": attempt_nr,
+                            "timeStamp": time_stamp,
+                            "data": data,
+                            "lockedBy": pid,
+                            "lockedTime": utc_now,
+                        }
+                    )
+                    var_maps.append({":PandaID": panda_id, ":attemptNr": attempt_nr, ":lockedBy": pid, ":lockedTime": utc_now})
+                if var_maps:
+                    self.cur.executemany(sql_lock + comment, var_maps)
+            # commit
+            if not self._commit():
+                raise RuntimeError("Commit error")
+            tmp_log.debug(f"locked {len(ret_list)} reports")
+            return ret_list
+        except Exception:
+            # roll back
+            self._rollback()
+            # error
+            self.dump_error_message(tmp_log)
+            return None
+
+    # delete job output reports in bulk
+    def delete_job_output_reports(self, reports):
+        """
+        Delete job output reports in bulk
+
+        :param reports: list of (PandaID, attemptNr)
+        :return: True if succeeded, False otherwise
+        """
+        comment = " /* DBProxy.delete_job_output_reports */"
+        tmp_log = self.create_tagged_logger(comment)
+        tmp_log.debug(f"start for {len(reports)} reports")
+        # sql to delete
+        sql_delete = f"DELETE FROM {panda_config.schemaPANDA}.Job_Output_Report WHERE PandaID=:PandaID AND attemptNr=:attemptNr "
+        try:
+            # start transaction
+            self.conn.begin()
+            var_maps = [{":PandaID": panda_id, ":attemptNr": attempt_nr} for panda_id, attempt_nr in reports]
+            for shard in create_shards(var_maps, 100):
+                self.cur.executemany(sql_delete + comment, shard)
+            # commit
+            if not self._commit():
+                raise RuntimeError("Commit error")
+            tmp_log.debug("done")
+            return True
+        except Exception:
+            # roll back
+            self._rollback()
+            # error
+            self.dump_error_message(tmp_log)
+            return False
+
     # list pandaID, jobStatus, attemptNr, timeStamp of job output report
     def listJobOutputReport(self, only_unlocked, time_limit, limit, grace_period, labels, anti_labels):
         comment = " /* DBProxy.listJobOutputReport */"
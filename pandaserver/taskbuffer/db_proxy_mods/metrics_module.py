@@ -9,6 +9,7 @@ from pandacommon.pandautils.PandaUtils import naive_utcnow
 
 from pandaserver.config import panda_config
 from pandaserver.srvcore import CoreUtils
+from pandaserver.taskbuffer import JobUtils
 from pandaserver.taskbuffer.db_proxy_mods.base_module import BaseModule
 from pandaserver.taskbuffer.JobSpec import JobSpec, get_task_queued_time
 
@@ -773,6 +774,58 @@ class MetricsModule(BaseModule):
             self.dump_error_message(tmpLog)
             return False, {}
 
+    def get_job_statistics_snapshot(self, vo):
+        """
+        This function will return the job statistics of all workqueues and global shares for a VO with a single grouped query,
+        together with the IDs of workqueues with the Resource function and the number of standby jobs defined in schedconfig.
+        Computing sites are kept only for starting jobs since they are needed for the dynamic number of standby jobs
+        :param vo: virtual organization
+        :return: True and a dictionary with "stats", "resource_queue_ids", and "standby", or False and an empty dictionary
+        """
+        comment = " /* DBProxy.get_job_statistics_snapshot */"
+        tmpLog = self.create_tagged_logger(comment, f"vo={vo}")
+        tmpLog.debug("start")
+
+        # sql to query on pre-cached job statistics tables (JOBS_SHARE_STATS and JOBSDEFINED_SHARE_STATS)
+        site_expr = "CASE WHEN jobstatus='starting' THEN computingsite ELSE NULL END"
+        sql_jt = f"SELECT gshare, workqueue_id, jobstatus, resource_type, {site_expr}, SUM(njobs) FROM ("
+        sql_jt += f"SELECT gshare, workqueue_id, jobstatus, resource_type, computingsite, njobs FROM {panda_config.schemaPANDA}.JOBS_SHARE_STATS WHERE vo=:vo "
+        sql_jt += "UNION ALL "
+        sql_jt += (
+            f"SELECT gshare, workqueue_id, jobstatus, resource_type, computingsite, njobs FROM {panda_config.schemaPANDA}.JOBSDEFINED_SHARE_STATS WHERE vo=:vo "
+        )
+        sql_jt += f") GROUP BY gshare, workqueue_id, jobstatus, resource_type, {site_expr} "
+
+        # sql to get workqueues with the Resource function
+        sql_rq = f"SELECT queue_id FROM {panda_config.schemaPANDA}.jedi_work_queue WHERE queue_function=:func "
+
+        # sql to get the number of standby jobs
+        sql_sb = f"SELECT /* use_json_type */ panda_queue, scj.data.catchall FROM {panda_config.schemaJEDI}.schedconfig_json scj "
+        sql_sb += "WHERE scj.data.status=:status "
+
+        return_map = {"stats": [], "resource_queue_ids": [], "standby": []}
+        try:
+            self.conn.begin()
+            self.cur.arraysize = 100000
+            self.cur.execute(sql_jt + comment, {":vo": vo})
+            return_map["stats"] = self.cur.fetchall()
+            self.cur.execute(sql_rq + comment, {":func": "Resource"})
+            return_map["resource_queue_ids"] = [queue_id for (queue_id,) in self.cur.fetchall()]
+            self.cur.execute(sql_sb + comment, {":status": "standby"})
+            for site_id, catchall in self.cur.fetchall():
+                num_map = JobUtils.parseNumStandby(catchall)
+                for wq_tag, resource_num in num_map.items():
+                    for resource_type, num in resource_num.items():
+                        return_map["standby"].append((site_id, wq_tag, resource_type, num))
+            if not self._commit():
+                raise RuntimeError("Commit error")
+            tmpLog.debug(f"done with {len(return_map['stats'])} rows")
+            return True, return_map
+        except Exception:
+            self._rollback()
+            self.dump_error_message(tmpLog)
+            return False, {}
+
     def getJobStatisticsByResourceTypeSite(self, workqueue):
         """
         This function will return the job statistics per site for a particular workqueue, broken down by resource type
@@ -320,6 +320,215 @@ class TaskEventModule(BaseModule):
             self.dump_error_message(tmp_log)
             return None
 
+    # get lists of event ranges for multiple PandaIDs
+    def get_event_ranges_bulk(self, job_list, accept_json, scattered, segment_id):
+        """
+        Get event ranges for multiple jobs. Event ranges are claimed for all jobs in a jobset in a single transaction,
+        while jumbo jobs are processed one by one as in getEventRanges
+
+        :param job_list: list of (PandaID, jobsetID, nRanges)
+        :param accept_json: False to get a JSON string of the dictionary
+        :param scattered: True to get scattered event ranges for jumbo jobs
+        :param segment_id: segment ID to get event ranges only from the dataset
+        :return: dictionary of PandaID and a list of event ranges. None for jobs of which event ranges failed to be retrieved
+        """
+        comment = " /* DBProxy.get_event_ranges_bulk */"
+        tmp_log = self.create_tagged_logger(comment, f"nJobs={len(job_list)}")
+        tmp_log.debug(f"start scattered={scattered} segment={segment_id}")
+        reg_start = naive_utcnow()
+        # sql to get jobs
+        sql_get_jobs = f"SELECT PandaID,jobStatus,commandToPilot,eventService,jediTaskID FROM {panda_config.schemaPANDA}.jobsActive4 "
+        sql_get_jobs += "WHERE PandaID IN ({0}) FOR UPDATE "
+        # sql to pre-lock ranges for all jobs with the first PandaID
+        sql_pre_lock = f"UPDATE {panda_config.schemaJEDI}.JEDI_Events tab "
+        sql_pre_lock += "SET PandaID=:pandaID,status=:newEventStatus "
+        sql_pre_lock += "WHERE (jediTaskID,PandaID,fileID,job_processID,attemptNr) IN ("
+        sql_pre_lock += "SELECT jediTaskID,PandaID,fileID,job_processID,attemptNr FROM ("
+        sql_pre_lock += "SELECT jediTaskID,PandaID,fileID,job_processID,attemptNr FROM "
+        sql_pre_lock += f"{panda_config.schemaJEDI}.JEDI_Events tab "
+        sql_pre_lock += "WHERE jediTaskID=:jediTaskID AND PandaID=:jobsetID AND status=:eventStatus AND attemptNr>:minAttemptNr "
+        if segment_id is not None:
+            sql_pre_lock += "AND datasetID=:datasetID "
+        sql_pre_lock += "ORDER BY jediTaskID,PandaID,fileID "
+        sql_pre_lock += ") WHERE rownum<={0}) "
+        # sql to get pre-locked ranges
+        sql_get_ranges = "SELECT jediTaskID,datasetID,fileID,attemptNr,job_processID,def_min_eventID,def_max_eventID,event_offset "
+        sql_get_ranges += f"FROM {panda_config.schemaJEDI}.JEDI_Events tab "
+        sql_get_ranges += "WHERE jediTaskID=:jediTaskID AND PandaID=:PandaID AND status=:eventStatus "
+        sql_get_ranges += "ORDER BY fileID,job_processID "
+        # sql to release a range
+        sql_release = f"UPDATE {panda_config.schemaJEDI}.JEDI_Events "
+        sql_release += "SET PandaID=event_offset,status=:eventStatus "
+        sql_release += "WHERE jediTaskID=:jediTaskID AND fileID=:fileID AND PandaID=:pandaID "
+        sql_release += "AND job_processID=:job_processID AND attemptNr=:attemptNr "
+        sql_release += "AND status=:oldEventStatus "
+        # sql to assign ranges to jobs
+        sql_assign = f"UPDATE {panda_config.schemaJEDI}.JEDI_Events "
+        sql_assign += "SET PandaID=:newPandaID,status=:eventStatus,is_jumbo=NULL "
+        sql_assign += "WHERE jediTaskID=:jediTaskID AND PandaID=:pandaID AND fileID=:fileID "
+        sql_assign += "AND job_processID=:job_processID AND attemptNr=:attemptNr "
+        sql_assign += "AND status=:oldEventStatus "
+        # sql to get file info
+        sql_file = f"SELECT lfn,GUID,scope FROM {panda_config.schemaJEDI}.JEDI_Dataset_Contents "
+        sql_file += "WHERE jediTaskID=:jediTaskID AND datasetID=:datasetID AND fileID=:fileID "
+        # group jobs by jobsetID
+        ret_map = {}
+        jobset_map = {}
+        for panda_id, jobset_id, n_ranges in job_list:
+            try:
+                n_ranges = int(n_ranges)
+            except Exception:
+                n_ranges = 8
+            try:
+                panda_id = int(panda_id)
+            except Exception:
+                pass
+            try:
+                jobset_id = int(jobset_id)
+            except Exception:
+                pass
+            if panda_id in ret_map:
+                continue
+            ret_map[panda_id] = []
+            jobset_map.setdefault(jobset_id, []).append((panda_id, n_ranges))
+        jumbo_jobs = []
+        n_ranges_total = 0
+        for jobset_id, jobs in jobset_map.items():
+            try:
+                # start transaction
+                self.conn.begin()
+                self.cur.arraysize = 100000
+                # get and lock jobs
+                panda_id_var_names_str, var_map = get_sql_IN_bind_variables([panda_id for panda_id, _ in jobs], prefix=":pandaID")
+                self.cur.execute(sql_get_jobs.format(panda_id_var_names_str) + comment, var_map)
+                job_attrs = {}
+                for panda_id, job_status, command_to_pilot, event_service, jedi_task_id in self.cur.fetchall():
+                    job_attrs[panda_id] = (job_status, command_to_pilot, event_service, jedi_task_id)
+                # group jobs to be dispatched by jediTaskID
+                task_jobs_map = {}
+                for panda_id, n_ranges in jobs:
+                    if panda_id not in job_attrs:
+                        tmp_log.debug(f"PandaID={panda_id} skip job not found")
+                        continue
+                    job_status, command_to_pilot, event_service, jedi_task_id = job_attrs[panda_id]
+                    if job_status not in ["sent", "running", "starting"]:
+                        tmp_log.debug(f"PandaID={panda_id} skip wrong job status in {job_status}")
+                    elif command_to_pilot == "tobekilled":
+                        tmp_log.debug(f"PandaID={panda_id} skip job is being killed")
+                    elif event_service == EventServiceUtils.jumboJobFlagNumber:
+                        jumbo_jobs.append((panda_id, jobset_id, n_ranges))
+                    else:
+                        task_jobs_map.setdefault(jedi_task_id, []).append((panda_id, n_ranges))
+                for jedi_task_id, task_jobs in task_jobs_map.items():
+                    # pre-lock event ranges for all jobs with the first PandaID
+                    locker_id = task_jobs[0][0]
+                    n_ranges_jobset = sum(n_ranges for _, n_ranges in task_jobs)
+                    var_map = {
+                        ":jediTaskID": jedi_task_id,
+                        ":pandaID": locker_id,
+                        ":jobsetID": jobset_id,
+                        ":eventStatus": EventServiceUtils.ST_ready,
+                        ":newEventStatus": EventServiceUtils.ST_reserved_get,
+                        ":minAttemptNr": 0,
+                    }
+                    if segment_id is not None:
+                        var_map[":datasetID"] = segment_id
+                    self.cur.execute(sql_pre_lock.format(n_ranges_jobset + 1) + comment, var_map)
+                    tmp_log.debug(f"jobsetID={jobset_id} pre-locked {self.cur.rowcount} events for {len(task_jobs)} jobs")
+                    # get event ranges
+                    var_map = {":jediTaskID": jedi_task_id, ":PandaID": locker_id, ":eventStatus": EventServiceUtils.ST_reserved_get}
+                    self.cur.execute(sql_get_ranges + comment, var_map)
+                    res_list = self.cur.fetchall()
+                    if len(res_list) > n_ranges_jobset:
+                        # release the last event range
+                        tmp_jedi_task_id, dataset_id, file_id, attempt_nr, job_process_id = res_list[-1][:5]
+                        var_map = {
+                            ":jediTaskID": tmp_jedi_task_id,
+                            ":fileID": file_id,
+                            ":job_processID": job_process_id,
+                            ":pandaID": locker_id,
+                            ":attemptNr": attempt_nr,
+                            ":eventStatus": EventServiceUtils.ST_ready,
+                            ":oldEventStatus": EventServiceUtils.ST_reserved_get,
+                        }
+                        self.cur.execute(sql_release + comment, var_map)
+                        res_list = res_list[:n_ranges_jobset]
+                        no_more_events = False
+                    else:
+                        no_more_events = True
+                    # distribute event ranges to jobs
+                    file_info = {}
+                    var_maps = []
+                    i_range = 0
+                    for panda_id, n_ranges in task_jobs:
+                        for tmp_jedi_task_id, dataset_id, file_id, attempt_nr, job_process_id, start_event, last_event, _ in res_list[
+                            i_range : i_range + n_ranges
+                        ]:
+                            # get file info
+                            if file_id not in file_info:
+                                var_map = {":jediTaskID": tmp_jedi_task_id, ":datasetID": dataset_id, ":fileID": file_id}
+                                self.cur.execute(sql_file + comment, var_map)
+                                res_file = self.cur.fetchone()
+                                if res_file is None:
+                                    res_file = (None, None, None)
+                                    tmp_log.warning(f"file info is not found for fileID={file_id}")
+                                file_info[file_id] = res_file
+                            tmp_lfn, tmp_guid, tmp_scope = file_info[file_id]
+                            ret_map[panda_id].append(
+                                {
+                                    "eventRangeID": self.makeEventRangeID(tmp_jedi_task_id, panda_id, file_id, job_process_id, attempt_nr),
+                                    "startEvent": start_event,
+                                    "lastEvent": last_event,
+                                    "LFN": tmp_lfn,
+                                    "GUID": tmp_guid,
+                                    "scope": tmp_scope,
+                                }
+                            )
+                            var_maps.append(
+                                {
+                                    ":newPandaID": panda_id,
+                                    ":eventStatus": EventServiceUtils.ST_sent,
+                                    ":jediTaskID": tmp_jedi_task_id,
+                                    ":pandaID": locker_id,
+                                    ":fileID": file_id,
+                                    ":job_processID": job_process_id,
+                                    ":attemptNr": attempt_nr,
+                                    ":oldEventStatus": EventServiceUtils.ST_reserved_get,
+                                }
+                            )
+                        i_range += n_ranges
+                    # assign event ranges to jobs and lock them
+                    if var_maps:
+                        self.cur.executemany(sql_assign + comment, var_maps)
+                    n_ranges_total += len(var_maps)
+                    tmp_log.debug(f"jobsetID={jobset_id} dispatched {len(var_maps)} events")
+                    # kill unused consumers
+                    if no_more_events and segment_id is None:
+                        tmp_log.debug(f"jobsetID={jobset_id} kill unused consumers")
+                        tmp_job_spec = JobSpec()
+                        tmp_job_spec.PandaID = locker_id
+                        tmp_job_spec.jobsetID = jobset_id
+                        tmp_job_spec.jediTaskID = jedi_task_id
+                        self.killUnusedEventServiceConsumers(tmp_job_spec, False, checkAttemptNr=True)
+                # commit
+                if not self._commit():
+                    raise RuntimeError("Commit error")
+            except Exception:
+                # roll back
+                self._rollback()
+                # error
+                self.dump_error_message(tmp_log)
+                for panda_id, _ in jobs:
+                    ret_map[panda_id] = None
+        # jumbo jobs
+        for panda_id, jobset_id, n_ranges in jumbo_jobs:
+            ret_map[panda_id] = self.getEventRanges(panda_id, jobset_id, None, n_ranges, True, scattered, segment_id)
+        reg_time = naive_utcnow() - reg_start
+        tmp_log.debug(f"done with {n_ranges_total} event ranges in {len(jobset_map)} jobsets. took {reg_time.seconds} sec")
+        if not accept_json:
+            return json.dumps(ret_map)
+        return ret_map
+
     # update even ranges
     def updateEventRanges(self, eventDictParam, version=0):
         # version 0: normal event service
@@ -16,6 +16,7 @@ from pandaserver.taskbuffer.db_proxy_mods.entity_module import get_entity_module
 from pandaserver.taskbuffer.HarvesterMetricsSpec import HarvesterMetricsSpec
 from pandaserver.taskbuffer.JobSpec import JobSpec
 from pandaserver.taskbuffer.ResourceSpec import BASIC_RESOURCE_TYPE
+from pandaserver.taskbuffer.Utils import create_shards
 from pandaserver.taskbuffer.WorkerSpec import WorkerSpec
 
 
@@ -817,211 +818,44 @@ class WorkerModule(BaseModule):
     # update workers
     def updateWorkers(self, harvesterID, data, useCommit=True):
         """
-        Update workers
+        Update workers. Workers are processed in batches where existing workers and job relations are pre-fetched
+        with keyed queries and inserts/updates/deletes are grouped into executemany calls
+
+        :param harvesterID: harvester ID
+        :param data: list of worker attribute dictionaries
+        :param useCommit: commit at the end of each batch
+        :return: list of True for each worker, or None if failed
         """
         comment = " /* DBProxy.updateWorkers */"
         tmp_log = self.create_tagged_logger(comment, f"harvesterID={harvesterID} pid={os.getpid()}")
         try:
             tmp_log.debug(f"start {len(data)} workers")
             regStart = naive_utcnow()
-            sqlC = f"SELECT {WorkerSpec.columnNames()} FROM ATLAS_PANDA.Harvester_Workers "
-            sqlC += "WHERE harvesterID=:harvesterID AND workerID=:workerID "
-            # loop over all workers
-            retList = []
+            # make batches where each worker appears only once so that duplicated reports are applied in order
+            batchSize = max(1, panda_config.update_workers_batch_size)
+            batchList = []
+            batch = []
+            batchWorkerIDs = set()
             for workerData in data:
-                timeNow = naive_utcnow()
+                if len(batch) >= batchSize or workerData["workerID"] in batchWorkerIDs:
+                    batchList.append(batch)
+                    batch = []
+                    batchWorkerIDs = set()
+                batch.append(workerData)
+                batchWorkerIDs.add(workerData["workerID"])
+            if batch:
+                batchList.append(batch)
+            # loop over all batches
+            retList = []
+            for batch in batchList:
                 if useCommit:
                     self.conn.begin()
-                workerSpec = WorkerSpec()
-                workerSpec.harvesterID = harvesterID
-                workerSpec.workerID = workerData["workerID"]
-                tmp_log.debug(f"workerID={workerSpec.workerID} start")
-                # check if already exists
-                varMap = dict()
-                varMap[":harvesterID"] = workerSpec.harvesterID
-                varMap[":workerID"] = workerSpec.workerID
-                self.cur.execute(sqlC + comment, varMap)
-                resC = self.cur.fetchone()
-                if resC is None:
-                    # not exist
-                    toInsert = True
-                    oldLastUpdate = None
-                else:
-                    # already exists
-                    toInsert = False
-                    workerSpec.pack(resC)
-                    oldLastUpdate = workerSpec.lastUpdate
-                # set new values
-                oldStatus = workerSpec.status
-                for key in workerData:
-                    val = workerData[key]
-                    if hasattr(workerSpec, key):
-                        setattr(workerSpec, key, val)
-                workerSpec.lastUpdate = timeNow
-                if oldStatus in ["finished", "failed", "cancelled", "missed"] and (
-                    oldLastUpdate is not None and oldLastUpdate > timeNow - datetime.timedelta(hours=3)
-                ):
-                    tmp_log.debug(f"workerID={workerSpec.workerID} keep old status={oldStatus} instead of new {workerSpec.status}")
-                    workerSpec.status = oldStatus
-                # insert or update
-                if toInsert:
-                    # insert
-                    tmp_log.debug(f"workerID={workerSpec.workerID} insert for status={workerSpec.status}")
-                    sqlI = f"INSERT INTO ATLAS_PANDA.Harvester_Workers ({WorkerSpec.columnNames()}) "
-                    sqlI += WorkerSpec.bindValuesExpression()
-                    varMap = workerSpec.valuesMap()
-                    self.cur.execute(sqlI + comment, varMap)
-                else:
-                    # update
-                    tmp_log.debug(f"workerID={workerSpec.workerID} update for status={workerSpec.status}")
-                    sqlU = f"UPDATE ATLAS_PANDA.Harvester_Workers SET {workerSpec.bindUpdateChangesExpression()} "
-                    sqlU += "WHERE harvesterID=:harvesterID AND workerID=:workerID "
-                    varMap = workerSpec.valuesMap(onlyChanged=True)
-                    self.cur.execute(sqlU + comment, varMap)
-                # job relation
-                if "pandaid_list" in workerData and len(workerData["pandaid_list"]) > 0:
-                    tmp_log.debug(f"workerID={workerSpec.workerID} update/insert job relation")
-                    sqlJC = "SELECT PandaID FROM ATLAS_PANDA.Harvester_Rel_Jobs_Workers "
-                    sqlJC += "WHERE harvesterID=:harvesterID AND workerID=:workerID "
-                    sqlJI = "INSERT INTO ATLAS_PANDA.Harvester_Rel_Jobs_Workers (harvesterID,workerID,PandaID,lastUpdate) "
-                    sqlJI += "VALUES (:harvesterID,:workerID,:PandaID,:lastUpdate) "
-                    sqlJU = "UPDATE ATLAS_PANDA.Harvester_Rel_Jobs_Workers SET lastUpdate=:lastUpdate "
-                    sqlJU += "WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID=:PandaID "
-                    # get jobs
-                    varMap = dict()
-                    varMap[":harvesterID"] = harvesterID
-                    varMap[":workerID"] = workerData["workerID"]
-                    self.cur.execute(sqlJC + comment, varMap)
-                    resJC = self.cur.fetchall()
-                    exPandaIDs = set()
-                    for (pandaID,) in resJC:
-                        exPandaIDs.add(pandaID)
-                    for pandaID in workerData["pandaid_list"]:
-                        # update or insert
-                        varMap = dict()
-                        varMap[":harvesterID"] = harvesterID
-                        varMap[":workerID"] = workerData["workerID"]
-                        varMap[":PandaID"] = pandaID
-                        varMap[":lastUpdate"] = timeNow
-                        if pandaID not in exPandaIDs:
-                            # insert
-                            self.cur.execute(sqlJI + comment, varMap)
-                        else:
-                            # update
-                            self.cur.execute(sqlJU + comment, varMap)
-                            exPandaIDs.discard(pandaID)
-                    # delete redundant list
-                    sqlJD = "DELETE FROM ATLAS_PANDA.Harvester_Rel_Jobs_Workers "
-                    sqlJD += "WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID=:PandaID "
-                    for pandaID in exPandaIDs:
-                        varMap = dict()
-                        varMap[":PandaID"] = pandaID
-                        varMap[":harvesterID"] = harvesterID
-                        varMap[":workerID"] = workerData["workerID"]
-                        self.cur.execute(sqlJD + comment, varMap)
-                    tmp_log.debug(f"workerID={workerSpec.workerID} deleted {len(exPandaIDs)} jobs")
-                # comprehensive heartbeat
-                tmp_log.debug(f"workerID={workerSpec.workerID} get jobs")
-                sqlCJ = "SELECT r.PandaID FROM "
-                sqlCJ += "ATLAS_PANDA.Harvester_Rel_Jobs_Workers r,ATLAS_PANDA.jobsActive4 j  "
-                sqlCJ += "WHERE r.harvesterID=:harvesterID AND r.workerID=:workerID "
-                sqlCJ += "AND j.PandaID=r.PandaID AND NOT j.jobStatus IN (:holding) "
-                sqlJAC = "SELECT jobStatus,prodSourceLabel,attemptNr FROM ATLAS_PANDA.jobsActive4 WHERE PandaID=:PandaID  "
-                sqlJAA = "UPDATE ATLAS_PANDA.jobsActive4 SET modificationTime=CURRENT_DATE WHERE PandaID=:PandaID AND jobStatus IN (:js1,:js2) "
-                sqlJAE = "UPDATE ATLAS_PANDA.jobsActive4 SET taskBufferErrorCode=:code,taskBufferErrorDiag=:diag,"
-                sqlJAE += "startTime=(CASE WHEN jobStatus=:starting THEN NULL ELSE startTime END) "
-                sqlJAE += "WHERE PandaID=:PandaID "
-                sqlJSE = "UPDATE {0} SET supErrorCode=:code,supErrorDiag=:diag,stateChangeTime=CURRENT_DATE "
-                sqlJSE += "WHERE PandaID=:PandaID AND NOT jobStatus IN (:finished) AND modificationTime>CURRENT_DATE-30"
-                varMap = dict()
-                varMap[":harvesterID"] = harvesterID
-                varMap[":workerID"] = workerData["workerID"]
-                varMap[":holding"] = "holding"
-                self.cur.execute(sqlCJ + comment, varMap)
-                resCJ = self.cur.fetchall()
-                tmp_log.debug(f"workerID={workerSpec.workerID} update {len(resCJ)} jobs")
-                for (pandaID,) in resCJ:
-                    # check job status when worker is in a final state
-                    if workerSpec.status in [
-                        "finished",
-                        "failed",
-                        "cancelled",
-                        "missed",
-                    ]:
-                        varMap = dict()
-                        varMap[":PandaID"] = pandaID
-                        self.cur.execute(sqlJAC + comment, varMap)
-                        resJAC = self.cur.fetchone()
-                        if resJAC is not None:
-                            jobStatus, prodSourceLabel, attemptNr = resJAC
-                            tmp_log.debug(f"workerID={workerSpec.workerID} {workerSpec.status} while PandaID={pandaID} {jobStatus}")
-                            # set failed if out of sync
-                            if "syncLevel" in workerData and workerData["syncLevel"] == 1 and jobStatus in ["running", "starting"]:
-                                tmp_log.debug(f"workerID={workerSpec.workerID} set failed to PandaID={pandaID} due to sync error")
-                                varMap = dict()
-                                varMap[":PandaID"] = pandaID
-                                varMap[":code"] = ErrorCode.EC_WorkerDone
-                                varMap[":starting"] = "starting"
-                                varMap[":diag"] = f"The worker was {workerSpec.status} while the job was {jobStatus} : {workerSpec.diagMessage}"
-                                varMap[":diag"] = JobSpec.truncateStringAttr("taskBufferErrorDiag", varMap[":diag"])
-                                self.cur.execute(sqlJAE + comment, varMap)
-                                # make an empty file to triggre registration for zip files in Adder
-                                # tmpFileName = '{0}_{1}_{2}'.format(pandaID, 'failed',
-                                #                                    uuid.uuid3(uuid.NAMESPACE_DNS,''))
-                                # tmpFileName = os.path.join(panda_config.logdir, tmpFileName)
-                                # try:
-                                #     open(tmpFileName, 'w').close()
-                                # except Exception:
-                                #     pass
-                                # sql to insert empty job output report for adder
-                                sqlI = (
-                                    "INSERT INTO {0}.Job_Output_Report "
-                                    "(PandaID, prodSourceLabel, jobStatus, attemptNr, data, timeStamp) "
-                                    "VALUES(:PandaID, :prodSourceLabel, :jobStatus, :attemptNr, :data, :timeStamp) "
-                                ).format(panda_config.schemaPANDA)
-                                # insert
-                                varMap = {}
-                                varMap[":PandaID"] = pandaID
-                                varMap[":prodSourceLabel"] = prodSourceLabel
-                                varMap[":jobStatus"] = "failed"
-                                varMap[":attemptNr"] = attemptNr
-                                varMap[":data"] = None
-                                varMap[":timeStamp"] = naive_utcnow()
-                                try:
-                                    self.cur.execute(sqlI + comment, varMap)
-                                except Exception:
-                                    pass
-                                else:
-                                    tmp_log.debug(f"successfully inserted job output report {pandaID}.{varMap[':attemptNr']}")
-                        if workerSpec.errorCode not in [None, 0]:
-                            varMap = dict()
-                            varMap[":PandaID"] = pandaID
-                            varMap[":code"] = workerSpec.errorCode
-                            varMap[":diag"] = f"Diag from worker : {workerSpec.diagMessage}"
-                            varMap[":diag"] = JobSpec.truncateStringAttr("supErrorDiag", varMap[":diag"])
-                            varMap[":finished"] = "finished"
-                            for tableName in [
-                                "ATLAS_PANDA.jobsActive4",
-                                "ATLAS_PANDA.jobsArchived4",
-                                "ATLAS_PANDAARCH.jobsArchived",
-                            ]:
-                                self.cur.execute(sqlJSE.format(tableName) + comment, varMap)
-                    """
-                    varMap = dict()
-                    varMap[':PandaID'] = pandaID
-                    varMap[':js1'] = 'running'
-                    varMap[':js2'] = 'starting'
-                    self.cur.execute(sqlJAA+comment, varMap)
-                    nRowJA = self.cur.rowcount
-                    if nRowJA > 0:
-                        tmp_log.debug('workerID={0} PandaID={1} updated modificationTime'.format(workerSpec.workerID, pandaID))
-                    """
-                tmp_log.debug(f"workerID={workerSpec.workerID} end")
+                self.update_worker_batch(harvesterID, batch, tmp_log)
                 # commit
                 if useCommit:
                     if not self._commit():
                         raise RuntimeError("Commit error")
-                retList.append(True)
+                retList += [True] * len(batch)
             regTime = naive_utcnow() - regStart
             tmp_log.debug("done. exec_time=%s.%03d sec" % (regTime.seconds, regTime.microseconds / 1000))
             return retList
@@ -1032,6 +866,207 @@ class WorkerModule(BaseModule):
             self.dump_error_message(tmp_log)
             return None
 
+    # update a batch of workers without commit
+    def update_worker_batch(self, harvester_id, batch, tmp_log):
+        """
+        Update a batch of workers and their job relations. Each worker must appear only once in the batch
+
+        :param harvester_id: harvester ID
+        :param batch: list of worker attribute dictionaries
+        :param tmp_log: logger
+        """
+        comment = " /* DBProxy.update_worker_batch */"
+        time_now = naive_utcnow()
+        worker_ids = [worker_data["workerID"] for worker_data in batch]
+        final_statuses = ["finished", "failed", "cancelled", "missed"]
+        # get existing workers
+        existing_workers = {}
+        for shard in create_shards(worker_ids, 100):
+            worker_id_var_names_str, var_map = get_sql_IN_bind_variables(shard, prefix=":workerID")
+            sql_check = f"SELECT {WorkerSpec.columnNames()} FROM ATLAS_PANDA.Harvester_Workers "
+            sql_check += f"WHERE harvesterID=:harvesterID AND workerID IN ({worker_id_var_names_str}) "
+            var_map[":harvesterID"] = harvester_id
+            self.cur.execute(sql_check + comment, var_map)
+            for res_check in self.cur.fetchall():
+                existing_worker = WorkerSpec()
+                existing_worker.pack(res_check)
+                existing_workers[existing_worker.workerID] = res_check
+        # set new values
+        worker_spec_map = {}
+        var_maps_insert = []
+        var_maps_update = {}
+        for worker_data in batch:
+            worker_spec = WorkerSpec()
+            worker_spec.harvesterID = harvester_id
+            worker_spec.workerID = worker_data["workerID"]
+            res_check = existing_workers.get(worker_spec.workerID)
+            if res_check is None:
+                old_last_update = None
+            else:
+                worker_spec.pack(res_check)
+                old_last_update = worker_spec.lastUpdate
+            old_status = worker_spec.status
+            for key in worker_data:
+                if hasattr(worker_spec, key):
+                    setattr(worker_spec, key, worker_data[key])
+            worker_spec.lastUpdate = time_now
+            # keep the final status for 3 hours
+            if old_status in final_statuses and (old_last_update is not None and old_last_update > time_now - datetime.timedelta(hours=3)):
+                tmp_log.debug(f"workerID={worker_spec.workerID} keep old status={old_status} instead of new {worker_spec.status}")
+                worker_spec.status = old_status
+            worker_spec_map[worker_spec.workerID] = worker_spec
+            if res_check is None:
+                var_maps_insert.append(worker_spec.valuesMap())
+            else:
+                # group updates by changed columns to use the same SQL
+                var_maps_update.setdefault(worker_spec.bindUpdateChangesExpression(), []).append(worker_spec.valuesMap(onlyChanged=True))
+        # insert
+        tmp_log.debug(f"insert {len(var_maps_insert)} workers and update {sum(len(v) for v in var_maps_update.values())} workers")
+        if var_maps_insert:
+            sql_insert = f"INSERT INTO ATLAS_PANDA.Harvester_Workers ({WorkerSpec.columnNames()}) "
+            sql_insert += WorkerSpec.bindValuesExpression()
+            for shard in create_shards(var_maps_insert, 100):
+                self.cur.executemany(sql_insert + comment, shard)
+        # update
+        for update_expression, var_map_list in var_maps_update.items():
+            sql_update = f"UPDATE ATLAS_PANDA.Harvester_Workers SET {update_expression} "
+            sql_update += "WHERE harvesterID=:harvesterID AND workerID=:workerID "
+            for shard in create_shards(var_map_list, 100):
+                self.cur.executemany(sql_update + comment, shard)
+        # job relations
+        rel_worker_ids = {worker_data["workerID"] for worker_data in batch if len(worker_data.get("pandaid_list", [])) > 0}
+        if rel_worker_ids:
+            # get existing relations
+            existing_relations = {}
+            for shard in create_shards(sorted(rel_worker_ids), 100):
+                worker_id_var_names_str, var_map = get_sql_IN_bind_variables(shard, prefix=":workerID")
+                sql_get_rel = "SELECT workerID,PandaID FROM ATLAS_PANDA.Harvester_Rel_Jobs_Workers "
+                sql_get_rel += f"WHERE harvesterID=:harvesterID AND workerID IN ({worker_id_var_names_str}) "
+                var_map[":harvesterID"] = harvester_id
+                self.cur.execute(sql_get_rel + comment, var_map)
+                for worker_id, panda_id in self.cur.fetchall():
+                    existing_relations.setdefault(worker_id, set()).add(panda_id)
+            # diff relations
+            var_maps_rel_insert = []
+            var_maps_rel_update = []
+            var_maps_rel_delete = []
+            for worker_data in batch:
+                worker_id = worker_data["workerID"]
+                if worker_id not in rel_worker_ids:
+                    continue
+                ex_panda_ids = existing_relations.get(worker_id, set())
+                new_panda_ids = set()
+                for panda_id in worker_data["pandaid_list"]:
+                    if panda_id in new_panda_ids:
+                        continue
+                    new_panda_ids.add(panda_id)
+                    var_map = {":harvesterID": harvester_id, ":workerID": worker_id, ":PandaID": panda_id, ":lastUpdate": time_now}
+                    if panda_id in ex_panda_ids:
+                        var_maps_rel_update.append(var_map)
+                    else:
+                        var_maps_rel_insert.append(var_map)
+                for panda_id in ex_panda_ids - new_panda_ids:
+                    var_maps_rel_delete.append({":harvesterID": harvester_id, ":workerID": worker_id, ":PandaID": panda_id})
+            tmp_log.debug(
+                f"job relations of {len(rel_worker_ids)} workers : insert={len(var_maps_rel_insert)} "
+                f"update={len(var_maps_rel_update)} delete={len(var_maps_rel_delete)}"
+            )
+            sql_rel_insert = "INSERT INTO ATLAS_PANDA.Harvester_Rel_Jobs_Workers (harvesterID,workerID,PandaID,lastUpdate) "
+            sql_rel_insert += "VALUES (:harvesterID,:workerID,:PandaID,:lastUpdate) "
+            sql_rel_update = "UPDATE ATLAS_PANDA.Harvester_Rel_Jobs_Workers SET lastUpdate=:lastUpdate "
+            sql_rel_update += "WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID=:PandaID "
+            sql_rel_delete = "DELETE FROM ATLAS_PANDA.Harvester_Rel_Jobs_Workers "
+            sql_rel_delete += "WHERE harvesterID=:harvesterID AND workerID=:workerID AND PandaID=:PandaID "
+            for sql_rel, var_map_list in [
+                (sql_rel_insert, var_maps_rel_insert),
+                (sql_rel_update, var_maps_rel_update),
+                (sql_rel_delete, var_maps_rel_delete),
+            ]:
+                for shard in create_shards(var_map_list, 100):
+                    self.cur.executemany(sql_rel + comment, shard)
+        # comprehensive heartbeat for jobs of workers in a final state
+        hb_worker_ids = [worker_id for worker_id, worker_spec in worker_spec_map.items() if worker_spec.status in final_statuses]
+        if not hb_worker_ids:
+            return
+        sync_map = {worker_data["workerID"]: worker_data.get("syncLevel") for worker_data in batch}
+        var_maps_job_error = []
+        var_maps_sup_error = []
+        job_output_reports = []
+        for shard in create_shards(hb_worker_ids, 100):
+            worker_id_var_names_str, var_map = get_sql_IN_bind_variables(shard, prefix=":workerID")
+            sql_get_jobs = "SELECT r.workerID,r.PandaID,j.jobStatus,j.prodSourceLabel,j.attemptNr FROM "
+            sql_get_jobs += "ATLAS_PANDA.Harvester_Rel_Jobs_Workers r,ATLAS_PANDA.jobsActive4 j "
+            sql_get_jobs += f"WHERE r.harvesterID=:harvesterID AND r.workerID IN ({worker_id_var_names_str}) "
+            sql_get_jobs += "AND j.PandaID=r.PandaID AND NOT j.jobStatus IN (:holding) "
+            var_map[":harvesterID"] = harvester_id
+            var_map[":holding"] = "holding"
+            self.cur.execute(sql_get_jobs + comment, var_map)
+            for worker_id, panda_id, job_status, prod_source_label, attempt_nr in self.cur.fetchall():
+                worker_spec = worker_spec_map[worker_id]
+                # jobs of workers in a final state
+                tmp_log.debug(f"workerID={worker_id} {worker_spec.status} while PandaID={panda_id} {job_status}")
+                # set failed if out of sync
+                if sync_map.get(worker_id) == 1 and job_status in ["running", "starting"]:
+                    tmp_log.debug(f"workerID={worker_id} set failed to PandaID={panda_id} due to sync error")
+                    diag = f"The worker was {worker_spec.status} while the job was {job_status} : {worker_spec.diagMessage}"
+                    var_maps_job_error.append(
+                        {
+                            ":PandaID": panda_id,
+                            ":code": ErrorCode.EC_WorkerDone,
+                            ":starting": "starting",
+                            ":diag": JobSpec.truncateStringAttr("taskBufferErrorDiag", diag),
+                        }
+                    )
+                    job_output_reports.append((panda_id, prod_source_label, attempt_nr))
+                if worker_spec.errorCode not in [None, 0]:
+                    diag = f"Diag from worker : {worker_spec.diagMessage}"
+                    var_maps_sup_error.append(
+                        {
+                            ":PandaID": panda_id,
+                            ":code": worker_spec.errorCode,
+                            ":diag": JobSpec.truncateStringAttr("supErrorDiag", diag),
+                            ":finished": "finished",
+                        }
+                    )
+        tmp_log.debug(f"set errors to {len(var_maps_job_error)} out-of-sync jobs and {len(var_maps_sup_error)} jobs of failed workers")
+        if var_maps_job_error:
+            sql_job_error = "UPDATE ATLAS_PANDA.jobsActive4 SET taskBufferErrorCode=:code,taskBufferErrorDiag=:diag,"
+            sql_job_error += "startTime=(CASE WHEN jobStatus=:starting THEN NULL ELSE startTime END) "
+            sql_job_error += "WHERE PandaID=:PandaID "
+            for shard in create_shards(var_maps_job_error, 100):
+                self.cur.executemany(sql_job_error + comment, shard)
+            # sql to insert empty job output report for adder
+            sql_report = (
+                "INSERT INTO {0}.Job_Output_Report "
+                "(PandaID, prodSourceLabel, jobStatus, attemptNr, data, timeStamp) "
+                "VALUES(:PandaID, :prodSourceLabel, :jobStatus, :attemptNr, :data, :timeStamp) "
+            ).format(panda_config.schemaPANDA)
+            for panda_id, prod_source_label, attempt_nr in job_output_reports:
+                var_map = {
+                    ":PandaID": panda_id,
+                    ":prodSourceLabel": prod_source_label,
+                    ":jobStatus": "failed",
+                    ":attemptNr": attempt_nr,
+                    ":data": None,
+                    ":timeStamp": naive_utcnow(),
+                }
+                try:
+                    self.cur.execute(sql_report + comment, var_map)
+                except Exception:
+                    pass
+                else:
+                    tmp_log.debug(f"successfully inserted job output report {panda_id}.{attempt_nr}")
+        if var_maps_sup_error:
+            sql_sup_error = "UPDATE {0} SET supErrorCode=:code,supErrorDiag=:diag,stateChangeTime=CURRENT_DATE "
+            sql_sup_error += "WHERE PandaID=:PandaID AND NOT jobStatus IN (:finished) AND modificationTime>CURRENT_DATE-30"
+            for table_name in [
+                "ATLAS_PANDA.jobsActive4",
+                "ATLAS_PANDA.jobsArchived4",
+                "ATLAS_PANDAARCH.jobsArchived",
+            ]:
+                for shard in create_shards(var_maps_sup_error, 100):
+                    self.cur.executemany(sql_sup_error.format(table_name) + comment, shard)
+
     # update the worker status as seen by the pilot
     def updateWorkerPilotStatus(self, workerID, harvesterID, status, node_id):
         comment = " /* DBProxy.updateWorkerPilotStatus */"
@@ -1,5 +1,6 @@
 import re
 import sys
+import threading
 import time
 import traceback
 from re import error as ReError
@@ -7,6 +8,9 @@ from re import error as ReError
 from pandacommon.pandalogger.LogWrapper import LogWrapper
 from pandacommon.pandalogger.PandaLogger import PandaLogger
 
+from pandaserver.config import panda_config
+from pandaserver.srvcore import CoreUtils
+
 _logger = PandaLogger().getLogger("RetrialModule")
 
 NO_RETRY = "no_retry"
@@ -43,12 +47,11 @@ def safe_match(pattern, message):
     """
     Wrapper around re.search with simple exception handling
     """
-    tmp_log = LogWrapper(_logger, f"safe_match")
-
     matches = False
     try:
         matches = re.match(pattern, message, flags=re.DOTALL)
     except ReError:
+        tmp_log = LogWrapper(_logger, f"safe_match")
         tmp_log.error(f"Regexp matching excepted. \nPattern: {pattern} \nString: {message}")
     finally:
         return matches
@@ -233,6 +236,180 @@ def preprocess_rules(rules, error_diag_job, release_job, architecture_job, wqid_
     return filtered_rules
 
 
+# action classes evaluated by the rule index in the order of the applicable rules.
+# LIMIT_RETRY stands for both LIMIT_RETRY and NO_RETRY
+FIRST_MATCH_ACTIONS = (INCREASE_MEM, INCREASE_MEM_XTIMES, INCREASE_CPU, REDUCE_INPUT_PER_JOB)
+ACTION_CLASSES = FIRST_MATCH_ACTIONS + (LIMIT_RETRY,)
+
+
+class CompiledRule:
+    """
+    Retrial rule with the precompiled error_diag regexp and the precomputed strictness
+    """
+
+    __slots__ = ("rule", "action_class", "regexp", "bad_regexp", "architecture", "release", "wqid", "weight")
+
+    def __init__(self, rule):
+        self.rule = rule
+        if rule["action"] in (LIMIT_RETRY, NO_RETRY):
+            self.action_class = LIMIT_RETRY
+        elif rule["action"] in FIRST_MATCH_ACTIONS:
+            self.action_class = rule["action"]
+        else:
+            self.action_class = None
+        self.regexp = None
+        self.bad_regexp = False
+        if rule["error_diag"]:
+            try:
+                self.regexp = re.compile(rule["error_diag"], flags=re.DOTALL)
+            except ReError:
+                _logger.error(f"Regexp compilation excepted. Rule: {rule}")
+                self.bad_regexp = True
+        self.architecture = rule["architecture"]
+        self.release = rule["release"]
+        self.wqid = rule["wqid"]
+        self.weight = sum(1 for attr in (self.architecture, self.release, self.wqid) if attr)
+
+    def conditions_apply(self, errordiag_job, architecture_job, release_job, wqid_job):
+        """
+        Same as conditions_apply but the cheap comparisons are done before the regexp matching
+        """
+        if (
+            (self.architecture and self.architecture != architecture_job)
+            or (self.release and self.release != release_job)
+            or (self.wqid and self.wqid != wqid_job)
+        ):
+            return False
+        if self.bad_regexp:
+            return False
+        if self.regexp is not None:
+            try:
+                if not self.regexp.match(errordiag_job):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+
+class RetrialRuleIndex:
+    """
+    Immutable index of retrial rules keyed by (error source, error code). Each entry has the rules of the known action classes
+    in the original order, so that all action classes are evaluated in one pass with the same resolution as preprocess_rules
+    """
+
+    def __init__(self, retrial_rules, version=0, fingerprint=None):
+        """
+        :param retrial_rules: dictionary of {error source: {error code: [rule, ...]}} given by getRetrialRules
+        :param version: version of the index which is incremented when the rules are changed
+        :param fingerprint: fingerprint of the rules to check if the rules are changed
+        """
+        self.version = version
+        self.fingerprint = fingerprint
+        self.rule_map = {}
+        self.n_rules = 0
+        for error_source, code_map in retrial_rules.items():
+            for error_code, rules in code_map.items():
+                compiled_rules = []
+                for rule in rules:
+                    try:
+                        compiled_rule = CompiledRule(rule)
+                    except KeyError:
+                        _logger.error(f"Rule was missing some field(s). Rule: {rule}")
+                        continue
+                    if compiled_rule.action_class is not None:
+                        compiled_rules.append(compiled_rule)
+                self.rule_map[(error_source, error_code)] = tuple(compiled_rules)
+                self.n_rules += len(compiled_rules)
+
+    def __len__(self):
+        return len(self.rule_map)
+
+    def __str__(self):
+        return f"RetrialRuleIndex(version={self.version} keys={len(self.rule_map)} rules={self.n_rules})"
+
+    def get_applicable_rules(self, error_source, error_code, error_diag_job, release_job, architecture_job, wqid_job):
+        """
+        Get the rules to be applied to an error, with the same resolution as preprocess_rules.
+        - the first matching rule for each of INCREASE_MEM, INCREASE_MEM_XTIMES, INCREASE_CPU, and REDUCE_INPUT_PER_JOB
+        - the narrowest matching rule of LIMIT_RETRY and NO_RETRY, taking the smallest maxAttempt in case of draw
+
+        :param error_source: error source, e.g. pilotErrorCode
+        :param error_code: error code
+        :param error_diag_job: error diag of the job
+        :param release_job: release of the job
+        :param architecture_job: architecture (cmtConfig) of the job
+        :param wqid_job: work queue ID of the job
+        :return: list of applicable rules, or None if no rules are defined for the error source and code
+        """
+        compiled_rules = self.rule_map.get((error_source, error_code))
+        if compiled_rules is None:
+            return None
+        matched_map = {}
+        limit_retry_rule, limit_retry_weight = None, None
+        for compiled_rule in compiled_rules:
+            action_class = compiled_rule.action_class
+            # only the first one is taken
+            if action_class in matched_map:
+                continue
+            if not compiled_rule.conditions_apply(error_diag_job, architecture_job, release_job, wqid_job):
+                continue
+            if action_class != LIMIT_RETRY:
+                matched_map[action_class] = compiled_rule.rule
+            elif limit_retry_rule is None or compiled_rule.weight > limit_retry_weight:
+                limit_retry_rule, limit_retry_weight = compiled_rule.rule, compiled_rule.weight
+            elif compiled_rule.weight == limit_retry_weight:
+                # resolve into the strictest rule on a copy not to change the cached rule
+                try:
+                    params = dict(limit_retry_rule["params"])
+                    params["maxAttempt"] = min(params["maxAttempt"], compiled_rule.rule["params"]["maxAttempt"])
+                except KeyError:
+                    _logger.error(f"Rules are not properly defined. Rules: {[r.rule for r in compiled_rules]}")
+                    continue
+                limit_retry_rule = dict(limit_retry_rule, params=params)
+        if limit_retry_rule is not None:
+            matched_map[LIMIT_RETRY] = limit_retry_rule
+        return [matched_map[action_class] for action_class in ACTION_CLASSES if action_class in matched_map]
+
+
+# cache of the retrial rule index
+_rule_index_cache = None
+_rule_index_cache_lock = threading.Lock()
+
+
+def _load_retrial_rule_index(task_buffer):
+    """
+    Load retrial rules from the DB and build the index. The current index is reused when the rules are unchanged
+    """
+    retrial_rules = task_buffer.getRetrialRules()
+    if retrial_rules is None:
+        return False, None
+    fingerprint = str(retrial_rules)
+    current_index = _rule_index_cache.cachedObj if _rule_index_cache is not None else None
+    if current_index is not None and current_index.fingerprint == fingerprint:
+        return True, current_index
+    version = current_index.version + 1 if current_index is not None else 0
+    rule_index = RetrialRuleIndex(retrial_rules, version, fingerprint)
+    _logger.info(f"loaded {rule_index}")
+    return True, rule_index
+
+
+def get_retrial_rule_index(task_buffer):
+    """
+    Get the retrial rule index which is refreshed every retrial_rules_cache_interval seconds
+
+    :param task_buffer: task buffer
+    :return: RetrialRuleIndex, or None if the rules have never been loaded successfully
+    """
+    global _rule_index_cache
+    with _rule_index_cache_lock:
+        if _rule_index_cache is None:
+            _rule_index_cache = CoreUtils.CachedObject(
+                "retrial_rules", panda_config.retrial_rules_cache_interval, lambda: _load_retrial_rule_index(task_buffer), _logger
+            )
+    _rule_index_cache.update()
+    return _rule_index_cache.cachedObj
+
+
 @timeit
 def apply_retrial_rules(task_buffer, job, errors, attemptNr):
     """
@@ -245,9 +422,9 @@ def apply_retrial_rules(task_buffer, job, errors, attemptNr):
 
     _logger.debug(f"Entered apply_retrial_rules for PandaID={job_id}, errors={errors}, attemptNr={attemptNr}")
 
-    retrial_rules = task_buffer.getRetrialRules()
-    _logger.debug("Back from getRetrialRules")
-    if not retrial_rules:
+    rule_index = get_retrial_rule_index(task_buffer)
+    _logger.debug(f"Back from get_retrial_rule_index with {rule_index}")
+    if not rule_index:
         return
 
     try:
@@ -267,13 +444,13 @@ def apply_retrial_rules(task_buffer, job, errors, attemptNr):
                 if error_code != "NULL":
                     _logger.error(f"Error code ({error_code}) can not be casted to int")
                 continue
-            try:
-                rule = retrial_rules[error_source][error_code]
-            except KeyError as e:
-                _logger.debug(f"Retry rule does not apply for jobID {job_id}, attemptNr {attemptNr}, failed with {errors}. (Exception {e})")
+            applicable_rules = rule_index.get_applicable_rules(error_source, error_code, error_diag, job.AtlasRelease, job.cmtConfig, job.workQueue_ID)
+            if applicable_rules is None:
+                _logger.debug(
+                    f"Retry rule does not apply for jobID {job_id}, attemptNr {attemptNr}, failed with {errors}. (No rule for {error_source} {error_code})"
+                )
                 continue
 
-            applicable_rules = preprocess_rules(rule, error_diag, job.AtlasRelease, job.cmtConfig, job.workQueue_ID)
             _logger.debug(f"Applicable rules for PandaID={job_id}: {applicable_rules}")
             for rule in applicable_rules:
                 try:
@@ -298,22 +475,8 @@ def apply_retrial_rules(task_buffer, job, errors, attemptNr):
                         )
                     )
 
+                    # the conditions were already checked by the rule index
                     _logger.debug(f"Processing rule {rule} for jobID {job_id}, error_source {error_source}, error_code {error_code}, attemptNr {attemptNr}")
-                    if not conditions_apply(
-                        error_diag,
-                        job.cmtConfig,
-                        job.AtlasRelease,
-                        job.workQueue_ID,
-                        error_diag_rule,
-                        architecture,
-                        release,
-                        wqid,
-                    ):
-                        _logger.debug(
-                            f"Skipped rule {rule}. cmtConfig ({architecture} : {job.cmtConfig}) or Release ({release} : {job.AtlasRelease}) did NOT match"
-                        )
-                        continue
-
                     if action == NO_RETRY:
                         if active:
                             task_buffer.setNoRetry(job_id, job.jediTaskID, job.Files)
@@ -0,0 +1,91 @@
+"""
+Compare the throughput of getEventRanges when event ranges are claimed job by job and in bulk.
+Concurrent clients dispatch event ranges to the given event service jobs of a jobset, and the dispatched
+event ranges are released after each iteration so that both modes see the same workload,
+hence run it only against a local test database, e.g. a local PostgreSQL instance.
+The jobs must be in sent, running, or starting in jobsActive4.
+
+Usage: python benchmarkEventRanges.py <jediTaskID> <jobsetID> <PandaID,PandaID,...> [nRanges] [nClients] [nIterations]
+"""
+
+import sys
+import threading
+import time
+
+from pandaserver.config import panda_config
+from pandaserver.taskbuffer import EventServiceUtils
+from pandaserver.taskbuffer.OraDBProxy import DBProxy
+
+
+# make a DB proxy
+def make_proxy():
+    proxy = DBProxy()
+    proxy.connect(
+        panda_config.dbhost,
+        panda_config.dbpasswd,
+        panda_config.dbuser,
+        panda_config.dbname,
+    )
+    return proxy
+
+
+# release dispatched event ranges
+def release_ranges(proxy, jedi_task_id, panda_ids):
+    for panda_id in panda_ids:
+        proxy.querySQLS(
+            f"UPDATE {panda_config.schemaJEDI}.JEDI_Events SET PandaID=event_offset,status=:newStatus "
+            "WHERE jediTaskID=:jediTaskID AND PandaID=:PandaID AND status=:oldStatus",
+            {":newStatus": EventServiceUtils.ST_ready, ":jediTaskID": jedi_task_id, ":PandaID": panda_id, ":oldStatus": EventServiceUtils.ST_sent},
+        )
+
+
+# dispatch event ranges to jobs of a client and return the number of ranges
+def get_ranges(proxy, jedi_task_id, jobset_id, panda_ids, n_ranges, bulk_mode):
+    if bulk_mode:
+        ret_map = proxy.get_event_ranges_bulk([(panda_id, jobset_id, n_ranges) for panda_id in panda_ids], True, False, None)
+        return sum(len(ranges) for ranges in ret_map.values() if ranges)
+    n_dispatched = 0
+    for panda_id in panda_ids:
+        ranges = proxy.getEventRanges(panda_id, jobset_id, jedi_task_id, n_ranges, True, False, None)
+        if ranges:
+            n_dispatched += len(ranges)
+    return n_dispatched
+
+
+if __name__ == "__main__":
+    jedi_task_id = int(sys.argv[1])
+    jobset_id = int(sys.argv[2])
+    panda_ids = [int(panda_id) for panda_id in sys.argv[3].split(",")]
+    n_ranges = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+    n_clients = int(sys.argv[5]) if len(sys.argv) > 5 else 4
+    n_iterations = int(sys.argv[6]) if len(sys.argv) > 6 else 5
+
+    # jobs are split among clients
+    client_jobs = [panda_ids[i::n_clients] for i in range(n_clients) if panda_ids[i::n_clients]]
+    proxies = [make_proxy() for _ in client_jobs]
+
+    for bulk_mode in [False, True]:
+        label = "bulk" if bulk_mode else "per-job"
+        elapsed_list = []
+        n_total = 0
+        for i_iteration in range(n_iterations):
+            results = [0] * len(client_jobs)
+
+            def run_client(i_client):
+                results[i_client] = get_ranges(proxies[i_client], jedi_task_id, jobset_id, client_jobs[i_client], n_ranges, bulk_mode)
+
+            threads = [threading.Thread(target=run_client, args=(i_client,)) for i_client in range(len(client_jobs))]
+            t_start = time.time()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed_list.append(time.time() - t_start)
+            n_total += sum(results)
+            release_ranges(proxies[0], jedi_task_id, panda_ids)
+        elapsed_list.sort()
+        print(
+            f"{label:8s} : nJobs={len(panda_ids)} nRanges={n_ranges} clients={len(client_jobs)} iterations={n_iterations} dispatched={n_total} "
+            f"min={elapsed_list[0]:.3f}s median={elapsed_list[len(elapsed_list) // 2]:.3f}s max={elapsed_list[-1]:.3f}s "
+            f"ranges/sec={n_total / max(sum(elapsed_list), 1e-6):.1f}"
+        )
@@ -0,0 +1,81 @@
+"""
+Compare the latency of getJobs when jobs are claimed one by one and in bulk.
+The jobs dispatched in each iteration are reset to activated so that both modes see the same workload,
+hence run it only against a local test database, e.g. a local PostgreSQL instance.
+
+Usage: python benchmarkGetJobs.py <siteName> [nJobs] [nIterations]
+"""
+
+import socket
+import sys
+import time
+
+from pandaserver.config import panda_config
+from pandaserver.taskbuffer.OraDBProxy import DBProxy
+
+
+# reset dispatched jobs to activated
+def reset_jobs(proxy, panda_ids):
+    for panda_id in panda_ids:
+        proxy.querySQLS(
+            "UPDATE ATLAS_PANDA.jobsActive4 SET jobStatus=:jobStatus WHERE PandaID=:PandaID",
+            {":jobStatus": "activated", ":PandaID": panda_id},
+        )
+
+
+# dispatch jobs and return the elapsed time
+def get_jobs(proxy, site_name, n_jobs, bulk_mode):
+    t_start = time.time()
+    jobs, n_sent = proxy.getJobs(
+        n_jobs,
+        site_name,
+        "managed",
+        0,
+        0,
+        socket.getfqdn(),
+        600,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        False,
+        False,
+        0,
+        bulk_mode=bulk_mode,
+    )
+    return time.time() - t_start, [job.PandaID for job in jobs]
+
+
+if __name__ == "__main__":
+    site_name = sys.argv[1]
+    n_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    n_iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    proxy = DBProxy()
+    proxy.connect(
+        panda_config.dbhost,
+        panda_config.dbpasswd,
+        panda_config.dbuser,
+        panda_config.dbname,
+    )
+
+    for bulk_mode in [False, True]:
+        label = "bulk" if bulk_mode else "per-job"
+        latencies = []
+        n_dispatched = 0
+        for i_iteration in range(n_iterations):
+            latency, panda_ids = get_jobs(proxy, site_name, n_jobs, bulk_mode)
+            latencies.append(latency)
+            n_dispatched += len(panda_ids)
+            reset_jobs(proxy, panda_ids)
+        latencies.sort()
+        print(
+            f"{label:8s} : nJobs={n_jobs} iterations={n_iterations} dispatched={n_dispatched} "
+            f"min={latencies[0]:.3f}s median={latencies[len(latencies) // 2]:.3f}s max={latencies[-1]:.3f}s "
+            f"per_job={sum(latencies) / max(n_dispatched, 1) * 1000:.2f}ms"
+        )
@@ -0,0 +1,131 @@
+"""
+Benchmark of Protocol.Response.appendJob and encoding of job descriptions for synthetic jobs with 10 to 10,000 files.
+It measures appendJob with and without a SiteContext shared by jobs, and JSON encoding as a whole and as a stream.
+
+Usage: python benchmarkJobEncoder.py [nJobsPerRequest] [fileCounts]
+  e.g. python benchmarkJobEncoder.py 10 10,100,1000,10000
+"""
+
+import json
+import sys
+import time
+from urllib.parse import urlencode
+
+from pandaserver.jobdispatcher import Protocol
+from pandaserver.taskbuffer.DdmSpec import DdmSpec
+from pandaserver.taskbuffer.FileSpec import FileSpec
+from pandaserver.taskbuffer.JobSpec import JobSpec
+from pandaserver.taskbuffer.SiteSpec import SiteSpec
+
+
+# dummy SiteMapper with a single site
+class DummySiteMapper:
+    def __init__(self):
+        self.site_spec = SiteSpec()
+        self.site_spec.sitename = "SITE_A"
+        self.site_spec.ddm_endpoints_input = {"default": DdmSpec()}
+        self.site_spec.ddm_endpoints_output = {"default": DdmSpec()}
+        self.site_spec.setokens_input = {"default": {"ATLASDATADISK": "SITE_A_DATADISK"}}
+        self.site_spec.setokens_output = {"default": {"ATLASDATADISK": "SITE_A_DATADISK"}}
+        self.site_spec.ddm_input = {"default": "SITE_A_DATADISK"}
+        self.site_spec.ddm_output = {"default": "SITE_A_DATADISK"}
+
+    def getSite(self, site_name):
+        return self.site_spec
+
+    def resolveNucleus(self, site_name):
+        return None if site_name == "NULL" else site_name
+
+
+# dummy cache of SiteMapper
+class DummySiteMapperCache:
+    def __init__(self):
+        self.site_mapper = DummySiteMapper()
+
+    def get_object(self):
+        return self.site_mapper
+
+    def release_object(self):
+        pass
+
+
+# make a job with input files, an output file, and a log file
+def make_job(i_job, n_files):
+    job = JobSpec()
+    job.PandaID = i_job
+    job.computingSite = "SITE_A"
+    job.prodSourceLabel = "managed"
+    job.destinationSE = "NULL"
+    job.jobParameters = "--input in.root --output out.root"
+    for i_file in range(n_files + 2):
+        file_spec = FileSpec()
+        file_spec.lfn = f"file.{i_job}.{i_file}.root"
+        file_spec.GUID = f"guid-{i_job}-{i_file}"
+        file_spec.scope = "mc23_13p6TeV"
+        file_spec.dataset = "mc23_13p6TeV:mc.dataset"
+        file_spec.fsize = 1024 * 1024 * 1024
+        file_spec.checksum = "ad:12345678"
+        file_spec.destinationSE = "NULL"
+        if i_file < n_files:
+            file_spec.type = "input"
+            file_spec.dispatchDBlock = "panda.dis.dataset"
+            file_spec.dispatchDBlockToken = "ATLASDATADISK"
+            file_spec.prodDBlock = "mc23_13p6TeV:mc.dataset"
+            file_spec.prodDBlockToken = "NULL"
+        else:
+            file_spec.type = "output" if i_file == n_files else "log"
+            file_spec.destinationDBlock = "mc.output.dataset_sub01"
+            file_spec.destinationDBlockToken = "ATLASDATADISK"
+        job.addFile(file_spec)
+    return job
+
+
+# make job descriptions and return the elapsed time and the descriptions
+def append_jobs(jobs, site_mapper_cache, shared_context):
+    t_start = time.perf_counter()
+    site_context = Protocol.SiteContext(site_mapper_cache, jobs) if shared_context else None
+    response_list = []
+    for job in jobs:
+        response = Protocol.Response(Protocol.SC_Success)
+        if shared_context:
+            response.appendJob(job, siteContext=site_context)
+        else:
+            response.appendJob(job, site_mapper_cache)
+        response_list.append(response.data)
+    return time.perf_counter() - t_start, response_list
+
+
+# encode the bulk response and return the elapsed time and the size
+def encode_jobs(response_list, mode):
+    t_start = time.perf_counter()
+    response = Protocol.Response(Protocol.SC_Success)
+    if mode == "url":
+        response.appendNode("jobs", json.dumps(response_list))
+        size = len(urlencode(response.data))
+    else:
+        response.appendNode("jobs", response_list)
+        ret = response.encode(True, stream=mode == "stream")
+        if mode == "stream":
+            size = sum(len(piece) for piece in ret["content"])
+        else:
+            size = len(ret["content"])
+    return time.perf_counter() - t_start, size
+
+
+if __name__ == "__main__":
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    file_counts = [int(n) for n in sys.argv[2].split(",")] if len(sys.argv) > 2 else [10, 100, 1000, 10000]
+    site_mapper_cache = DummySiteMapperCache()
+
+    for n_files in file_counts:
+        jobs = [make_job(i_job, n_files) for i_job in range(n_jobs)]
+        t_per_job, _ = append_jobs(jobs, site_mapper_cache, False)
+        t_shared, response_list = append_jobs(jobs, site_mapper_cache, True)
+        t_url, size = encode_jobs(response_list, "url")
+        t_json, _ = encode_jobs(response_list, "json")
+        t_stream, _ = encode_jobs(response_list, "stream")
+        print(
+            f"nFiles={n_files:6d} nJobs={n_jobs} : appendJob {t_per_job * 1e3:9.2f} ms, with shared context {t_shared * 1e3:9.2f} ms "
+            f"({t_shared / n_jobs / (n_files + 2) * 1e6:.2f} us/file) | encode url {t_url * 1e3:9.2f} ms, "
+            f"json {t_json * 1e3:9.2f} ms, json stream {t_stream * 1e3:9.2f} ms | {size / 1024:.0f} kB"
+        )
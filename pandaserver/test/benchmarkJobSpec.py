@@ -0,0 +1,86 @@
+"""
+Micro-benchmark of JobSpec and FileSpec for construction, attribute access, change tracking, pickling, and memory per object.
+
+Usage: python benchmarkJobSpec.py [nJobs] [nFilesPerJob]
+"""
+
+import pickle
+import sys
+import time
+import tracemalloc
+
+from pandaserver.taskbuffer.FileSpec import FileSpec
+from pandaserver.taskbuffer.JobSpec import JobSpec
+
+
+# make a job with files
+def make_job(i_job, n_files):
+    job = JobSpec()
+    job.PandaID = i_job
+    job.jobStatus = "defined"
+    job.computingSite = "SITE_A"
+    job.prodSourceLabel = "managed"
+    job.currentPriority = 1000
+    job.jobParameters = "--input in.root --output out.root"
+    for i_file in range(n_files):
+        file_spec = FileSpec()
+        file_spec.lfn = f"file.{i_job}.{i_file}.root"
+        file_spec.type = "input"
+        file_spec.dataset = "mc.dataset"
+        file_spec.fsize = 1024
+        job.addFile(file_spec)
+    return job
+
+
+# run a function and return the elapsed time in microseconds per job
+def measure(label, func, n_jobs):
+    t_start = time.perf_counter()
+    ret = func()
+    elapsed = time.perf_counter() - t_start
+    print(f"{label:12s} : {elapsed:.3f} sec, {elapsed / n_jobs * 1e6:.1f} us/job")
+    return ret
+
+
+if __name__ == "__main__":
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_files = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    print(f"{n_jobs} jobs with {n_files} files each")
+
+    jobs = measure("construction", lambda: [make_job(i, n_files) for i in range(n_jobs)], n_jobs)
+
+    def access():
+        n = 0
+        for job in jobs:
+            if job.jobStatus == "defined" and job.computingSite != "NULL" and job.cloud == "NULL":
+                n += job.currentPriority
+            for file_spec in job.Files:
+                n += file_spec.fsize
+                n += len(file_spec.lfn)
+        return n
+
+    measure("access", access, n_jobs)
+
+    def update():
+        for job in jobs:
+            job.resetChangedList()
+            job.jobStatus = "assigned"
+            job.modificationHost = "host"
+            job.valuesMap(onlyChanged=True)
+            job.bindUpdateChangesExpression()
+            for file_spec in job.Files:
+                file_spec.status = "ready"
+                file_spec.valuesMap(onlyChanged=True)
+
+    measure("update", update, n_jobs)
+    measure("valuesMap", lambda: [job.valuesMap() for job in jobs], n_jobs)
+    blob = measure("pickle", lambda: pickle.dumps(jobs, protocol=pickle.HIGHEST_PROTOCOL), n_jobs)
+    measure("unpickle", lambda: pickle.loads(blob), n_jobs)
+    print(f"pickle size  : {len(blob) / n_jobs:.0f} bytes/job")
+
+    # memory
+    del jobs
+    tracemalloc.start()
+    jobs = [make_job(i, n_files) for i in range(n_jobs)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"memory       : {current / n_jobs:.0f} bytes/job")
@@ -0,0 +1,107 @@
+"""
+Replay the failed jobs of the last day against the retrial rules and compare the legacy evaluation with
+the retrial rule index. The legacy evaluation reads the rules from the database and scans them per action for every job,
+while the index is built once and evaluates all actions in one pass. Only rules are evaluated and no action is taken on jobs,
+and the number of jobs which got different rules is reported.
+
+Usage: python benchmarkRetrialRules.py [hours] [maxJobs]
+"""
+
+import sys
+import time
+
+from pandaserver.config import panda_config
+from pandaserver.taskbuffer import retryModule
+from pandaserver.taskbuffer.OraDBProxy import DBProxy
+
+# error sources as in get_job_error_details
+ERROR_SOURCES = ["pilotError", "exeError", "supError", "ddmError", "brokerageError", "jobDispatcherError", "taskBufferError"]
+
+
+# get errors of failed jobs
+def get_failed_jobs(proxy, hours, max_jobs):
+    columns = ",".join(f"{source}Code,{source}Diag" for source in ERROR_SOURCES)
+    sql = f"SELECT PandaID,AtlasRelease,cmtConfig,workQueue_ID,{columns} FROM {panda_config.schemaPANDA}.jobsArchived4 "
+    sql += f"WHERE jobStatus=:jobStatus AND modificationTime>CURRENT_DATE-{hours}/24 "
+    status, res = proxy.querySQLS(sql, {":jobStatus": "failed"})
+    jobs = []
+    for row in res[:max_jobs]:
+        panda_id, release, architecture, wqid = row[:4]
+        errors = []
+        for i_source, source in enumerate(ERROR_SOURCES):
+            error_code, error_diag = row[4 + 2 * i_source : 6 + 2 * i_source]
+            if error_code:
+                errors.append((f"{source}Code", error_code, error_diag))
+        jobs.append((panda_id, release, architecture, wqid, errors))
+    return jobs
+
+
+# convert applicable rules to comparable values
+def summarize(applicable_rules):
+    return [(rule["error_id"], rule["action"], rule["params"].get("maxAttempt")) for rule in applicable_rules]
+
+
+# evaluate rules in the legacy way
+def replay_legacy(proxy, jobs, with_db):
+    retrial_rules = proxy.getRetrialRules()
+    results = {}
+    for panda_id, release, architecture, wqid, errors in jobs:
+        if with_db:
+            retrial_rules = proxy.getRetrialRules()
+        for error_source, error_code, error_diag in errors:
+            try:
+                rules = retrial_rules[error_source][int(error_code)]
+            except (KeyError, ValueError):
+                continue
+            results[(panda_id, error_source)] = summarize(retryModule.preprocess_rules(rules, error_diag, release, architecture, wqid))
+    return results
+
+
+# evaluate rules with the index
+def replay_index(rule_index, jobs):
+    results = {}
+    for panda_id, release, architecture, wqid, errors in jobs:
+        for error_source, error_code, error_diag in errors:
+            try:
+                error_code = int(error_code)
+            except ValueError:
+                continue
+            applicable_rules = rule_index.get_applicable_rules(error_source, error_code, error_diag, release, architecture, wqid)
+            if applicable_rules is not None:
+                results[(panda_id, error_source)] = summarize(applicable_rules)
+    return results
+
+
+if __name__ == "__main__":
+    hours = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    max_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+    proxy = DBProxy()
+    proxy.connect(
+        panda_config.dbhost,
+        panda_config.dbpasswd,
+        panda_config.dbuser,
+        panda_config.dbname,
+    )
+
+    jobs = get_failed_jobs(proxy, hours, max_jobs)
+    n_errors = sum(len(job[-1]) for job in jobs)
+    print(f"replaying {len(jobs)} failed jobs with {n_errors} errors")
+
+    t_start = time.time()
+    legacy_results = replay_legacy(proxy, jobs, True)
+    print(f"legacy with DB : {time.time() - t_start:.3f} sec")
+
+    t_start = time.time()
+    replay_legacy(proxy, jobs, False)
+    print(f"legacy CPU     : {time.time() - t_start:.3f} sec")
+
+    t_start = time.time()
+    rule_index = retryModule.RetrialRuleIndex(proxy.getRetrialRules())
+    t_build = time.time() - t_start
+    t_start = time.time()
+    index_results = replay_index(rule_index, jobs)
+    print(f"index          : {time.time() - t_start:.3f} sec (build {t_build:.3f} sec, {rule_index})")
+
+    n_diff = sum(1 for key in legacy_results if legacy_results[key] != index_results.get(key))
+    print(f"{len(legacy_results)} errors with rules, {n_diff} with different rules")
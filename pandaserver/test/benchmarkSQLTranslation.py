@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of the SQL translation for PostgreSQL with and without the translation cache of WrappedCursor.
+SQL statements are collected from the string literals in taskbuffer/db_proxy_mods.
+
+Usage: python benchmarkSQLTranslation.py [nRepeat]
+"""
+
+import ast
+import glob
+import os
+import re
+import sys
+import time
+
+from pandaserver.taskbuffer import WrappedCursor as wrapped_cursor_module
+from pandaserver.taskbuffer.WrappedCursor import (
+    WrappedCursor,
+    convert_query_in_printf_format,
+    get_params_in_order,
+    sql_translation_cache,
+)
+
+
+# dummy connection since no statement is executed
+class DummyConnection:
+    def cursor(self):
+        return None
+
+
+# collect SQL statements and make dummy bind variables
+def collect_statements():
+    statements = []
+    mods_dir = os.path.join(os.path.dirname(wrapped_cursor_module.__file__), "db_proxy_mods")
+    for file_name in sorted(glob.glob(os.path.join(mods_dir, "*.py"))):
+        with open(file_name) as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                sql = node.value.strip()
+                if re.match(r"^(SELECT|INSERT|UPDATE|DELETE)\s", sql, flags=re.IGNORECASE) is None:
+                    continue
+                var_dict = {name: 1 for name in re.findall(r":[A-Za-z_]\w*", sql)}
+                # skip docstrings and fragments which cannot be translated alone
+                try:
+                    new_sql, bind_names = convert_query_in_printf_format(sql, var_dict)
+                    get_params_in_order(bind_names, var_dict)
+                except Exception:
+                    continue
+                statements.append((sql, var_dict))
+    return statements
+
+
+if __name__ == "__main__":
+    n_repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    statements = collect_statements()
+    cursor = WrappedCursor(DummyConnection())
+    cursor.backend = "postgres"
+    print(f"{len(statements)} statements x {n_repeat} repeats")
+
+    # translate every time
+    t_start = time.perf_counter()
+    for _ in range(n_repeat):
+        for sql, var_dict in statements:
+            new_sql = re.sub("`", "", cursor.change_schema(sql))
+            new_sql, bind_names = convert_query_in_printf_format(new_sql, var_dict)
+            get_params_in_order(bind_names, var_dict)
+    t_uncached = time.perf_counter() - t_start
+
+    # use the cache
+    t_start = time.perf_counter()
+    for _ in range(n_repeat):
+        for sql, var_dict in statements:
+            new_sql, bind_names = cursor.translate(sql, var_dict, True)
+            get_params_in_order(bind_names, var_dict)
+    t_cached = time.perf_counter() - t_start
+
+    n_calls = n_repeat * len(statements)
+    print(f"uncached : {t_uncached:.3f} sec, {t_uncached / n_calls * 1e6:.1f} us/statement")
+    print(f"cached   : {t_cached:.3f} sec, {t_cached / n_calls * 1e6:.1f} us/statement")
+    print(f"speedup  : {t_uncached / t_cached:.1f}x")
+    print(f"cache    : {sql_translation_cache.get_stats()}")
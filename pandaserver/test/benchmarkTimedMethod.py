@@ -0,0 +1,106 @@
+"""
+Micro-benchmark of timed methods of API calls. Calls with a new thread per call as before are compared with calls in the
+shared executor, for a method as fast as a cached lookup and for a method which overruns the deadline. Methods changing
+the state are checked to be waited for once they started, and to be cancelled when the deadline passes before starting.
+
+Usage: python benchmarkTimedMethod.py [nCalls] [nCallers]
+"""
+
+import sys
+import threading
+import time
+
+from pandaserver.srvcore.timed_executor import TimedExecutor
+
+TIME_OUT = "TimeOut"
+
+
+# a new thread per call as before
+class ThreadPerCallMethod:
+    def __init__(self, method, timeout):
+        self.method = method
+        self.timeout = timeout
+        self.result = TIME_OUT
+
+    def __call__(self, *var):
+        self.result = self.method(*var)
+
+    def run(self, *var):
+        thr = threading.Thread(target=self, args=var)
+        thr.start()
+        thr.join()
+
+
+# call methods from caller threads like httpd threads
+def run_callers(call, n_calls, n_callers):
+    results = []
+
+    def caller():
+        for _ in range(n_calls // n_callers):
+            results.append(call())
+
+    threads = [threading.Thread(target=caller) for _ in range(n_callers)]
+    t_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - t_start, results
+
+
+if __name__ == "__main__":
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_callers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    executor = TimedExecutor(n_callers, n_callers)
+
+    def fast_method(x):
+        return x + 1
+
+    def thread_per_call():
+        timed_method = ThreadPerCallMethod(fast_method, 10)
+        timed_method.run(1)
+        return timed_method.result
+
+    for label, call in [("thread", thread_per_call), ("executor", lambda: executor.call(fast_method, 10, TIME_OUT, (1,), read_only=True))]:
+        elapsed, results = run_callers(call, n_calls, n_callers)
+        print(f"{label:8s} : nCalls={len(results)} nCallers={n_callers} {elapsed:.3f} sec {elapsed / len(results) * 1e6:.1f} us/call")
+
+    # deadline is enforced only by the executor for read-only methods
+    def slow_method(x):
+        time.sleep(x)
+        return x
+
+    timed_method = ThreadPerCallMethod(slow_method, 0.1)
+    t_start = time.perf_counter()
+    timed_method.run(0.5)
+    print(f"thread   : timeout=0.1 sec method=0.5 sec result={timed_method.result} {time.perf_counter() - t_start:.3f} sec")
+    t_start = time.perf_counter()
+    result = executor.call(slow_method, 0.1, TIME_OUT, (0.5,), read_only=True)
+    print(f"executor : timeout=0.1 sec method=0.5 sec read_only result={result} {time.perf_counter() - t_start:.3f} sec")
+
+    # methods changing the state are waited for once they started, and are cancelled if they didn't start until the deadline
+    claimed = []
+
+    def claim_method(x):
+        time.sleep(x)
+        claimed.append(x)
+        return x
+
+    t_start = time.perf_counter()
+    result = executor.call(claim_method, 0.1, TIME_OUT, (0.5,))
+    print(f"executor : timeout=0.1 sec method=0.5 sec started result={result} {time.perf_counter() - t_start:.3f} sec")
+    assert result == 0.5 and claimed == [0.5]
+    # occupy all workers so that the next call waits for a worker beyond the deadline
+    busy_threads = [threading.Thread(target=executor.call, args=(slow_method, None, TIME_OUT, (0.5,))) for _ in range(n_callers)]
+    for thread in busy_threads:
+        thread.start()
+    time.sleep(0.05)
+    t_start = time.perf_counter()
+    result = executor.call(claim_method, 0.1, TIME_OUT, (0.01,))
+    print(f"executor : timeout=0.1 sec all workers busy queued result={result} {time.perf_counter() - t_start:.3f} sec")
+    for thread in busy_threads:
+        thread.join()
+    time.sleep(0.1)
+    assert result == TIME_OUT and claimed == [0.5]
+    print(f"stats : {executor.get_stats()}")
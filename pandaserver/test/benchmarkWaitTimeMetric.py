@@ -0,0 +1,157 @@
+"""
+Benchmark of the wait time metric of analysis pmerge jobs in metric_collector with a synthetic jobs_StatusLog table in an
+in-memory SQLite database. The chunked grouped query with statistics of all sites in one go is compared with one query
+per job and statistics per site with NumPy, and results of both are checked to be identical.
+
+Usage: python benchmarkWaitTimeMetric.py [nJobs] [nSites]
+"""
+
+import datetime
+import logging
+import random
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from pandaserver.daemons.scripts.metric_collector import (
+    conf_interval_upper,
+    get_jobs_wait_time_and_run_age,
+    get_site_wait_time_stats,
+)
+
+
+# sum of weights, weighted mean and standard deviation of a site, as metric_collector used to get them per site
+def weighted_stats(values, weights):
+    sum_of_weights = np.sum(weights)
+    mean = np.average(values, weights=weights)
+    variance = np.average((values - mean) ** 2, weights=weights)
+    stdev = np.sqrt(variance)
+    return sum_of_weights, mean, stdev
+
+
+# task buffer with only querySQL on the SQLite database
+class SQLiteTaskBuffer(object):
+    def __init__(self, conn):
+        self.conn = conn
+        self.n_queries = 0
+
+    def querySQL(self, sql, varMap):
+        self.n_queries += 1
+        res = []
+        for row in self.conn.execute(sql, {key.lstrip(":"): value for key, value in varMap.items()}):
+            # timestamps are stored as ISO strings
+            res.append(tuple(datetime.datetime.fromisoformat(item) if isinstance(item, str) and item[:1].isdigit() else item for item in row))
+        return res
+
+
+# make the synthetic table
+def make_status_log(n_jobs, n_sites, now_time):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("ATTACH DATABASE ':memory:' AS ATLAS_PANDA")
+    conn.execute("CREATE TABLE ATLAS_PANDA.jobs_StatusLog (pandaID INTEGER, modificationTime TEXT, jobStatus TEXT)")
+    conn.execute("CREATE INDEX ATLAS_PANDA.jobs_StatusLog_idx ON jobs_StatusLog (pandaID)")
+    random.seed(0)
+    job_site_set = set()
+    rows = []
+    for panda_id in range(1, n_jobs + 1):
+        site = f"SITE_{random.randrange(n_sites)}"
+        job_site_set.add((panda_id, site))
+        defined_time = now_time - datetime.timedelta(seconds=random.randint(3 * 3600, 4 * 24 * 3600))
+        activated_time = defined_time + datetime.timedelta(seconds=random.randint(0, 600))
+        running_time = activated_time + datetime.timedelta(seconds=random.randint(0, 7200))
+        rows.append((panda_id, defined_time.isoformat(), "defined"))
+        # some jobs are still activated
+        if random.random() < 0.05:
+            rows.append((panda_id, activated_time.isoformat(), "activated"))
+            continue
+        rows.append((panda_id, activated_time.isoformat(), "activated"))
+        # status log is recorded more than once for a few jobs
+        if random.random() < 0.05:
+            rows.append((panda_id, (activated_time + datetime.timedelta(seconds=30)).isoformat(), "activated"))
+        rows.append((panda_id, running_time.isoformat(), "running"))
+        rows.append((panda_id, (running_time + datetime.timedelta(seconds=random.randint(60, 3600))).isoformat(), "finished"))
+    conn.executemany("INSERT INTO ATLAS_PANDA.jobs_StatusLog VALUES (?,?,?)", rows)
+    return conn, job_site_set
+
+
+# one query per job and statistics per site as before
+def run_per_job(tbuf, job_site_set, now_time):
+    sql_get_latest_job_mtime_status = (
+        "SELECT jobStatus, MIN(modificationTime) " "FROM ATLAS_PANDA.jobs_StatusLog " "WHERE pandaID=:pandaID " "GROUP BY jobStatus "
+    )
+    tmp_site_dict = dict()
+    for pandaID, site in job_site_set:
+        if not site:
+            continue
+        status_mtime_dict = dict(tbuf.querySQL(sql_get_latest_job_mtime_status, {":pandaID": pandaID}))
+        if "activated" not in status_mtime_dict or "running" not in status_mtime_dict:
+            continue
+        wait_time_sec = (status_mtime_dict["running"] - status_mtime_dict["activated"]).total_seconds()
+        if wait_time_sec < 0:
+            continue
+        run_age_sec = int((now_time - status_mtime_dict["running"]).total_seconds())
+        if run_age_sec < 0:
+            continue
+        tmp_site_dict.setdefault(site, {"wait_time": [], "run_age": []})
+        tmp_site_dict[site]["wait_time"].append(wait_time_sec)
+        tmp_site_dict[site]["run_age"].append(run_age_sec)
+    site_dict = dict()
+    for site, data_dict in tmp_site_dict.items():
+        n_jobs = len(data_dict["wait_time"])
+        wait_time_array = np.array(data_dict["wait_time"])
+        run_age_array = np.array(data_dict["run_age"])
+        mean = np.mean(wait_time_array)
+        stdev = np.std(wait_time_array)
+        weight_array = np.exp2(-run_age_array / (12 * 60 * 60))
+        sum_of_weights, w_mean, w_stdev = weighted_stats(wait_time_array, weight_array)
+        site_dict[site] = {
+            "n": n_jobs,
+            "mean": mean,
+            "stdev": stdev,
+            "med": np.median(wait_time_array),
+            "cl95upp": conf_interval_upper(n=n_jobs, mean=mean, stdev=stdev, cl=0.95),
+            "sum_of_weights": sum_of_weights,
+            "w_mean": w_mean,
+            "w_stdev": w_stdev,
+            "w_cl95upp": conf_interval_upper(n=sum_of_weights + 1, mean=w_mean, stdev=w_stdev, cl=0.95),
+        }
+    return site_dict
+
+
+# chunked grouped query and statistics of all sites
+def run_grouped(tbuf, job_site_set, now_time):
+    site_list, wait_time_list, run_age_list = get_jobs_wait_time_and_run_age(tbuf, job_site_set, now_time, logging.getLogger("benchmark"))
+    return get_site_wait_time_stats(site_list, wait_time_list, run_age_list)
+
+
+# compare results
+def is_identical(site_dict_a, site_dict_b):
+    if site_dict_a.keys() != site_dict_b.keys():
+        return False
+    for site, stats_a in site_dict_a.items():
+        stats_b = site_dict_b[site]
+        if stats_a.keys() != stats_b.keys():
+            return False
+        for key in stats_a:
+            if not np.isclose(stats_a[key], stats_b[key], rtol=1e-9, equal_nan=True):
+                print(f"  {site} {key} : {stats_a[key]} != {stats_b[key]}")
+                return False
+    return True
+
+
+if __name__ == "__main__":
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_sites = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    now_time = datetime.datetime(2024, 1, 1)
+    conn, job_site_set = make_status_log(n_jobs, n_sites, now_time)
+    results = {}
+    for label, func in [("per-job", run_per_job), ("grouped", run_grouped)]:
+        tbuf = SQLiteTaskBuffer(conn)
+        t_start = time.perf_counter()
+        results[label] = func(tbuf, job_site_set, now_time)
+        elapsed = time.perf_counter() - t_start
+        print(f"{label:7s} : nJobs={n_jobs} nSites={len(results[label])} nQueries={tbuf.n_queries} {elapsed:.3f} sec")
+    print(f"identical results : {is_identical(results['per-job'], results['grouped'])}")
@@ -18,7 +18,7 @@ import pandaserver.jobdispatcher.Protocol as Protocol
 from pandaserver.brokerage.SiteMapper import SiteMapper
 from pandaserver.config import panda_config
 from pandaserver.dataservice.ddm import rucioAPI
-from pandaserver.srvcore import CoreUtils
+from pandaserver.srvcore import CoreUtils, statistics_snapshot
 from pandaserver.srvcore.CoreUtils import clean_user_id, resolve_bool
 from pandaserver.taskbuffer import JobUtils, PrioUtil
 from pandaserver.taskbuffer.JediTaskSpec import JediTaskSpec
@@ -197,13 +197,27 @@ class UserIF:
         return WrappedPickle.dumps(ret)
 
     # get job statistics per site
-    def getJobStatisticsPerSite(self):
-        ret = self.taskBuffer.getJobStatistics()
+    def getJobStatisticsPerSite(self, req):
+        # use the snapshot if available
+        view = statistics_snapshot.get_view("job_stats_by_site")
+        if view is None:
+            ret = self.taskBuffer.getJobStatistics()
+        elif view.set_response_headers(req):
+            return ""
+        else:
+            ret = view.data
         return WrappedPickle.dumps(ret, convert_to_safe=True)
 
     # get job statistics per site, source label, and resource type
-    def get_job_statistics_per_site_label_resource(self, time_window):
-        ret = self.taskBuffer.get_job_statistics_per_site_label_resource(time_window)
+    def get_job_statistics_per_site_label_resource(self, req, time_window):
+        # use the snapshot if available for the default time window
+        view = statistics_snapshot.get_view("job_stats_by_site_share_and_resource_type") if time_window is None else None
+        if view is None:
+            ret = self.taskBuffer.get_job_statistics_per_site_label_resource(time_window)
+        elif view.set_response_headers(req):
+            return ""
+        else:
+            ret = view.data
         return json.dumps(ret)
 
     # kill jobs
@@ -758,12 +772,12 @@ def checkSandboxFile(req, fileSize, checkSum):
 
 # get job statistics per site and resource
 def get_job_statistics_per_site_label_resource(req, time_window=None):
-    return userIF.get_job_statistics_per_site_label_resource(time_window)
+    return userIF.get_job_statistics_per_site_label_resource(req, time_window)
 
 
 # get job statistics per site
 def getJobStatisticsPerSite(req):
-    return userIF.getJobStatisticsPerSite()
+    return userIF.getJobStatisticsPerSite(req)
 
 
 # kill jobs